@@ -0,0 +1,100 @@
+"""
+Caché TTL + LRU de API Keys validadas.
+
+Las entradas se indexan por el SHA-256 de la API Key (la clave en claro no se
+guarda como índice) y por un espacio de nombres, de modo que la usan tanto
+public_api_key_required (registros de Tenant_API_Keys con permisos ya
+parseados) como rbac_required (correspondencia API Key ↔ tenant en public_api_keys, que
+solo se cachea cuando coincide).
+
+La caché es por proceso; las invalidaciones explícitas solo alcanzan al worker
+que hizo el cambio y el TTL acota cuánto tardan los demás en verlo.
+
+Variables de entorno:
+    API_KEY_CACHE_TTL   Segundos de vida de una entrada (default 60)
+    API_KEY_CACHE_MAX   Entradas máximas antes de expulsar la menos usada (default 1024)
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def hash_api_key(api_key: str) -> str:
+    """SHA-256 hexadecimal de la API Key, usado como índice de la caché"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+class APIKeyCache:
+    """Caché LRU con expiración por entrada e invalidación por id o tenant"""
+
+    def __init__(self, ttl: float = 60, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (namespace, hash) -> (valor, expira_en, api_key_id, tenant_id)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, api_key: str) -> Optional[Any]:
+        key = (namespace, hash_api_key(api_key))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, namespace: str, api_key: str, value: Any,
+            api_key_id: Optional[int] = None, tenant_id: Optional[int] = None):
+        key = (namespace, hash_api_key(api_key))
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl, api_key_id, tenant_id)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, api_key_id: Optional[int] = None, tenant_id: Optional[int] = None,
+                   namespace: Optional[str] = None):
+        """Elimina las entradas que coincidan con todos los filtros indicados"""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if namespace is not None and key[0] != namespace:
+                    continue
+                if api_key_id is not None and entry[2] != api_key_id:
+                    continue
+                if tenant_id is not None and entry[3] != tenant_id:
+                    continue
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def invalidate_api_key(api_key_id: int, tenant_id: int):
+    """Invalida una API Key de Tenant_API_Keys tras desactivarla, eliminarla o modificarla"""
+    api_key_cache.invalidate(api_key_id=api_key_id, tenant_id=tenant_id, namespace='tenant_api_keys')
+
+
+# Instancia global de la caché
+api_key_cache = APIKeyCache(
+    ttl=float(os.getenv('API_KEY_CACHE_TTL', 60)),
+    max_entries=int(os.getenv('API_KEY_CACHE_MAX', 1024)),
+)
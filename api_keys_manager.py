@@ -11,6 +11,8 @@ from flask import jsonify, request, g
 import mysql.connector
 import logging
 
+from api_key_cache import invalidate_api_key
+
 logger = logging.getLogger(__name__)
 
 def generate_api_key():
@@ -292,6 +294,7 @@ class APIKeysManager:
             
             cursor.execute(query, values)
             self.conn.commit()
+            invalidate_api_key(api_key_id, tenant_id)
             
             if cursor.rowcount == 0:
                 cursor.close()
@@ -336,6 +339,7 @@ class APIKeysManager:
             """, (api_key_id, tenant_id))
             
             self.conn.commit()
+            invalidate_api_key(api_key_id, tenant_id)
             
             if cursor.rowcount == 0:
                 cursor.close()
@@ -0,0 +1,170 @@
+"""
+Escritor asíncrono y por lotes para API_Key_Logs.
+
+Los registros de auditoría de la API pública se encolan en memoria y un hilo
+en segundo plano los escribe con INSERT multi-fila, junto con UPDATEs
+agregados de los contadores de Tenant_API_Keys. La respuesta HTTP ya no espera
+a estas escrituras.
+
+Variables de entorno:
+    API_LOG_BATCH_SIZE       Registros que disparan un volcado inmediato (default 200)
+    API_LOG_FLUSH_INTERVAL   Segundos máximos entre volcados (default 5)
+    API_LOG_QUEUE_MAX        Registros en cola antes de descartar (default 10000)
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Any, Dict, List
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+
+class APILogBatchWriter:
+    """Cola acotada + hilo de volcado para los logs de uso de API Keys"""
+
+    INSERT_SQL = """
+        INSERT INTO API_Key_Logs (
+            api_key_id, tenant_id, endpoint, metodo, status_code,
+            exitoso, ip_origen, user_agent, query_params,
+            error_message, response_time_ms, timestamp
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 5, max_queue: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'failed_batches': 0}
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """Encola un registro. Devuelve False si la cola está llena y se descartó."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['dropped'] += 1
+            return False
+
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+        self._ensure_thread()
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or self._thread_pid != pid or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='api-log-writer', daemon=True)
+                self._thread_pid = pid
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Escribe todo lo encolado en lotes de batch_size"""
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return
+                self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        counters = {}
+        for record in batch:
+            total, ok, failed = counters.get(record['api_key_id'], (0, 0, 0))
+            if record['exitoso']:
+                counters[record['api_key_id']] = (total + 1, ok + 1, failed)
+            else:
+                counters[record['api_key_id']] = (total + 1, ok, failed + 1)
+
+        try:
+            conn = db_pool.get_connection()
+        except Exception as e:
+            logger.error(f"Error obteniendo conexión para logs de API: {str(e)}")
+            self._count_failed(batch)
+            return
+
+        cursor = conn.cursor()
+        try:
+            # mysql-connector reescribe executemany de un INSERT como un único INSERT multi-fila
+            cursor.executemany(self.INSERT_SQL, [(
+                r['api_key_id'], r['tenant_id'], r['endpoint'], r['metodo'], r['status_code'],
+                r['exitoso'], r['ip_origen'], r['user_agent'], r['query_params'],
+                r['error_message'], r['response_time_ms'], r['timestamp']
+            ) for r in batch])
+
+            cursor.executemany("""
+                UPDATE Tenant_API_Keys
+                SET total_requests = total_requests + %s,
+                    requests_exitosos = requests_exitosos + %s,
+                    requests_fallidos = requests_fallidos + %s
+                WHERE id = %s
+            """, [(total, ok, failed, api_key_id) for api_key_id, (total, ok, failed) in counters.items()])
+
+            conn.commit()
+            with self._stats_lock:
+                self._stats['written'] += len(batch)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error escribiendo lote de {len(batch)} logs de API: {str(e)}")
+            self._count_failed(batch)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _count_failed(self, batch):
+        # Los lotes fallidos no se reintentan para no acumular memoria sin límite
+        with self._stats_lock:
+            self._stats['failed_batches'] += 1
+            self._stats['dropped'] += len(batch)
+
+    def drain(self, timeout: float = 10):
+        """Vacía la cola antes de terminar el proceso"""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+# Instancia global del escritor
+api_log_writer = APILogBatchWriter(
+    batch_size=int(os.getenv('API_LOG_BATCH_SIZE', 200)),
+    flush_interval=float(os.getenv('API_LOG_FLUSH_INTERVAL', 5)),
+    max_queue=int(os.getenv('API_LOG_QUEUE_MAX', 10000)),
+)
+atexit.register(api_log_writer.drain)
@@ -50,6 +50,8 @@ except ImportError:
 from datetime import datetime, date, timedelta
 from decimal import Decimal
 import io
+import itertools
+import tempfile
 import re # Importado para la limpieza de números de teléfono
 
 # --- NUEVAS IMPORTACIONES ---
@@ -62,7 +64,8 @@ import pytz
 from drive_uploader import upload_file_to_drive
 import re
 import hashlib
-from celery_tasks import calculate_candidate_score
+from celery_tasks import (celery_app, dispatch_whatsapp_campaign, enqueue_cv_job, export_candidates_task,
+                          import_candidates_task, send_whatsapp_notifications_batch)
 # ✨ MÓDULO B5 - Sistema de Permisos y Jerarquía
 from permission_service import (
     can_create_resource,
@@ -83,28 +86,61 @@ from permission_service import (
     get_scope_for_tab,
     can_action_on_tab,
     get_ui_flags_for_tab,
-    get_redactions_for_tab
+    get_redactions_for_tab,
+    invalidate_permission_cache
 )
 from werkzeug.utils import secure_filename
-from flask import Flask, jsonify, request, Response, send_file, send_from_directory, g, url_for, redirect
+from flask import Flask, jsonify, request, Response, send_file, send_from_directory, g, url_for, redirect, stream_with_context
 from flask_sock import Sock
 import jwt
 import bcrypt
 
 # Importaciones para OCI Object Storage (opcionales)
 try:
-    from oci_storage_service import oci_storage_service
+    from oci_storage_service import oci_storage_service, oci_upload_manager
     from cv_processing_service import cv_processing_service
+    import cv_par_cache
     OCI_SERVICES_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Servicios OCI no disponibles: {str(e)}")
     OCI_SERVICES_AVAILABLE = False
     oci_storage_service = None
+    oci_upload_manager = None
     cv_processing_service = None
+    cv_par_cache = None
 
 # --- PUBLIC API SERVICE ---
 from public_api_service import public_api_service
 
+# --- POOL DE CONEXIONES MYSQL ---
+import db_pool
+from api_log_writer import api_log_writer
+from api_key_cache import api_key_cache
+from candidate_search import build_term_clause
+from pagination import (
+    COUNT_MODES, CountCache, decode_cursor, encode_cursor,
+    keyset_condition, keyset_order_clause, resolve_count
+)
+from dashboard_rollups import daily_series, db_today, metric_total, months_ago
+from dashboard_queries import DashboardQueryPlanner
+from candidate_export import (
+    CSV_MIMETYPE, EXPORT_DIR, EXPORT_FORMATS, XLSX_MIMETYPE, build_export_query,
+    export_filename, iter_candidate_chunks, iter_csv, parse_filters, write_xlsx
+)
+from duplicate_index import reindex_candidates
+from candidate_scoring import SCORE_FIELDS, mark_dirty, mark_dirty_select, simulate as simulate_scoring, tenant_features
+import whatsapp_campaigns
+from cv_duplicate_detector import create_duplicate_detector
+from candidate_import import (
+    IMPORT_DIR, analyze_dataframe, import_dataframe, missing_required_columns,
+    read_spreadsheet, summarize_import
+)
+import cv_cache
+from cv_pipeline import (
+    create_candidate_from_cv_data, create_job, get_job, get_job_files, new_job_id,
+    save_cv_to_database, stage_file
+)
+
 # --- DATABASE MIGRATIONS ---
 from database_migrations import run_database_migrations
 from agent_orchestrator import orchestrator, BASE_DATA_PATH
@@ -515,25 +551,41 @@ def rbac_required(modulo, accion):
             except Exception as e:
                 return jsonify({"error": f"Token inválido: {str(e)}"}), 401
 
-            # 3. Validar correspondencia API Key con Tenant (Cruce de Cables)
-            conn = get_db_connection()
-            if not conn:
-                return jsonify({"error": "Error de conexión a base de datos"}), 500
-            
-            cursor = conn.cursor(dictionary=True)
-            try:
-                # Verificar si la API Key pertenece al tenant del usuario
-                cursor.execute("""
-                    SELECT id FROM public_api_keys 
-                    WHERE api_key = %s AND tenant_id = %s AND activa = 1
-                """, (api_key, tenant_id))
-                key_match = cursor.fetchone()
+            # 3. Validar correspondencia API Key con Tenant (Cruce de Cables).
+            # Las coincidencias se cachean (api_key_cache.py) y la clave interna
+            # no necesita consulta, así que la BD solo se toca en un fallo de caché.
+            if api_key != INTERNAL_API_KEY:
+                cache_key = f"{tenant_id}:{api_key}"
+                key_match = api_key_cache.get('rbac', cache_key)
+                if key_match is None:
+                    conn = get_db_connection()
+                    if not conn:
+                        return jsonify({"error": "Error de conexión a base de datos"}), 500
+                    
+                    cursor = conn.cursor(dictionary=True)
+                    try:
+                        # Verificar si la API Key pertenece al tenant del usuario
+                        cursor.execute("""
+                            SELECT id FROM public_api_keys 
+                            WHERE api_key = %s AND tenant_id = %s AND activa = 1
+                        """, (api_key, tenant_id))
+                        key_match = cursor.fetchone()
+                    except Exception as e:
+                        app.logger.error(f"Error en validación RBAC: {str(e)}")
+                        return jsonify({"error": "Error interno validando permisos"}), 500
+                    finally:
+                        cursor.close()
+                        conn.close()
+                    
+                    if key_match:
+                        api_key_cache.set('rbac', cache_key, True, api_key_id=key_match['id'], tenant_id=tenant_id)
                 
-                if not key_match and api_key != INTERNAL_API_KEY:
+                if not key_match:
                     app.logger.error(f"BRECHA DE SEGURIDAD DETECTADA: API Key no coincide con Tenant del usuario. UserID: {user_id}, TenantID: {tenant_id}")
                     return jsonify({"error": "Inconsistencia de seguridad: API Key no autorizada para este usuario"}), 403
 
-                # 4. Validar Permisos mediante permission_service
+            # 4. Validar Permisos mediante permission_service
+            try:
                 from permission_service import can_perform_action as check_perm
                 if not check_perm(user_id, tenant_id, modulo, accion):
                     app.logger.warning(f"ACCESO DENEGADO: Usuario {user_id} intentó {accion} en {modulo} sin permisos.")
@@ -549,9 +601,6 @@ def rbac_required(modulo, accion):
             except Exception as e:
                 app.logger.error(f"Error en validación RBAC: {str(e)}")
                 return jsonify({"error": "Error interno validando permisos"}), 500
-            finally:
-                cursor.close()
-                conn.close()
                 
         return decorated_function
     return decorator
@@ -602,17 +651,19 @@ def public_api_key_required(f):
                 'message': 'Debes incluir el header X-API-Key con tu clave de API'
             }), 401
         
-        # Validar API Key
-        conn = get_db_connection()
-        if not conn:
+        # Validar API Key. Solo se toma una conexión del pool si la clave no
+        # está en caché; los logs y el rate limit no la necesitan.
+        conn = None
+        try:
+            is_valid, api_key_data = public_api_service.validate_api_key(None, api_key)
+        except (db_pool.PoolExhaustedError, mysql.connector.Error) as e:
+            app.logger.error(f"Error de conexión validando API Key pública: {str(e)}")
             return jsonify({
                 'success': False,
                 'error': 'Error de conexión al servidor'
             }), 500
         
         try:
-            is_valid, api_key_data = public_api_service.validate_api_key(conn, api_key)
-            
             if not is_valid:
                 error_msg = api_key_data.get('error', 'API Key inválida') if api_key_data else 'API Key inválida'
                 
@@ -635,11 +686,12 @@ def public_api_key_required(f):
                     'error': error_msg
                 }), 401
             
-            # Verificar rate limit
-            rate_limit_ok, requests_remaining = public_api_service.check_rate_limit(
+            # Verificar rate limit (por minuto y por día)
+            rate_limit_ok, requests_remaining, ventana_excedida = public_api_service.check_rate_limit(
                 conn=conn,
                 api_key_id=api_key_data['id'],
-                rate_limit_per_minute=api_key_data['rate_limit_per_minute']
+                rate_limit_per_minute=api_key_data['rate_limit_per_minute'],
+                rate_limit_per_day=api_key_data.get('rate_limit_per_day')
             )
             
             if not rate_limit_ok:
@@ -655,10 +707,15 @@ def public_api_key_required(f):
                     error_message='Rate limit excedido'
                 )
                 
+                if ventana_excedida == 'day':
+                    limit_msg = f'Has excedido el límite de {api_key_data["rate_limit_per_day"]} peticiones por día'
+                else:
+                    limit_msg = f'Has excedido el límite de {api_key_data["rate_limit_per_minute"]} peticiones por minuto'
+                
                 return jsonify({
                     'success': False,
                     'error': 'Rate limit excedido',
-                    'message': f'Has excedido el límite de {api_key_data["rate_limit_per_minute"]} peticiones por minuto'
+                    'message': limit_msg
                 }), 429
             
             # Almacenar datos de la API Key en el contexto
@@ -720,21 +777,21 @@ def public_api_key_required(f):
                 'success': False,
                 'error': 'Error interno del servidor'
             }), 500
-        finally:
-            if conn:
-                conn.close()
     
     return decorated
 
 
 # --- FUNCIÓN DE CONEXIÓN A LA BD ---
 def get_db_connection():
+    """
+    Presta una conexión del pool del proceso (ver db_pool.py).
+    conn.close() la devuelve al pool en lugar de cerrar el socket.
+    """
     try:
-        return mysql.connector.connect(
-            host=os.getenv('DB_HOST'), user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'), port=int(os.getenv('DB_PORT')),
-            database=os.getenv('DB_NAME')
-        )
+        return db_pool.get_connection()
+    except db_pool.PoolExhaustedError as err:
+        app.logger.error(f"Pool de conexiones agotado: {err}")
+        return None
     except mysql.connector.Error as err:
         app.logger.error(f"Error de conexión a la base de datos: {err}")
         return None
@@ -1365,7 +1422,8 @@ def assistant_command():
                             "message_body": {"type": "string", "description": "Mensaje personalizado. Usa [nombre] para reemplazo automático"},
                             "candidate_ids": {"type": "string", "description": "IDs de candidatos separados por comas"},
                             "vacancy_id": {"type": "integer", "description": "ID de vacante para contactar candidatos postulados"},
-                            "template_type": {"type": "string", "description": "Tipo: 'vacancy_invitation', 'interview_reminder', 'status_update', 'custom'"}
+                            "template_type": {"type": "string", "description": "Tipo: 'vacancy_invitation', 'interview_reminder', 'status_update', 'custom'"},
+                            "dispatch": {"type": "boolean", "description": "true para enviar la campaña ahora; por defecto solo se prepara"}
                         }, 
                         "required": []
                     }
@@ -1950,10 +2008,13 @@ def get_dashboard_stats_multi_tenant(tenant_id: int, report_type: str = "kpi"):
 
 def create_whatsapp_campaign_multi_tenant(tenant_id: int, message_body: str = None, 
                                          candidate_ids: str = None, vacancy_id: int = None, 
-                                         template_type: str = "custom", **campaign_options):
+                                         template_type: str = "custom", dispatch: bool = False,
+                                         **campaign_options):
     """
     Crea campañas de WhatsApp inteligentes con soporte multi-tenant
-    Detecta automáticamente si usar API oficial o WhatsApp Web según configuración del tenant
+    Detecta automáticamente si usar API oficial o WhatsApp Web según configuración del tenant.
+    Con dispatch=True la campaña se guarda y se envía por lotes en Celery
+    (ver whatsapp_campaigns.py); si no, solo se prepara la lista de destinatarios.
     """
     conn = get_db_connection()
     if not conn: 
@@ -1975,39 +2036,14 @@ def create_whatsapp_campaign_multi_tenant(tenant_id: int, message_body: str = No
                 "action_required": "Configure WhatsApp en Configuración > Integraciones"
             })
         
-        # Obtener candidatos objetivo
-        recipients = []
-        
-        if candidate_ids:
-            # Buscar por lista de IDs
-            ids_list = [id.strip() for id in candidate_ids.split(',')]
-            for candidate_id in ids_list:
-                if candidate_id.isdigit():
-                    cursor.execute("""
-                        SELECT id_afiliado, nombre_completo, telefono 
-                        FROM Afiliados 
-                        WHERE id_afiliado = %s AND tenant_id = %s
-                    """, (int(candidate_id), tenant_id))
-                    candidate = cursor.fetchone()
-                    if candidate:
-                        recipients.append(candidate)
-        
-        elif vacancy_id:
-            # Buscar candidatos postulados a una vacante específica
-            cursor.execute("""
-                SELECT DISTINCT a.id_afiliado, a.nombre_completo, a.telefono
-                FROM Afiliados a
-                JOIN Postulaciones p ON a.id_afiliado = p.id_afiliado
-                JOIN Vacantes v ON p.id_vacante = v.id_vacante
-                WHERE v.id_vacante = %s AND v.tenant_id = %s AND a.tenant_id = %s
-            """, (vacancy_id, tenant_id, tenant_id))
-            recipients = cursor.fetchall()
-        
-        else:
+        if not candidate_ids and not vacancy_id:
             return json.dumps({
                 "error": "Debe especificar candidate_ids o vacancy_id para la campaña"
             })
         
+        # Obtener candidatos objetivo (una consulta por lista de IDs o por vacante)
+        recipients = whatsapp_campaigns.resolve_recipients(cursor, tenant_id, candidate_ids, vacancy_id)
+        
         if not recipients:
             return json.dumps({
                 "error": "No se encontraron candidatos válidos para la campaña"
@@ -2015,36 +2051,32 @@ def create_whatsapp_campaign_multi_tenant(tenant_id: int, message_body: str = No
         
         # Determinar mensaje según tipo de plantilla
         if not message_body:
-            if template_type == "vacancy_invitation":
-                message_body = "Hola [nombre], tenemos una nueva oportunidad laboral que podría interesarte. ¿Te gustaría conocer más detalles?"
-            elif template_type == "interview_reminder":
-                message_body = "Hola [nombre], te recordamos tu entrevista programada. ¡Te esperamos!"
-            elif template_type == "status_update":
-                message_body = "Hola [nombre], hay una actualización sobre tu postulación. Te contactaremos pronto."
-            else:
-                message_body = "Hola [nombre], nos comunicamos contigo desde nuestro equipo de reclutamiento."
+            message_body = whatsapp_campaigns.DEFAULT_MESSAGES.get(template_type, whatsapp_campaigns.DEFAULT_MESSAGES['custom'])
         
         # Preparar lista de destinatarios con datos limpios
-        campaign_recipients = []
-        for recipient in recipients:
-            clean_phone = clean_phone_number(recipient['telefono'])
-            if clean_phone and len(clean_phone) >= 10:
-                campaign_recipients.append({
-                    "id_afiliado": recipient['id_afiliado'],
-                    "nombre_completo": recipient['nombre_completo'],
-                    "telefono": clean_phone,
-                    "mensaje_personalizado": message_body.replace('[nombre]', recipient['nombre_completo'])
-                })
+        campaign_recipients = whatsapp_campaigns.build_messages(recipients, message_body)
         
-        return json.dumps({
+        response = {
             "success": True,
             "whatsapp_method": whatsapp_config['config_type'],  # 'api' o 'web'
             "total_recipients": len(campaign_recipients),
-            "recipients": campaign_recipients,
             "message_template": message_body,
             "message": f"Campaña preparada para {len(campaign_recipients)} candidatos usando {whatsapp_config['config_type'].upper()}",
             "tenant_id": tenant_id
-        })
+        }
+        
+        if dispatch and campaign_recipients:
+            user_id = g.current_user.get('user_id') if getattr(g, 'current_user', None) else None
+            campaign_id = whatsapp_campaigns.create_campaign(conn, tenant_id, campaign_recipients, created_by=user_id)
+            dispatch_whatsapp_campaign.delay(campaign_id)
+            response.update({
+                "campaign_id": campaign_id,
+                "message": f"Campaña en envío para {len(campaign_recipients)} candidatos usando {whatsapp_config['config_type'].upper()}"
+            })
+        else:
+            response["recipients"] = campaign_recipients
+        
+        return json.dumps(response)
         
     except Exception as e:
         app.logger.error(f"Error en create_whatsapp_campaign_multi_tenant: {str(e)}")
@@ -3537,6 +3569,7 @@ def upload_excel():
     if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')): return jsonify({"success": False, "error": "Formato de archivo no válido."}), 400
 
     try:
+        tenant_id = get_current_tenant_id()
         df = pd.read_excel(file, engine='openpyxl')
         # ✨ CORRECCIÓN PRINCIPAL AQUÍ ✨
         # Reemplazamos los valores vacíos (NaN) de pandas por None de Python.
@@ -3549,56 +3582,9 @@ def upload_excel():
         processed_count = 0
 
         if data_type == 'afiliados':
-            # Lógica para importar candidatos desde Excel
-            for _, row in df.iterrows():
-                # Validar campos obligatorios
-                if not row.get('nombre_completo') or not row.get('email'):
-                    continue  # Saltar filas sin datos mínimos
-                
-                # Procesar campos opcionales
-                telefono = row.get('telefono') if row.get('telefono') else None
-                ciudad = row.get('ciudad') if row.get('ciudad') else None
-                identidad = row.get('identidad') if row.get('identidad') else None
-                grado_academico = row.get('grado_academico') if row.get('grado_academico') else None
-                cv_url = row.get('cv_url') if row.get('cv_url') else None
-                linkedin = row.get('linkedin') if row.get('linkedin') else None
-                portfolio = row.get('portfolio') if row.get('portfolio') else None
-                skills = row.get('skills') if row.get('skills') else None
-                experiencia = row.get('experiencia') if row.get('experiencia') else None
-                estado = row.get('estado') if row.get('estado') else 'Activo'
-                comentarios = row.get('comentarios') if row.get('comentarios') else None
-                observaciones = row.get('observaciones') if row.get('observaciones') else None
-                
-                # Procesar campos booleanos
-                disponibilidad_rotativos = 1 if str(row.get('disponibilidad_rotativos', '')).strip().lower() in ['sí', 'si', 'yes', 'true', '1'] else 0
-                transporte_propio = 1 if str(row.get('transporte_propio', '')).strip().lower() in ['sí', 'si', 'yes', 'true', '1'] else 0
-                
-                sql = """
-                    INSERT INTO Afiliados (
-                        tenant_id, nombre_completo, email, telefono, ciudad, identidad,
-                        grado_academico, cv_url, linkedin, portfolio, skills, experiencia,
-                        estado, disponibilidad_rotativos, transporte_propio,
-                        comentarios, observaciones, puntuacion, fecha_registro
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 0, CURRENT_TIMESTAMP
-                    )
-                    ON DUPLICATE KEY UPDATE
-                        nombre_completo=VALUES(nombre_completo), telefono=VALUES(telefono),
-                        ciudad=VALUES(ciudad), grado_academico=VALUES(grado_academico),
-                        cv_url=VALUES(cv_url), linkedin=VALUES(linkedin), portfolio=VALUES(portfolio),
-                        skills=VALUES(skills), experiencia=VALUES(experiencia), estado=VALUES(estado),
-                        disponibilidad_rotativos=VALUES(disponibilidad_rotativos), transporte_propio=VALUES(transporte_propio),
-                        comentarios=VALUES(comentarios), observaciones=VALUES(observaciones),
-                        ultima_actualizacion=CURRENT_TIMESTAMP
-                """
-                params = (
-                    tenant_id, row.get('nombre_completo'), row.get('email'), telefono, ciudad, identidad,
-                    grado_academico, cv_url, linkedin, portfolio, skills, experiencia,
-                    estado, disponibilidad_rotativos, transporte_propio,
-                    comentarios, observaciones
-                )
-                cursor.execute(sql, params)
-                processed_count += 1
+            # Mismo motor que /api/candidates/excel/import (limpieza vectorizada y upserts por bloques)
+            outcome = import_dataframe(conn, df, tenant_id, g.current_user.get('user_id'))
+            processed_count = outcome['stats']['processed']
         
         # ✨ LÓGICA PARA CLIENTES AÑADIDA AQUÍ ✨
         elif data_type == 'clientes':
@@ -3973,7 +3959,7 @@ def get_vacancy_pipeline(id_vacante):
             WHERE p.id_vacante = %s AND v.tenant_id = %s
         """
         cursor.execute(sql, (id_vacante, tenant_id))
-        postulaciones = cursor.fetchall()
+        postulaciones = _attach_cv_links(cursor.fetchall())
         pipeline = {'Recibida': [], 'En Revisión': [], 'Pre-seleccionado': [], 'En Entrevista': [], 'Oferta': [], 'Contratado': [], 'Rechazado': []}
         for post in postulaciones:
             estado = post.get('estado', 'Recibida')
@@ -4065,6 +4051,7 @@ def update_application_status(id_postulacion):
                     INSERT INTO Contratados (id_afiliado, id_vacante, fecha_contratacion, tenant_id)
                     VALUES (%s, %s, NOW(), %s)
                 """, (id_afiliado, id_vacante, tenant_id))
+                mark_dirty(cursor, [id_afiliado], 'contratacion')
                 app.logger.info(f"Candidato {id_afiliado} contratado para vacante {id_vacante}")
                 
                 # Registrar actividad de contratación
@@ -4176,27 +4163,12 @@ def get_kpi_reports():
                 rate = (total / total_aplicaciones) * 100
                 conversion_rates[estado] = round(rate, 2)
         
-        # 3. Métricas de candidatos
-        sql = "SELECT COUNT(*) as total_candidates FROM Afiliados a WHERE a.tenant_id = %s"
-        params = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params.extend(candidate_params)
-        cursor.execute(sql, tuple(params))
-        total_candidates = cursor.fetchone()['total_candidates']
+        # 3. Métricas de candidatos (agregados diarios + días aún no consolidados)
+        total_candidates = metric_total(cursor, 'candidatos', tenant_id, user_id)['total']
         
-        sql = """
-            SELECT COUNT(*) as new_this_month FROM Afiliados a
-            WHERE MONTH(a.fecha_registro) = MONTH(CURDATE()) 
-            AND YEAR(a.fecha_registro) = YEAR(CURDATE())
-            AND a.tenant_id = %s
-        """
-        params = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params.extend(candidate_params)
-        cursor.execute(sql, tuple(params))
-        new_candidates_month = cursor.fetchone()['new_this_month']
+        inicio_mes = db_today(cursor).replace(day=1)
+        fin_mes = months_ago(inicio_mes, -1) - timedelta(days=1)
+        new_candidates_month = metric_total(cursor, 'candidatos', tenant_id, user_id, inicio_mes, fin_mes)['total']
         
         # 4. Métricas de vacantes
         sql = "SELECT COUNT(*) as active_vacancies FROM Vacantes v WHERE v.estado = 'Activa' AND v.tenant_id = %s"
@@ -4344,9 +4316,126 @@ def get_kpi_reports():
         conn.close()
 
 
+def _build_candidate_search_conditions(cursor, term=None, experience=None, city=None, recency_days=None,
+                                       registered_today=False, status=None, availability=None,
+                                       min_score=None, user_id=None, tenant_id=None):
+    """
+    Construye las condiciones WHERE compartidas por la búsqueda y el conteo de candidatos.
+    
+    Returns:
+        tuple: (condiciones, params, relevancia_sql, params_relevancia). relevancia_sql
+        es None si el término no se resolvió con el índice FULLTEXT (ver candidate_search.py).
+    """
+    conditions = []
+    params = []
+    relevance_sql = None
+    relevance_params = []
+    
+    # 🔐 MÓDULO B5: Filtrar por tenant_id
+    if tenant_id:
+        conditions.append("a.tenant_id = %s")
+        params.append(tenant_id)
+    
+    # 🔐 MÓDULO B5: Filtrar por usuario según rol
+    if user_id and tenant_id:
+        condition, filter_params = build_user_filter_condition(user_id, tenant_id, 'a.created_by_user_id', 'candidate', 'a.id_afiliado')
+        if condition:
+            conditions.append(f"({condition})")
+            params.extend(filter_params)
+
+    # 🔍 BÚSQUEDA INTELIGENTE: Filtro por término de búsqueda
+    if term:
+        app.logger.info(f"🔍 Término de búsqueda recibido: '{term}'")
+        
+        if term.isdigit():
+            # Si es un número, buscar por ID, teléfono o puntuación
+            conditions.append("""
+                (a.id_afiliado = %s 
+                OR a.telefono LIKE %s 
+                OR a.puntuacion = %s)
+            """)
+            params.extend([term, f"%{term}%", term])
+        else:
+            # Todas las palabras deben coincidir; FULLTEXT cuando hay índice, LIKE si no
+            term_condition, term_params, relevance_sql, relevance_params = build_term_clause(cursor, term)
+            if term_condition:
+                conditions.append(term_condition)
+                params.extend(term_params)
+    
+    # Filtros adicionales
+    if experience:
+        conditions.append("a.experiencia LIKE %s")
+        params.append(f"%{experience}%")
+        
+    if city:
+        conditions.append("a.ciudad LIKE %s")
+        params.append(f"%{city}%")
+        
+    if recency_days and str(recency_days).isdigit():
+        conditions.append("a.fecha_registro >= CURDATE() - INTERVAL %s DAY")
+        params.append(int(recency_days))
+        
+    if registered_today:
+        conditions.append("DATE(a.fecha_registro) = CURDATE()")
+        
+    if status:
+        conditions.append("a.estado = %s")
+        params.append(status)
+        
+    if availability:
+        conditions.append("a.disponibilidad_rotativos = %s")
+        params.append(availability)
+        
+    if min_score and min_score.isdigit():
+        conditions.append("a.puntuacion >= %s")
+        params.append(int(min_score))
+    
+    return conditions, params, relevance_sql, relevance_params
+
+
+def _attach_application_summary(cursor, rows, id_field='id'):
+    """
+    Agrega total_aplicaciones y empresas_aplicadas a cada fila con una sola
+    consulta agregada sobre los IDs de la página (en lugar de subconsultas por fila).
+    """
+    if not rows:
+        return rows
+    
+    ids = list({row[id_field] for row in rows})
+    placeholders = ','.join(['%s'] * len(ids))
+    cursor.execute(f"""
+        SELECT 
+            p.id_afiliado,
+            COUNT(*) as total_aplicaciones,
+            GROUP_CONCAT(DISTINCT c.empresa SEPARATOR ', ') as empresas_aplicadas
+        FROM Postulaciones p
+        LEFT JOIN Vacantes v ON p.id_vacante = v.id_vacante
+        LEFT JOIN Clientes c ON v.id_cliente = c.id_cliente
+        WHERE p.id_afiliado IN ({placeholders})
+        GROUP BY p.id_afiliado
+    """, tuple(ids))
+    summary = {r['id_afiliado']: r for r in cursor.fetchall()}
+    
+    for row in rows:
+        item = summary.get(row[id_field])
+        row['total_aplicaciones'] = item['total_aplicaciones'] if item else 0
+        row['empresas_aplicadas'] = item['empresas_aplicadas'] if item else None
+    return rows
+
+
+def _attach_cv_links(rows, field='cv_url'):
+    """
+    Reemplaza las URLs de CV de las filas por PARs vigentes de la caché
+    (cv_par_cache): una consulta por página, sin llamadas a OCI por fila.
+    """
+    if cv_par_cache is not None and rows:
+        cv_par_cache.attach_cv_urls(rows, field)
+    return rows
+
+
 def _internal_search_candidates(term=None, tags=None, experience=None, city=None, recency_days=None, 
                            registered_today=False, status=None, availability=None, min_score=None,
-                           limit=None, offset=None, user_id=None, tenant_id=None):
+                           limit=None, offset=None, user_id=None, tenant_id=None, keyset=False, after=None):
     """
     Lógica de búsqueda interna que puede ser llamada desde la API o el Asistente.
     
@@ -4364,6 +4453,9 @@ def _internal_search_candidates(term=None, tags=None, experience=None, city=None
         offset (int, optional): Desplazamiento para paginación.
         user_id (int, optional): ID del usuario (para filtrar según permisos). 🔐 MÓDULO B5
         tenant_id (int, optional): ID del tenant (para multi-tenancy). 🔐 MÓDULO B5
+        keyset (bool, optional): Paginar por cursor sobre (fecha_registro, id_afiliado)
+            en lugar de offset; ordena por fecha aunque haya término de búsqueda.
+        after (dict, optional): Cursor decodificado (pagination.decode_cursor) de la página anterior.
         
     Returns:
         list: Lista de candidatos con formato estandarizado para la interfaz.
@@ -4414,130 +4506,45 @@ def _internal_search_candidates(term=None, tags=None, experience=None, city=None
                 NULL as tags_json,
                 0 as documentsCount,
                 NULL as lastInteractionType,
-                NULL as lastInteractionDate,
-                
-                -- Contadores útiles para la búsqueda
-                (SELECT COUNT(*) FROM Postulaciones p WHERE p.id_afiliado = a.id_afiliado) as total_aplicaciones,
-                (SELECT GROUP_CONCAT(DISTINCT c.empresa SEPARATOR ', ') 
-                 FROM Postulaciones p 
-                 JOIN Vacantes v ON p.id_vacante = v.id_vacante 
-                 JOIN Clientes c ON v.id_cliente = c.id_cliente 
-                 WHERE p.id_afiliado = a.id_afiliado) as empresas_aplicadas
+                NULL as lastInteractionDate
                 
             FROM Afiliados a
             WHERE 1=1
         """
         
-        # Lista de condiciones de filtrado
-        conditions = []
-        params = []
-        
-        # 🔐 MÓDULO B5: Filtrar por tenant_id
-        if tenant_id:
-            conditions.append("a.tenant_id = %s")
-            params.append(tenant_id)
-        
-        # 🔐 MÓDULO B5: Filtrar por usuario según rol
-        if user_id and tenant_id:
-            condition, filter_params = build_user_filter_condition(user_id, tenant_id, 'a.created_by_user_id', 'candidate', 'a.id_afiliado')
-            if condition:
-                # Appending the condition to base query via conditions list
-                conditions.append(f"({condition})")
-                params.extend(filter_params)
-
-        # 🔍 BÚSQUEDA INTELIGENTE: Filtro por término de búsqueda mejorado
-        if term:
-            # Debug: Log del término de búsqueda
-            app.logger.info(f"🔍 Término de búsqueda recibido: '{term}'")
-            
-            if term.isdigit():
-                # Si es un número, buscar por ID, teléfono o puntuación
-                conditions.append("""
-                    (a.id_afiliado = %s 
-                    OR a.telefono LIKE %s 
-                    OR a.puntuacion = %s)
-                """)
-                params.extend([term, f"%{term}%", term])
-                app.logger.info(f"🔍 Búsqueda numérica: {term}")
-            else:
-                # Limpiar y procesar el término de búsqueda
-                # Reemplazar + por espacios (viene de URL encoding)
-                clean_term = term.replace('+', ' ').strip()
-                app.logger.info(f"🔍 Término limpio: '{clean_term}'")
-                
-                # Búsqueda inteligente por palabras clave
-                search_terms = [t.strip().lower() for t in clean_term.split() if t.strip()]
-                app.logger.info(f"🔍 Palabras de búsqueda: {search_terms}")
-                
-                if search_terms:
-                    term_conditions = []
-                    
-                    for t in search_terms:
-                        app.logger.info(f"🔍 Buscando palabra: '{t}'")
-                        # Buscar en múltiples columnas con diferentes estrategias
-                        term_conditions.append("""
-                            (LOWER(a.nombre_completo) LIKE %s 
-                            OR LOWER(a.experiencia) LIKE %s 
-                            OR LOWER(a.ciudad) LIKE %s 
-                            OR LOWER(a.cargo_solicitado) LIKE %s
-                            OR LOWER(a.email) LIKE %s
-                            OR LOWER(a.grado_academico) LIKE %s
-                            OR LOWER(a.observaciones) LIKE %s
-                            OR LOWER(a.linkedin) LIKE %s
-                            OR LOWER(a.portfolio) LIKE %s
-                            OR LOWER(a.skills) LIKE %s
-                            OR LOWER(a.fuente_reclutamiento) LIKE %s
-                            OR LOWER(a.telefono) LIKE %s)
-                        """)
-                        # 12 columnas = 12 parámetros
-                        params.extend([f"%{t}%"] * 12)
-                    
-                    # Combinar todas las condiciones con AND (todas las palabras deben coincidir)
-                    final_condition = f"({' AND '.join(term_conditions)})" if len(term_conditions) > 1 else term_conditions[0]
-                    conditions.append(final_condition)
-                    app.logger.info(f"🔍 Condición final de búsqueda: {final_condition}")
-        
-        # Filtros adicionales
-        if experience:
-            conditions.append("a.experiencia LIKE %s")
-            params.append(f"%{experience}%")
-            
-        if city:
-            conditions.append("a.ciudad LIKE %s")
-            params.append(f"%{city}%")
-            
-        if recency_days and str(recency_days).isdigit():
-            conditions.append("a.fecha_registro >= CURDATE() - INTERVAL %s DAY")
-            params.append(int(recency_days))
-            
-        if registered_today:
-            conditions.append("DATE(a.fecha_registro) = CURDATE()")
-            
-        if status:
-            conditions.append("a.estado = %s")
-            params.append(status)
-            
-        if availability:
-            conditions.append("a.disponibilidad_rotativos = %s")
-            params.append(availability)
-            
-        if min_score and min_score.isdigit():
-            conditions.append("a.puntuacion >= %s")
-            params.append(int(min_score))
+        conditions, params, relevance_sql, relevance_params = _build_candidate_search_conditions(
+            cursor, term=term, experience=experience, city=city, recency_days=recency_days,
+            registered_today=registered_today, status=status, availability=availability,
+            min_score=min_score, user_id=user_id, tenant_id=tenant_id
+        )
 
         # Aplicar condiciones de filtrado
         if conditions:
             base_query += " AND " + " AND ".join(conditions)
         
-        # Ordenar por fecha de registro por defecto
-        base_query += " ORDER BY a.fecha_registro DESC"
+        if keyset and after:
+            condition, condition_params = keyset_condition(after)
+            base_query += f" AND {condition}"
+            params.extend(condition_params)
+        
+        # Con término de texto, ordenar por relevancia; si no (o con cursor), por fecha de registro
+        if keyset:
+            base_query += " " + keyset_order_clause(after['order'] if after else 'desc')
+        elif relevance_sql:
+            base_query += f" ORDER BY {relevance_sql} DESC, a.fecha_registro DESC"
+            params.extend(relevance_params)
+        else:
+            base_query += " ORDER BY a.fecha_registro DESC"
         
         # Debug: Log de la consulta SQL completa
         app.logger.info(f"🔍 Consulta SQL: {base_query}")
         app.logger.info(f"🔍 Parámetros: {params}")
         
         # Aplicar paginación si se especifica
-        if limit is not None and offset is not None:
+        if keyset and limit is not None:
+            base_query += " LIMIT %s"
+            params.append(limit)
+        elif limit is not None and offset is not None:
             base_query += " LIMIT %s OFFSET %s"
             params.extend([limit, offset])
         
@@ -4548,10 +4555,11 @@ def _internal_search_candidates(term=None, tags=None, experience=None, city=None
         cursor.execute(base_query, tuple(params))
         results = cursor.fetchall()
         
+        # Contadores de postulaciones solo para las filas devueltas
+        _attach_application_summary(cursor, results)
+        
         # Debug: Log de resultados
         app.logger.info(f"🔍 Resultados encontrados: {len(results)}")
-        if results:
-            app.logger.info(f"🔍 Primer resultado: {results[0]}")
         
         # Procesar resultados
         formatted_results = []
@@ -4607,6 +4615,40 @@ def _internal_search_candidates(term=None, tags=None, experience=None, city=None
         conn.close()
 
 
+def _internal_count_candidates(term=None, experience=None, city=None, recency_days=None,
+                               registered_today=False, status=None, availability=None, min_score=None,
+                               user_id=None, tenant_id=None, count_mode='exact'):
+    """
+    Cuenta los candidatos que devolvería _internal_search_candidates con los mismos
+    filtros, sin traer las filas. count_mode acepta los modos de pagination.resolve_count
+    ('exact', 'cached', 'estimate', 'none'). Devuelve 0 si hay error.
+    """
+    conn = get_db_connection()
+    if not conn:
+        app.logger.error("No se pudo establecer conexión con la base de datos")
+        return 0
+    
+    cursor = conn.cursor(dictionary=True)
+    try:
+        conditions, params, _, _ = _build_candidate_search_conditions(
+            cursor, term=term, experience=experience, city=city, recency_days=recency_days,
+            registered_today=registered_today, status=status, availability=availability,
+            min_score=min_score, user_id=user_id, tenant_id=tenant_id
+        )
+        from_where = "FROM Afiliados a WHERE 1=1"
+        if conditions:
+            from_where += " AND " + " AND ".join(conditions)
+        cache_key = CountCache.make_key('candidate_search', tenant_id, user_id, term, experience, city,
+                                        recency_days, registered_today, status, availability, min_score)
+        return resolve_count(count_mode, cursor, from_where, params, cache_key=cache_key)
+    except Exception as e:
+        app.logger.error(f"Error en _internal_count_candidates: {str(e)}")
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def search_candidates_tool(term=None, tags=None, experience=None, city=None, recency_days=None):
     """Herramienta para el Asistente: Busca candidatos y devuelve los resultados en formato JSON."""
     app.logger.info(f"Búsqueda de candidatos con: term={term}, tags={tags}, experience={experience}, city={city}")
@@ -4837,6 +4879,7 @@ class ProgressTracker:
 batch_processor = BatchProcessor()
 filter_engine = FilterEngine()
 progress_tracker = ProgressTracker()
+duplicate_detector = create_duplicate_detector()
 
 # ===============================================================
 # ENDPOINTS DEL MÓDULO 1
@@ -5543,22 +5586,12 @@ def get_dashboard_data():
         cursor.execute(sql, tuple(params))
         estadisticas_vacantes = cursor.fetchall()
         
-        # Candidatos
-        sql = "SELECT COUNT(*) as total FROM Afiliados a WHERE DATE(a.fecha_registro) = CURDATE() AND a.tenant_id = %s"
-        params = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params.extend(candidate_params)
-        cursor.execute(sql, tuple(params))
-        afiliados_hoy = cursor.fetchone()['total']
-        
-        sql = "SELECT COUNT(*) as total FROM Afiliados a WHERE MONTH(a.fecha_registro) = MONTH(CURDATE()) AND YEAR(a.fecha_registro) = YEAR(CURDATE()) AND a.tenant_id = %s"
-        params = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params.extend(candidate_params)
-        cursor.execute(sql, tuple(params))
-        afiliados_mes = cursor.fetchone()['total']
+        # Candidatos (agregados diarios + días aún no consolidados)
+        hoy = db_today(cursor)
+        inicio_mes = hoy.replace(day=1)
+        fin_mes = months_ago(inicio_mes, -1) - timedelta(days=1)
+        afiliados_hoy = metric_total(cursor, 'candidatos', tenant_id, user_id, hoy, hoy)['total']
+        afiliados_mes = metric_total(cursor, 'candidatos', tenant_id, user_id, inicio_mes, fin_mes)['total']
         
         # Top ciudades (filtrado por usuario)
         sql = """
@@ -5620,159 +5653,62 @@ def get_dashboard_metrics():
         if not tenant_id:
             return jsonify({"error": "No se pudo obtener tenant_id del usuario autenticado"}), 401
         
-        # 🔐 CORRECCIÓN: Obtener filtros por usuario
-        candidate_condition, candidate_params = build_user_filter_condition(user_id, tenant_id, 'a.created_by_user_id', 'candidate', 'a.id_afiliado')
-        vacancy_condition, vacancy_params = build_user_filter_condition(user_id, tenant_id, 'v.created_by_user', 'vacancy', 'v.id_vacante')
+        hoy = db_today(cursor)
         
-        # 1. Candidatos activos totales (filtrado por usuario)
-        sql = "SELECT COUNT(*) as total FROM Afiliados a WHERE a.tenant_id = %s"
-        params = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params.extend(candidate_params)
-        cursor.execute(sql, tuple(params))
-        total_candidatos = cursor.fetchone()['total']
+        # 1. Candidatos activos totales (filtrado por usuario, desde agregados diarios)
+        total_candidatos = metric_total(cursor, 'candidatos', tenant_id, user_id)['total']
         
         # 2. Candidatos activos hoy (filtrado por usuario)
-        sql = "SELECT COUNT(*) as total FROM Afiliados a WHERE DATE(a.fecha_registro) = CURDATE() AND a.tenant_id = %s"
-        params = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params.extend(candidate_params)
-        cursor.execute(sql, tuple(params))
-        candidatos_hoy = cursor.fetchone()['total']
-        
-        # 3. Vacantes por estado (filtrado por usuario)
-        sql = """
-            SELECT v.estado, COUNT(*) as total 
-            FROM Vacantes v
-            WHERE v.tenant_id = %s
-        """
-        params = [tenant_id]
-        if vacancy_condition:
-            sql += f" AND ({vacancy_condition})"
-            params.extend(vacancy_params)
-        sql += " GROUP BY v.estado"
-        cursor.execute(sql, tuple(params))
-        vacantes_por_estado = cursor.fetchall()
-        
-        # 4. Tasa de conversión (postulaciones → contrataciones) - filtrado por usuario y candidato
-        sql = """
-            SELECT 
-                COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
-                COUNT(DISTINCT c.id_contratado) as total_contrataciones
-            FROM Postulaciones p
-            JOIN Vacantes v ON p.id_vacante = v.id_vacante
-            JOIN Afiliados a ON p.id_afiliado = a.id_afiliado
-            LEFT JOIN Contratados c ON p.id_afiliado = c.id_afiliado AND p.id_vacante = c.id_vacante AND c.tenant_id = %s
-            WHERE p.tenant_id = %s AND v.tenant_id = %s AND a.tenant_id = %s
-        """
-        params = [tenant_id, tenant_id, tenant_id, tenant_id]
-        if vacancy_condition:
-            sql += f" AND ({vacancy_condition})"
-            params.extend(vacancy_params)
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params.extend(candidate_params)
-        
-        cursor.execute(sql, tuple(params))
-        conversion_data = cursor.fetchone()
-        tasa_conversion = (conversion_data['total_contrataciones'] / conversion_data['total_postulaciones'] * 100) if conversion_data['total_postulaciones'] > 0 else 0
-        
-        # 5. Tiempo promedio de contratación (filtrado por usuario)
-        sql = """
-            SELECT AVG(DATEDIFF(c.fecha_contratacion, p.fecha_aplicacion)) as tiempo_promedio
-            FROM Contratados c
-            JOIN Postulaciones p ON c.id_afiliado = p.id_afiliado AND c.id_vacante = p.id_vacante
-            JOIN Vacantes v ON c.id_vacante = v.id_vacante
-            WHERE c.fecha_contratacion IS NOT NULL AND p.fecha_aplicacion IS NOT NULL
-            AND c.tenant_id = %s AND p.tenant_id = %s AND v.tenant_id = %s
-        """
-        params = [tenant_id, tenant_id, tenant_id]
-        if vacancy_condition:
-            sql += f" AND ({vacancy_condition})"
-            params.extend(vacancy_params)
-        cursor.execute(sql, tuple(params))
-        tiempo_promedio = cursor.fetchone()['tiempo_promedio'] or 0
+        candidatos_hoy = metric_total(cursor, 'candidatos', tenant_id, user_id, hoy, hoy)['total']
         
         # 6. Candidatos por mes (últimos 6 meses) - filtrado por usuario
-        sql = """
-            SELECT 
-                DATE_FORMAT(a.fecha_registro, '%Y-%m') as mes,
-                COUNT(*) as total
-            FROM Afiliados a
-            WHERE a.fecha_registro >= DATE_SUB(CURDATE(), INTERVAL 6 MONTH)
-            AND a.tenant_id = %s
-        """
-        params = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params.extend(candidate_params)
-        sql += " GROUP BY DATE_FORMAT(a.fecha_registro, '%Y-%m') ORDER BY mes"
-        cursor.execute(sql, tuple(params))
-        candidatos_por_mes_raw = cursor.fetchall()
-        
-        # 🔧 VALIDAR Y SANITIZAR candidatos_por_mes
-        candidatos_por_mes = []
-        for item in candidatos_por_mes_raw:
-            item_clean = dict(item)
-            # Validar formato de mes YYYY-MM
-            if item_clean.get('mes'):
-                try:
-                    from datetime import datetime
-                    datetime.strptime(item_clean['mes'], '%Y-%m')
-                except (ValueError, TypeError):
-                    app.logger.warning(f"Formato de mes inválido: {item_clean.get('mes')}")
-                    continue
-            if item_clean.get('total') is None:
-                item_clean['total'] = 0
-            candidatos_por_mes.append(item_clean)
+        totales_por_mes = {}
+        for dia in daily_series(cursor, 'candidatos', tenant_id, user_id, months_ago(hoy, 6)):
+            mes = dia['dia'].strftime('%Y-%m')
+            totales_por_mes[mes] = totales_por_mes.get(mes, 0) + dia['total']
+        candidatos_por_mes = [{'mes': mes, 'total': total} for mes, total in sorted(totales_por_mes.items())]
         
         # 7. Ingresos generados - 🔐 CORRECCIÓN: Solo Admin puede ver datos financieros
         ingresos_totales = 0
         if is_admin(user_id, tenant_id):
-            hired_condition, hired_params = build_user_filter_condition(user_id, tenant_id, 'c.created_by_user', 'hired', 'c.id_contratado')
-            sql = """
-                SELECT SUM(COALESCE(c.tarifa_servicio, 0)) as ingresos_totales
-                FROM Contratados c
-                WHERE c.fecha_contratacion >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
-                AND c.tenant_id = %s
-            """
-            params = [tenant_id]
-            if hired_condition:
-                sql += f" AND ({hired_condition})"
-                params.extend(hired_params)
-            cursor.execute(sql, tuple(params))
-            ingresos_totales = cursor.fetchone()['ingresos_totales'] or 0
-        
-        # 8. Top 5 clientes por actividad (filtrado por usuario)
-        sql = """
-            SELECT 
-                c.empresa,
-                COUNT(DISTINCT v.id_vacante) as total_vacantes,
-                COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
-                COUNT(DISTINCT co.id_contratado) as total_contrataciones
-            FROM Clientes c
-            LEFT JOIN Vacantes v ON c.id_cliente = v.id_cliente AND v.tenant_id = %s {vacancy_join_cond}
-            LEFT JOIN Postulaciones p ON v.id_vacante = p.id_vacante AND p.tenant_id = %s
-            LEFT JOIN Contratados co ON v.id_vacante = co.id_vacante AND co.tenant_id = %s
-            WHERE c.tenant_id = %s
-        """
+            ingresos_totales = metric_total(
+                cursor, 'contrataciones', tenant_id, user_id, months_ago(hoy, 12)
+            )['monto']
         
-        # Preparar parámetros y condición de JOIN
-        vacancy_join_cond = f"AND ({vacancy_condition})" if vacancy_condition else ""
-        sql = sql.replace("{vacancy_join_cond}", vacancy_join_cond)
+        # 🔐 Resto de métricas sobre los candidatos y vacantes visibles para el usuario,
+        # resueltos una sola vez (ver dashboard_queries.DashboardQueryPlanner)
+        with DashboardQueryPlanner(cursor, tenant_id, user_id) as planner:
+            # 3 y 5. Vacantes por estado y tiempo promedio de contratación
+            vacantes = planner.vacantes_resumen()
+            vacantes_por_estado = vacantes['vacantes_por_estado']
+            tiempo_promedio = vacantes['tiempo_promedio_contratacion']
+            
+            # 4, 9 y 10. Conversión, efectividad del usuario y tasa de éxito por vacante
+            postulaciones = planner.postulaciones_por_vacante()
+            
+            # 8. Top 5 clientes por actividad
+            top_clientes_raw = planner.top_clientes()
+            
+            # 11. Candidatos más activos
+            candidatos_mas_activos_raw = planner.candidatos_mas_activos()
+            
+            # 12. Skills más demandados
+            skills_demandados = planner.skills_demandados()
+            
+            # 13. Distribución por ciudades (porcentaje sobre el total del usuario)
+            distribucion_ciudades = planner.distribucion_ciudades()['ciudades']
         
-        params_clientes = [tenant_id]
-        if vacancy_condition:
-            params_clientes.extend(vacancy_params)
-        params_clientes.extend([tenant_id, tenant_id, tenant_id])
+        app.logger.debug(f"📊 Dashboard metrics - tiempos por métrica: {planner.timings}")
         
-        sql += " GROUP BY c.id_cliente, c.empresa ORDER BY total_postulaciones DESC LIMIT 5"
-        cursor.execute(sql, tuple(params_clientes))
-        top_clientes_raw = cursor.fetchall()
+        tasa_conversion = postulaciones['tasa_conversion']
+        tasa_exito_vacantes = postulaciones['tasa_exito_vacantes']
+        efectividad_usuario = {
+            'usuario': user_data.get('nombre', 'Usuario'),
+            'total_postulaciones': postulaciones['total_postulaciones'],
+            'total_contrataciones': postulaciones['total_contrataciones'],
+        }
         
-        # 🔧 VALIDAR Y SANITIZAR datos en top_clientes (no hay fechas aquí, pero validamos por seguridad)
+        # 🔧 VALIDAR Y SANITIZAR datos en top_clientes
         top_clientes = []
         for cliente in top_clientes_raw:
             cliente_clean = dict(cliente)
@@ -5782,96 +5718,6 @@ def get_dashboard_metrics():
                     cliente_clean[key] = 0
             top_clientes.append(cliente_clean)
         
-        # 9. Efectividad por usuario (FILTRADO POR USUARIO Y CANDIDATO) 🔐
-        sql = """
-            SELECT 
-                %s as usuario,
-                COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
-                COUNT(DISTINCT co.id_contratado) as total_contrataciones
-            FROM Postulaciones p
-            JOIN Vacantes v ON p.id_vacante = v.id_vacante
-            JOIN Afiliados a ON p.id_afiliado = a.id_afiliado
-            LEFT JOIN Contratados co ON p.id_afiliado = co.id_afiliado AND p.id_vacante = co.id_vacante
-            WHERE p.tenant_id = %s AND v.tenant_id = %s AND a.tenant_id = %s AND (co.tenant_id = %s OR co.tenant_id IS NULL)
-        """
-        params_efectividad = [user_data.get('nombre', 'Usuario'), tenant_id, tenant_id, tenant_id, tenant_id]
-        if vacancy_condition:
-            sql += f" AND ({vacancy_condition})"
-            params_efectividad.extend(vacancy_params)
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params_efectividad.extend(candidate_params)
-            
-        cursor.execute(sql, tuple(params_efectividad))
-        efectividad_usuario = cursor.fetchone()
-        
-        # 10. Tasa de éxito por tipo de vacante (FILTRADO POR USUARIO Y CANDIDATO) 🔐
-        sql = """
-            SELECT 
-                v.cargo_solicitado,
-                COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
-                COUNT(DISTINCT co.id_contratado) as total_contrataciones,
-                CASE 
-                    WHEN COUNT(DISTINCT p.id_postulacion) > 0 THEN
-                        (COUNT(DISTINCT co.id_contratado) * 100.0 / COUNT(DISTINCT p.id_postulacion))
-                    ELSE 0
-                END as tasa_exito
-            FROM Vacantes v
-            JOIN Postulaciones p ON v.id_vacante = p.id_vacante
-            JOIN Afiliados a ON p.id_afiliado = a.id_afiliado
-            LEFT JOIN Contratados co ON v.id_vacante = co.id_vacante AND co.id_afiliado = a.id_afiliado
-            WHERE v.tenant_id = %s AND p.tenant_id = %s AND a.tenant_id = %s AND (co.tenant_id = %s OR co.tenant_id IS NULL)
-        """
-        params_tasa = [tenant_id, tenant_id, tenant_id, tenant_id]
-        if vacancy_condition:
-            sql += f" AND ({vacancy_condition})"
-            params_tasa.extend(vacancy_params)
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params_tasa.extend(candidate_params)
-            
-        sql += """
-            GROUP BY v.id_vacante, v.cargo_solicitado
-            HAVING total_postulaciones > 0
-            ORDER BY tasa_exito DESC
-            LIMIT 5
-        """
-        cursor.execute(sql, tuple(params_tasa))
-        tasa_exito_vacantes = cursor.fetchall()
-        
-        # 11. Candidatos más activos (FILTRADO POR USUARIO) 🔐
-        sql = """
-            SELECT 
-                a.nombre_completo as nombre,
-                a.email,
-                a.ciudad,
-                COUNT(DISTINCT p.id_postulacion) as postulaciones,
-                COUNT(DISTINCT e.id_entrevista) as entrevistas,
-                COUNT(DISTINCT c.id_contratado) as contrataciones,
-                AVG(DATEDIFF(COALESCE(c.fecha_contratacion, NOW()), p.fecha_aplicacion)) as tiempoColocacion,
-                a.skills,
-                a.ultimo_contacto as ultimaActividad,
-                a.puntuacion as rating
-            FROM Afiliados a
-            LEFT JOIN Postulaciones p ON a.id_afiliado = p.id_afiliado AND p.tenant_id = %s
-            LEFT JOIN Vacantes v ON p.id_vacante = v.id_vacante
-            LEFT JOIN Entrevistas e ON p.id_postulacion = e.id_postulacion
-            LEFT JOIN Contratados c ON p.id_afiliado = c.id_afiliado AND p.id_vacante = c.id_vacante AND c.tenant_id = %s
-            WHERE a.tenant_id = %s
-        """
-        params_candidatos = [tenant_id, tenant_id, tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params_candidatos.extend(candidate_params)
-        sql += """
-            GROUP BY a.id_afiliado, a.nombre_completo, a.email, a.ciudad, a.skills, a.ultimo_contacto, a.puntuacion
-            HAVING postulaciones > 0
-            ORDER BY postulaciones DESC, rating DESC
-            LIMIT 5
-        """
-        cursor.execute(sql, tuple(params_candidatos))
-        candidatos_mas_activos_raw = cursor.fetchall()
-        
         # 🔧 VALIDAR Y SANITIZAR FECHAS en candidatos_mas_activos
         candidatos_mas_activos = []
         for candidato in candidatos_mas_activos_raw:
@@ -5883,7 +5729,6 @@ def get_dashboard_metrics():
                     if hasattr(candidato_clean['ultimaActividad'], 'isoformat'):
                         candidato_clean['ultimaActividad'] = candidato_clean['ultimaActividad'].isoformat()
                     # Validar que sea una fecha válida
-                    from datetime import datetime
                     datetime.fromisoformat(str(candidato_clean['ultimaActividad']).replace('Z', '+00:00').split('.')[0])
                 except (ValueError, AttributeError, TypeError) as e:
                     app.logger.warning(f"Fecha inválida en ultimaActividad para candidato {candidato_clean.get('nombre')}: {candidato_clean.get('ultimaActividad')} - Error: {e}")
@@ -5892,75 +5737,6 @@ def get_dashboard_metrics():
                 candidato_clean['ultimaActividad'] = None
             candidatos_mas_activos.append(candidato_clean)
         
-        # 12. Skills más demandados (FILTRADO POR USUARIO) 🔐
-        sql = """
-            SELECT 
-                TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(a.skills, ',', numbers.n), ',', -1)) as skill,
-                COUNT(*) as demanda,
-                COUNT(*) as crecimiento
-            FROM Afiliados a
-            CROSS JOIN (
-                SELECT 1 n UNION SELECT 2 UNION SELECT 3 UNION SELECT 4 UNION SELECT 5 UNION
-                SELECT 6 UNION SELECT 7 UNION SELECT 8 UNION SELECT 9 UNION SELECT 10
-            ) numbers
-            WHERE a.tenant_id = %s 
-            AND a.skills IS NOT NULL 
-            AND a.skills != ''
-            AND CHAR_LENGTH(a.skills) - CHAR_LENGTH(REPLACE(a.skills, ',', '')) >= numbers.n - 1
-        """
-        params_skills = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params_skills.extend(candidate_params)
-        sql += """
-            GROUP BY skill
-            HAVING skill != '' AND LENGTH(skill) > 2
-            ORDER BY demanda DESC
-            LIMIT 8
-        """
-        cursor.execute(sql, tuple(params_skills))
-        skills_demandados = cursor.fetchall()
-        
-        # 13. Distribución por ciudades (FILTRADO POR USUARIO) 🔐
-        # Primero obtener el total de candidatos del usuario para calcular porcentaje
-        sql_total = "SELECT COUNT(*) as total FROM Afiliados a WHERE a.tenant_id = %s"
-        params_total = [tenant_id]
-        if candidate_condition:
-            sql_total += f" AND ({candidate_condition})"
-            params_total.extend(candidate_params)
-        cursor.execute(sql_total, tuple(params_total))
-        total_candidatos_usuario = cursor.fetchone()['total']
-        
-        # Luego obtener la distribución
-        sql = """
-            SELECT 
-                a.ciudad,
-                COUNT(*) as candidatos
-            FROM Afiliados a
-            WHERE a.tenant_id = %s AND a.ciudad IS NOT NULL AND a.ciudad != ''
-        """
-        params_ciudades = [tenant_id]
-        if candidate_condition:
-            sql += f" AND ({candidate_condition})"
-            params_ciudades.extend(candidate_params)
-        sql += """
-            GROUP BY a.ciudad
-            ORDER BY candidatos DESC
-            LIMIT 10
-        """
-        cursor.execute(sql, tuple(params_ciudades))
-        ciudades_raw = cursor.fetchall()
-        
-        # Calcular porcentaje basado en el total del usuario
-        distribucion_ciudades = []
-        for ciudad in ciudades_raw:
-            porcentaje = round((ciudad['candidatos'] * 100.0 / total_candidatos_usuario), 1) if total_candidatos_usuario > 0 else 0
-            distribucion_ciudades.append({
-                'ciudad': ciudad['ciudad'],
-                'candidatos': ciudad['candidatos'],
-                'porcentaje': porcentaje
-            })
-        
         # 14. Usuarios efectividad (para UserReports)
         usuarios_efectividad = [{
             'nombre': user_data.get('nombre'),
@@ -6044,6 +5820,23 @@ def get_candidates():
         search = request.args.get('search', '')
         status = request.args.get('status', '')
         sort_order = request.args.get('sort', 'newest')  # newest o oldest
+        order = 'asc' if sort_order == 'oldest' else 'desc'
+        
+        # Paginación por cursor si se envía 'cursor' (vacío = primera página);
+        # sin él se mantiene la paginación por página/offset
+        use_keyset = 'cursor' in request.args
+        after = None
+        if request.args.get('cursor'):
+            try:
+                after = decode_cursor(request.args['cursor'])
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Cursor de paginación inválido'}), 400
+            order = after['order']
+        
+        # Total: 'exact' (por defecto con offset), 'cached' (por defecto con cursor), 'estimate' o 'none'
+        count_mode = request.args.get('count', 'cached' if use_keyset else 'exact')
+        if count_mode not in COUNT_MODES:
+            count_mode = 'exact'
         
         # Construir consulta base con estructura limpia
         query = """
@@ -6068,22 +5861,15 @@ def get_candidates():
                 a.cargo_solicitado,
                 a.fuente_reclutamiento,
                 a.fecha_nacimiento,
-                a.ultimo_contacto,
-                (SELECT COUNT(*) FROM Postulaciones p WHERE p.id_afiliado = a.id_afiliado) as total_aplicaciones,
-                (SELECT GROUP_CONCAT(DISTINCT c.empresa SEPARATOR ', ') 
-                 FROM Postulaciones p 
-                 JOIN Vacantes v ON p.id_vacante = v.id_vacante 
-                 JOIN Clientes c ON v.id_cliente = c.id_cliente 
-                 WHERE p.id_afiliado = a.id_afiliado) as empresas_aplicadas
-            FROM Afiliados a
-            WHERE a.tenant_id = %s
+                a.ultimo_contacto
         """
+        from_where = " FROM Afiliados a WHERE a.tenant_id = %s"
         params = [tenant_id]
         
         # 🔐 Fase 4: Aplicar filtro según Permisos_Unificados y Asignaciones_Centrales
         candidate_condition, candidate_params = build_user_filter_condition(user_id, tenant_id, 'a.created_by_user_id', 'candidate', 'a.id_afiliado')
         if candidate_condition:
-            query += f" AND ({candidate_condition})"
+            from_where += f" AND ({candidate_condition})"
             params.extend(candidate_params)
         
         # Aplicar filtros - búsqueda palabra por palabra
@@ -6115,25 +5901,44 @@ def get_candidates():
                     params.extend([f"%{word.lower()}%"] * 12)
                 
                 # Todas las palabras deben coincidir (AND)
-                query += " AND " + " AND ".join(word_conditions)
+                from_where += " AND " + " AND ".join(word_conditions)
         
         if status:
-            query += " AND estado = %s"
+            from_where += " AND estado = %s"
             params.append(status)
         
-        # Obtener total de registros
-        # Solución robusta: Envolver el query original como una subquery en lugar de reemplazar strings frágiles.
-        count_query = f"SELECT COUNT(*) as total FROM ({query}) AS sub"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()['total']
+        # Obtener total de registros (sin ordenar ni traer columnas)
+        total = resolve_count(
+            count_mode, cursor, from_where, params,
+            cache_key=CountCache.make_key('candidates', tenant_id, user_id, search, status)
+        )
         
-        # Aplicar ordenación y paginación
-        offset = (page - 1) * limit
-        order_clause = "ORDER BY fecha_registro DESC" if sort_order == "newest" else "ORDER BY fecha_registro ASC"
-        query += f" {order_clause} LIMIT {limit} OFFSET {offset}"
+        # Aplicar ordenación y paginación. El id desempata filas con la misma fecha
+        order_clause = keyset_order_clause(order)
+        if use_keyset:
+            page_params = list(params)
+            page_where = from_where
+            if after:
+                condition, condition_params = keyset_condition(after)
+                page_where += f" AND {condition}"
+                page_params.extend(condition_params)
+            # Una fila extra indica si hay página siguiente
+            cursor.execute(f"{query} {page_where} {order_clause} LIMIT {limit + 1}", page_params)
+            candidates = cursor.fetchall()
+            has_more = len(candidates) > limit
+            candidates = candidates[:limit]
+            # El cursor se toma antes de redactar campos
+            next_cursor = None
+            if has_more:
+                last = candidates[-1]
+                next_cursor = encode_cursor(last['fecha_registro'], last['id_afiliado'], order)
+        else:
+            offset = (page - 1) * limit
+            cursor.execute(f"{query} {from_where} {order_clause} LIMIT {limit} OFFSET {offset}", params)
+            candidates = cursor.fetchall()
         
-        cursor.execute(query, params)
-        candidates = cursor.fetchall()
+        # Contadores de postulaciones solo para las filas de la página
+        _attach_application_summary(cursor, candidates, id_field='id_afiliado')
         
         # 🔏 Redactar campos sensibles si aplica
         if redact_fields:
@@ -6142,9 +5947,24 @@ def get_candidates():
                     if field in row:
                         row[field] = None
         
+        _attach_cv_links(candidates)
+        
         # Cerrar cursor antes de devolver respuesta
         cursor.close()
         
+        if use_keyset:
+            return jsonify({
+                'success': True,
+                'data': candidates,
+                'pagination': {
+                    'limit': limit,
+                    'has_more': has_more,
+                    'next_cursor': next_cursor,
+                    'total': total,
+                    'total_mode': count_mode
+                }
+            })
+        
         return jsonify({
             'success': True,
             'data': candidates,
@@ -6152,7 +5972,7 @@ def get_candidates():
                 'total': total,
                 'page': page,
                 'limit': limit,
-                'pages': (total + limit - 1) // limit
+                'pages': (total + limit - 1) // limit if total is not None else None
             }
         })
         
@@ -6232,8 +6052,9 @@ def create_candidate():
             user_id  # 🔐 Registrar quién creó el candidato
         ))
         
-        conn.commit()
         candidate_id = cursor.lastrowid
+        reindex_candidates(cursor, tenant_id, ids=[candidate_id])
+        conn.commit()
         
         # Registrar actividad
         log_activity(
@@ -6332,6 +6153,7 @@ def get_candidate_profile(candidate_id):
         candidate = cursor.fetchone()
         if not candidate:
             return jsonify({"error": "Candidato no encontrado"}), 404
+        _attach_cv_links([candidate])
         
         # Obtener aplicaciones del candidato con validación de tenant
         cursor.execute("""
@@ -6430,6 +6252,19 @@ def search_candidates():
         except ValueError:
             return jsonify({"error": "Los parámetros de paginación deben ser números válidos"}), 400
         
+        # Paginación por cursor si se envía 'cursor' (vacío = primera página)
+        use_keyset = 'cursor' in request.args
+        after = None
+        if request.args.get('cursor'):
+            try:
+                after = decode_cursor(request.args['cursor'])
+            except ValueError:
+                return jsonify({"error": "Cursor de paginación inválido"}), 400
+        
+        count_mode = request.args.get('count', 'cached' if use_keyset else 'exact')
+        if count_mode not in COUNT_MODES:
+            count_mode = 'exact'
+        
         # 🔐 MÓDULO B5: Llamar a la función interna con user_id y tenant_id
         results = _internal_search_candidates(
             term=term, 
@@ -6438,23 +6273,44 @@ def search_candidates():
             status=status,
             availability=availability,
             min_score=min_score,
-            limit=limit,
+            limit=limit + 1 if use_keyset else limit,
             offset=offset,
             user_id=user_id,
-            tenant_id=tenant_id
+            tenant_id=tenant_id,
+            keyset=use_keyset,
+            after=after
         )
         
         # Contar el total de resultados (sin paginación) para la paginación
-        total_results = len(_internal_search_candidates(
+        total_results = _internal_count_candidates(
             term=term, 
-            tags=tags, 
             registered_today=registered_today,
             status=status,
             availability=availability,
             min_score=min_score,
             user_id=user_id,
-            tenant_id=tenant_id
-        ))
+            tenant_id=tenant_id,
+            count_mode=count_mode
+        )
+        
+        if use_keyset:
+            # Una fila extra indica si hay página siguiente
+            has_more = len(results) > limit
+            results = results[:limit]
+            next_cursor = None
+            if has_more:
+                last = results[-1]
+                next_cursor = encode_cursor(last['createdAt'], last['id'], after['order'] if after else 'desc')
+            return jsonify({
+                "data": results,
+                "pagination": {
+                    "limit": limit,
+                    "has_more": has_more,
+                    "next_cursor": next_cursor,
+                    "total": total_results,
+                    "total_mode": count_mode
+                }
+            })
         
         # Formatear la respuesta según lo esperado por la interfaz
         response = {
@@ -6463,7 +6319,7 @@ def search_candidates():
                 "total": total_results,
                 "page": page,
                 "limit": limit,
-                "total_pages": (total_results + limit - 1) // limit
+                "total_pages": (total_results + limit - 1) // limit if total_results is not None else None
             }
         }
         
@@ -6720,7 +6576,8 @@ def get_notifications():
         # 1. Nuevos candidatos registrados hoy
         sql = """
             SELECT COUNT(*) as count FROM Afiliados a
-            WHERE DATE(a.fecha_registro) = CURDATE() AND a.tenant_id = %s
+            WHERE a.fecha_registro >= CURDATE() AND a.fecha_registro < CURDATE() + INTERVAL 1 DAY
+            AND a.tenant_id = %s
         """
         params = [tenant_id]
         if candidate_condition:
@@ -7094,33 +6951,13 @@ def advanced_search_candidates():
             conditions.append(f"({condition})")
             params.extend(filter_params)
         
-        # Búsqueda por término - palabra por palabra
+        # Búsqueda por término - todas las palabras deben coincidir (ver candidate_search.py)
+        relevance_sql, relevance_params = None, []
         if search_term:
-            # Dividir en palabras individuales
-            search_words = [word.strip() for word in search_term.split() if word.strip()]
-            
-            if search_words:
-                word_conditions = []
-                for word in search_words:
-                    word_conditions.append("""
-                        (LOWER(a.nombre_completo) LIKE %s 
-                        OR LOWER(a.experiencia) LIKE %s 
-                        OR LOWER(a.ciudad) LIKE %s 
-                        OR LOWER(a.cargo_solicitado) LIKE %s
-                        OR LOWER(a.email) LIKE %s
-                        OR LOWER(a.grado_academico) LIKE %s
-                        OR LOWER(a.observaciones) LIKE %s
-                        OR LOWER(a.skills) LIKE %s
-                        OR LOWER(a.linkedin) LIKE %s
-                        OR LOWER(a.portfolio) LIKE %s
-                        OR LOWER(a.fuente_reclutamiento) LIKE %s
-                        OR LOWER(a.telefono) LIKE %s)
-                    """)
-                    # 12 columnas = 12 parámetros
-                    params.extend([f"%{word.lower()}%"] * 12)
-                
-                # Todas las palabras deben coincidir (AND)
-                conditions.append(" AND ".join(word_conditions))
+            term_condition, term_params, relevance_sql, relevance_params = build_term_clause(cursor, search_term)
+            if term_condition:
+                conditions.append(term_condition)
+                params.extend(term_params)
         
         # Filtros avanzados
         if filters.get('city'):
@@ -7168,21 +7005,27 @@ def advanced_search_candidates():
         if conditions:
             base_query += " AND " + " AND ".join(conditions)
         
-        # Ordenar por relevancia (puntuación + fecha)
-        base_query += " ORDER BY a.puntuacion DESC, a.fecha_registro DESC"
-        
-        # Contar total sin paginación
-        count_query = f"SELECT COUNT(*) as total FROM ({base_query}) as subquery"
+        # Contar total sin paginación (sin ordenar ni traer columnas)
+        count_query = "SELECT COUNT(*) as total FROM Afiliados a WHERE 1=1"
+        if conditions:
+            count_query += " AND " + " AND ".join(conditions)
         cursor.execute(count_query, tuple(params))
         total_results = cursor.fetchone()['total']
         
+        # Ordenar por relevancia (coincidencia de texto + puntuación + fecha)
+        if relevance_sql:
+            base_query += f" ORDER BY {relevance_sql} DESC, a.puntuacion DESC, a.fecha_registro DESC"
+            params.extend(relevance_params)
+        else:
+            base_query += " ORDER BY a.puntuacion DESC, a.fecha_registro DESC"
+        
         # Aplicar paginación
         base_query += " LIMIT %s OFFSET %s"
         params.extend([limit, offset])
         
         # Ejecutar consulta
         cursor.execute(base_query, tuple(params))
-        results = cursor.fetchall()
+        results = _attach_cv_links(cursor.fetchall())
         
         # Procesar resultados
         formatted_results = []
@@ -7460,6 +7303,10 @@ def handle_candidate_profile(id_afiliado):
                 old_data = cursor.fetchone()
                 
                 cursor.execute(sql, tuple(params))
+                if any(field in data for field in ('nombre_completo', 'telefono', 'email')):
+                    reindex_candidates(cursor, tenant_id, ids=[id_afiliado])
+                if any(field in data for field in SCORE_FIELDS):
+                    mark_dirty(cursor, [id_afiliado], 'perfil')
                 conn.commit()
                 
                 # 🔐 CORRECCIÓN: Registrar actividad para auditoría
@@ -7898,6 +7745,7 @@ def handle_applications():
             if results:
                 app.logger.info(f"🔍 Primer resultado: {results[0]}")
             
+            _attach_cv_links(results)
             for row in results:
                 for key, value in row.items():
                     if isinstance(value, (datetime, date)):
@@ -7942,6 +7790,7 @@ def handle_applications():
             sql = "INSERT INTO Postulaciones (id_afiliado, id_vacante, fecha_aplicacion, estado, comentarios, created_by_user) VALUES (%s, %s, NOW(), 'Recibida', %s, %s)"
             cursor.execute(sql, (data['id_afiliado'], data['id_vacante'], data.get('comentarios', ''), user_id))
             new_postulation_id = cursor.lastrowid
+            mark_dirty(cursor, [data['id_afiliado']], 'postulacion')
             conn.commit()
 
             cursor.execute("""
@@ -8067,6 +7916,9 @@ def delete_application(id_postulacion):
                 'code': 'FORBIDDEN'
             }), 403
         
+        mark_dirty_select(cursor, "SELECT id_afiliado FROM Postulaciones WHERE id_postulacion = %s",
+                          (id_postulacion,), 'postulacion_eliminada')
+        
         # Antes de borrar la postulación, borramos las entrevistas asociadas si existen
         cursor.execute("DELETE FROM Entrevistas WHERE id_postulacion = %s", (id_postulacion,))
         
@@ -8232,6 +8084,8 @@ def handle_interviews():
                 new_interview_id = cursor.lastrowid
                 
                 cursor.execute("UPDATE Postulaciones SET estado = 'En Entrevista' WHERE id_postulacion = %s", (id_postulacion,))
+                mark_dirty_select(cursor, "SELECT id_afiliado FROM Postulaciones WHERE id_postulacion = %s",
+                                  (id_postulacion,), 'entrevista')
                 conn.commit()
 
                 cursor.execute("""
@@ -8366,6 +8220,11 @@ def delete_interview(id_entrevista):
             }), 403
         
         # Eliminar la entrevista
+        mark_dirty_select(cursor, """
+            SELECT p.id_afiliado FROM Entrevistas e
+            JOIN Postulaciones p ON e.id_postulacion = p.id_postulacion
+            WHERE e.id_entrevista = %s
+        """, (id_entrevista,), 'entrevista_eliminada')
         cursor.execute("DELETE FROM Entrevistas WHERE id_entrevista = %s", (id_entrevista,))
         conn.commit()
         
@@ -8595,6 +8454,7 @@ def handle_hired():
                 SET p.estado = 'Contratado'
                 WHERE p.id_afiliado = %s AND p.id_vacante = %s AND v.tenant_id = %s
             """, (id_afiliado, id_vacante, tenant_id))
+            mark_dirty(cursor, [id_afiliado], 'contratacion')
             conn.commit()
 
             cursor.execute("""
@@ -8782,6 +8642,7 @@ def annul_hiring(id_contratado):
             SET p.estado = 'Oferta'
             WHERE p.id_afiliado = %s AND p.id_vacante = %s AND v.tenant_id = %s
         """, (record['id_afiliado'], record['id_vacante'], tenant_id))
+        mark_dirty(cursor, [record['id_afiliado']], 'contratacion_anulada')
         
         conn.commit()
         return jsonify({"success": True, "message": "Contratación anulada correctamente."})
@@ -9210,6 +9071,8 @@ def update_user(user_id, user_data):
         update_query = f"UPDATE Users SET {', '.join(update_fields)} WHERE id = %s"
         cursor.execute(update_query, params)
         conn.commit()
+        # El rol o el estado activo pueden haber cambiado
+        invalidate_permission_cache(user_id=user_id)
         
         # Obtener el usuario actualizado
         user = get_user_by_id(user_id)
@@ -9236,6 +9099,7 @@ def delete_user(user_id):
         # Realizar borrado lógico
         cursor.execute("UPDATE Users SET activo = FALSE, fecha_eliminacion = NOW() WHERE id = %s", (user_id,))
         conn.commit()
+        invalidate_permission_cache(user_id=user_id)
         
         cursor.close()
         conn.close()
@@ -10126,6 +9990,8 @@ def update_role_permissions(role_id):
         """, (permisos_json, role_id))
         
         conn.commit()
+        # Los roles se comparten entre usuarios de distintos tenants
+        invalidate_permission_cache()
         
         app.logger.info(f"Admin {user_id} actualizó permisos del rol {role['nombre']} (ID: {role_id})")
         
@@ -10631,6 +10497,7 @@ def update_user_custom_permissions(user_id):
         # cursor.execute("UPDATE Users SET custom_permissions = %s WHERE id = %s AND tenant_id = %s", (permissions_json, user_id, tenant_id))
         
         conn.commit()
+        invalidate_permission_cache(tenant_id=tenant_id, user_id=user_id)
         
         app.logger.info(f"✅ Admin {current_user_id} actualizó permisos (V3) de usuario {user_id} ({user['nombre']})")
         
@@ -10840,46 +10707,17 @@ def get_dashboard_activity():
         user_data = g.current_user
         user_id = user_data.get('user_id')
         
-        # 🔐 Construir filtros por usuario
-        candidate_condition, candidate_params = build_user_filter_condition(user_id, tenant_id, 'a.created_by_user_id', 'candidate', 'a.id_afiliado')
-        vacancy_condition, vacancy_params = build_user_filter_condition(user_id, tenant_id, 'v.created_by_user', 'vacancy', 'v.id_vacante')
-        
-        # Consulta FILTRADA para nuevos afiliados por día en los últimos 30 días
-        sql_afiliados = """
-            SELECT DATE(a.fecha_registro) as dia, COUNT(a.id_afiliado) as total 
-            FROM Afiliados a
-            WHERE a.fecha_registro >= CURDATE() - INTERVAL 30 DAY 
-            AND a.tenant_id = %s
-        """
-        params_afiliados = [tenant_id]
-        if candidate_condition:
-            sql_afiliados += f" AND ({candidate_condition})"
-            params_afiliados.extend(candidate_params)
-        sql_afiliados += " GROUP BY DATE(a.fecha_registro) ORDER BY dia"
-        
-        cursor.execute(sql_afiliados, tuple(params_afiliados))
-        afiliados_data = cursor.fetchall()
-
-        # Consulta FILTRADA para nuevas postulaciones por día en los últimos 30 días
-        sql_postulaciones = """
-            SELECT DATE(p.fecha_aplicacion) as dia, COUNT(p.id_postulacion) as total 
-            FROM Postulaciones p
-            JOIN Vacantes v ON p.id_vacante = v.id_vacante
-            WHERE p.fecha_aplicacion >= CURDATE() - INTERVAL 30 DAY 
-            AND p.tenant_id = %s AND v.tenant_id = %s
-        """
-        params_postulaciones = [tenant_id, tenant_id]
-        if vacancy_condition:
-            sql_postulaciones += f" AND ({vacancy_condition})"
-            params_postulaciones.extend(vacancy_params)
-        sql_postulaciones += " GROUP BY DATE(p.fecha_aplicacion) ORDER BY dia"
-        
-        cursor.execute(sql_postulaciones, tuple(params_postulaciones))
-        postulaciones_data = cursor.fetchall()
-        
-        # Formatear fechas a string para JSON
-        for row in afiliados_data: row['dia'] = row['dia'].isoformat()
-        for row in postulaciones_data: row['dia'] = row['dia'].isoformat()
+        # Series diarias de los últimos 30 días (agregados + días aún no consolidados),
+        # filtradas por los permisos del usuario sobre candidatos y vacantes
+        desde = db_today(cursor) - timedelta(days=30)
+        afiliados_data = [
+            {'dia': row['dia'].isoformat(), 'total': row['total']}
+            for row in daily_series(cursor, 'candidatos', tenant_id, user_id, desde)
+        ]
+        postulaciones_data = [
+            {'dia': row['dia'].isoformat(), 'total': row['total']}
+            for row in daily_series(cursor, 'postulaciones', tenant_id, user_id, desde)
+        ]
 
         return jsonify({
             "success": True, 
@@ -11062,74 +10900,6 @@ def bot_get_candidate_status():
         if 'conn' in locals():
             conn.close()
 
-# Función para configurar tareas periódicas
-def setup_periodic_tasks(sender, **kwargs):
-    """Configura tareas periódicas para Celery"""
-    # Recalcular puntuaciones de candidatos sin actividad reciente (ejecutar diariamente a las 2 AM)
-    sender.add_periodic_task(
-        crontab(hour=2, minute=0),
-        recalculate_stale_scores.s(),
-        name='recalcular-puntuaciones-diarias'
-    )
-
-# Tarea periódica para recalcular puntuaciones estancadas
-# @celery_app.task(bind=True, name='recalculate_stale_scores')
-def recalculate_stale_scores(self):
-    """
-    Tarea que recalcula puntuaciones de candidatos que no han sido actualizados
-    en los últimos 7 días o que nunca han sido puntuados.
-    """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Obtener candidatos que necesitan actualización
-        cursor.execute("""
-            SELECT id_afiliado 
-            FROM Afiliados 
-            WHERE ultima_actualizacion_puntuacion IS NULL 
-               OR ultima_actualizacion_puntuacion < DATE_SUB(NOW(), INTERVAL 7 DAY)
-            LIMIT 1000  # Limitar para no sobrecargar el sistema
-        """)
-        
-        candidates = cursor.fetchall()
-        total = len(candidates)
-        logger.info(f"Iniciando recálculo de puntuaciones para {total} candidatos")
-        
-        # Procesar cada candidato
-        for i, candidate in enumerate(candidates, 1):
-            candidate_id = candidate['id_afiliado']
-            try:
-                # Actualizar estado de la tarea
-                self.update_state(
-                    state='PROGRESS',
-                    meta={
-                        'current': i,
-                        'total': total,
-                        'status': f'Procesando candidato {i} de {total}'
-                    }
-                )
-                
-                # Ejecutar cálculo de puntuación
-                calculate_candidate_score.delay(candidate_id)
-                
-            except Exception as e:
-                logger.error(f"Error al programar cálculo para candidato {candidate_id}: {str(e)}")
-        
-        return {
-            'total': total,
-            'message': f'Se programó el recálculo para {total} candidatos'
-        }
-        
-    except Exception as e:
-        logger.error(f"Error en recalculate_stale_scores: {str(e)}")
-        raise
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
-
 @app.route('/api/bot_tools/vacancies_with_details', methods=['GET'])
 @require_api_key
 def bot_get_vacancies_with_details():
@@ -11188,17 +10958,20 @@ def update_notification_status():
 @app.route('/api/applications/resync_pending_notifications', methods=['POST'])
 @require_api_key
 def resync_pending_notifications():
-    """Busca todas las postulaciones con notificaciones pendientes y las re-envía a bridge.js."""
+    """
+    Busca todas las postulaciones con notificaciones pendientes y las re-envía
+    a bridge.js en una sola tarea por lotes (send_whatsapp_notifications_batch).
+    """
     app.logger.info("INICIANDO RESINCRONIZACIÓN DE NOTIFICACIONES PENDIENTES")
     conn = get_db_connection()
     if not conn: return jsonify({"error": "DB connection failed"}), 500
     cursor = conn.cursor(dictionary=True)
     
-    tasks_sent = 0
+    notifications = []
     try:
         # Solo buscamos postulaciones, las otras notificaciones son menos críticas si fallan.
         query = """
-            SELECT p.id_postulacion, a.telefono, a.nombre_completo, v.cargo_solicitado, v.ciudad, v.salario, v.requisitos
+            SELECT p.id_postulacion, p.tenant_id, a.telefono, a.nombre_completo, v.cargo_solicitado, v.ciudad, v.salario, v.requisitos
             FROM Postulaciones p
             JOIN Afiliados a ON p.id_afiliado = a.id_afiliado
             JOIN Vacantes v ON p.id_vacante = v.id_vacante
@@ -11218,17 +10991,20 @@ def resync_pending_notifications():
                 f"*Requisitos principales:*\n{info['requisitos']}\n\n"
                 "Por favor, confirma si estás interesado/a en continuar con este proceso. ¡Mucho éxito!"
             )
-            task = {
+            notifications.append({
                 "task_type": "postulation",
                 "related_id": info['id_postulacion'],
-                "chat_id": clean_phone_number(info['telefono']),
-                "message_body": message_body
-            }
-            if _send_task_to_bridge(task):
-                tasks_sent += 1
+                "phone_number": info['telefono'],
+                "message_body": message_body,
+                "tenant_id": info['tenant_id']
+            })
         
-        app.logger.info(f"Resincronización completada. {tasks_sent} tareas reenviadas a bridge.js.")
-        return jsonify({"success": True, "tasks_resent": tasks_sent}), 200
+        if not notifications:
+            return jsonify({"success": True, "tasks_resent": 0}), 200
+        
+        task = send_whatsapp_notifications_batch.delay(notifications)
+        app.logger.info(f"Resincronización encolada. {len(notifications)} notificaciones en la tarea {task.id}.")
+        return jsonify({"success": True, "tasks_resent": len(notifications), "task_id": task.id}), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -11274,6 +11050,25 @@ def get_all_affiliates_for_sync():
         conn.close()
 
 
+@app.route('/api/internal/db-pool/stats', methods=['GET'])
+@require_api_key
+def get_db_pool_stats():
+    """
+    Métricas del worker que atiende la petición: pool de conexiones
+    (préstamos, esperas, timeouts, reciclajes, health checks), cola de
+    logs de la API pública (encolados, escritos, descartados), caché de
+    API Keys (entradas, aciertos, fallos) y planificador de Gemini
+    (throughput, cola, errores y 429 por key).
+    """
+    return jsonify({
+        'pid': os.getpid(),
+        'pool': db_pool.get_pool_stats(),
+        'api_log_writer': api_log_writer.get_stats(),
+        'api_key_cache': api_key_cache.get_stats(),
+        'gemini_scheduler': cv_processing_service.gemini_scheduler.get_stats() if cv_processing_service else None
+    })
+
+
 @app.route('/uploads/<path:folder>/<path:filename>')
 def serve_uploaded_file(folder, filename):
     """
@@ -11434,7 +11229,7 @@ def get_dashboard_stats():
             SELECT 
                 COUNT(*) as total_candidatos,
                 COUNT(CASE WHEN a.estado = 'active' THEN 1 END) as candidatos_activos,
-                COUNT(CASE WHEN DATE(a.fecha_registro) = CURDATE() THEN 1 END) as candidatos_hoy
+                COUNT(CASE WHEN a.fecha_registro >= CURDATE() AND a.fecha_registro < CURDATE() + INTERVAL 1 DAY THEN 1 END) as candidatos_hoy
             FROM Afiliados a
             WHERE a.tenant_id = %s
         """
@@ -11452,7 +11247,7 @@ def get_dashboard_stats():
                 COUNT(*) as total_aplicaciones,
                 COUNT(CASE WHEN p.estado = 'Contratado' THEN 1 END) as contratados,
                 COUNT(CASE WHEN p.estado = 'Entrevista' THEN 1 END) as entrevistas,
-                COUNT(CASE WHEN DATE(p.fecha_aplicacion) = CURDATE() THEN 1 END) as aplicaciones_hoy
+                COUNT(CASE WHEN p.fecha_aplicacion >= CURDATE() AND p.fecha_aplicacion < CURDATE() + INTERVAL 1 DAY THEN 1 END) as aplicaciones_hoy
             FROM Postulaciones p
             JOIN Vacantes v ON p.id_vacante = v.id_vacante
             WHERE p.tenant_id = %s AND v.tenant_id = %s
@@ -11469,7 +11264,7 @@ def get_dashboard_stats():
             SELECT
                 COUNT(*) as total_vacantes,
                 COUNT(CASE WHEN v.estado = 'Abierta' THEN 1 END) as vacantes_abiertas,
-                COUNT(CASE WHEN DATE(v.fecha_apertura) = CURDATE() THEN 1 END) as vacantes_hoy
+                COUNT(CASE WHEN v.fecha_apertura >= CURDATE() AND v.fecha_apertura < CURDATE() + INTERVAL 1 DAY THEN 1 END) as vacantes_hoy
             FROM Vacantes v
             WHERE v.tenant_id = %s
         """
@@ -11974,7 +11769,7 @@ def get_client_applications(client_id):
         
         cursor.execute(query, tuple(params))
         
-        applications = cursor.fetchall()
+        applications = _attach_cv_links(cursor.fetchall())
         
         # Convertir datetime objects a strings para JSON serialization
         for application in applications:
@@ -12168,6 +11963,53 @@ def get_permissions():
 
 # ==================== ENDPOINTS DE CARGA MASIVA DE CVs ====================
 
+def find_cv_job(tenant_id, user_id):
+    """
+    Id del job del pipeline de CVs para esta petición y el job si ya existe.
+    Con el header Idempotency-Key, reenviar la petición da el mismo job_id.
+    """
+    job_id = new_job_id(tenant_id, user_id, request.headers.get('Idempotency-Key'))
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        return job_id, get_job(cursor, tenant_id, job_id)
+    finally:
+        cursor.close()
+        conn.close()
+
+def start_cv_job(tenant_id, user_id, files, uploaded=None):
+    """
+    Registra un job del pipeline de CVs y lo encola en Celery (ver cv_pipeline.py).
+    files: archivos de request.files, que se dejan en CV_STAGING_DIR; uploaded:
+    info de archivos que la web ya subió a OCI (object_key, file_url, par_id...).
+    Si el job ya existía (Idempotency-Key repetido) no se vuelve a encolar.
+    Retorna (job_id, creado).
+    """
+    job_id = new_job_id(tenant_id, user_id, request.headers.get('Idempotency-Key'))
+    
+    file_infos = list(uploaded or [])
+    for file in files:
+        file_infos.append({'filename': file.filename, 'path': stage_file(file)})
+    
+    conn = get_db_connection()
+    try:
+        created = create_job(conn, tenant_id, user_id, job_id, file_infos)
+    finally:
+        conn.close()
+    
+    if not created:
+        app.logger.info(f"Job {job_id} ya registrado, no se vuelve a encolar")
+        for file_info in file_infos:
+            if file_info.get('path'):
+                try:
+                    os.remove(file_info['path'])
+                except OSError:
+                    pass
+        return job_id, False
+    
+    enqueue_cv_job(tenant_id, user_id, job_id, file_infos)
+    return job_id, True
+
 @app.route('/api/candidates/upload', methods=['POST'])
 @token_required
 def upload_cvs():
@@ -12232,138 +12074,15 @@ def upload_cvs():
         
         app.logger.info(f"Procesando {len(valid_files)} archivos para tenant {tenant_id}")
         
-        # Procesar archivos en segundo plano
-        def process_cvs_background():
-            results = []
-            errors = []
-            
-            for file in valid_files:
-                try:
-                    # Leer contenido del archivo
-                    file.seek(0)
-                    file_content = file.read()
-                    
-                    # Generar identificador único
-                    cv_identifier = oci_storage_service.generate_cv_identifier(
-                        tenant_id=tenant_id,
-                        candidate_id=None
-                    )
-                    
-                    # Subir a OCI
-                    upload_result = oci_storage_service.upload_cv(
-                        file_content=file_content,
-                        tenant_id=tenant_id,
-                        cv_identifier=cv_identifier,
-                        original_filename=file.filename,
-                        candidate_id=None
-                    )
-                    
-                    if not upload_result['success']:
-                        errors.append({
-                            'filename': file.filename,
-                            'error': f"Error subiendo a OCI: {upload_result['error']}"
-                        })
-                        continue
-                    
-                    # Crear PAR
-                    par_result = oci_storage_service.create_par(
-                        object_key=upload_result['object_key'],
-                        cv_identifier=cv_identifier
-                    )
-                    
-                    if not par_result['success']:
-                        errors.append({
-                            'filename': file.filename,
-                            'error': f"Error creando PAR: {par_result['error']}"
-                        })
-                        continue
-                    
-                    # Extraer texto del CV
-                    cv_text = cv_processing_service.extract_text_from_file(
-                        file_content=file_content,
-                        filename=file.filename
-                    )
-                    
-                    # Procesar con Gemini
-                    gemini_result = cv_processing_service.process_cv_with_gemini(
-                        cv_text=cv_text,
-                        tenant_id=tenant_id
-                    )
-                    
-                    if gemini_result['success']:
-                        # Validar datos
-                        validation_result = cv_processing_service.validate_cv_data(
-                            gemini_result['data']
-                        )
-                        
-                        if validation_result['success']:
-                            processed_data = validation_result['validated_data']
-                            
-                            # Crear candidato
-                            try:
-                                candidate_id = create_candidate_from_cv_data(
-                                    processed_data, tenant_id, user_id
-                                )
-                                
-                                # Guardar CV en BD
-                                save_cv_to_database(
-                                    tenant_id=tenant_id,
-                                    candidate_id=candidate_id,
-                                    cv_identifier=cv_identifier,
-                                    original_filename=file.filename,
-                                    object_key=upload_result['object_key'],
-                                    file_url=par_result['access_uri'],
-                                    par_id=par_result['par_id'],
-                                    mime_type=upload_result['mime_type'],
-                                    file_size=upload_result['size'],
-                                    processed_data=processed_data
-                                )
-                                
-                                results.append({
-                                    'filename': file.filename,
-                                    'success': True,
-                                    'candidate_id': candidate_id,
-                                    'cv_identifier': cv_identifier
-                                })
-                                
-                                app.logger.info(f"CV procesado exitosamente: {file.filename} -> Candidato {candidate_id}")
-                                
-                            except Exception as e:
-                                app.logger.error(f"Error creando candidato para {file.filename}: {str(e)}")
-                                errors.append({
-                                    'filename': file.filename,
-                                    'error': f"Error creando candidato: {str(e)}"
-                                })
-                        else:
-                            errors.append({
-                                'filename': file.filename,
-                                'error': f"Error validando datos: {validation_result['error']}"
-                            })
-                    else:
-                        errors.append({
-                            'filename': file.filename,
-                            'error': f"Error procesando con IA: {gemini_result['error']}"
-                        })
-                        
-                except Exception as e:
-                    app.logger.error(f"Error procesando {file.filename}: {str(e)}")
-                    errors.append({
-                        'filename': file.filename,
-                        'error': str(e)
-                    })
-            
-            app.logger.info(f"Procesamiento completado: {len(results)} exitosos, {len(errors)} errores")
-        
-        # Iniciar procesamiento en background
-        import threading
-        thread = threading.Thread(target=process_cvs_background)
-        thread.daemon = True
-        thread.start()
+        # Encolar el pipeline de CVs en Celery
+        job_id, created = start_cv_job(tenant_id, user_id, valid_files)
         
         return jsonify({
             'success': True,
-            'message': f'Procesando {len(valid_files)} archivos. Los candidatos se crearán en segundo plano.',
-            'total_files': len(valid_files)
+            'message': f'Procesando {len(valid_files)} archivos. Los candidatos se crearán en segundo plano.' if created
+                       else 'Este lote ya fue recibido; consulte su estado con el job_id.',
+            'total_files': len(valid_files),
+            'job_id': job_id
         })
         
     except Exception as e:
@@ -13010,9 +12729,54 @@ def send_whatsapp_message_direct():
             'message': 'Error interno del servidor'
         }), 500
 
-# =====================================================
-# 📱 ENDPOINTS ESPECÍFICOS DE WHATSAPP WEB.JS
-# =====================================================
+@app.route('/api/whatsapp/campaigns', methods=['POST'])
+@token_required
+def create_whatsapp_campaign():
+    """
+    Crea y envía una campaña de WhatsApp por lotes.
+    Body: {candidate_ids (lista o texto separado por comas) o vacancy_id,
+    message_body (usa [nombre]) o template_type}
+    """
+    tenant_id = get_current_tenant_id()
+    data = request.get_json() or {}
+    result = json.loads(create_whatsapp_campaign_multi_tenant(
+        tenant_id,
+        message_body=data.get('message_body'),
+        candidate_ids=data.get('candidate_ids'),
+        vacancy_id=data.get('vacancy_id'),
+        template_type=data.get('template_type', 'custom'),
+        dispatch=True
+    ))
+    if 'error' in result:
+        return jsonify({'success': False, **result}), 400
+    if 'campaign_id' in result:
+        result['status_url'] = url_for('get_whatsapp_campaign', campaign_id=result['campaign_id'])
+    return jsonify(result), 202
+
+@app.route('/api/whatsapp/campaigns/<campaign_id>', methods=['GET'])
+@token_required
+def get_whatsapp_campaign(campaign_id):
+    """Progreso de una campaña: mensajes pendientes, enviados y fallidos"""
+    tenant_id = get_current_tenant_id()
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Error de conexión"}), 500
+    cursor = conn.cursor(dictionary=True)
+    try:
+        summary = whatsapp_campaigns.campaign_summary(cursor, tenant_id, campaign_id)
+        if summary is None:
+            return jsonify({'error': 'Campaña no encontrada'}), 404
+        return jsonify({'success': True, **summary})
+    except Exception as e:
+        app.logger.error(f"Error obteniendo campaña WhatsApp: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+# =====================================================
+# 📱 ENDPOINTS ESPECÍFICOS DE WHATSAPP WEB.JS
+# =====================================================
 @app.route('/api/whatsapp/web/init-session', methods=['POST'])
 @token_required
 def init_whatsapp_web_session():
@@ -13207,8 +12971,16 @@ def upload_cv_to_oci():
         
         # Obtener datos adicionales del formulario
         candidate_id = request.form.get('candidate_id')
-        # Gemini AI es OBLIGATORIO para crear perfiles de candidatos
-        force_process = True  # Siempre procesar con IA
+        
+        # Petición repetida con el mismo Idempotency-Key: no subir otra vez
+        job_id, job = find_cv_job(tenant_id, user_id)
+        if job:
+            return jsonify({
+                'success': True,
+                'message': 'Este CV ya fue recibido; consulte su estado con el job_id.',
+                'job_id': job_id,
+                'processing_status': job['status']
+            })
         
         # Leer contenido del archivo
         file_content = file.read()
@@ -13246,11 +13018,25 @@ def upload_cv_to_oci():
                 'error': f"Error creando PAR: {par_result['error']}"
             }), 500
         
+        # Procesar CV con Gemini AI en Celery (extracción, IA, duplicados y BD)
+        job_id, _ = start_cv_job(tenant_id, user_id, [], uploaded=[{
+            'filename': file.filename,
+            'cv_identifier': cv_identifier,
+            'object_key': upload_result['object_key'],
+            'mime_type': upload_result['mime_type'],
+            'size': upload_result['size'],
+            'file_url': par_result['access_uri'],
+            'par_id': par_result['par_id'],
+            'content_hash': cv_cache.sha256(file_content),
+            'target_candidate_id': int(candidate_id) if candidate_id else None
+        }])
+        
         # Responder inmediatamente al frontend con éxito
         response_data = {
             'success': True,
             'message': 'CV subido exitosamente. Procesando con IA...',
             'cv_identifier': cv_identifier,
+            'job_id': job_id,
             'file_info': {
                 'filename': file.filename,
                 'size': upload_result['size'],
@@ -13264,98 +13050,6 @@ def upload_cv_to_oci():
             'processing_status': 'processing'
         }
         
-        # Procesar CV con Gemini AI en segundo plano (sin bloquear respuesta)
-        def process_cv_background():
-            try:
-                # 1. Extraer texto del CV
-                cv_text = cv_processing_service.extract_text_from_file(
-                    file_content=file_content,
-                    filename=file.filename
-                )
-                
-                # 2. Procesar con Gemini
-                gemini_result = cv_processing_service.process_cv_with_gemini(
-                    cv_text=cv_text,
-                    tenant_id=tenant_id
-                )
-                
-                if gemini_result['success']:
-                    # Validar datos procesados
-                    validation_result = cv_processing_service.validate_cv_data(
-                        gemini_result['data']
-                    )
-                    
-                    if validation_result['success']:
-                        processed_data = validation_result['validated_data']
-                        
-                        # 3. Crear o actualizar candidato con los datos del CV
-                        try:
-                            # Buscar candidato existente por email o teléfono si están disponibles
-                            existing_candidate_id = None
-                            if processed_data.get('email'):
-                                with get_db_connection() as conn:
-                                    with conn.cursor(dictionary=True) as cursor:
-                                        cursor.execute("""
-                                            SELECT id_afiliado FROM Afiliados 
-                                            WHERE (email = %s OR telefono = %s) AND tenant_id = %s
-                                            LIMIT 1
-                                        """, (processed_data.get('email'), 
-                                             processed_data.get('telefono'), 
-                                             tenant_id))
-                                        if cursor.rowcount > 0:
-                                            existing_candidate = cursor.fetchone()
-                                            existing_candidate_id = existing_candidate['id_afiliado']
-                            
-                            # 4. Crear o actualizar el candidato
-                            candidate_id = existing_candidate_id or None
-                            
-                            # Si no existe, crear nuevo candidato
-                            if not candidate_id:
-                                candidate_id = create_candidate_from_cv_data(
-                                    processed_data, tenant_id, user_id
-                                )
-                                app.logger.info(f"Nuevo candidato creado: ID {candidate_id} para tenant {tenant_id}")
-                            else:
-                                app.logger.info(f"Actualizando candidato existente: ID {candidate_id}")
-                                # Aquí podrías agregar lógica para actualizar datos existentes si es necesario
-                            
-                            # 5. Guardar CV en base de datos y asociar con el candidato
-                            save_cv_result = save_cv_to_database(
-                                tenant_id=tenant_id,
-                                candidate_id=int(candidate_id),
-                                cv_identifier=cv_identifier,
-                                original_filename=file.filename,
-                                object_key=upload_result['object_key'],
-                                file_url=par_result['access_uri'],
-                                par_id=par_result['par_id'],
-                                mime_type=upload_result['mime_type'],
-                                file_size=upload_result['size'],
-                                processed_data=processed_data
-                            )
-                            
-                            if save_cv_result['success']:
-                                app.logger.info(f"CV guardado exitosamente para candidato {candidate_id}")
-                            else:
-                                app.logger.error(f"Error guardando CV: {save_cv_result.get('error')}")
-                                
-                        except Exception as e:
-                            app.logger.error(f"Error en procesamiento de candidato: {str(e)}", exc_info=True)
-                            
-                    else:
-                        app.logger.error(f"Error validando datos del CV: {validation_result.get('error')}")
-                else:
-                    app.logger.error(f"Error procesando CV con Gemini: {gemini_result.get('error')}")
-                    
-            except Exception as e:
-                app.logger.error(f"Error en procesamiento en segundo plano: {str(e)}", exc_info=True)
-        
-        # Ejecutar procesamiento en segundo plano
-        import threading
-        background_thread = threading.Thread(target=process_cv_background)
-        background_thread.daemon = True
-        background_thread.start()
-        
-        # Responder inmediatamente al frontend
         app.logger.info(f"CV subido exitosamente: {cv_identifier}")
         return jsonify(response_data)
         
@@ -13415,261 +13109,24 @@ def upload_multiple_cvs_to_oci():
         if not valid_files:
             return jsonify({'error': 'No se encontraron archivos válidos. Verifique que sean PDF, DOCX, DOC, JPG, PNG, GIF o BMP y menores a 10MB'}), 400
         
-        # Crear job para procesamiento masivo
-        job_id = f"batch_cv_{tenant_id}_{int(time.time())}_{user_id}"
-        
-        # Guardar información del job en la tabla CV_Processing_Logs
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+        # Crear job para procesamiento masivo (Celery: subida, IA, duplicados y BD por archivo)
+        job_id, created = start_cv_job(tenant_id, user_id, valid_files)
+        app.logger.info(f"🚀 Job {job_id} con {len(valid_files)} archivos {'encolado' if created else 'ya existente'}")
         
-        cursor = conn.cursor()
+        # Responder inmediatamente al frontend
+        response_data = {
+            'success': True,
+            'message': f'Iniciando procesamiento de {len(valid_files)} archivos con IA...',
+            'job_id': job_id,
+            'total_files': len(valid_files),
+            'processing_status': 'processing'
+        }
         
-        try:
-            # Insertar job en la tabla de procesamiento
-            cursor.execute("""
-                INSERT INTO CV_Processing_Logs (
-                    tenant_id, cv_identifier, processing_step, status, 
-                    message, details, created_at
-                ) VALUES (
-                    %s, %s, 'batch_start', 'processing', 
-                    %s, %s, NOW()
-                )
-            """, (
-                tenant_id, 
-                job_id, 
-                f'Iniciando procesamiento de {len(valid_files)} archivos',
-                json.dumps({
-                    'total_files': len(valid_files),
-                    'processed_files': 0,
-                    'successful_files': 0,
-                    'failed_files': 0
-                })
-            ))
-            
-            conn.commit()
-            
-            # Procesar archivos en segundo plano
-            def process_files_background():
-                try:
-                    app.logger.info(f"🔄 INICIANDO PROCESAMIENTO EN SEGUNDO PLANO para job {job_id}")
-                    
-                    processed_count = 0
-                    successful_count = 0
-                    failed_count = 0
-                    
-                    for file in valid_files:
-                        try:
-                            app.logger.info(f"Procesando archivo: {file.filename}")
-                            
-                            # Leer contenido del archivo
-                            file_content = file.read()
-                            file.seek(0)
-                            
-                            # Generar identificador único para el CV
-                            cv_identifier = oci_storage_service.generate_cv_identifier(
-                                tenant_id=tenant_id,
-                                candidate_id=None
-                            )
-                            
-                            # Subir archivo a OCI Object Storage
-                            upload_result = oci_storage_service.upload_cv(
-                                file_content=file_content,
-                                tenant_id=tenant_id,
-                                cv_identifier=cv_identifier,
-                                original_filename=file.filename,
-                                candidate_id=None
-                            )
-                            
-                            if upload_result['success']:
-                                # Crear PAR para acceso al archivo
-                                par_result = oci_storage_service.create_par(
-                                    object_key=upload_result['object_key'],
-                                    cv_identifier=cv_identifier
-                                )
-                                
-                                if par_result['success']:
-                                    # Procesar CV con IA (mismo proceso que el individual)
-                                    try:
-                                        # 1. Extraer texto del CV
-                                        cv_text = cv_processing_service.extract_text_from_file(
-                                            file_content=file_content,
-                                            filename=file.filename
-                                        )
-                                        
-                                        # 2. Procesar con Gemini
-                                        gemini_result = cv_processing_service.process_cv_with_gemini(
-                                            cv_text=cv_text,
-                                            tenant_id=tenant_id
-                                        )
-                                        
-                                        if gemini_result['success']:
-                                            # Validar datos procesados
-                                            validation_result = cv_processing_service.validate_cv_data(
-                                                gemini_result['data']
-                                            )
-                                            
-                                            if validation_result['success']:
-                                                processed_data = validation_result['validated_data']
-                                                
-                                                # 3. Buscar candidato existente por email o teléfono
-                                                existing_candidate_id = None
-                                                if processed_data.get('email'):
-                                                    with get_db_connection() as conn_search:
-                                                        with conn_search.cursor(dictionary=True) as cursor_search:
-                                                            cursor_search.execute("""
-                                                                SELECT id_afiliado FROM Afiliados 
-                                                                WHERE (email = %s OR telefono = %s) AND tenant_id = %s
-                                                                LIMIT 1
-                                                            """, (processed_data.get('email'), 
-                                                                 processed_data.get('telefono'), 
-                                                                 tenant_id))
-                                                            if cursor_search.rowcount > 0:
-                                                                existing_candidate = cursor_search.fetchone()
-                                                                existing_candidate_id = existing_candidate['id_afiliado']
-                                                
-                                                # 4. Crear o actualizar el candidato
-                                                candidate_id = existing_candidate_id or None
-                                                
-                                                if not candidate_id:
-                                                    candidate_id = create_candidate_from_cv_data(
-                                                        processed_data, tenant_id, user_id
-                                                    )
-                                                    app.logger.info(f"Nuevo candidato creado: ID {candidate_id} para tenant {tenant_id}")
-                                                else:
-                                                    app.logger.info(f"Actualizando candidato existente: ID {candidate_id}")
-                                                
-                                                # 5. Guardar CV en base de datos y asociar con el candidato
-                                                save_cv_result = save_cv_to_database(
-                                                    tenant_id=tenant_id,
-                                                    candidate_id=int(candidate_id),
-                                                    cv_identifier=cv_identifier,
-                                                    original_filename=file.filename,
-                                                    object_key=upload_result['object_key'],
-                                                    file_url=par_result['access_uri'],
-                                                    par_id=par_result['par_id'],
-                                                    mime_type=upload_result['mime_type'],
-                                                    file_size=upload_result['size'],
-                                                    processed_data=processed_data
-                                                )
-                                                
-                                                if save_cv_result['success']:
-                                                    successful_count += 1
-                                                    app.logger.info(f"CV procesado exitosamente: {file.filename}")
-                                                else:
-                                                    failed_count += 1
-                                                    app.logger.error(f"Error guardando CV en BD: {save_cv_result['error']}")
-                                            else:
-                                                failed_count += 1
-                                                app.logger.error(f"Error validando datos del CV {file.filename}: {validation_result['error']}")
-                                        else:
-                                            failed_count += 1
-                                            app.logger.error(f"Error procesando CV con Gemini {file.filename}: {gemini_result['error']}")
-                                    
-                                    except Exception as process_error:
-                                        failed_count += 1
-                                        app.logger.error(f"Error procesando CV {file.filename}: {str(process_error)}")
-                                else:
-                                    failed_count += 1
-                                    app.logger.error(f"Error creando PAR para {file.filename}: {par_result['error']}")
-                            else:
-                                failed_count += 1
-                                app.logger.error(f"Error subiendo archivo {file.filename}: {upload_result['error']}")
-                            
-                            processed_count += 1
-                            
-                            # Actualizar progreso del job
-                            cursor.execute("""
-                                UPDATE CV_Processing_Logs 
-                                SET details = %s, created_at = NOW()
-                                WHERE tenant_id = %s AND cv_identifier = %s
-                            """, (
-                                json.dumps({
-                                    'total_files': len(valid_files),
-                                    'processed_files': processed_count,
-                                    'successful_files': successful_count,
-                                    'failed_files': failed_count
-                                }),
-                                tenant_id, job_id
-                            ))
-                            conn.commit()
-                            
-                        except Exception as file_error:
-                            failed_count += 1
-                            processed_count += 1
-                            app.logger.error(f"Error procesando archivo {file.filename}: {str(file_error)}")
-                            
-                            # Actualizar progreso del job
-                            cursor.execute("""
-                                UPDATE CV_Processing_Logs 
-                                SET details = %s, created_at = NOW()
-                                WHERE tenant_id = %s AND cv_identifier = %s
-                            """, (
-                                json.dumps({
-                                    'total_files': len(valid_files),
-                                    'processed_files': processed_count,
-                                    'successful_files': successful_count,
-                                    'failed_files': failed_count
-                                }),
-                                tenant_id, job_id
-                            ))
-                            conn.commit()
-                    
-                    # Marcar job como completado
-                    cursor.execute("""
-                        UPDATE CV_Processing_Logs 
-                        SET processing_step = 'batch_completed', status = 'completed', created_at = NOW()
-                        WHERE tenant_id = %s AND cv_identifier = %s
-                    """, (tenant_id, job_id))
-                    conn.commit()
-                    
-                    app.logger.info(f"Procesamiento masivo completado: {successful_count} exitosos, {failed_count} fallidos")
-                    
-                except Exception as batch_error:
-                    app.logger.error(f"Error en procesamiento masivo: {str(batch_error)}")
-                    # Marcar job como fallido
-                    try:
-                        cursor.execute("""
-                            UPDATE CV_Processing_Logs 
-                            SET processing_step = 'batch_failed', status = 'failed', message = %s, created_at = NOW()
-                            WHERE tenant_id = %s AND cv_identifier = %s
-                        """, (str(batch_error), tenant_id, job_id))
-                        conn.commit()
-                    except:
-                        pass
-            
-            # Iniciar procesamiento en segundo plano
-            import threading
-            app.logger.info(f"🚀 Iniciando thread para procesamiento de {len(valid_files)} archivos")
-            thread = threading.Thread(target=process_files_background)
-            thread.daemon = True
-            thread.start()
-            app.logger.info(f"✅ Thread iniciado exitosamente")
-            
-            # Responder inmediatamente al frontend
-            response_data = {
-                'success': True,
-                'message': f'Iniciando procesamiento de {len(valid_files)} archivos con IA...',
-                'job_id': job_id,
-                'total_files': len(valid_files),
-                'processing_status': 'processing'
-            }
-            
-            return jsonify(response_data)
-            
-        except Exception as db_error:
-            conn.rollback()
-            app.logger.error(f"Error en base de datos: {str(db_error)}")
-            return jsonify({'error': 'Error interno del servidor'}), 500
+        return jsonify(response_data)
             
     except Exception as e:
         app.logger.error(f"Error en upload_multiple_cvs_to_oci: {str(e)}")
         return jsonify({'error': 'Error al procesar archivos'}), 500
-    
-    finally:
-        if 'conn' in locals():
-            cursor.close()
-            conn.close()
 
 @app.route('/api/candidates/process-status/<job_id>', methods=['GET'])
 @token_required
@@ -13686,17 +13143,8 @@ def get_cv_processing_status(job_id):
         
         cursor = conn.cursor(dictionary=True)
         
-        # Obtener información del job
-        cursor.execute("""
-            SELECT 
-                cv_identifier, processing_step, status, message, details, created_at
-            FROM CV_Processing_Logs 
-            WHERE tenant_id = %s AND cv_identifier = %s
-            ORDER BY created_at DESC
-            LIMIT 1
-        """, (tenant_id, job_id))
-        
-        job_data = cursor.fetchone()
+        # Obtener información del job (los workers de Celery actualizan los contadores)
+        job_data = get_job(cursor, tenant_id, job_id)
         
         if not job_data:
             return jsonify({"error": "Job no encontrado"}), 404
@@ -13725,7 +13173,9 @@ def get_cv_processing_status(job_id):
                 'status': job_data['status'],
                 'progress_percent': round(progress_percent, 2),
                 'message': job_data['message'],
-                'created_at': job_data['created_at'].isoformat() if job_data['created_at'] else None
+                'created_at': job_data['created_at'].isoformat() if job_data['created_at'] else None,
+                # Etapa actual de cada archivo (upload, extract, parse, validate, duplicates, save)
+                'files': get_job_files(cursor, tenant_id, job_id)
             }
         }
         
@@ -13755,17 +13205,8 @@ def get_cv_batch_results(job_id):
         
         cursor = conn.cursor(dictionary=True)
         
-        # Obtener información del job
-        cursor.execute("""
-            SELECT 
-                cv_identifier, processing_step, status, message, details, created_at
-            FROM CV_Processing_Logs 
-            WHERE tenant_id = %s AND cv_identifier = %s
-            ORDER BY created_at DESC
-            LIMIT 1
-        """, (tenant_id, job_id))
-        
-        job_data = cursor.fetchone()
+        # Obtener información del job (los workers de Celery actualizan los contadores)
+        job_data = get_job(cursor, tenant_id, job_id)
         
         if not job_data:
             return jsonify({"error": "Job no encontrado"}), 404
@@ -13778,16 +13219,18 @@ def get_cv_batch_results(job_id):
             except:
                 details = {}
         
+        files = get_job_files(cursor, tenant_id, job_id)
+        
         # Preparar respuesta con formato esperado por el frontend
         response_data = {
             'success': True,
             'summary': {
                 'successful': details.get('successful_files', 0),
-                'duplicates': 0,  # No aplica para CVs
+                'duplicates': sum(1 for file in files if file['possible_duplicates']),
                 'errors': details.get('failed_files', 0),
                 'total': details.get('total_files', 0)
             },
-            'results': [],  # Se puede expandir para incluir detalles específicos
+            'results': files,
             'job_id': job_id,
             'status': job_data['status'],
             'message': job_data['message']
@@ -13912,7 +13355,7 @@ def download_cv(cv_identifier):
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
-            SELECT cpl.file_url, cpl.original_filename, cpl.mime_type, cpl.candidate_id
+            SELECT cpl.object_key, cpl.file_url, cpl.original_filename, cpl.mime_type, cpl.candidate_id
             FROM CV_Processing_Logs cpl
             WHERE cpl.tenant_id = %s AND cpl.cv_identifier = %s
         """, (tenant_id, cv_identifier))
@@ -13929,8 +13372,10 @@ def download_cv(cv_identifier):
                 app.logger.warning(f"Usuario {user_id} intentó descargar CV de candidato {candidate_id} sin acceso")
                 return jsonify({'error': 'No tienes acceso a este CV'}), 403
         
-        # La PAR ya contiene la URL completa para acceso directo
+        # PAR vigente de la caché; la URL guardada al subir queda como respaldo
         file_url = cv_record['file_url']
+        if cv_par_cache is not None and cv_record.get('object_key'):
+            file_url = cv_par_cache.get_url(cv_record['object_key']) or file_url
         
         cursor.close()
         conn.close()
@@ -13982,21 +13427,18 @@ def bulk_upload_cvs_to_oci():
                 if file_ext not in allowed_extensions:
                     return jsonify({'error': f'Tipo de archivo no soportado: {file_ext}. Solo se permiten PDF, DOCX y DOC.'}), 400
                 
-                # Verificar tamaño del archivo
-                file_content = file.read()
-                file_size = len(file_content)
+                # Verificar tamaño del archivo por la longitud del stream (sin leerlo)
+                file.seek(0, 2)
+                file_size = file.tell()
+                file.seek(0)
                 
                 if file_size > max_file_size:
                     return jsonify({'error': f'Archivo {file.filename} excede el límite de 50MB'}), 400
                 
                 total_size += file_size
                 
-                # Resetear posición del archivo
-                file.seek(0)
-                
                 valid_files.append({
                     'file': file,
-                    'content': file_content,
                     'filename': file.filename,
                     'size': file_size
                 })
@@ -14006,6 +13448,28 @@ def bulk_upload_cvs_to_oci():
         if total_size > max_total_size:
             return jsonify({'error': 'El tamaño total de los archivos excede 500MB'}), 400
         
+        # Volcar los archivos a disco (CV_STAGING_DIR): la subida a OCI se hace en
+        # streaming y la extracción la leen los procesos del pool, así la memoria
+        # del worker no crece con el tamaño del lote
+        try:
+            for file_data in valid_files:
+                file_data['path'] = stage_file(file_data.pop('file'))
+            return _bulk_upload_staged_cvs(tenant_id, user_id, valid_files, total_size)
+        finally:
+            for file_data in valid_files:
+                if file_data.get('path'):
+                    try:
+                        os.remove(file_data['path'])
+                    except OSError:
+                        pass
+        
+    except Exception as e:
+        app.logger.error(f"Error en bulk_upload_cvs_to_oci: {str(e)}")
+        return jsonify({'error': 'Error al procesar carga masiva'}), 500
+
+def _bulk_upload_staged_cvs(tenant_id, user_id, valid_files, total_size):
+    """Sube, procesa y guarda los CVs de /api/cv/bulk-upload ya volcados a disco"""
+    try:
         # Crear trabajo de procesamiento masivo
         job_id = f"bulk_upload_{tenant_id}_{user_id}_{int(time.time())}"
         
@@ -14021,76 +13485,67 @@ def bulk_upload_cvs_to_oci():
             batch_results = []
             batch_errors = []
             
-            # PASO 1: Subir todos los archivos del lote a OCI
+            # PASO 1: Subir todos los archivos del lote a OCI y crear sus PARs
+            # en paralelo (pool acotado de OCIUploadManager)
+            upload_items = [{
+                'path': file_data['path'],
+                'tenant_id': tenant_id,
+                'cv_identifier': oci_storage_service.generate_cv_identifier(tenant_id=tenant_id, candidate_id=None),
+                'original_filename': file_data['filename'],
+                'candidate_id': None
+            } for file_data in batch]
+            try:
+                shared = oci_upload_manager.upload_with_par(upload_items)
+            except Exception as e:
+                logger.error(f"Error subiendo lote a OCI: {str(e)}")
+                shared = [{'upload': {'success': False, 'error': str(e)}, 'par': None}] * len(batch)
+            
             upload_tasks = []
-            for file_data in batch:
-                try:
-                    cv_identifier = oci_storage_service.generate_cv_identifier(
-                        tenant_id=tenant_id,
-                        candidate_id=None
-                    )
-                    
-                    upload_result = oci_storage_service.upload_cv(
-                        file_content=file_data['content'],
-                        tenant_id=tenant_id,
-                        cv_identifier=cv_identifier,
-                        original_filename=file_data['filename'],
-                        candidate_id=None
-                    )
-                    
-                    if upload_result['success']:
-                        par_result = oci_storage_service.create_par(
-                            object_key=upload_result['object_key'],
-                            cv_identifier=cv_identifier
-                        )
-                        
-                        if par_result['success']:
-                            upload_tasks.append({
-                                'file_data': file_data,
-                                'cv_identifier': cv_identifier,
-                                'upload_result': upload_result,
-                                'par_result': par_result
-                            })
-                        else:
-                            batch_errors.append({
-                                'filename': file_data['filename'],
-                                'error': f"Error creando PAR: {par_result['error']}"
-                            })
-                    else:
-                        batch_errors.append({
-                            'filename': file_data['filename'],
-                            'error': f"Error subiendo a OCI: {upload_result['error']}"
-                        })
-                        
-                except Exception as e:
+            for file_data, item, result in zip(batch, upload_items, shared):
+                upload_result, par_result = result['upload'], result['par']
+                if not upload_result['success']:
                     batch_errors.append({
                         'filename': file_data['filename'],
-                        'error': f"Error preparando archivo: {str(e)}"
+                        'error': f"Error subiendo a OCI: {upload_result['error']}"
+                    })
+                elif not par_result['success']:
+                    batch_errors.append({
+                        'filename': file_data['filename'],
+                        'error': f"Error creando PAR: {par_result['error']}"
+                    })
+                else:
+                    upload_tasks.append({
+                        'file_data': file_data,
+                        'cv_identifier': item['cv_identifier'],
+                        'upload_result': upload_result,
+                        'par_result': par_result
                     })
             
             # PASO 2: Procesar textos con Gemini en paralelo
             if upload_tasks:
+                # Extracción del lote completo en paralelo (pool de procesos)
+                extractions = cv_processing_service.extract_texts_from_files(
+                    [(task['file_data']['path'], task['file_data']['filename']) for task in upload_tasks]
+                )
                 cv_texts = []
-                for task in upload_tasks:
-                    try:
-                        cv_text = cv_processing_service.extract_text_from_file(
-                            file_content=task['file_data']['content'],
-                            filename=task['file_data']['filename']
-                        )
-                        cv_texts.append(cv_text)
-                    except Exception as e:
+                for task, extraction in zip(upload_tasks, extractions):
+                    if 'error' in extraction:
                         batch_errors.append({
                             'filename': task['file_data']['filename'],
-                            'error': f"Error extrayendo texto: {str(e)}"
+                            'error': f"Error extrayendo texto: {extraction['error']}"
                         })
                         cv_texts.append("")  # Placeholder para mantener índices
+                    else:
+                        cv_texts.append(extraction['text'])
                 
                 # Procesar lote completo con Gemini en paralelo
                 gemini_results = cv_processing_service.process_cv_batch(cv_texts, tenant_id)
                 
-                # PASO 3: Crear candidatos y guardar en BD
+                # PASO 3: Validar datos y buscar duplicados de todo el lote (incluidos
+                # CVs repetidos dentro del mismo lote)
                 # Asegurar que ambas listas tengan la misma longitud
                 min_length = min(len(upload_tasks), len(gemini_results))
+                validated = []
                 for i in range(min_length):
                     task = upload_tasks[i]
                     gemini_result = gemini_results[i]
@@ -14101,34 +13556,7 @@ def bulk_upload_cvs_to_oci():
                             )
                             
                             if validation_result['success']:
-                                processed_data = validation_result['validated_data']
-                                
-                                # Crear candidato
-                                candidate_id = create_candidate_from_cv_data(
-                                    processed_data, tenant_id, user_id
-                                )
-                                
-                                # Guardar CV en BD
-                                save_cv_to_database(
-                                    tenant_id=tenant_id,
-                                    candidate_id=candidate_id,
-                                    cv_identifier=task['cv_identifier'],
-                                    original_filename=task['file_data']['filename'],
-                                    object_key=task['upload_result']['object_key'],
-                                    file_url=task['par_result']['access_uri'],
-                                    par_id=task['par_result']['par_id'],
-                                    mime_type=task['upload_result']['mime_type'],
-                                    file_size=task['upload_result']['size'],
-                                    processed_data=processed_data
-                                )
-                                
-                                batch_results.append({
-                                    'filename': task['file_data']['filename'],
-                                    'success': True,
-                                    'cv_identifier': task['cv_identifier'],
-                                    'candidate_id': candidate_id,
-                                    'processed_data': processed_data
-                                })
+                                validated.append((task, validation_result['validated_data']))
                             else:
                                 batch_errors.append({
                                     'filename': task['file_data']['filename'],
@@ -14144,6 +13572,48 @@ def bulk_upload_cvs_to_oci():
                             'filename': task['file_data']['filename'],
                             'error': f"Error procesando con IA: {gemini_result.get('error', 'Error desconocido') if gemini_result else 'No se procesó'}"
                         })
+                
+                duplicates_by_cv = find_cv_duplicates([data for _, data in validated], tenant_id)
+                for possible_duplicates in duplicates_by_cv:
+                    for duplicate in possible_duplicates:
+                        if 'batch_index' in duplicate:
+                            duplicate['filename'] = validated[duplicate.pop('batch_index')][0]['file_data']['filename']
+                
+                # PASO 4: Crear candidatos y guardar en BD
+                for (task, processed_data), possible_duplicates in zip(validated, duplicates_by_cv):
+                    try:
+                        # Crear candidato
+                        candidate_id = create_candidate_from_cv_data(
+                            processed_data, tenant_id, user_id
+                        )
+                        
+                        # Guardar CV en BD
+                        save_cv_to_database(
+                            tenant_id=tenant_id,
+                            candidate_id=candidate_id,
+                            cv_identifier=task['cv_identifier'],
+                            original_filename=task['file_data']['filename'],
+                            object_key=task['upload_result']['object_key'],
+                            file_url=task['par_result']['access_uri'],
+                            par_id=task['par_result']['par_id'],
+                            mime_type=task['upload_result']['mime_type'],
+                            file_size=task['upload_result']['size'],
+                            processed_data=processed_data
+                        )
+                        
+                        batch_results.append({
+                            'filename': task['file_data']['filename'],
+                            'success': True,
+                            'cv_identifier': task['cv_identifier'],
+                            'candidate_id': candidate_id,
+                            'processed_data': processed_data,
+                            'possible_duplicates': possible_duplicates
+                        })
+                    except Exception as e:
+                        batch_errors.append({
+                            'filename': task['file_data']['filename'],
+                            'error': f"Error creando candidato: {str(e)}"
+                        })
             
             results.extend(batch_results)
             errors.extend(batch_errors)
@@ -14346,7 +13816,9 @@ def download_candidates_excel_template():
 def import_candidates_from_excel():
     """
     Importa candidatos masivamente desde archivo Excel
-    Maneja validaciones, duplicados y errores
+    Maneja validaciones, duplicados y errores (ver candidate_import).
+    Con async=1 la importación corre en Celery y se consulta su avance en
+    /api/candidates/excel/import/<task_id>.
     """
     if 'file' not in request.files:
         return jsonify({"success": False, "error": "No se encontró ningún archivo."}), 400
@@ -14359,22 +13831,30 @@ def import_candidates_from_excel():
         return jsonify({"success": False, "error": "Formato de archivo no válido. Use .xlsx o .xls"}), 400
 
     conn = None
-    cursor = None
     try:
         # Obtener datos del usuario y tenant
         tenant_id = get_current_tenant_id()
         user_data = g.current_user
         user_id = user_data.get('user_id')
         
-        # Leer archivo Excel
-        df = pd.read_excel(file, engine='openpyxl')
+        if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+            # El worker lee el archivo desde la carpeta compartida
+            os.makedirs(IMPORT_DIR, exist_ok=True)
+            path = os.path.join(IMPORT_DIR, f"{uuid.uuid4().hex}{os.path.splitext(file.filename)[1]}")
+            file.save(path)
+            task = import_candidates_task.delay(tenant_id, user_id, path)
+            return jsonify({
+                'success': True,
+                'task_id': task.id,
+                'status': 'PENDING',
+                'status_url': url_for('get_candidates_import_status', task_id=task.id)
+            }), 202
         
-        # Limpiar datos (reemplazar NaN con None)
-        df = df.astype(object).where(df.notna(), None)
+        # Leer archivo Excel
+        df = read_spreadsheet(file)
         
         # Validar columnas mínimas requeridas
-        required_columns = ['nombre_completo', 'email']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = missing_required_columns(df)
         if missing_columns:
             return jsonify({
                 "success": False, 
@@ -14386,164 +13866,8 @@ def import_candidates_from_excel():
         if not conn:
             return jsonify({"success": False, "error": "Error de conexión a la BD."}), 500
         
-        cursor = conn.cursor()
-        
-        # Estadísticas de procesamiento
-        stats = {
-            'total_rows': len(df),
-            'processed': 0,
-            'created': 0,
-            'updated': 0,
-            'errors': 0,
-            'skipped': 0
-        }
-        
-        errors = []
-        results = []
-        
-        # Función auxiliar para limpiar valores
-        def clean_value(value):
-            if pd.isna(value) or value is None or str(value).strip() == '' or str(value).strip().lower() in ['nan', 'null', 'none', 'n/a', 'na']:
-                return None
-            return str(value).strip()
-        
-        # Procesar cada fila
-        for index, row in df.iterrows():
-            try:
-                # Validar datos mínimos
-                nombre = clean_value(row.get('nombre_completo', ''))
-                email = clean_value(row.get('email', ''))
-                
-                if not nombre or not email:
-                    errors.append({
-                        'row': index + 2,
-                        'error': 'Nombre completo y email son obligatorios'
-                    })
-                    stats['errors'] += 1
-                    continue
-                
-                # Validar formato de email
-                import re
-                email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-                if not re.match(email_pattern, email):
-                    errors.append({
-                        'row': index + 2,
-                        'error': 'Formato de email inválido'
-                    })
-                    stats['errors'] += 1
-                    continue
-                
-                # Procesar campos opcionales con limpieza mejorada
-                telefono = clean_value(row.get('telefono', ''))
-                ciudad = clean_value(row.get('ciudad', ''))
-                identidad = clean_value(row.get('identidad', ''))
-                grado_academico = clean_value(row.get('grado_academico', ''))
-                cv_url = clean_value(row.get('cv_url', ''))
-                linkedin = clean_value(row.get('linkedin', ''))
-                portfolio = clean_value(row.get('portfolio', ''))
-                skills = clean_value(row.get('skills', ''))
-                experiencia = clean_value(row.get('experiencia', ''))
-                estado = clean_value(row.get('estado', '')) or 'Activo'  # Cambiado de 'Disponible' a 'Activo'
-                observaciones = clean_value(row.get('observaciones', ''))
-                
-                # Procesar campos booleanos
-                disponibilidad_rotativos = 1 if clean_value(row.get('disponibilidad_rotativos', '')).lower() in ['sí', 'si', 'yes', 'true', '1', 'verdadero', 'disponible'] else 0
-                transporte_propio = 1 if clean_value(row.get('transporte_propio', '')).lower() in ['sí', 'si', 'yes', 'true', '1', 'verdadero', 'tengo', 'poseo'] else 0
-                
-                # Verificar si el candidato ya existe (por email o identidad)
-                existing = None
-                query = "SELECT id_afiliado FROM Afiliados WHERE tenant_id = %s AND (email = %s"
-                params = [tenant_id, email]
-                
-                if identidad:
-                    query += " OR identidad = %s"
-                    params.append(identidad)
-                query += ") LIMIT 1"
-                
-                try:
-                    cursor.execute(query, params)
-                    existing = cursor.fetchone()
-                    cursor.fetchall()  # Limpiar resultados pendientes
-                except Exception as e:
-                    app.logger.error(f"Error buscando duplicados: {str(e)}")
-                    existing = None
-                
-                if existing:
-                    # Actualizar candidato existente
-                    cursor.execute("""
-                        UPDATE Afiliados SET
-                            nombre_completo = %s,
-                            telefono = COALESCE(NULLIF(%s, ''), telefono),
-                            ciudad = COALESCE(NULLIF(%s, ''), ciudad),
-                            identidad = COALESCE(NULLIF(%s, ''), identidad),
-                            grado_academico = COALESCE(NULLIF(%s, ''), grado_academico),
-                            cv_url = COALESCE(NULLIF(%s, ''), cv_url),
-                            linkedin = COALESCE(NULLIF(%s, ''), linkedin),
-                            portfolio = COALESCE(NULLIF(%s, ''), portfolio),
-                            skills = COALESCE(NULLIF(%s, ''), skills),
-                            experiencia = COALESCE(NULLIF(%s, ''), experiencia),
-                            estado = COALESCE(NULLIF(%s, ''), estado),
-                            disponibilidad_rotativos = %s,
-                            transporte_propio = %s,
-                            observaciones = COALESCE(NULLIF(%s, ''), observaciones),
-                            ultima_actualizacion = CURRENT_TIMESTAMP
-                        WHERE id_afiliado = %s
-                    """, (
-                        nombre, telefono, ciudad, identidad, grado_academico, cv_url,
-                        linkedin, portfolio, skills, experiencia, estado,
-                        disponibilidad_rotativos, transporte_propio, observaciones,
-                        existing[0]
-                    ))
-                    action = 'updated'
-                    stats['updated'] += 1
-                else:
-                    # Crear nuevo candidato
-                    cursor.execute("""
-                        INSERT INTO Afiliados (
-                            tenant_id, nombre_completo, email, telefono, ciudad, identidad,
-                            grado_academico, cv_url, linkedin, portfolio, skills, experiencia,
-                            estado, disponibilidad_rotativos, transporte_propio, observaciones,
-                            fecha_registro, created_by_user_id
-                        ) VALUES (
-                            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 
-                            CURRENT_TIMESTAMP, %s
-                        )
-                    """, (
-                        tenant_id, nombre, email, telefono, ciudad, identidad,
-                        grado_academico, cv_url, linkedin, portfolio, skills, experiencia,
-                        estado, disponibilidad_rotativos, transporte_propio, observaciones,
-                        user_id
-                    ))
-                    action = 'created'
-                    stats['created'] += 1
-                
-                results.append({
-                    'row': index + 2,
-                    'action': action,
-                    'candidate': nombre,
-                    'email': email
-                })
-                stats['processed'] += 1
-                
-            except Exception as row_error:
-                app.logger.error(f"Error procesando fila {index + 2}: {str(row_error)}")
-                errors.append({
-                    'row': index + 2,
-                    'error': f'Error interno: {str(row_error)}'
-                })
-                stats['errors'] += 1
-        
-        conn.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': f'Importación completada: {stats["processed"]} registros procesados',
-            'stats': stats,
-            'results': results[:50],
-            'errors': errors[:50],
-            'has_more_results': len(results) > 50,
-            'has_more_errors': len(errors) > 50
-        })
+        outcome = import_dataframe(conn, df, tenant_id, user_id)
+        return jsonify(summarize_import(outcome))
         
     except Exception as e:
         if conn:
@@ -14552,188 +13876,195 @@ def import_candidates_from_excel():
         return jsonify({'success': False, 'error': f'Error procesando archivo: {str(e)}'}), 500
     
     finally:
-        if cursor:
-            cursor.close()
         if conn:
             conn.close()
 
+@app.route('/api/candidates/excel/import/<task_id>', methods=['GET'])
+@token_required
+def get_candidates_import_status(task_id):
+    """Avance o resultado de una importación asíncrona del usuario actual"""
+    tenant_id = get_current_tenant_id()
+    user_id = g.current_user.get('user_id')
+    
+    result = celery_app.AsyncResult(task_id)
+    if result.state == 'FAILURE':
+        return jsonify({'success': False, 'status': 'FAILURE', 'error': 'La importación falló'}), 500
+    
+    info = result.info if isinstance(result.info, dict) else {}
+    if result.state in ('PROGRESS', 'SUCCESS') and (
+            info.get('tenant_id') != tenant_id or info.get('user_id') != user_id):
+        return jsonify({'error': 'Importación no encontrada'}), 404
+    
+    if result.state == 'PROGRESS':
+        return jsonify({'success': True, 'status': 'PROGRESS', 'stats': info.get('stats')})
+    if result.state != 'SUCCESS':
+        return jsonify({'success': True, 'status': result.state})
+    
+    response = {key: value for key, value in info.items() if key not in ('tenant_id', 'user_id')}
+    response['status'] = 'SUCCESS'
+    return jsonify(response)
+
             
 @app.route('/api/candidates/excel/export', methods=['GET'])
 @token_required
 def export_candidates_to_excel():
     """
-    Exporta candidatos a archivo Excel
-    Incluye filtros y paginación
+    Exporta candidatos a Excel (format=xlsx, por defecto) o CSV (format=csv).
+    Las filas se leen y escriben por bloques (ver candidate_export), sin cargar
+    todo el resultado en memoria. Con async=1 la exportación se encola en Celery
+    y se devuelve el enlace para consultar su estado y descargarla.
     """
+    tenant_id = get_current_tenant_id()
+    user_data = g.current_user
+    user_id = user_data.get('user_id')
+    
+    fmt = (request.args.get('format') or 'xlsx').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Formato no soportado. Use: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    # Filtros opcionales
+    filters = parse_filters(request.args)
+    
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        task = export_candidates_task.delay(tenant_id, user_id, filters, fmt)
+        return jsonify({
+            'success': True,
+            'task_id': task.id,
+            'status': 'PENDING',
+            'status_url': url_for('get_candidates_export_result', task_id=task.id)
+        }), 202
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Error de conexión"}), 500
+    
+    streaming = False
     try:
-        # Obtener parámetros de consulta
-        tenant_id = get_current_tenant_id()
-        user_data = g.current_user
-        user_id = user_data.get('user_id')
-        
-        # Filtros opcionales
-        city_filter = request.args.get('city')
-        status_filter = request.args.get('status')
-        availability_filter = request.args.get('availability')
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        
-        # Construir consulta con filtros
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "Error de conexión"}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        # Consulta base
-        query = """
-            SELECT 
-                a.id_afiliado,
-                a.nombre_completo,
-                a.email,
-                a.telefono,
-                a.ciudad,
-                a.identidad,
-                a.grado_academico,
-                a.cv_url,
-                a.linkedin,
-                a.portfolio,
-                a.skills,
-                a.experiencia,
-                a.disponibilidad,
-                a.disponibilidad_rotativos,
-                a.transporte_propio,
-                a.comentarios,
-                a.observaciones,
-                a.estado,
-                a.puntuacion,
-                a.fecha_registro,
-                a.ultima_actualizacion
-            FROM Afiliados a
-            WHERE a.tenant_id = %s
-        """
-        params = [tenant_id]
-        
-        # 🔐 Aplicar filtros de permisos (RBAC)
-        condition, filter_params = build_user_filter_condition(user_id, tenant_id, 'a.created_by_user_id', 'candidate', 'a.id_afiliado')
-        if condition:
-            query += f" AND ({condition})"
-            params.extend(filter_params)
-        
-        # Aplicar filtros
-        if city_filter:
-            query += " AND a.ciudad LIKE %s"
-            params.append(f"%{city_filter}%")
-        
-        if status_filter:
-            query += " AND a.estado = %s"
-            params.append(status_filter)
-        
-        if availability_filter:
-            query += " AND a.disponibilidad = %s"
-            params.append(availability_filter)
-        
-        if date_from:
-            query += " AND DATE(a.fecha_registro) >= %s"
-            params.append(date_from)
-        
-        if date_to:
-            query += " AND DATE(a.fecha_registro) <= %s"
-            params.append(date_to)
-        
-        query += " ORDER BY a.fecha_registro DESC"
-        
-        # Ejecutar consulta
-        cursor.execute(query, params)
-        candidates = cursor.fetchall()
+        query, params = build_export_query(tenant_id, user_id, filters)
+        chunks = iter_candidate_chunks(conn, query, params)
         
-        if not candidates:
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
             return jsonify({'error': 'No se encontraron candidatos para exportar'}), 404
+        all_chunks = itertools.chain([first_chunk], chunks)
         
-        # Preparar datos para Excel
-        export_data = []
-        for candidate in candidates:
-            export_data.append({
-                'ID': candidate['id_afiliado'],
-                'Nombre Completo': candidate['nombre_completo'],
-                'Email': candidate['email'],
-                'Teléfono': candidate['telefono'] or '',
-                'Ciudad': candidate['ciudad'] or '',
-                'Identidad': candidate['identidad'] or '',
-                'Grado Académico': candidate['grado_academico'] or '',
-                'CV URL': candidate['cv_url'] or '',
-                'LinkedIn': candidate['linkedin'] or '',
-                'Portfolio': candidate['portfolio'] or '',
-                'Skills': candidate['skills'] or '',
-                'Experiencia': candidate['experiencia'] or '',
-                'Disponibilidad': candidate['disponibilidad'] or '',
-                'Turnos Rotativos': 'Sí' if candidate['disponibilidad_rotativos'] else 'No',
-                'Transporte Propio': 'Sí' if candidate['transporte_propio'] else 'No',
-                'Comentarios': candidate['comentarios'] or '',
-                'Observaciones': candidate['observaciones'] or '',
-                'Estado': candidate['estado'] or '',
-                'Puntuación': candidate['puntuacion'] or 0,
-                'Fecha Registro': candidate['fecha_registro'].strftime('%Y-%m-%d %H:%M:%S') if candidate['fecha_registro'] else '',
-                'Última Actualización': candidate['ultima_actualizacion'].strftime('%Y-%m-%d %H:%M:%S') if candidate['ultima_actualizacion'] else ''
-            })
-        
-        # Crear DataFrame
-        df = pd.DataFrame(export_data)
+        filename = export_filename(fmt)
         
-        # Crear archivo Excel en memoria
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Hoja principal con datos
-            df.to_excel(writer, sheet_name='Candidatos', index=False)
-            
-            # Hoja con estadísticas
-            stats_data = {
-                'Métrica': [
-                    'Total de Candidatos',
-                    'Fecha de Exportación',
-                    'Filtros Aplicados',
-                    'Ciudad',
-                    'Estado',
-                    'Disponibilidad',
-                    'Fecha Desde',
-                    'Fecha Hasta'
-                ],
-                'Valor': [
-                    len(candidates),
-                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'Sí' if any([city_filter, status_filter, availability_filter, date_from, date_to]) else 'No',
-                    city_filter or 'Todos',
-                    status_filter or 'Todos',
-                    availability_filter or 'Todos',
-                    date_from or 'Sin filtro',
-                    date_to or 'Sin filtro'
-                ]
-            }
-            stats_df = pd.DataFrame(stats_data)
-            stats_df.to_excel(writer, sheet_name='Estadísticas', index=False)
+        if fmt == 'csv':
+            def generate():
+                try:
+                    for piece in iter_csv(all_chunks):
+                        yield piece.encode('utf-8')
+                finally:
+                    chunks.close()
+                    conn.close()
+            
+            streaming = True
+            return Response(
+                stream_with_context(generate()),
+                mimetype=CSV_MIMETYPE,
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            )
         
+        # El workbook write-only se vuelca a un archivo temporal (no a memoria)
+        output = tempfile.TemporaryFile()
+        write_xlsx(output, all_chunks, filters)
         output.seek(0)
         
-        # Generar nombre de archivo con timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'candidatos_export_{timestamp}.xlsx'
-        
         return send_file(
             output,
             as_attachment=True,
             download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            mimetype=XLSX_MIMETYPE
         )
         
     except Exception as e:
-        app.logger.error(f"Error exportando candidatos a Excel: {str(e)}")
-        return jsonify({'error': f'Error generando archivo Excel: {str(e)}'}), 500
+        app.logger.error(f"Error exportando candidatos: {str(e)}")
+        return jsonify({'error': f'Error generando archivo de exportación: {str(e)}'}), 500
     
     finally:
-        if 'conn' in locals():
-            cursor.close()
+        if not streaming:
             conn.close()
 
+@app.route('/api/candidates/excel/export/<task_id>', methods=['GET'])
+@token_required
+def get_candidates_export_result(task_id):
+    """
+    Estado de una exportación asíncrona. Cuando terminó devuelve download_url;
+    con download=1 entrega el archivo. Solo el usuario que la pidió puede verla.
+    """
+    tenant_id = get_current_tenant_id()
+    user_id = g.current_user.get('user_id')
+    
+    result = celery_app.AsyncResult(task_id)
+    if result.state == 'FAILURE':
+        return jsonify({'success': False, 'status': 'FAILURE', 'error': 'La exportación falló'}), 500
+    if not result.successful():
+        return jsonify({'success': True, 'status': result.state})
+    
+    info = result.result or {}
+    if info.get('tenant_id') != tenant_id or info.get('user_id') != user_id:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    
+    path = os.path.join(EXPORT_DIR, info['file_name'])
+    if not os.path.exists(path):
+        return jsonify({'error': 'La exportación expiró, vuelva a generarla'}), 410
+    
+    if request.args.get('download', '').lower() in ('1', 'true', 'yes'):
+        return send_file(
+            path,
+            as_attachment=True,
+            download_name=info['download_name'],
+            mimetype=CSV_MIMETYPE if info['format'] == 'csv' else XLSX_MIMETYPE
+        )
+    
+    return jsonify({
+        'success': True,
+        'status': 'SUCCESS',
+        'rows': info['rows'],
+        'format': info['format'],
+        'download_url': url_for('get_candidates_export_result', task_id=task_id, download=1)
+    })
+
+@app.route('/api/candidates/scoring/simulate', methods=['POST'])
+@token_required
+def simulate_candidate_scoring():
+    """
+    Simula un juego de pesos de scoring_config sobre los candidatos del tenant
+    sin escribir nada: histograma de categorías actual vs. simulado y los
+    candidatos que más cambian (ver candidate_scoring.simulate).
+    
+    Body: {"weights": {"experience": {"years_multiplier": 3}, "thresholds": {"bueno": 65}},
+           "top": 20, "refresh": false}
+    """
+    tenant_id = get_current_tenant_id()
+    user_id = g.current_user.get('user_id')
+    
+    # 🔐 Solo Admin y Supervisor ajustan pesos
+    if not is_admin(user_id, tenant_id) and not is_supervisor(user_id, tenant_id):
+        return jsonify({
+            'success': False,
+            'error': 'No tienes permisos para simular puntuaciones',
+            'code': 'FORBIDDEN'
+        }), 403
+    
+    data = request.get_json(silent=True) or {}
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Error de conexión"}), 500
+    try:
+        features = tenant_features(conn, tenant_id, refresh=bool(data.get('refresh')))
+        result = simulate_scoring(features, data.get('weights'), top=min(int(data.get('top', 20)), 200))
+        return jsonify({'success': True, **result})
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error simulando puntuaciones: {str(e)}")
+        return jsonify({'success': False, 'error': 'Error al simular puntuaciones'}), 500
+    finally:
+        conn.close()
+
+
 @app.route('/api/candidates/excel/stats', methods=['GET'])
 @token_required
 def get_candidates_import_stats():
@@ -14847,506 +14178,62 @@ def validate_candidates_excel():
     if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
         return jsonify({"success": False, "error": "Formato de archivo no válido. Use .xlsx o .xls"}), 400
 
+    conn = None
+    cursor = None
     try:
         # Leer archivo Excel
-        df = pd.read_excel(file, engine='openpyxl')
+        df = read_spreadsheet(file)
         
-        # Limpiar datos
-        df = df.astype(object).where(df.notna(), None)
-        
-        validation_results = {
-            'total_rows': len(df),
-            'valid_rows': 0,
-            'invalid_rows': 0,
-            'errors': [],
-            'warnings': [],
-            'column_analysis': {},
-            'duplicate_emails': [],
-            'duplicate_identities': []
-        }
-        
-        # Analizar columnas
-        required_columns = ['nombre_completo', 'email']
-        optional_columns = [
-            'telefono', 'ciudad', 'identidad', 'grado_academico', 'cv_url',
-            'linkedin', 'portfolio', 'skills', 'experiencia', 'disponibilidad',
-            'disponibilidad_rotativos', 'transporte_propio', 'comentarios', 'observaciones'
-        ]
-        
-        for col in required_columns + optional_columns:
-            if col in df.columns:
-                non_null_count = df[col].notna().sum()
-                validation_results['column_analysis'][col] = {
-                    'present': True,
-                    'non_null_count': int(non_null_count),
-                    'null_count': int(len(df) - non_null_count),
-                    'required': col in required_columns
-                }
-            else:
-                validation_results['column_analysis'][col] = {
-                    'present': False,
-                    'non_null_count': 0,
-                    'null_count': len(df),
-                    'required': col in required_columns
-                }
-        
-        # Verificar columnas faltantes
-        missing_required = [col for col in required_columns if col not in df.columns]
-        if missing_required:
-            validation_results['errors'].append({
-                'type': 'missing_columns',
-                'message': f'Faltan columnas obligatorias: {", ".join(missing_required)}'
-            })
+        if missing_required_columns(df):
             return jsonify({
                 'success': False,
-                'validation_results': validation_results
+                'validation_results': analyze_dataframe(df)
             }), 400
         
-        # Validar cada fila
-        emails = set()
-        identities = set()
-        
-        for index, row in df.iterrows():
-            row_errors = []
-            row_warnings = []
-            
-            # Función auxiliar para limpiar valores
-            def clean_value(value):
-                if pd.isna(value) or value is None or str(value).strip() == '' or str(value).strip().lower() in ['nan', 'null', 'none', 'n/a', 'na']:
-                    return None
-                return str(value).strip()
-            
-            # Validar campos obligatorios
-            nombre = clean_value(row.get('nombre_completo', ''))
-            email = clean_value(row.get('email', ''))
-            
-            if not nombre:
-                row_errors.append('Nombre completo es obligatorio')
-            
-            if not email:
-                row_errors.append('Email es obligatorio')
-            else:
-                # Validar formato de email
-                import re
-                email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-                if not re.match(email_pattern, email):
-                    row_errors.append('Formato de email inválido')
-                
-                # Verificar duplicados
-                if email in emails:
-                    row_warnings.append('Email duplicado en el archivo')
-                else:
-                    emails.add(email)
-            
-            # Validar identidad si está presente (solo si no está vacía)
-            identidad = clean_value(row.get('identidad', ''))
-            if identidad:
-                if identidad in identities:
-                    row_warnings.append('Identidad duplicada en el archivo')
-                else:
-                    identities.add(identidad)
-            
-            # Validar disponibilidad (solo si está presente y no está vacía)
-            disponibilidad = clean_value(row.get('disponibilidad', ''))
-            if disponibilidad and disponibilidad not in ['Disponible', 'No disponible', 'Trabajando', 'Disponible Inmediatamente', 'En búsqueda']:
-                # Solo advertencia si el valor no está vacío pero no es válido
-                row_warnings.append(f'Valor de disponibilidad no estándar: {disponibilidad} (se aceptará como está)')
-            
-            # Validar URLs si están presentes (solo si no están vacías)
-            cv_url = clean_value(row.get('cv_url', ''))
-            if cv_url:
-                # Verificar que sea una URL válida
-                if not cv_url.startswith(('http://', 'https://', 'drive.google.com', 'docs.google.com', 'onedrive.live.com', 'dropbox.com')):
-                    row_warnings.append('CV URL no parece ser una URL válida (se aceptará como está)')
-            
-            linkedin = clean_value(row.get('linkedin', ''))
-            if linkedin:
-                # LinkedIn puede ser solo el username o URL completa
-                if not (linkedin.startswith(('http://', 'https://')) or linkedin.startswith('linkedin.com/') or '/' not in linkedin):
-                    row_warnings.append('LinkedIn puede ser username o URL completa (se aceptará como está)')
-            
-            portfolio = clean_value(row.get('portfolio', ''))
-            if portfolio:
-                # Portfolio puede ser URL o texto descriptivo
-                if not portfolio.startswith(('http://', 'https://', 'github.com', 'gitlab.com', 'bitbucket.org')):
-                    # Solo advertencia si parece ser una URL pero no es válida
-                    if '.' in portfolio and ('www.' in portfolio or 'http' in portfolio):
-                        row_warnings.append('Portfolio URL no parece ser una URL válida (se aceptará como está)')
-            
-            # Validar teléfono si está presente (solo si no está vacío)
-            telefono = clean_value(row.get('telefono', ''))
-            if telefono:
-                # Limpiar teléfono de caracteres especiales
-                telefono_limpio = re.sub(r'[^\d+]', '', telefono)
-                if len(telefono_limpio) < 7:
-                    row_warnings.append('Teléfono parece muy corto (se aceptará como está)')
-            
-            # Validar grado académico si está presente
-            grado_academico = clean_value(row.get('grado_academico', ''))
-            if grado_academico:
-                # Aceptar cualquier valor, solo advertencia si está muy largo
-                if len(grado_academico) > 100:
-                    row_warnings.append('Grado académico muy largo (se aceptará como está)')
-            
-            # Validar ciudad si está presente
-            ciudad = clean_value(row.get('ciudad', ''))
-            if ciudad:
-                # Aceptar cualquier valor, solo advertencia si está muy largo
-                if len(ciudad) > 100:
-                    row_warnings.append('Ciudad muy larga (se aceptará como está)')
-            
-            # Validar skills si está presente
-            skills = clean_value(row.get('skills', ''))
-            if skills:
-                # Aceptar cualquier valor, solo advertencia si está muy largo
-                if len(skills) > 500:
-                    row_warnings.append('Skills muy largos (se aceptará como está)')
-            
-            # Validar experiencia si está presente
-            experiencia = clean_value(row.get('experiencia', ''))
-            if experiencia:
-                # Aceptar cualquier valor, solo advertencia si está muy largo
-                if len(experiencia) > 1000:
-                    row_warnings.append('Experiencia muy larga (se aceptará como está)')
-            
-            # Validar comentarios/observaciones si están presentes
-            comentarios = clean_value(row.get('comentarios', ''))
-            observaciones = clean_value(row.get('observaciones', ''))
-            if comentarios and len(comentarios) > 1000:
-                row_warnings.append('Comentarios muy largos (se aceptará como está)')
-            if observaciones and len(observaciones) > 1000:
-                row_warnings.append('Observaciones muy largas (se aceptará como está)')
-            
-            # Solo contar como fila válida si no tiene errores críticos
-            if row_errors:
-                validation_results['errors'].extend([{
-                    'row': index + 2,
-                    'errors': row_errors
-                }])
-                validation_results['invalid_rows'] += 1
-            else:
-                validation_results['valid_rows'] += 1
-            
-            # Solo agregar advertencias si son significativas (no por valores vacíos)
-            if row_warnings:
-                validation_results['warnings'].extend([{
-                    'row': index + 2,
-                    'warnings': row_warnings
-                }])
-        
         # Verificar duplicados con base de datos
-        if emails or identities:
-            tenant_id = get_current_tenant_id()
-            conn = get_db_connection()
-            if conn:
-                cursor = conn.cursor()
-                
-                if emails:
-                    email_placeholders = ','.join(['%s'] * len(emails))
-                    cursor.execute(f"""
-                        SELECT email FROM Afiliados 
-                        WHERE tenant_id = %s AND email IN ({email_placeholders})
-                    """, [tenant_id] + list(emails))
-                    existing_emails = [row[0] for row in cursor.fetchall()]
-                    if existing_emails:
-                        validation_results['duplicate_emails'] = existing_emails
-                        validation_results['warnings'].append({
-                            'type': 'existing_emails',
-                            'message': f'{len(existing_emails)} emails ya existen en la base de datos',
-                            'emails': existing_emails[:10]  # Limitar para evitar respuestas muy grandes
-                        })
-                
-                if identities:
-                    identity_placeholders = ','.join(['%s'] * len(identities))
-                    cursor.execute(f"""
-                        SELECT identidad FROM Afiliados 
-                        WHERE tenant_id = %s AND identidad IN ({identity_placeholders})
-                    """, [tenant_id] + list(identities))
-                    existing_identities = [row[0] for row in cursor.fetchall()]
-                    if existing_identities:
-                        validation_results['duplicate_identities'] = existing_identities
-                        validation_results['warnings'].append({
-                            'type': 'existing_identities',
-                            'message': f'{len(existing_identities)} identidades ya existen en la base de datos',
-                            'identities': existing_identities[:10]  # Limitar para evitar respuestas muy grandes
-                        })
-                
-                cursor.close()
-                conn.close()
+        tenant_id = get_current_tenant_id()
+        conn = get_db_connection()
+        if conn:
+            cursor = conn.cursor()
         
         return jsonify({
             'success': True,
-            'validation_results': validation_results
+            'validation_results': analyze_dataframe(df, cursor, tenant_id)
         })
         
     except Exception as e:
         app.logger.error(f"Error validando archivo Excel: {str(e)}")
         return jsonify({'error': f'Error validando archivo: {str(e)}'}), 500
+    
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
 
-def create_candidate_from_cv_data(cv_data, tenant_id, user_id):
+def find_cv_duplicates(cv_datas, tenant_id):
     """
-    Crear candidato en base de datos a partir de datos extraídos por IA
+    Para cada CV procesado, candidatos existentes u otros CVs anteriores del
+    mismo lote que podrían ser la misma persona, con la clasificación de
+    confianza de CVDuplicateDetector (pocas consultas para todo el lote)
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
+    records = []
+    for cv_data in cv_datas:
         personal_info = cv_data.get('personal_info', {})
-        experiencia = cv_data.get('experiencia', {})
-        habilidades = cv_data.get('habilidades', {})
-        
-        # Extraer información personal
-        nombre_completo = personal_info.get('nombre_completo', 'Candidato Sin Nombre')
-        email = personal_info.get('email', '')
-        telefono = personal_info.get('telefono', '')
-        ciudad = personal_info.get('ciudad', '')
-        pais = personal_info.get('pais', '')
-        linkedin = personal_info.get('linkedin', '')
-        portfolio = personal_info.get('portfolio', '')
-        
-        # Extraer experiencia detallada
-        años_experiencia = 0
-        if isinstance(experiencia, dict):
-            años_experiencia = experiencia.get('años_experiencia', 0)
-        elif isinstance(experiencia, list) and len(experiencia) > 0:
-            # Si es una lista, intentar obtener la experiencia del primer elemento
-            primera_exp = experiencia[0]
-            if isinstance(primera_exp, dict):
-                años_experiencia = primera_exp.get('años_experiencia', 0)
-        if isinstance(años_experiencia, str):
-            try:
-                años_experiencia = float(años_experiencia)
-            except ValueError:
-                años_experiencia = 0
-        
-        # Crear resumen de experiencia más detallado
-        experiencia_detallada = []
-        if isinstance(experiencia, dict):
-            experiencia_detallada = experiencia.get('experiencia_detallada', [])
-        elif isinstance(experiencia, list):
-            experiencia_detallada = experiencia  # Usar la lista directamente si es una lista
-        
-        experiencia_texto = ""
-        especializaciones = []
-        
-        if experiencia_detallada:
-            # Incluir más experiencias y más detalles
-            for exp in experiencia_detallada[:5]:  # Las primeras 5 experiencias
-                empresa = exp.get('empresa', '')
-                posicion = exp.get('posicion', '')
-                duracion = exp.get('duracion_meses', 0)
-                if empresa and posicion:
-                    if duracion:
-                        experiencia_texto += f"{posicion} en {empresa} ({duracion} meses), "
-                    else:
-                        experiencia_texto += f"{posicion} en {empresa}, "
-            experiencia_texto = experiencia_texto.rstrip(', ')
-        
-        # Agregar especializaciones al texto de experiencia
-        if isinstance(experiencia, dict):
-            especializaciones = experiencia.get('especializaciones', [])
-        if especializaciones:
-            especializaciones_texto = ", ".join(especializaciones[:3])
-            experiencia_texto += f" | Especializado en: {especializaciones_texto}"
-        
-        # Crear resumen de habilidades más completo
-        habilidades_tecnicas = habilidades.get('habilidades_tecnicas', [])
-        niveles_dominio = habilidades.get('niveles_dominio', {})
-        # Combinar habilidades técnicas con niveles de dominio
-        habilidades_texto = ""
-        if niveles_dominio:
-            expert_skills = niveles_dominio.get('expert', [])
-            avanzado_skills = niveles_dominio.get('avanzado', [])
-            if expert_skills:
-                habilidades_texto += f"Experto: {', '.join(expert_skills[:3])}"
-            if avanzado_skills:
-                if habilidades_texto:
-                    habilidades_texto += f" | Avanzado: {', '.join(avanzado_skills[:3])}"
-                else:
-                    habilidades_texto = f"Avanzado: {', '.join(avanzado_skills[:3])}"
-        
-        # Si no hay niveles de dominio, usar habilidades técnicas simples
-        if not habilidades_texto and habilidades_tecnicas:
-            habilidades_texto = ", ".join(habilidades_tecnicas[:10])
-        
-        # Insertar candidato en tabla Afiliados con campos adicionales
-        # Incluye el user_id para rastrear quién subió el CV
-        # 🔍 CORRECCIÓN: Usar 'active' en lugar de 'Activo' para el ENUM
-        cursor.execute("""
-            INSERT INTO Afiliados (
-                tenant_id, nombre_completo, email, telefono, ciudad,
-                experiencia, skills, linkedin, portfolio, estado, fecha_registro,
-                created_by_user_id, created_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, 'active', NOW(), %s, NOW()
-            )
-        """, (
-            tenant_id, nombre_completo, email, telefono, ciudad,
-            experiencia_texto, habilidades_texto, linkedin, portfolio, user_id
-        ))
-        
-        candidate_id = cursor.lastrowid
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        app.logger.info(f"Candidato creado: ID {candidate_id} para tenant {tenant_id}")
-        return candidate_id
-        
-    except Exception as e:
-        app.logger.error(f"Error creando candidato: {str(e)}")
-        raise
-
-def save_cv_to_database(tenant_id, candidate_id, cv_identifier, original_filename, 
-                       object_key, file_url, par_id, mime_type, file_size, processed_data):
-    """
-    Actualizar información del CV en tabla Afiliados
-    
-    Args:
-        tenant_id: ID del tenant
-        candidate_id: ID del candidato en Afiliados
-        cv_identifier: Identificador único del CV
-        original_filename: Nombre original del archivo
-        object_key: Clave del objeto en el almacenamiento
-        file_url: URL del archivo subido
-        par_id: ID del PAR (opcional)
-        mime_type: Tipo MIME del archivo
-        file_size: Tamaño del archivo en bytes
-        processed_data: Datos procesados del CV
-        
-    Returns:
-        dict: {'success': bool, 'message': str, 'error': str or None}
-    """
+        records.append({
+            'nombre_completo': personal_info.get('nombre_completo'),
+            'email': personal_info.get('email'),
+            'telefono': personal_info.get('telefono')
+        })
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Extraer datos del CV procesado
-        personal_info = processed_data.get('personal_info', {})
-        experiencia = processed_data.get('experiencia', [])
-        habilidades = processed_data.get('habilidades', {})
-        
-        # Formatear experiencia para guardar en la base de datos
-        def format_experience(exp):
-            parts = []
-            
-            # Agregar puesto si existe
-            puesto = exp.get('puesto')
-            if puesto:
-                parts.append(puesto)
-            
-            # Agregar empresa si existe
-            empresa = exp.get('empresa')
-            if empresa:
-                if parts:  # Si ya hay un puesto, agregar "en"
-                    parts[-1] = f"{parts[-1]} en {empresa}"
-                else:
-                    parts.append(empresa)
-            
-            # Agregar fechas si hay al menos una
-            fecha_inicio = exp.get('fecha_inicio')
-            fecha_fin = exp.get('fecha_fin', 'actual')
-            
-            if fecha_inicio or fecha_fin:
-                fechas = []
-                if fecha_inicio:
-                    fechas.append(fecha_inicio)
-                fechas.append(fecha_fin)
-                parts.append(f"({fechas[0]} - {fechas[-1]})")
-            
-            # Agregar descripción si existe
-            descripcion = exp.get('descripcion')
-            if descripcion and descripcion.lower() != 'none':
-                if not parts:  # Si no hay nada más, solo poner la descripción
-                    return f"- {descripcion}"
-                parts.append(f"\n- {descripcion}")
-            
-            return " ".join(parts)
-        
-        # Aplicar formato a cada experiencia
-        experiencias_formateadas = [format_experience(exp) for exp in experiencia]
-        
-        # Filtrar experiencias vacías y unir con doble salto de línea
-        experiencia_texto = "\n\n".join(filter(None, experiencias_formateadas))
-        
-        # Combinar todas las habilidades en un solo texto
-        habilidades_tecnicas = habilidades.get('tecnicas', [])
-        habilidades_blandas = habilidades.get('blandas', [])
-        idiomas = [f"{i.get('idioma', '')} ({i.get('nivel', '')})" 
-                  for i in habilidades.get('idiomas', [])]
-        
-        # Combinar todas las habilidades en un solo campo
-        todas_las_habilidades = ", ".join(
-            habilidades_tecnicas + habilidades_blandas + idiomas
-        )
-        
-        # Actualizar el registro del candidato con toda la información del CV
-        cursor.execute("""
-            UPDATE Afiliados 
-            SET cv_url = %s,
-                experiencia = %s,
-                skills = %s,
-                telefono = COALESCE(%s, telefono),
-                email = COALESCE(%s, email),
-                ciudad = COALESCE(%s, ciudad),
-                ultima_actualizacion = NOW()
-            WHERE id_afiliado = %s AND tenant_id = %s
-        """, (
-            file_url,
-            experiencia_texto,
-            todas_las_habilidades,
-            personal_info.get('telefono'),
-            personal_info.get('email'),
-            personal_info.get('ciudad'),
-            candidate_id,
-            tenant_id
-        ))
-        
-        # Registrar en log de procesamiento
-        cursor.execute("""
-            INSERT INTO CV_Processing_Logs (
-                tenant_id, cv_identifier, processing_step, status, 
-                message, details, created_at
-            ) VALUES (
-                %s, %s, 'cv_processed', 'success', 
-                'CV procesado exitosamente', %s, NOW()
-            )
-        """, (
-            tenant_id, 
-            cv_identifier, 
-            json.dumps({
-                'candidate_id': candidate_id,
-                'original_filename': original_filename,
-                'object_key': object_key,
-                'file_url': file_url,
-                'mime_type': mime_type,
-                'file_size': file_size,
-                'processing_summary': {
-                    'experience_items': len(experiencia),
-                    'skills_count': len(habilidades_tecnicas) + len(habilidades_blandas) + len(idiomas)
-                }
-            })
-        ))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        app.logger.info(f"CV procesado exitosamente: {cv_identifier} para candidato {candidate_id}")
-        return {
-            'success': True,
-            'message': 'CV procesado exitosamente',
-            'error': None
-        }
-        
+        batch = duplicate_detector.find_duplicates_batch(records, tenant_id)
     except Exception as e:
-        error_msg = f"Error procesando CV: {str(e)}"
-        app.logger.error(error_msg, exc_info=True)
-        return {
-            'success': False,
-            'message': 'Error al procesar el CV',
-            'error': error_msg
-        }
+        app.logger.warning(f"No se pudieron buscar duplicados de los CVs: {str(e)}")
+        return [[] for _ in records]
+    
+    fields = ('id_afiliado', 'batch_index', 'nombre_completo', 'email', 'telefono', 'source', 'classification')
+    return [[{field: duplicate[field] for field in fields if field in duplicate} for duplicate in duplicates]
+            for duplicates in batch]
 
 @app.route('/api/cv/delete/<cv_identifier>', methods=['DELETE'])
 @token_required
@@ -15378,6 +14265,8 @@ def delete_cv_from_oci(cv_identifier):
         
         if not delete_result['success']:
             app.logger.warning(f"Error eliminando archivo de OCI: {delete_result['error']}")
+        if cv_par_cache is not None:
+            cv_par_cache.forget(cv_record['object_key'])
         
         # Eliminar registro de logs y limpiar cv_url en Afiliados
         cursor.execute("""
@@ -16094,6 +14983,7 @@ def create_candidate_from_web_form(manual_data, cv_data, tenant_id, cv_url, refe
                 linkedin, portfolio, "Sitio Web",
                 candidate_id
             ))
+            reindex_candidates(cursor, tenant_id, ids=[candidate_id])
             
             conn.commit()
             cursor.close()
@@ -16134,6 +15024,7 @@ def create_candidate_from_web_form(manual_data, cv_data, tenant_id, cv_url, refe
                 app.logger.info(f"📌 Candidato será asociado al usuario {referrer_user_id} vía TrackingEnlaces")
             
             candidate_id = cursor.lastrowid
+            reindex_candidates(cursor, tenant_id, ids=[candidate_id])
             
             # Si hay código de referencia, registrar en TrackingEnlaces
             if referrer_user_id and codigo_referencia:
@@ -16665,6 +15556,7 @@ def role_permissions(role_id):
             permisos = json.dumps(payload.get('permisos', payload), ensure_ascii=False)
             cursor.execute("UPDATE Roles SET permisos = %s WHERE id = %s", (permisos, role_id))
             conn.commit()
+            invalidate_permission_cache()
             return jsonify({'success': True})
     except Exception as e:
         if 'conn' in locals():
@@ -17243,6 +16135,7 @@ def post_public_application_agent():
             sql_c = "INSERT INTO Afiliados (tenant_id, nombre_completo, identidad, telefono, creado_en) VALUES (%s, %s, %s, %s, NOW())"
             cursor.execute(sql_c, (tenant_id, candidate.get('nombre'), candidate['identidad'], candidate.get('telefono')))
             candidate_id = cursor.lastrowid
+            reindex_candidates(cursor, tenant_id, ids=[candidate_id])
             
         sql_p = "INSERT INTO Postulaciones (tenant_id, id_afiliado, id_vacante, fecha_aplicacion, estado) VALUES (%s, %s, %s, NOW(), 'Recibida')"
         cursor.execute(sql_p, (tenant_id, candidate_id, vacancy_id))
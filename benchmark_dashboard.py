@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de las métricas de /api/dashboard/metrics.
+
+Compara, métrica por métrica, tres variantes sobre los mismos datos:
+    - 'original': las 14 consultas que lanzaba el endpoint antes del
+      planificador (control, ver run_baseline)
+    - 'inline': DashboardQueryPlanner con build_user_filter_condition repetido
+      en cada consulta
+    - 'materializado': DashboardQueryPlanner con los conjuntos visibles
+      resueltos una sola vez, como lo usa el endpoint
+Las variantes nuevas leen total, hoy, por mes e ingresos de los agregados
+diarios (dashboard_rollups), igual que el endpoint. También cuenta las
+sentencias SQL de cada variante. Usa la configuración de BD del .env.
+
+Uso:
+    python benchmark_dashboard.py --tenant 1 --user 5 --runs 5
+    python benchmark_dashboard.py --tenant 99 --user 5 --seed 20000   # datos sintéticos
+    python benchmark_dashboard.py --tenant 99 --cleanup                # borrar datos sintéticos
+
+El seed inserta filas marcadas con '__benchmark__' en el tenant indicado y
+asigna al usuario una parte de los candidatos y vacantes, para que el alcance
+'asignados' tenga trabajo real. Usar un tenant y una BD de pruebas.
+"""
+
+import sys
+import time
+import random
+import argparse
+import statistics
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import db_pool
+from permission_service import build_user_filter_condition
+from dashboard_queries import DashboardQueryPlanner
+from dashboard_rollups import daily_series, db_today, metric_total, months_ago
+
+SEED_MARK = '__benchmark__'
+BATCH_SIZE = 1000
+CITIES = ['Tegucigalpa', 'San Pedro Sula', 'La Ceiba', 'Choluteca', 'Comayagua', 'Danlí', 'Juticalpa']
+SKILLS = ['excel', 'ventas', 'python', 'contabilidad', 'inglés', 'atención al cliente', 'logística', 'sql']
+
+METRICS = [
+    'vacantes_resumen',
+    'postulaciones_por_vacante',
+    'top_clientes',
+    'candidatos_mas_activos',
+    'skills_demandados',
+    'distribucion_ciudades',
+]
+
+
+def _insert_batches(cursor, sql, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        cursor.executemany(sql, rows[i:i + BATCH_SIZE])
+
+
+def seed(conn, tenant_id, user_id, candidates):
+    """Inserta candidatos, clientes, vacantes, postulaciones, contrataciones y asignaciones"""
+    cursor = conn.cursor()
+    rng = random.Random(tenant_id)
+    today = date.today()
+    owners = [user_id, user_id + 1, user_id + 2, None]
+
+    clients = max(candidates // 2000, 5)
+    _insert_batches(cursor, """
+        INSERT INTO Clientes (empresa, contacto_nombre, telefono, email, sector, observaciones, tenant_id, created_by_user)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(f"Empresa {i}", 'Contacto', '00000000', f"cliente{i}@example.com", 'Servicios', SEED_MARK, tenant_id, user_id)
+          for i in range(clients)])
+    cursor.execute("SELECT id_cliente FROM Clientes WHERE tenant_id = %s AND observaciones = %s", (tenant_id, SEED_MARK))
+    client_ids = [row[0] for row in cursor.fetchall()]
+
+    vacancies = max(candidates // 50, 10)
+    _insert_batches(cursor, """
+        INSERT INTO Vacantes (id_cliente, cargo_solicitado, descripcion, ciudad, requisitos, fecha_apertura, estado, tenant_id, created_by_user)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(rng.choice(client_ids), f"Cargo {i % 40}", SEED_MARK, rng.choice(CITIES), 'N/A',
+           today - timedelta(days=rng.randint(0, 720)), rng.choice(['Abierta', 'Cerrada', 'Pausada']),
+           tenant_id, rng.choice(owners))
+          for i in range(vacancies)])
+    cursor.execute("SELECT id_vacante FROM Vacantes WHERE tenant_id = %s AND descripcion = %s", (tenant_id, SEED_MARK))
+    vacancy_ids = [row[0] for row in cursor.fetchall()]
+
+    _insert_batches(cursor, """
+        INSERT INTO Afiliados (nombre_completo, email, telefono, ciudad, cargo_solicitado, skills, observaciones,
+                               tenant_id, estado, created_by_user_id, fecha_registro)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(f"Candidato {i}", f"candidato{i}@example.com", '00000000', rng.choice(CITIES), f"Cargo {i % 40}",
+           ', '.join(rng.sample(SKILLS, 3)), SEED_MARK, tenant_id, 'active', rng.choice(owners),
+           today - timedelta(days=rng.randint(0, 720)))
+          for i in range(candidates)])
+    cursor.execute("SELECT id_afiliado FROM Afiliados WHERE tenant_id = %s AND observaciones = %s", (tenant_id, SEED_MARK))
+    candidate_ids = [row[0] for row in cursor.fetchall()]
+
+    applications = set()
+    while len(applications) < candidates * 3:
+        applications.add((rng.choice(candidate_ids), rng.choice(vacancy_ids)))
+    _insert_batches(cursor, """
+        INSERT INTO Postulaciones (id_afiliado, id_vacante, fecha_aplicacion, estado, comentarios, tenant_id)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(cand, vac, today - timedelta(days=rng.randint(0, 365)),
+           rng.choice(['Recibida', 'Entrevista', 'Contratado', 'Rechazado']), SEED_MARK, tenant_id)
+          for cand, vac in applications])
+
+    hires = rng.sample(sorted(applications), len(applications) // 20)
+    _insert_batches(cursor, """
+        INSERT INTO Contratados (id_afiliado, id_vacante, fecha_contratacion, tarifa_servicio, tenant_id, created_by_user)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(cand, vac, today - timedelta(days=rng.randint(0, 300)), rng.randint(1000, 9000), tenant_id, user_id)
+          for cand, vac in hires])
+
+    assignments = [(tenant_id, user_id, cid, 'candidate') for cid in rng.sample(candidate_ids, len(candidate_ids) // 10)]
+    assignments += [(tenant_id, user_id, vid, 'vacancy') for vid in rng.sample(vacancy_ids, len(vacancy_ids) // 10)]
+    _insert_batches(cursor, """
+        INSERT INTO Asignaciones_Centrales (tenant_id, usuario_destino, entidad_id, tipo_entidad)
+        VALUES (%s, %s, %s, %s)
+    """, assignments)
+
+    conn.commit()
+    cursor.close()
+    print(f"Seed: {candidates} candidatos, {len(vacancy_ids)} vacantes, {len(applications)} postulaciones, "
+          f"{len(hires)} contrataciones, {len(assignments)} asignaciones en tenant {tenant_id}")
+
+
+def cleanup(conn, tenant_id):
+    """Elimina las filas sintéticas del tenant"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE c FROM Contratados c JOIN Afiliados a ON c.id_afiliado = a.id_afiliado
+        WHERE a.tenant_id = %s AND a.observaciones = %s
+    """, (tenant_id, SEED_MARK))
+    cursor.execute("DELETE FROM Postulaciones WHERE tenant_id = %s AND comentarios = %s", (tenant_id, SEED_MARK))
+    cursor.execute("""
+        DELETE ac FROM Asignaciones_Centrales ac JOIN Afiliados a ON ac.entidad_id = a.id_afiliado
+        WHERE ac.tenant_id = %s AND ac.tipo_entidad = 'candidate' AND a.observaciones = %s
+    """, (tenant_id, SEED_MARK))
+    cursor.execute("""
+        DELETE ac FROM Asignaciones_Centrales ac JOIN Vacantes v ON ac.entidad_id = v.id_vacante
+        WHERE ac.tenant_id = %s AND ac.tipo_entidad = 'vacancy' AND v.descripcion = %s
+    """, (tenant_id, SEED_MARK))
+    cursor.execute("DELETE FROM Afiliados WHERE tenant_id = %s AND observaciones = %s", (tenant_id, SEED_MARK))
+    cursor.execute("DELETE FROM Vacantes WHERE tenant_id = %s AND descripcion = %s", (tenant_id, SEED_MARK))
+    cursor.execute("DELETE FROM Clientes WHERE tenant_id = %s AND observaciones = %s", (tenant_id, SEED_MARK))
+    conn.commit()
+    cursor.close()
+    print(f"Datos sintéticos eliminados del tenant {tenant_id}")
+
+
+class CountingCursor:
+    """Cursor que cuenta las sentencias ejecutadas"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.statements = 0
+
+    def execute(self, *args, **kwargs):
+        self.statements += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _timed(timings, metric, started):
+    timings[metric] = timings.get(metric, 0.0) + time.perf_counter() - started
+
+
+def _with_condition(sql, params, condition, condition_params):
+    if condition:
+        return sql + f" AND ({condition})", params + condition_params
+    return sql, params
+
+
+def run_baseline(cursor, tenant_id, user_id):
+    """
+    Consultas del endpoint antes del planificador, con su filtro RBAC en línea.
+    Las métricas se agrupan con los mismos nombres que en el planificador. Los
+    ingresos se calculan siempre (el endpoint solo lo hace para admins).
+    """
+    timings = {}
+    t = tenant_id
+
+    started = time.perf_counter()
+    cand_cond, cand_params = build_user_filter_condition(user_id, t, 'a.created_by_user_id', 'candidate', 'a.id_afiliado')
+    vac_cond, vac_params = build_user_filter_condition(user_id, t, 'v.created_by_user', 'vacancy', 'v.id_vacante')
+    hired_cond, hired_params = build_user_filter_condition(user_id, t, 'c.created_by_user', 'hired', 'c.id_contratado')
+    _timed(timings, 'preparar_alcance', started)
+
+    # 1, 2, 6 y 7: total, hoy, por mes e ingresos
+    started = time.perf_counter()
+    for sql in ("SELECT COUNT(*) as total FROM Afiliados a WHERE a.tenant_id = %s",
+                "SELECT COUNT(*) as total FROM Afiliados a WHERE DATE(a.fecha_registro) = CURDATE() AND a.tenant_id = %s"):
+        cursor.execute(*_with_condition(sql, [t], cand_cond, cand_params))
+        cursor.fetchall()
+    sql, params = _with_condition("""
+        SELECT DATE_FORMAT(a.fecha_registro, '%Y-%m') as mes, COUNT(*) as total
+        FROM Afiliados a
+        WHERE a.fecha_registro >= DATE_SUB(CURDATE(), INTERVAL 6 MONTH) AND a.tenant_id = %s
+    """, [t], cand_cond, cand_params)
+    cursor.execute(sql + " GROUP BY DATE_FORMAT(a.fecha_registro, '%Y-%m') ORDER BY mes", tuple(params))
+    cursor.fetchall()
+    cursor.execute(*_with_condition("""
+        SELECT SUM(COALESCE(c.tarifa_servicio, 0)) as ingresos_totales
+        FROM Contratados c
+        WHERE c.fecha_contratacion >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH) AND c.tenant_id = %s
+    """, [t], hired_cond, hired_params))
+    cursor.fetchall()
+    _timed(timings, 'agregados', started)
+
+    # 3 y 5: vacantes por estado y tiempo promedio de contratación
+    started = time.perf_counter()
+    sql, params = _with_condition("SELECT v.estado, COUNT(*) as total FROM Vacantes v WHERE v.tenant_id = %s",
+                                  [t], vac_cond, vac_params)
+    cursor.execute(sql + " GROUP BY v.estado", tuple(params))
+    cursor.fetchall()
+    cursor.execute(*_with_condition("""
+        SELECT AVG(DATEDIFF(c.fecha_contratacion, p.fecha_aplicacion)) as tiempo_promedio
+        FROM Contratados c
+        JOIN Postulaciones p ON c.id_afiliado = p.id_afiliado AND c.id_vacante = p.id_vacante
+        JOIN Vacantes v ON c.id_vacante = v.id_vacante
+        WHERE c.fecha_contratacion IS NOT NULL AND p.fecha_aplicacion IS NOT NULL
+        AND c.tenant_id = %s AND p.tenant_id = %s AND v.tenant_id = %s
+    """, [t, t, t], vac_cond, vac_params))
+    cursor.fetchall()
+    _timed(timings, 'vacantes_resumen', started)
+
+    # 4, 9 y 10: conversión, efectividad del usuario y tasa de éxito por vacante
+    started = time.perf_counter()
+    sql, params = _with_condition("""
+        SELECT COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
+               COUNT(DISTINCT c.id_contratado) as total_contrataciones
+        FROM Postulaciones p
+        JOIN Vacantes v ON p.id_vacante = v.id_vacante
+        JOIN Afiliados a ON p.id_afiliado = a.id_afiliado
+        LEFT JOIN Contratados c ON p.id_afiliado = c.id_afiliado AND p.id_vacante = c.id_vacante AND c.tenant_id = %s
+        WHERE p.tenant_id = %s AND v.tenant_id = %s AND a.tenant_id = %s
+    """, [t, t, t, t], vac_cond, vac_params)
+    cursor.execute(*_with_condition(sql, params, cand_cond, cand_params))
+    cursor.fetchall()
+    sql, params = _with_condition("""
+        SELECT %s as usuario,
+               COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
+               COUNT(DISTINCT co.id_contratado) as total_contrataciones
+        FROM Postulaciones p
+        JOIN Vacantes v ON p.id_vacante = v.id_vacante
+        JOIN Afiliados a ON p.id_afiliado = a.id_afiliado
+        LEFT JOIN Contratados co ON p.id_afiliado = co.id_afiliado AND p.id_vacante = co.id_vacante
+        WHERE p.tenant_id = %s AND v.tenant_id = %s AND a.tenant_id = %s AND (co.tenant_id = %s OR co.tenant_id IS NULL)
+    """, ['benchmark', t, t, t, t], vac_cond, vac_params)
+    cursor.execute(*_with_condition(sql, params, cand_cond, cand_params))
+    cursor.fetchall()
+    sql, params = _with_condition("""
+        SELECT v.cargo_solicitado,
+               COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
+               COUNT(DISTINCT co.id_contratado) as total_contrataciones,
+               CASE WHEN COUNT(DISTINCT p.id_postulacion) > 0 THEN
+                   (COUNT(DISTINCT co.id_contratado) * 100.0 / COUNT(DISTINCT p.id_postulacion))
+               ELSE 0 END as tasa_exito
+        FROM Vacantes v
+        JOIN Postulaciones p ON v.id_vacante = p.id_vacante
+        JOIN Afiliados a ON p.id_afiliado = a.id_afiliado
+        LEFT JOIN Contratados co ON v.id_vacante = co.id_vacante AND co.id_afiliado = a.id_afiliado
+        WHERE v.tenant_id = %s AND p.tenant_id = %s AND a.tenant_id = %s AND (co.tenant_id = %s OR co.tenant_id IS NULL)
+    """, [t, t, t, t], vac_cond, vac_params)
+    sql, params = _with_condition(sql, params, cand_cond, cand_params)
+    cursor.execute(sql + """
+        GROUP BY v.id_vacante, v.cargo_solicitado
+        HAVING total_postulaciones > 0
+        ORDER BY tasa_exito DESC
+        LIMIT 5
+    """, tuple(params))
+    cursor.fetchall()
+    _timed(timings, 'postulaciones_por_vacante', started)
+
+    # 8: top clientes
+    started = time.perf_counter()
+    vacancy_join = f"AND ({vac_cond})" if vac_cond else ""
+    cursor.execute(f"""
+        SELECT c.empresa,
+               COUNT(DISTINCT v.id_vacante) as total_vacantes,
+               COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
+               COUNT(DISTINCT co.id_contratado) as total_contrataciones
+        FROM Clientes c
+        LEFT JOIN Vacantes v ON c.id_cliente = v.id_cliente AND v.tenant_id = %s {vacancy_join}
+        LEFT JOIN Postulaciones p ON v.id_vacante = p.id_vacante AND p.tenant_id = %s
+        LEFT JOIN Contratados co ON v.id_vacante = co.id_vacante AND co.tenant_id = %s
+        WHERE c.tenant_id = %s
+        GROUP BY c.id_cliente, c.empresa ORDER BY total_postulaciones DESC LIMIT 5
+    """, tuple([t] + (vac_params if vac_cond else []) + [t, t, t]))
+    cursor.fetchall()
+    _timed(timings, 'top_clientes', started)
+
+    # 11: candidatos más activos
+    started = time.perf_counter()
+    sql, params = _with_condition("""
+        SELECT a.nombre_completo as nombre, a.email, a.ciudad,
+               COUNT(DISTINCT p.id_postulacion) as postulaciones,
+               COUNT(DISTINCT e.id_entrevista) as entrevistas,
+               COUNT(DISTINCT c.id_contratado) as contrataciones,
+               AVG(DATEDIFF(COALESCE(c.fecha_contratacion, NOW()), p.fecha_aplicacion)) as tiempoColocacion,
+               a.skills, a.ultimo_contacto as ultimaActividad, a.puntuacion as rating
+        FROM Afiliados a
+        LEFT JOIN Postulaciones p ON a.id_afiliado = p.id_afiliado AND p.tenant_id = %s
+        LEFT JOIN Vacantes v ON p.id_vacante = v.id_vacante
+        LEFT JOIN Entrevistas e ON p.id_postulacion = e.id_postulacion
+        LEFT JOIN Contratados c ON p.id_afiliado = c.id_afiliado AND p.id_vacante = c.id_vacante AND c.tenant_id = %s
+        WHERE a.tenant_id = %s
+    """, [t, t, t], cand_cond, cand_params)
+    cursor.execute(sql + """
+        GROUP BY a.id_afiliado, a.nombre_completo, a.email, a.ciudad, a.skills, a.ultimo_contacto, a.puntuacion
+        HAVING postulaciones > 0
+        ORDER BY postulaciones DESC, rating DESC
+        LIMIT 5
+    """, tuple(params))
+    cursor.fetchall()
+    _timed(timings, 'candidatos_mas_activos', started)
+
+    # 12: skills más demandados
+    started = time.perf_counter()
+    sql, params = _with_condition("""
+        SELECT TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(a.skills, ',', numbers.n), ',', -1)) as skill,
+               COUNT(*) as demanda, COUNT(*) as crecimiento
+        FROM Afiliados a
+        CROSS JOIN (
+            SELECT 1 n UNION SELECT 2 UNION SELECT 3 UNION SELECT 4 UNION SELECT 5 UNION
+            SELECT 6 UNION SELECT 7 UNION SELECT 8 UNION SELECT 9 UNION SELECT 10
+        ) numbers
+        WHERE a.tenant_id = %s AND a.skills IS NOT NULL AND a.skills != ''
+        AND CHAR_LENGTH(a.skills) - CHAR_LENGTH(REPLACE(a.skills, ',', '')) >= numbers.n - 1
+    """, [t], cand_cond, cand_params)
+    cursor.execute(sql + """
+        GROUP BY skill
+        HAVING skill != '' AND LENGTH(skill) > 2
+        ORDER BY demanda DESC
+        LIMIT 8
+    """, tuple(params))
+    cursor.fetchall()
+    _timed(timings, 'skills_demandados', started)
+
+    # 13: distribución por ciudades (total + top)
+    started = time.perf_counter()
+    cursor.execute(*_with_condition("SELECT COUNT(*) as total FROM Afiliados a WHERE a.tenant_id = %s",
+                                    [t], cand_cond, cand_params))
+    cursor.fetchall()
+    sql, params = _with_condition("""
+        SELECT a.ciudad, COUNT(*) as candidatos
+        FROM Afiliados a
+        WHERE a.tenant_id = %s AND a.ciudad IS NOT NULL AND a.ciudad != ''
+    """, [t], cand_cond, cand_params)
+    cursor.execute(sql + " GROUP BY a.ciudad ORDER BY candidatos DESC LIMIT 10", tuple(params))
+    cursor.fetchall()
+    _timed(timings, 'distribucion_ciudades', started)
+
+    return timings
+
+
+def run_planner(cursor, tenant_id, user_id, materialize):
+    """Métricas como las calcula ahora el endpoint: agregados diarios + planificador"""
+    timings = {}
+
+    started = time.perf_counter()
+    hoy = db_today(cursor)
+    metric_total(cursor, 'candidatos', tenant_id, user_id)
+    metric_total(cursor, 'candidatos', tenant_id, user_id, hoy, hoy)
+    daily_series(cursor, 'candidatos', tenant_id, user_id, months_ago(hoy, 6))
+    metric_total(cursor, 'contrataciones', tenant_id, user_id, months_ago(hoy, 12))
+    _timed(timings, 'agregados', started)
+
+    planner = DashboardQueryPlanner(cursor, tenant_id, user_id, materialize=materialize)
+    with planner:
+        for metric in METRICS:
+            getattr(planner, metric)()
+    for metric, seconds in planner.timings.items():
+        timings[metric] = timings.get(metric, 0.0) + seconds
+    return timings
+
+
+VARIANTS = [
+    ('original', lambda cursor, tenant_id, user_id: run_baseline(cursor, tenant_id, user_id)),
+    ('inline', lambda cursor, tenant_id, user_id: run_planner(cursor, tenant_id, user_id, False)),
+    ('materializado', lambda cursor, tenant_id, user_id: run_planner(cursor, tenant_id, user_id, True)),
+]
+
+
+def run_once(conn, run, tenant_id, user_id):
+    cursor = CountingCursor(conn.cursor(dictionary=True))
+    try:
+        timings = run(cursor, tenant_id, user_id)
+    finally:
+        cursor.close()
+    return timings, cursor.statements
+
+
+def benchmark(conn, tenant_id, user_id, runs):
+    rows = ['preparar_alcance', 'agregados'] + METRICS
+    results = {}
+    statements = {}
+    for label, run in VARIANTS:
+        run_once(conn, run, tenant_id, user_id)  # calentar buffer pool
+        samples = [run_once(conn, run, tenant_id, user_id) for _ in range(runs)]
+        results[label] = {
+            metric: statistics.median(timings.get(metric, 0.0) for timings, _ in samples)
+            for metric in rows
+        }
+        statements[label] = samples[-1][1]
+
+    labels = [label for label, _ in VARIANTS]
+    print(f"\nTenant {tenant_id}, usuario {user_id}, mediana de {runs} ejecuciones (ms)\n")
+    print(f"{'métrica':<32}" + ''.join(f"{label:>16}" for label in labels) + f"{'speedup':>10}")
+    totals = {label: 0.0 for label in labels}
+    for metric in rows:
+        values = [results[label][metric] for label in labels]
+        for label, value in zip(labels, values):
+            totals[label] += value
+        before, after = values[0], values[-1]
+        speedup = f"{before / after:.1f}x" if after > 0 and before > 0 else '-'
+        print(f"{metric:<32}" + ''.join(f"{value * 1000:>16.1f}" for value in values) + f"{speedup:>10}")
+    before, after = totals[labels[0]], totals[labels[-1]]
+    speedup = f"{before / after:.1f}x" if after > 0 else '-'
+    print(f"{'TOTAL':<32}" + ''.join(f"{totals[label] * 1000:>16.1f}" for label in labels) + f"{speedup:>10}")
+    print(f"{'sentencias SQL':<32}" + ''.join(f"{statements[label]:>16}" for label in labels))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de métricas del dashboard')
+    parser.add_argument('--tenant', type=int, required=True)
+    parser.add_argument('--user', type=int, help='Usuario cuyos permisos se aplican')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, metavar='N', help='Insertar N candidatos sintéticos antes de medir')
+    parser.add_argument('--cleanup', action='store_true', help='Eliminar los datos sintéticos y salir')
+    args = parser.parse_args()
+
+    conn = db_pool.get_connection()
+    try:
+        if args.cleanup:
+            cleanup(conn, args.tenant)
+            return 0
+        if not args.user:
+            parser.error('--user es requerido para medir o generar datos')
+        if args.seed:
+            seed(conn, args.tenant, args.user, args.seed)
+        benchmark(conn, args.tenant, args.user, args.runs)
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Exportación de candidatos a CSV / Excel en streaming.
+
+Las filas se leen con un cursor sin buffer (el servidor MySQL las envía a
+medida que se piden) en bloques de fetchmany, y se escriben directamente:
+    - CSV: generador que produce el archivo por trozos para un Response de Flask
+    - XLSX: workbook write-only de openpyxl, que vuelca cada fila a disco en
+      lugar de mantener todas las celdas en memoria
+
+Así la memoria del worker no depende del número de candidatos del tenant.
+Para exportaciones muy grandes existe la variante asíncrona
+(celery_tasks.export_candidates_task), que deja el archivo en
+CANDIDATE_EXPORT_DIR para descargarlo cuando termina.
+
+Variables de entorno:
+    CANDIDATE_EXPORT_CHUNK   Filas por fetchmany (default 2000)
+    CANDIDATE_EXPORT_DIR     Carpeta de las exportaciones asíncronas, compartida
+                             entre workers web y Celery (default <tmp>/candidate_exports)
+    CANDIDATE_EXPORT_TTL     Horas que se conserva una exportación asíncrona (default 24)
+"""
+
+import os
+import io
+import csv
+import time
+import logging
+import tempfile
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from permission_service import build_user_filter_condition
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv('CANDIDATE_EXPORT_CHUNK', 2000))
+EXPORT_DIR = os.getenv('CANDIDATE_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'candidate_exports'))
+EXPORT_TTL_HOURS = float(os.getenv('CANDIDATE_EXPORT_TTL', 24))
+EXPORT_FORMATS = ('xlsx', 'csv')
+FILTER_KEYS = ('city', 'status', 'availability', 'date_from', 'date_to')
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv; charset=utf-8'
+
+
+def _text(value):
+    return value or ''
+
+
+def _yes_no(value):
+    return 'Sí' if value else 'No'
+
+
+def _datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+# (encabezado, columna, formato) en el orden de la hoja 'Candidatos'
+EXPORT_COLUMNS = [
+    ('ID', 'id_afiliado', None),
+    ('Nombre Completo', 'nombre_completo', None),
+    ('Email', 'email', None),
+    ('Teléfono', 'telefono', _text),
+    ('Ciudad', 'ciudad', _text),
+    ('Identidad', 'identidad', _text),
+    ('Grado Académico', 'grado_academico', _text),
+    ('CV URL', 'cv_url', _text),
+    ('LinkedIn', 'linkedin', _text),
+    ('Portfolio', 'portfolio', _text),
+    ('Skills', 'skills', _text),
+    ('Experiencia', 'experiencia', _text),
+    ('Disponibilidad', 'disponibilidad', _text),
+    ('Turnos Rotativos', 'disponibilidad_rotativos', _yes_no),
+    ('Transporte Propio', 'transporte_propio', _yes_no),
+    ('Comentarios', 'comentarios', _text),
+    ('Observaciones', 'observaciones', _text),
+    ('Estado', 'estado', _text),
+    ('Puntuación', 'puntuacion', lambda value: value or 0),
+    ('Fecha Registro', 'fecha_registro', _datetime),
+    ('Última Actualización', 'ultima_actualizacion', _datetime),
+]
+
+EXPORT_HEADERS = [header for header, _, _ in EXPORT_COLUMNS]
+
+
+def parse_filters(args) -> Dict[str, Optional[str]]:
+    """Filtros opcionales de la exportación a partir de request.args (o un dict)"""
+    return {key: args.get(key) or None for key in FILTER_KEYS}
+
+
+def build_export_query(tenant_id: int, user_id: int, filters: Dict) -> Tuple[str, List]:
+    """SELECT de candidatos con RBAC y filtros, ordenado por fecha de registro"""
+    query = f"""
+        SELECT {', '.join(f'a.{column}' for _, column, _ in EXPORT_COLUMNS)}
+        FROM Afiliados a
+        WHERE a.tenant_id = %s
+    """
+    params = [tenant_id]
+
+    # 🔐 Aplicar filtros de permisos (RBAC)
+    condition, filter_params = build_user_filter_condition(user_id, tenant_id, 'a.created_by_user_id', 'candidate', 'a.id_afiliado')
+    if condition:
+        query += f" AND ({condition})"
+        params.extend(filter_params)
+
+    if filters.get('city'):
+        query += " AND a.ciudad LIKE %s"
+        params.append(f"%{filters['city']}%")
+
+    if filters.get('status'):
+        query += " AND a.estado = %s"
+        params.append(filters['status'])
+
+    if filters.get('availability'):
+        query += " AND a.disponibilidad = %s"
+        params.append(filters['availability'])
+
+    # Rangos sobre la columna (sin DATE()) para usar idx_afiliados_tenant_fecha_id
+    if filters.get('date_from'):
+        query += " AND a.fecha_registro >= %s"
+        params.append(filters['date_from'])
+
+    if filters.get('date_to'):
+        query += " AND a.fecha_registro < DATE_ADD(%s, INTERVAL 1 DAY)"
+        params.append(filters['date_to'])
+
+    query += " ORDER BY a.fecha_registro DESC"
+    return query, params
+
+
+def export_row(candidate: Dict) -> List:
+    """Valores de una fila de la exportación, en el orden de EXPORT_HEADERS"""
+    row = []
+    for _, column, formatter in EXPORT_COLUMNS:
+        value = candidate.get(column)
+        row.append(formatter(value) if formatter else value)
+    return row
+
+
+def iter_candidate_chunks(conn, query: str, params, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Dict]]:
+    """
+    Bloques de filas de un cursor sin buffer. La conexión no admite otras
+    consultas hasta consumir el generador o cerrarlo.
+    """
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(query, tuple(params))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            # Filas sin leer (cliente desconectado); el pool las descarta al devolver la conexión
+            pass
+
+
+def iter_csv(chunks: Iterator[List[Dict]]) -> Iterator[str]:
+    """CSV por trozos (un trozo por bloque de filas), con BOM para que Excel detecte UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    yield '\ufeff' + buffer.getvalue()
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate(0)
+        for candidate in rows:
+            writer.writerow(export_row(candidate))
+        yield buffer.getvalue()
+
+
+def write_xlsx(target, chunks: Iterator[List[Dict]], filters: Dict) -> int:
+    """
+    Escribe el workbook (hojas 'Candidatos' y 'Estadísticas') en target, una ruta
+    o un archivo binario. Devuelve el número de candidatos exportados.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Candidatos')
+    sheet.append(EXPORT_HEADERS)
+
+    total = 0
+    for rows in chunks:
+        for candidate in rows:
+            sheet.append(export_row(candidate))
+        total += len(rows)
+
+    stats = workbook.create_sheet('Estadísticas')
+    stats.append(['Métrica', 'Valor'])
+    for metric, value in [
+        ('Total de Candidatos', total),
+        ('Fecha de Exportación', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+        ('Filtros Aplicados', 'Sí' if any(filters.get(key) for key in FILTER_KEYS) else 'No'),
+        ('Ciudad', filters.get('city') or 'Todos'),
+        ('Estado', filters.get('status') or 'Todos'),
+        ('Disponibilidad', filters.get('availability') or 'Todos'),
+        ('Fecha Desde', filters.get('date_from') or 'Sin filtro'),
+        ('Fecha Hasta', filters.get('date_to') or 'Sin filtro'),
+    ]:
+        stats.append([metric, value])
+
+    workbook.save(target)
+    return total
+
+
+def export_filename(fmt: str) -> str:
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f'candidatos_export_{timestamp}.{fmt}'
+
+
+def export_to_file(conn, tenant_id: int, user_id: int, filters: Dict, fmt: str, path: str) -> int:
+    """Exporta a un archivo en disco (variante asíncrona). Devuelve las filas escritas."""
+    query, params = build_export_query(tenant_id, user_id, filters)
+    chunks = iter_candidate_chunks(conn, query, params)
+
+    if fmt == 'csv':
+        total = 0
+
+        def counted():
+            nonlocal total
+            for rows in chunks:
+                total += len(rows)
+                yield rows
+
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            for piece in iter_csv(counted()):
+                output.write(piece)
+        return total
+
+    return write_xlsx(path, chunks, filters)
+
+
+def purge_old_exports(max_age_hours: float = EXPORT_TTL_HOURS) -> int:
+    """Elimina de EXPORT_DIR las exportaciones más antiguas que max_age_hours"""
+    if not os.path.isdir(EXPORT_DIR):
+        return 0
+    limit = time.time() - max_age_hours * 3600
+    removed = 0
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < limit:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            logger.warning(f"No se pudo eliminar la exportación {name}: {str(e)}")
+    return removed
@@ -0,0 +1,517 @@
+"""
+Motor de importación masiva de candidatos desde Excel.
+
+Lo usan /api/candidates/excel/import, /api/candidates/excel/validate y
+/api/upload-excel (type=afiliados), y la tarea de Celery import_candidates_task
+para archivos grandes.
+
+    1. clean_frame: limpieza vectorizada con pandas (espacios, 'nan', 'null',
+       'n/a'... pasan a None) de todas las columnas conocidas a la vez
+    2. validación vectorizada de obligatorios y formato de email
+    3. por bloques de CHUNK_SIZE filas: una sola consulta de duplicados
+       (email o identidad ya existentes en el tenant, vía duplicate_index), un
+       INSERT multi-fila para los nuevos y un INSERT ... ON DUPLICATE KEY UPDATE
+       multi-fila sobre la clave primaria para los existentes; después se
+       actualizan las claves del índice de duplicados del bloque
+
+La semántica es la de la importación fila a fila: un candidato existente
+(mismo email o identidad) se actualiza sin pisar con vacíos los campos que ya
+tenía, y si el archivo repite un email o identidad la fila posterior
+actualiza a la anterior.
+
+Variables de entorno:
+    CANDIDATE_IMPORT_CHUNK   Filas por bloque de consultas (default 500)
+    CANDIDATE_IMPORT_DIR     Carpeta donde se guardan los archivos de las
+                             importaciones asíncronas (default <tmp>/candidate_imports)
+"""
+
+import os
+import logging
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from cv_duplicate_detector import CVDuplicateDetector
+from duplicate_index import INDEX_TABLE, normalize_email, normalize_identity, reindex_candidates
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv('CANDIDATE_IMPORT_CHUNK', 500))
+IMPORT_DIR = os.getenv('CANDIDATE_IMPORT_DIR', os.path.join(tempfile.gettempdir(), 'candidate_imports'))
+
+REQUIRED_COLUMNS = ['nombre_completo', 'email']
+TEXT_COLUMNS = [
+    'telefono', 'ciudad', 'identidad', 'grado_academico', 'cv_url', 'linkedin',
+    'portfolio', 'skills', 'experiencia', 'disponibilidad', 'comentarios',
+    'observaciones', 'estado',
+]
+# Columnas de texto que escribe la importación: las mismas que la importación
+# fila a fila. disponibilidad y comentarios solo se validan.
+IMPORT_TEXT_COLUMNS = [col for col in TEXT_COLUMNS if col not in ('disponibilidad', 'comentarios')]
+BOOLEAN_COLUMNS = ['disponibilidad_rotativos', 'transporte_propio']
+OPTIONAL_COLUMNS = [col for col in TEXT_COLUMNS if col != 'estado'] + BOOLEAN_COLUMNS
+
+NULL_TOKENS = ['nan', 'null', 'none', 'n/a', 'na']
+EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+TRUE_VALUES = {
+    'disponibilidad_rotativos': ['sí', 'si', 'yes', 'true', '1', 'verdadero', 'disponible'],
+    'transporte_propio': ['sí', 'si', 'yes', 'true', '1', 'verdadero', 'tengo', 'poseo'],
+}
+DEFAULT_ESTADO = 'Activo'
+STANDARD_AVAILABILITY = ['Disponible', 'No disponible', 'Trabajando', 'Disponible Inmediatamente', 'En búsqueda']
+
+_detector = CVDuplicateDetector()
+
+
+def read_spreadsheet(file) -> pd.DataFrame:
+    """Lee la primera hoja del Excel (ruta o archivo subido)"""
+    return pd.read_excel(file, engine='openpyxl')
+
+
+def missing_required_columns(df: pd.DataFrame) -> List[str]:
+    return [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+
+def _clean_series(series: pd.Series) -> pd.Series:
+    text = series.where(series.notna(), '').astype(str).str.strip()
+    valid = (text != '') & ~text.str.lower().isin(NULL_TOKENS)
+    return text.astype(object).where(valid, None)
+
+
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Todas las columnas conocidas como texto limpio o None (las ausentes quedan
+    en None), más 'row' con el número de fila de Excel (encabezado = fila 1).
+    """
+    clean = pd.DataFrame(index=df.index)
+    for col in REQUIRED_COLUMNS + TEXT_COLUMNS + BOOLEAN_COLUMNS:
+        clean[col] = _clean_series(df[col]) if col in df.columns else None
+    clean['row'] = [position + 2 for position in range(len(df))]
+    return clean
+
+
+def _filled(series: pd.Series) -> pd.Series:
+    return series.fillna('').astype(str)
+
+
+def _rows_with(mask: pd.Series, clean: pd.DataFrame) -> List[int]:
+    return clean.loc[mask, 'row'].tolist()
+
+
+def prepare_records(clean: pd.DataFrame):
+    """
+    Valida el DataFrame limpio y lo convierte en registros listos para insertar.
+
+    Returns:
+        Tuple (registros, errores) con errores como [{'row', 'error'}]
+    """
+    missing = clean['nombre_completo'].isna() | clean['email'].isna()
+    bad_email = ~missing & ~_filled(clean['email']).str.match(EMAIL_PATTERN)
+
+    errors = [{'row': row, 'error': 'Nombre completo y email son obligatorios'} for row in _rows_with(missing, clean)]
+    errors += [{'row': row, 'error': 'Formato de email inválido'} for row in _rows_with(bad_email, clean)]
+    errors.sort(key=lambda item: item['row'])
+
+    valid = clean.loc[~missing & ~bad_email].copy()
+    for col in BOOLEAN_COLUMNS:
+        valid[col] = _filled(valid[col]).str.lower().isin(TRUE_VALUES[col]).astype(int)
+
+    records = valid.to_dict('records')
+    for record in records:
+        # to_dict devuelve tipos de numpy para las columnas numéricas
+        for col in BOOLEAN_COLUMNS:
+            record[col] = int(record[col])
+    return records, errors
+
+
+def lookup_existing(cursor, tenant_id: int, emails, identities) -> List[tuple]:
+    """
+    (id_afiliado, email, identidad) de los candidatos del tenant que coinciden,
+    por bloques, a través del índice de duplicados (email sin distinguir
+    mayúsculas, identidad solo por dígitos).
+    """
+    emails = sorted({normalize_email(email) for email in emails if normalize_email(email)})
+    identities = sorted({normalize_identity(value) for value in identities if normalize_identity(value)})
+    found = []
+    for start in range(0, max(len(emails), len(identities)), CHUNK_SIZE):
+        email_chunk = emails[start:start + CHUNK_SIZE]
+        identity_chunk = identities[start:start + CHUNK_SIZE]
+        conditions, params = [], [tenant_id]
+        if email_chunk:
+            conditions.append(f"(k.tipo = 'email' AND k.valor IN ({', '.join(['%s'] * len(email_chunk))}))")
+            params.extend(email_chunk)
+        if identity_chunk:
+            conditions.append(f"(k.tipo = 'identidad' AND k.valor IN ({', '.join(['%s'] * len(identity_chunk))}))")
+            params.extend(identity_chunk)
+        cursor.execute(f"""
+            SELECT DISTINCT a.id_afiliado, a.email, a.identidad
+            FROM {INDEX_TABLE} k
+            JOIN Afiliados a ON a.id_afiliado = k.id_afiliado
+            WHERE k.tenant_id = %s AND ({' OR '.join(conditions)})
+        """, tuple(params))
+        found.extend(tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in cursor.fetchall())
+    return found
+
+
+def _merge(base: Optional[Dict], record: Dict) -> Dict:
+    """Aplica una fila sobre otra anterior: los vacíos no pisan valores existentes"""
+    if base is None:
+        return dict(record)
+    merged = dict(base)
+    merged['nombre_completo'] = record['nombre_completo']
+    for col in IMPORT_TEXT_COLUMNS:
+        if record.get(col):
+            merged[col] = record[col]
+    for col in BOOLEAN_COLUMNS:
+        merged[col] = record[col]
+    merged['row'] = record['row']
+    return merged
+
+
+INSERT_COLUMNS = ['tenant_id', 'nombre_completo', 'email'] + IMPORT_TEXT_COLUMNS + BOOLEAN_COLUMNS
+
+
+def _insert_new(cursor, tenant_id: int, user_id: int, records: List[Dict]):
+    placeholders = '(' + ', '.join(['%s'] * (len(INSERT_COLUMNS) + 1)) + ', CURRENT_TIMESTAMP)'
+    params = []
+    for record in records:
+        # Un estado vacío solo toma el valor por defecto en candidatos nuevos
+        values = dict(record, estado=record['estado'] or DEFAULT_ESTADO)
+        params.extend([tenant_id] + [values[col] for col in INSERT_COLUMNS[1:]] + [user_id])
+    cursor.execute(f"""
+        INSERT INTO Afiliados ({', '.join(INSERT_COLUMNS)}, created_by_user_id, fecha_registro)
+        VALUES {', '.join([placeholders] * len(records))}
+    """, tuple(params))
+
+
+def _update_existing(cursor, tenant_id: int, updates: Dict[int, Dict]):
+    """
+    Actualización multi-fila: INSERT sobre ids existentes cae siempre en
+    ON DUPLICATE KEY UPDATE por la clave primaria. Los vacíos (incluido el
+    estado) van como '' para no chocar con columnas NOT NULL en la parte del
+    INSERT, y COALESCE(NULLIF(...)) conserva el valor guardado.
+    """
+    columns = ['id_afiliado'] + INSERT_COLUMNS
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    params = []
+    for id_afiliado, record in updates.items():
+        values = dict(record, **{col: record[col] or '' for col in IMPORT_TEXT_COLUMNS})
+        params.extend([id_afiliado, tenant_id] + [values[col] for col in INSERT_COLUMNS[1:]])
+    assignments = ['nombre_completo = VALUES(nombre_completo)']
+    assignments += [f"{col} = COALESCE(NULLIF(VALUES({col}), ''), {col})" for col in IMPORT_TEXT_COLUMNS]
+    assignments += [f"{col} = VALUES({col})" for col in BOOLEAN_COLUMNS]
+    assignments.append('ultima_actualizacion = CURRENT_TIMESTAMP')
+    cursor.execute(f"""
+        INSERT INTO Afiliados ({', '.join(columns)})
+        VALUES {', '.join([placeholders] * len(updates))}
+        ON DUPLICATE KEY UPDATE {', '.join(assignments)}
+    """, tuple(params))
+
+
+def _write_with_fallback(write: Callable[[Dict], None], rows: Dict, action: str) -> Dict:
+    """
+    Escribe las filas con una sola sentencia; si falla, las reintenta una por
+    una para que solo las filas con error queden fuera. Devuelve {clave: error}.
+    """
+    try:
+        write(rows)
+        return {}
+    except Exception as e:
+        logger.warning(f"Error {action} bloque de {len(rows)} candidatos, se reintenta fila por fila: {str(e)}")
+
+    failed = {}
+    for key, record in rows.items():
+        try:
+            write({key: record})
+        except Exception as e:
+            logger.error(f"Error {action} candidato (fila {record['row']}): {str(e)}")
+            failed[key] = str(e)
+    return failed
+
+
+def import_records(conn, tenant_id: int, user_id: int, records: List[Dict], total_rows: int,
+                   errors: Optional[List[Dict]] = None,
+                   progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Inserta/actualiza los registros por bloques y confirma cada bloque.
+
+    Returns:
+        dict con 'stats', 'results' ([{'row', 'action', 'candidate', 'email'}]) y 'errors'
+    """
+    errors = list(errors or [])
+    stats = {
+        'total_rows': total_rows,
+        'processed': 0,
+        'created': 0,
+        'updated': 0,
+        'errors': len(errors),
+        'skipped': 0,
+    }
+    results = []
+    cursor = conn.cursor()
+
+    try:
+        for start in range(0, len(records), CHUNK_SIZE):
+            chunk = records[start:start + CHUNK_SIZE]
+
+            # Clave -> ('id', id_afiliado) para existentes o ('new', índice) para nuevos del bloque
+            targets = {}
+            existing = lookup_existing(
+                cursor, tenant_id,
+                {r['email'] for r in chunk},
+                {r['identidad'] for r in chunk if r['identidad']}
+            )
+            for id_afiliado, email, identidad in existing:
+                if email:
+                    targets.setdefault(('email', normalize_email(email)), ('id', id_afiliado))
+                if normalize_identity(identidad):
+                    targets.setdefault(('identidad', normalize_identity(identidad)), ('id', id_afiliado))
+
+            inserts: List[Dict] = []
+            updates: Dict[int, Dict] = {}
+            actions = []
+            for record in chunk:
+                keys = [('email', normalize_email(record['email']))]
+                if normalize_identity(record['identidad']):
+                    keys.append(('identidad', normalize_identity(record['identidad'])))
+                target = next((targets[key] for key in keys if key in targets), None)
+
+                if target is None:
+                    target = ('new', len(inserts))
+                    inserts.append(dict(record))
+                    actions.append((record, 'created', target))
+                elif target[0] == 'id':
+                    updates[target[1]] = _merge(updates.get(target[1]), record)
+                    actions.append((record, 'updated', target))
+                else:
+                    inserts[target[1]] = _merge(inserts[target[1]], record)
+                    actions.append((record, 'updated', target))
+
+                for key in keys:
+                    targets.setdefault(key, target)
+
+            failed = {}
+            if inserts:
+                failed.update(_write_with_fallback(
+                    lambda rows: _insert_new(cursor, tenant_id, user_id, list(rows.values())),
+                    {('new', index): record for index, record in enumerate(inserts)},
+                    'insertando'
+                ))
+            if updates:
+                failed.update(_write_with_fallback(
+                    lambda rows: _update_existing(cursor, tenant_id, {key[1]: record for key, record in rows.items()}),
+                    {('id', id_afiliado): record for id_afiliado, record in updates.items()},
+                    'actualizando'
+                ))
+            try:
+                reindex_candidates(
+                    cursor, tenant_id,
+                    ids=[id_afiliado for id_afiliado in updates if ('id', id_afiliado) not in failed],
+                    emails=[record['email'] for index, record in enumerate(inserts) if ('new', index) not in failed]
+                )
+            except Exception as e:
+                # El bloque ya está escrito; rebuild_index puede recuperar las claves
+                logger.error(f"Error actualizando índice de duplicados: {str(e)}")
+            conn.commit()
+
+            for record, action, target in actions:
+                if target in failed:
+                    errors.append({'row': record['row'], 'error': f"Error interno: {failed[target]}"})
+                    stats['errors'] += 1
+                    continue
+                results.append({
+                    'row': record['row'],
+                    'action': action,
+                    'candidate': record['nombre_completo'],
+                    'email': record['email']
+                })
+                stats[action] += 1
+                stats['processed'] += 1
+
+            if progress:
+                progress(dict(stats))
+    finally:
+        cursor.close()
+
+    return {'stats': stats, 'results': results, 'errors': errors}
+
+
+def import_dataframe(conn, df: pd.DataFrame, tenant_id: int, user_id: int,
+                     progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Limpia, valida e importa un DataFrame leído del Excel"""
+    records, errors = prepare_records(clean_frame(df))
+    return import_records(conn, tenant_id, user_id, records, len(df), errors, progress)
+
+
+def summarize_import(outcome: Dict, limit: int = 50) -> Dict:
+    """Respuesta de la importación con resultados y errores recortados a limit"""
+    stats = outcome['stats']
+    return {
+        'success': True,
+        'message': f'Importación completada: {stats["processed"]} registros procesados',
+        'stats': stats,
+        'results': outcome['results'][:limit],
+        'errors': outcome['errors'][:limit],
+        'has_more_results': len(outcome['results']) > limit,
+        'has_more_errors': len(outcome['errors']) > limit
+    }
+
+
+def analyze_dataframe(df: pd.DataFrame, cursor=None, tenant_id: Optional[int] = None) -> Dict:
+    """
+    Validación sin importar (/api/candidates/excel/validate): errores y
+    advertencias por fila, análisis de columnas y duplicados contra la BD si se
+    pasa cursor.
+    """
+    results = {
+        'total_rows': len(df),
+        'valid_rows': 0,
+        'invalid_rows': 0,
+        'errors': [],
+        'warnings': [],
+        'column_analysis': {},
+        'duplicate_emails': [],
+        'duplicate_identities': []
+    }
+
+    for col in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+        present = col in df.columns
+        non_null = int(df[col].notna().sum()) if present else 0
+        results['column_analysis'][col] = {
+            'present': present,
+            'non_null_count': non_null,
+            'null_count': int(len(df) - non_null),
+            'required': col in REQUIRED_COLUMNS
+        }
+
+    missing = missing_required_columns(df)
+    if missing:
+        results['errors'].append({
+            'type': 'missing_columns',
+            'message': f'Faltan columnas obligatorias: {", ".join(missing)}'
+        })
+        return results
+
+    clean = clean_frame(df)
+    text = {col: _filled(clean[col]) for col in REQUIRED_COLUMNS + TEXT_COLUMNS}
+    has = {col: clean[col].notna() for col in REQUIRED_COLUMNS + TEXT_COLUMNS}
+
+    row_errors = [
+        (~has['nombre_completo'], 'Nombre completo es obligatorio'),
+        (~has['email'], 'Email es obligatorio'),
+        (has['email'] & ~text['email'].str.match(EMAIL_PATTERN), 'Formato de email inválido'),
+    ]
+    row_warnings = [
+        (has['email'] & clean['email'].duplicated(), 'Email duplicado en el archivo'),
+        (has['identidad'] & clean['identidad'].duplicated(), 'Identidad duplicada en el archivo'),
+        (has['disponibilidad'] & ~clean['disponibilidad'].isin(STANDARD_AVAILABILITY), None),
+        (has['cv_url'] & ~text['cv_url'].str.match(
+            r'(https?://|drive\.google\.com|docs\.google\.com|onedrive\.live\.com|dropbox\.com)'),
+         'CV URL no parece ser una URL válida (se aceptará como está)'),
+        (has['linkedin'] & ~(text['linkedin'].str.match(r'(https?://|linkedin\.com/)') | ~text['linkedin'].str.contains('/', regex=False)),
+         'LinkedIn puede ser username o URL completa (se aceptará como está)'),
+        (has['portfolio'] & ~text['portfolio'].str.match(r'(https?://|github\.com|gitlab\.com|bitbucket\.org)')
+         & text['portfolio'].str.contains('.', regex=False)
+         & (text['portfolio'].str.contains('www.', regex=False) | text['portfolio'].str.contains('http', regex=False)),
+         'Portfolio URL no parece ser una URL válida (se aceptará como está)'),
+        (has['telefono'] & (text['telefono'].str.replace(r'[^\d+]', '', regex=True).str.len() < 7),
+         'Teléfono parece muy corto (se aceptará como está)'),
+        (text['grado_academico'].str.len() > 100, 'Grado académico muy largo (se aceptará como está)'),
+        (text['ciudad'].str.len() > 100, 'Ciudad muy larga (se aceptará como está)'),
+        (text['skills'].str.len() > 500, 'Skills muy largos (se aceptará como está)'),
+        (text['experiencia'].str.len() > 1000, 'Experiencia muy larga (se aceptará como está)'),
+        (text['comentarios'].str.len() > 1000, 'Comentarios muy largos (se aceptará como está)'),
+        (text['observaciones'].str.len() > 1000, 'Observaciones muy largas (se aceptará como está)'),
+    ]
+
+    any_error = pd.Series(False, index=clean.index)
+    for mask, _ in row_errors:
+        any_error |= mask
+    any_warning = pd.Series(False, index=clean.index)
+    for mask, _ in row_warnings:
+        any_warning |= mask
+
+    results['invalid_rows'] = int(any_error.sum())
+    results['valid_rows'] = int(len(df) - results['invalid_rows'])
+
+    # Solo las filas con problemas se recorren para armar los mensajes
+    for index in clean.index[any_error | any_warning]:
+        row = int(clean.at[index, 'row'])
+        errors = [message for mask, message in row_errors if mask.at[index]]
+        warnings = []
+        for mask, message in row_warnings:
+            if mask.at[index]:
+                warnings.append(message or
+                                f"Valor de disponibilidad no estándar: {clean.at[index, 'disponibilidad']} (se aceptará como está)")
+        if errors:
+            results['errors'].append({'row': row, 'errors': errors})
+        if warnings:
+            results['warnings'].append({'row': row, 'warnings': warnings})
+
+    if cursor is not None:
+        emails = clean['email'].dropna().unique().tolist()
+        identities = clean['identidad'].dropna().unique().tolist()
+        if emails or identities:
+            email_set = {normalize_email(email) for email in emails}
+            identity_set = {normalize_identity(value) for value in identities}
+            existing_emails, existing_identities = [], []
+            for _, email, identidad in lookup_existing(cursor, tenant_id, emails, identities):
+                if email and normalize_email(email) in email_set and email not in existing_emails:
+                    existing_emails.append(email)
+                if identidad and normalize_identity(identidad) in identity_set and identidad not in existing_identities:
+                    existing_identities.append(identidad)
+
+            if existing_emails:
+                results['duplicate_emails'] = existing_emails
+                results['warnings'].append({
+                    'type': 'existing_emails',
+                    'message': f'{len(existing_emails)} emails ya existen en la base de datos',
+                    'emails': existing_emails[:10]  # Limitar para evitar respuestas muy grandes
+                })
+            if existing_identities:
+                results['duplicate_identities'] = existing_identities
+                results['warnings'].append({
+                    'type': 'existing_identities',
+                    'message': f'{len(existing_identities)} identidades ya existen en la base de datos',
+                    'identities': existing_identities[:10]
+                })
+
+        possible = possible_duplicates(cursor, tenant_id, clean.loc[~any_error])
+        if possible:
+            results['possible_duplicates'] = possible[:50]
+            results['warnings'].append({
+                'type': 'possible_duplicates',
+                'message': f'{len(possible)} filas se parecen a otros candidatos (teléfono o nombre similar)'
+            })
+
+    return results
+
+
+def possible_duplicates(cursor, tenant_id: int, clean: pd.DataFrame) -> List[Dict]:
+    """
+    Filas válidas que parecen la misma persona que un candidato existente o que
+    una fila anterior del bloque, sin contar las coincidencias exactas de email
+    (ya reportadas como duplicate_emails). Una búsqueda por lote de CHUNK_SIZE filas.
+    """
+    rows = clean[['row', 'nombre_completo', 'email', 'telefono']].to_dict('records')
+    possible = []
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        for record, duplicates in zip(chunk, _detector.find_duplicates_batch(chunk, tenant_id, cursor)):
+            matches = []
+            for duplicate in duplicates:
+                if normalize_email(duplicate.get('email')) == normalize_email(record['email']):
+                    continue
+                match = {
+                    'nombre_completo': duplicate.get('nombre_completo'),
+                    'classification': duplicate['classification']
+                }
+                if duplicate['source'] == 'db':
+                    match['id_afiliado'] = duplicate['id_afiliado']
+                else:
+                    match['row'] = chunk[duplicate['batch_index']]['row']
+                matches.append(match)
+            if matches:
+                possible.append({'row': record['row'], 'matches': matches})
+    return possible
@@ -0,0 +1,557 @@
+"""
+Motor de puntuación de candidatos por lotes.
+
+Lo usan la tarea calculate_candidate_score (un candidato),
+rescore_dirty_candidates (los candidatos con cambios) y
+recalculate_stale_scores (barrido nocturno de puntuaciones viejas).
+
+    1. load_features: los datos de puntuación de un bloque de candidatos con
+       cuatro consultas por conjunto (Afiliados y un COUNT ... GROUP BY por
+       Postulaciones, Entrevistas y Contratados) en lugar de subconsultas
+       correlacionadas por candidato
+    2. compute_scores: los puntos de cada criterio con operaciones vectorizadas
+       de pandas sobre todo el bloque, con los pesos de scoring_config
+    3. write_scores: un UPDATE ... JOIN para Afiliados y un INSERT multi-fila
+       en puntuaciones_candidato por bloque
+
+Los puntos y el detalle guardado en puntuaciones_candidato son los del cálculo
+por candidato: experiencia por los años del primer término ("3 años"), el
+primer nivel educativo de EDUCATION_WEIGHTS que aparece en grado_academico,
+habilidades por la cantidad de elementos del JSON, historial con tope por tipo
+y total, y disponibilidad por coincidencia exacta.
+
+Invalidación por eventos: los endpoints que cambian algo que entra en la
+puntuación (postulaciones, entrevistas, contrataciones y los campos
+SCORE_FIELDS del perfil) marcan al candidato en Afiliados_Puntuacion_Pendiente
+con mark_dirty, en la misma transacción que el cambio. rescore_dirty recalcula
+solo los marcados; una marca hecha mientras se recalcula se conserva para la
+siguiente pasada.
+
+Simulación (what-if): simulate puntúa en memoria la matriz de un tenant
+(tenant_features, en caché del proceso) con los pesos vigentes y con un juego
+alternativo, sin escribir; la usan POST /api/candidates/scoring/simulate y
+simulate_scoring.py.
+
+Variables de entorno:
+    SCORING_FEATURE_CACHE_TTL   Segundos que se reutiliza la matriz de un tenant (default 300)
+"""
+
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from scoring_config import (
+    EXPERIENCE_WEIGHTS,
+    EDUCATION_WEIGHTS,
+    SKILLS_WEIGHTS,
+    HISTORY_WEIGHTS,
+    AVAILABILITY_WEIGHTS,
+    RECALCULATION_CONFIG,
+    SCORE_THRESHOLDS
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_SCORE = 100
+CHUNK_SIZE = RECALCULATION_CONFIG['batch_size']
+DEFAULT_MOTIVO = 'Cálculo automático'
+DIRTY_TABLE = 'Afiliados_Puntuacion_Pendiente'
+
+# Campos de Afiliados que entran en la puntuación
+SCORE_FIELDS = ('experiencia', 'grado_academico', 'habilidades', 'disponibilidad')
+
+# Origen (FROM, columna del afiliado) de cada contador de historial_score
+HISTORY_TABLES = {
+    'postulaciones': ('Postulaciones p', 'p.id_afiliado'),
+    'entrevistas': ('Entrevistas e JOIN Postulaciones p ON e.id_postulacion = p.id_postulacion', 'p.id_afiliado'),
+    'contrataciones': ('Contratados c', 'c.id_afiliado'),
+}
+HISTORY_KEYS = {'postulaciones': 'postulacion', 'entrevistas': 'entrevista', 'contrataciones': 'contratacion'}
+
+
+def _placeholders(values) -> str:
+    return ', '.join(['%s'] * len(values))
+
+
+def _load_features(conn, condition: str, params: tuple, extra_columns: Iterable[str] = ()) -> pd.DataFrame:
+    """Filas de Afiliados a que cumplen condition, con sus contadores de historial"""
+    columns = ['id_afiliado', *extra_columns, 'experiencia', 'grado_academico', 'habilidades', 'disponibilidad']
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT {', '.join('a.' + column for column in columns)} FROM Afiliados a
+            WHERE {condition}
+        """, params)
+        features = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+        for counter, (source, column) in HISTORY_TABLES.items():
+            cursor.execute(f"""
+                SELECT {column}, COUNT(*) FROM {source}
+                JOIN Afiliados a ON a.id_afiliado = {column}
+                WHERE {condition}
+                GROUP BY {column}
+            """, params)
+            counts = dict(cursor.fetchall())
+            features[counter] = features['id_afiliado'].map(counts).fillna(0).astype(int)
+    finally:
+        cursor.close()
+    return features
+
+
+def load_features(conn, candidate_ids: List[int]) -> pd.DataFrame:
+    """Datos de puntuación de los candidatos indicados, una fila por candidato existente"""
+    if not candidate_ids:
+        return pd.DataFrame(columns=['id_afiliado', 'experiencia', 'grado_academico', 'habilidades',
+                                     'disponibilidad', *HISTORY_TABLES])
+    return _load_features(conn, f"a.id_afiliado IN ({_placeholders(candidate_ids)})", tuple(candidate_ids))
+
+
+def load_tenant_features(conn, tenant_id: int) -> pd.DataFrame:
+    """Datos de puntuación (y nombre) de todos los candidatos de un tenant"""
+    return _load_features(conn, "a.tenant_id = %s", (tenant_id,), extra_columns=['nombre_completo'])
+
+
+def default_weights() -> Dict[str, Any]:
+    """Pesos vigentes de scoring_config, por sección"""
+    return copy.deepcopy({
+        'experience': EXPERIENCE_WEIGHTS,
+        'education': EDUCATION_WEIGHTS,
+        'skills': SKILLS_WEIGHTS,
+        'history': HISTORY_WEIGHTS,
+        'availability': AVAILABILITY_WEIGHTS,
+        'thresholds': SCORE_THRESHOLDS,
+    })
+
+
+def merge_weights(overrides: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Pesos vigentes con overrides aplicados (mismas secciones y claves que
+    default_weights; solo se indican las que cambian). Lanza ValueError si una
+    sección no existe o un valor no es un número no negativo.
+    """
+    def merge(base, changes, path):
+        for key, value in changes.items():
+            if isinstance(value, dict):
+                if not isinstance(base.get(key, {}), dict):
+                    raise ValueError(f"'{path}{key}' no es una sección")
+                merge(base.setdefault(key, {}), value, f"{path}{key}.")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"'{path}{key}' debe ser un número no negativo")
+            else:
+                base[key] = value
+
+    weights = default_weights()
+    for section, changes in (overrides or {}).items():
+        if section not in weights or not isinstance(changes, dict):
+            raise ValueError(f"Sección de pesos desconocida: '{section}'")
+        merge(weights[section], changes, f"{section}.")
+    return weights
+
+
+def _skill_count(value) -> float:
+    """Cantidad de habilidades del JSON; NaN si no es una lista, -1 si el JSON es inválido"""
+    if value is None:
+        return np.nan
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    try:
+        skills = json.loads(value) if isinstance(value, str) else value
+    except json.JSONDecodeError:
+        return -1
+    return len(skills) if isinstance(skills, list) else np.nan
+
+
+def prepare_features(features: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnas que no dependen de los pesos (años de experiencia, textos en
+    minúsculas, cantidad de habilidades). Se calculan una vez por matriz de
+    datos; compute_scores las reutiliza con cualquier juego de pesos.
+    """
+    if 'anios' in features.columns:
+        return features
+    prepared = features.copy()
+
+    # Experiencia: años del primer término cuando el texto habla de años
+    experiencia = prepared['experiencia'].fillna('').astype(str).str.lower()
+    digits = experiencia.str.split().str[0].fillna('').str.replace(r'\D', '', regex=True)
+    prepared['anios'] = pd.to_numeric(digits.where(digits != ''), errors='coerce')
+    prepared['menciona_anios'] = experiencia.str.contains('año', regex=False)
+
+    prepared['educacion'] = prepared['grado_academico'].fillna('').astype(str).str.lower()
+    prepared['cantidad_habilidades'] = prepared['habilidades'].map(_skill_count).astype(float)
+    prepared['disponibilidad'] = prepared['disponibilidad'].fillna('').astype(str).str.lower()
+    return prepared
+
+
+def categorize(scores: pd.Series, thresholds: Dict[str, Any] = SCORE_THRESHOLDS) -> np.ndarray:
+    """get_candidate_category vectorizado"""
+    return np.select(
+        [scores >= thresholds['excelente'], scores >= thresholds['bueno'], scores >= thresholds['regular']],
+        ['excelente', 'bueno', 'regular'],
+        default='bajo'
+    )
+
+
+def compute_scores(features: pd.DataFrame, weights: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """Puntos por criterio, puntuación total y categoría de cada candidato"""
+    weights = weights or default_weights()
+    experience, education, skills = weights['experience'], weights['education'], weights['skills']
+    history, availability = weights['history'], weights['availability']
+    scores = prepare_features(features).copy()
+
+    scores['puntos_experiencia'] = (
+        (scores['anios'] * experience['years_multiplier'])
+        .clip(upper=experience['max_points'])
+        .where(scores['menciona_anios'], 0)
+        .fillna(0)
+    )
+
+    # Educación: primer nivel de la tabla de pesos presente en el texto
+    nivel = pd.Series(None, index=scores.index, dtype=object)
+    for candidate_level in education:
+        nivel = nivel.where(nivel.notna() | ~scores['educacion'].str.contains(candidate_level, regex=False),
+                            candidate_level)
+    scores['nivel_educativo'] = nivel
+    scores['puntos_educacion'] = nivel.map(education).fillna(0)
+
+    # Habilidades: cantidad de elementos del JSON
+    scores['puntos_habilidades'] = (
+        (scores['cantidad_habilidades'] * skills['per_skill'])
+        .clip(lower=0, upper=skills['max_points'])
+        .fillna(0)
+    )
+
+    # Historial: cada tipo con su tope y el total con el suyo
+    historial = 0
+    for counter, key in HISTORY_KEYS.items():
+        points = (scores[counter] * history[key]['per_item']).clip(upper=history[key]['max_points'])
+        scores[f'puntos_{counter}'] = points
+        historial = historial + points
+    scores['puntos_historial'] = pd.Series(historial, index=scores.index).clip(upper=history['max_total'])
+
+    # Disponibilidad: coincidencia exacta con la tabla de pesos
+    scores['puntos_disponibilidad'] = scores['disponibilidad'].map(availability).fillna(availability.get('default', 0))
+
+    total = scores[['puntos_experiencia', 'puntos_educacion', 'puntos_habilidades',
+                    'puntos_historial', 'puntos_disponibilidad']].sum(axis=1)
+    scores['score'] = total.clip(upper=MAX_SCORE).astype(int)
+    scores['categoria'] = categorize(scores['score'], weights['thresholds'])
+    return scores
+
+
+def _details(row) -> Dict[str, Any]:
+    """Detalle por criterio de un candidato (el que se guarda en puntuaciones_candidato)"""
+    details = {}
+
+    if row.menciona_anios:
+        if pd.notna(row.anios):
+            years = int(row.anios)
+            details['experiencia'] = {'puntos': int(row.puntos_experiencia), 'detalle': f"{years} años de experiencia"}
+        else:
+            details['experiencia'] = {
+                'puntos': 0,
+                'detalle': 'No se pudo determinar la experiencia',
+                'advertencia': 'No se encontraron los años de experiencia'
+            }
+
+    if row.nivel_educativo is not None and pd.notna(row.nivel_educativo):
+        details['educacion'] = {
+            'puntos': int(row.puntos_educacion),
+            'detalle': f"Nivel educativo: {row.nivel_educativo.capitalize()}",
+            'categoria': row.nivel_educativo
+        }
+    elif row.educacion.strip():
+        details['educacion'] = {
+            'puntos': 0,
+            'detalle': f"Nivel educativo no reconocido: {row.educacion}",
+            'advertencia': 'Nivel educativo no reconocido'
+        }
+
+    if row.cantidad_habilidades == -1:
+        details['habilidades'] = {
+            'puntos': 0,
+            'detalle': 'Formato de habilidades inválido',
+            'advertencia': 'No se pudieron procesar las habilidades'
+        }
+    elif row.cantidad_habilidades > 0:
+        cantidad = int(row.cantidad_habilidades)
+        details['habilidades'] = {
+            'puntos': int(row.puntos_habilidades),
+            'cantidad': cantidad,
+            'detalle': f"{cantidad} habilidades registradas"
+        }
+
+    historial = []
+    if row.postulaciones > 0:
+        historial.append(f"+{int(row.puntos_postulaciones)} por {row.postulaciones} postulación(es)")
+    if row.entrevistas > 0:
+        historial.append(f"+{int(row.puntos_entrevistas)} por {row.entrevistas} entrevista(s)")
+    if row.contrataciones > 0:
+        historial.append(f"+{int(row.puntos_contrataciones)} por {row.contrataciones} contratación(es) previa(s)")
+    if historial:
+        details['historial'] = {
+            'puntos': int(row.puntos_historial),
+            'detalle': "; ".join(historial),
+            'desglose': {
+                'postulaciones': int(row.postulaciones),
+                'entrevistas': int(row.entrevistas),
+                'contrataciones': int(row.contrataciones)
+            }
+        }
+
+    if row.puntos_disponibilidad > 0:
+        details['disponibilidad'] = {
+            'puntos': int(row.puntos_disponibilidad),
+            'disponibilidad': row.disponibilidad,
+            'detalle': f"Disponibilidad: {row.disponibilidad.capitalize()}"
+        }
+    else:
+        details['disponibilidad'] = {
+            'puntos': 0,
+            'disponibilidad': 'no especificada',
+            'detalle': 'Disponibilidad no especificada',
+            'advertencia': 'El candidato no ha especificado su disponibilidad'
+        }
+    return details
+
+
+def write_scores(cursor, results: List[Dict[str, Any]], motivo: str = DEFAULT_MOTIVO, usuario_id: int = 0):
+    """UPDATE de Afiliados y registro en puntuaciones_candidato de un bloque, en dos sentencias"""
+    if not results:
+        return
+    values = [(r['candidate_id'], r['score'], r['categoria']) for r in results]
+    cursor.execute(f"""
+        UPDATE Afiliados a
+        JOIN ({' UNION ALL '.join(['SELECT %s AS id_afiliado, %s AS puntuacion, %s AS categoria'] * len(values))}) s
+            ON s.id_afiliado = a.id_afiliado
+        SET a.puntuacion = s.puntuacion,
+            a.categoria_puntuacion = s.categoria,
+            a.ultima_actualizacion_puntuacion = NOW()
+    """, tuple(value for row in values for value in row))
+
+    cursor.execute(f"""
+        INSERT INTO puntuaciones_candidato
+        (id_afiliado, puntuacion, motivo, usuario_id, fecha, detalles, categoria)
+        VALUES {', '.join(['(%s, %s, %s, %s, NOW(), %s, %s)'] * len(results))}
+    """, tuple(value for r in results for value in (
+        r['candidate_id'], r['score'], motivo, usuario_id, json.dumps(r['details']), r['categoria']
+    )))
+
+
+def score_candidates(conn, candidate_ids: Iterable[int], motivo: str = DEFAULT_MOTIVO,
+                     usuario_id: int = 0, chunk_size: int = CHUNK_SIZE) -> List[Dict[str, Any]]:
+    """
+    Calcula y guarda la puntuación de los candidatos, por bloques de chunk_size
+    con un commit por bloque. Devuelve {'candidate_id', 'score', 'categoria',
+    'details'} por cada candidato existente.
+    """
+    candidate_ids = list(dict.fromkeys(candidate_ids))
+    results = []
+    for start in range(0, len(candidate_ids), chunk_size):
+        chunk = candidate_ids[start:start + chunk_size]
+        scores = compute_scores(load_features(conn, chunk))
+        chunk_results = [{
+            'candidate_id': int(row.id_afiliado),
+            'score': int(row.score),
+            'categoria': row.categoria,
+            'details': _details(row)
+        } for row in scores.itertuples(index=False)]
+
+        cursor = conn.cursor()
+        try:
+            write_scores(cursor, chunk_results, motivo, usuario_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        results.extend(chunk_results)
+    return results
+
+
+def stale_candidate_ids(conn, stale_days: int = RECALCULATION_CONFIG['stale_days'],
+                        after_id: int = 0, limit: int = CHUNK_SIZE) -> List[int]:
+    """Candidatos sin puntuar o con puntuación de hace más de stale_days días, por id ascendente"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT id_afiliado
+            FROM Afiliados
+            WHERE (ultima_actualizacion_puntuacion IS NULL
+                   OR ultima_actualizacion_puntuacion < DATE_SUB(NOW(), INTERVAL %s DAY))
+              AND id_afiliado > %s
+            ORDER BY id_afiliado
+            LIMIT %s
+        """, (stale_days, after_id, limit))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def mark_dirty(cursor, candidate_ids: Iterable[int], motivo: str):
+    """Marca candidatos para recalcular su puntuación (dentro de la transacción del cambio)"""
+    candidate_ids = [int(candidate_id) for candidate_id in dict.fromkeys(candidate_ids) if candidate_id]
+    if not candidate_ids:
+        return
+    cursor.execute(f"""
+        INSERT INTO {DIRTY_TABLE} (id_afiliado, motivo, marked_at)
+        VALUES {', '.join(['(%s, %s, NOW(6))'] * len(candidate_ids))}
+        ON DUPLICATE KEY UPDATE motivo = VALUES(motivo), marked_at = NOW(6)
+    """, tuple(value for candidate_id in candidate_ids for value in (candidate_id, motivo[:50])))
+
+
+def mark_dirty_select(cursor, select_sql: str, params: tuple, motivo: str):
+    """
+    Marca los candidatos que devuelve select_sql (una columna id_afiliado),
+    para eventos en los que el endpoint no tiene el id del candidato a mano.
+    """
+    cursor.execute(f"""
+        INSERT INTO {DIRTY_TABLE} (id_afiliado, motivo, marked_at)
+        SELECT DISTINCT id_afiliado, %s, NOW(6) FROM ({select_sql}) AS marcados
+        WHERE id_afiliado IS NOT NULL
+        ON DUPLICATE KEY UPDATE motivo = VALUES(motivo), marked_at = NOW(6)
+    """, (motivo[:50],) + tuple(params))
+
+
+def rescore_dirty(conn, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Recalcula los candidatos marcados, por bloques, y borra sus marcas. Solo se
+    borran las marcas anteriores al inicio de la pasada. Devuelve los
+    candidatos recalculados.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT NOW(6)")
+        snapshot = cursor.fetchone()[0]
+        conn.commit()
+    finally:
+        cursor.close()
+
+    total = 0
+    while True:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT id_afiliado FROM {DIRTY_TABLE}
+                WHERE marked_at <= %s
+                ORDER BY marked_at
+                LIMIT %s
+            """, (snapshot, chunk_size))
+            candidate_ids = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+        if not candidate_ids:
+            break
+
+        total += len(score_candidates(conn, candidate_ids, chunk_size=chunk_size))
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                DELETE FROM {DIRTY_TABLE}
+                WHERE id_afiliado IN ({_placeholders(candidate_ids)}) AND marked_at <= %s
+            """, tuple(candidate_ids) + (snapshot,))
+            conn.commit()
+        finally:
+            cursor.close()
+        if len(candidate_ids) < chunk_size:
+            break
+    return total
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Resultado de calculate_candidate_score a partir del de score_candidates"""
+    details = dict(result['details'])
+    details['resumen'] = {
+        'puntuacion_total': result['score'],
+        'puntuacion_maxima': MAX_SCORE,
+        'categoria': result['categoria'],
+        'fecha_calculo': datetime.now().isoformat()
+    }
+    return {
+        'success': True,
+        'candidate_id': result['candidate_id'],
+        'score': result['score'],
+        'max_score': MAX_SCORE,
+        'details': details,
+        'message': f"Puntuación calculada exitosamente: {result['score']}/{MAX_SCORE}"
+    }
+
+
+# --- Simulación de pesos (what-if) ---
+
+FEATURE_CACHE_TTL = float(os.getenv('SCORING_FEATURE_CACHE_TTL', 300))
+
+_feature_cache: Dict[int, tuple] = {}
+_feature_lock = threading.Lock()
+
+
+def tenant_features(conn, tenant_id: int, refresh: bool = False) -> pd.DataFrame:
+    """
+    Matriz de datos preparada de un tenant, en caché del proceso durante
+    FEATURE_CACHE_TTL segundos para que los ajustes sucesivos de pesos no
+    vuelvan a leer la base de datos.
+    """
+    with _feature_lock:
+        cached = _feature_cache.get(tenant_id)
+    if cached and not refresh and time.monotonic() - cached[0] < FEATURE_CACHE_TTL:
+        return cached[1]
+
+    features = prepare_features(load_tenant_features(conn, tenant_id))
+    with _feature_lock:
+        _feature_cache[tenant_id] = (time.monotonic(), features)
+    return features
+
+
+def _histogram(categories) -> Dict[str, int]:
+    counts = pd.Series(categories).value_counts()
+    return {category: int(counts.get(category, 0)) for category in ('excelente', 'bueno', 'regular', 'bajo')}
+
+
+def simulate(features: pd.DataFrame, overrides: Optional[Dict[str, Any]] = None, top: int = 20) -> Dict[str, Any]:
+    """
+    Puntúa la matriz con los pesos vigentes y con los pesos con overrides, sin
+    escribir nada. Devuelve el histograma de categorías de ambos, cuántos
+    candidatos cambian de categoría y los top candidatos con mayor cambio.
+    """
+    started = time.perf_counter()
+    weights = merge_weights(overrides)
+    actual = compute_scores(features)
+    simulated = compute_scores(features, weights)
+
+    delta = simulated['score'] - actual['score']
+    movers = delta.abs().nlargest(top).index if top > 0 else []
+    top_movers = [{
+        'id_afiliado': int(actual.at[index, 'id_afiliado']),
+        'nombre_completo': actual.at[index, 'nombre_completo'] if 'nombre_completo' in actual.columns else None,
+        'score_actual': int(actual.at[index, 'score']),
+        'score_simulado': int(simulated.at[index, 'score']),
+        'delta': int(delta.at[index]),
+        'categoria_actual': actual.at[index, 'categoria'],
+        'categoria_simulada': simulated.at[index, 'categoria'],
+    } for index in movers if delta.at[index] != 0]
+
+    return {
+        'candidatos': len(features),
+        'pesos': weights,
+        'histograma': {
+            'actual': _histogram(actual['categoria']),
+            'simulado': _histogram(simulated['categoria']),
+        },
+        'cambios_categoria': int((actual['categoria'] != simulated['categoria']).sum()),
+        'score_promedio': {
+            'actual': round(float(actual['score'].mean()), 2) if len(actual) else 0.0,
+            'simulado': round(float(simulated['score'].mean()), 2) if len(simulated) else 0.0,
+        },
+        'top_movers': top_movers,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
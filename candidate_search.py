@@ -0,0 +1,207 @@
+"""
+Búsqueda de texto de candidatos (Afiliados) sobre índice FULLTEXT.
+
+El término se normaliza (minúsculas, sin acentos ni signos) y se divide en
+tokens. Los tokens indexables se resuelven con MATCH ... AGAINST en modo
+booleano sobre el índice ft_afiliados_busqueda (migración 9), que InnoDB
+mantiene solo al crear o editar candidatos, y además dan la relevancia para
+ordenar. Los tokens más cortos que innodb_ft_min_token_size, las stopwords,
+o cualquier token si el índice aún no existe, siguen usando LIKE. También
+van por LIKE los números y las palabras con signos ('c++', 'c#', 'node.js'),
+que se buscan completas. Un término con forma de teléfono ('9999-8888',
+'+504 9999 8888') se compara solo con los dígitos de telefono.
+
+Las columnas de Afiliados usan colaciones *_ci (insensibles a acentos y
+mayúsculas), por lo que "maria" encuentra "María" tanto con MATCH como con LIKE.
+
+Variables de entorno:
+    SEARCH_FT_MIN_TOKEN   Debe coincidir con innodb_ft_min_token_size (default 3)
+"""
+
+import os
+import re
+import time
+import logging
+import unicodedata
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FULLTEXT_INDEX_NAME = 'ft_afiliados_busqueda'
+
+# Columnas del índice FULLTEXT (ver database_migrations._migration_009_candidate_fulltext)
+FULLTEXT_COLUMNS = (
+    'nombre_completo', 'cargo_solicitado', 'experiencia', 'skills', 'ciudad',
+    'observaciones', 'grado_academico', 'email', 'fuente_reclutamiento',
+)
+
+# Columnas de la búsqueda LIKE original, usadas como respaldo
+LIKE_COLUMNS = (
+    'nombre_completo', 'experiencia', 'ciudad', 'cargo_solicitado', 'email',
+    'grado_academico', 'observaciones', 'skills', 'linkedin', 'portfolio',
+    'fuente_reclutamiento', 'telefono',
+)
+
+MIN_TOKEN_LENGTH = int(os.getenv('SEARCH_FT_MIN_TOKEN', 3))
+
+# Signos que se quitan de los extremos de cada palabra ('c++' y 'c#' se conservan)
+WORD_STRIP_CHARS = '.,;:!?¡¿"\'()[]{}*'
+PLAIN_TOKEN_RE = re.compile(r'^[a-z0-9]+$')
+PHONE_TERM_RE = re.compile(r'^\s*\+?[\d\s().-]+$')
+MIN_PHONE_DIGITS = 7
+
+# Teléfono sin separadores, para comparar solo dígitos sin importar cómo se guardó
+PHONE_DIGITS_SQL = "REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE({col}, '-', ''), ' ', ''), '(', ''), ')', ''), '+', ''), '.', '')"
+
+# Stopwords por defecto de InnoDB: no se indexan, así que no pueden exigirse con MATCH
+INNODB_STOPWORDS = frozenset([
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for',
+    'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the',
+    'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und',
+    'www',
+])
+
+# Cada cuánto volver a buscar el índice si no existía (p. ej. migración pendiente)
+_INDEX_RECHECK_SECONDS = 300
+_index_state = {'columns': None, 'checked_at': 0.0}
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas y sin acentos/diacríticos ('Técnico Año' -> 'tecnico ano')"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(term: str) -> List[str]:
+    """
+    Palabras normalizadas del término, sin repetir y en orden. Los signos de
+    los extremos se quitan, pero los de dentro se conservan para que términos
+    como 'c++', 'c#' o 'node.js' se busquen completos.
+    """
+    tokens = []
+    for word in normalize_text(term).split():
+        token = word.strip(WORD_STRIP_CHARS)
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def phone_digits(term: str) -> Optional[str]:
+    """
+    Dígitos de un término con forma de teléfono ('9999-8888', '+504 9999 8888'),
+    o None. Con prefijo 504 se buscan los 8 dígitos locales, que es como se
+    guardan la mayoría de los teléfonos.
+    """
+    if not PHONE_TERM_RE.match(term or ''):
+        return None
+    digits = re.sub(r'\D', '', term)
+    if len(digits) < MIN_PHONE_DIGITS:
+        return None
+    if digits.startswith('504') and len(digits) == 11:
+        digits = digits[3:]
+    return digits
+
+
+def _is_fulltext_token(token: str) -> bool:
+    """Palabras simples que el índice contiene; los números (teléfonos) no están en el índice"""
+    return (PLAIN_TOKEN_RE.match(token) is not None and not token.isdigit()
+            and len(token) >= MIN_TOKEN_LENGTH and token not in INNODB_STOPWORDS)
+
+
+def get_fulltext_columns(cursor) -> Optional[Tuple[str, ...]]:
+    """
+    Columnas del índice FULLTEXT de Afiliados en orden, o None si no existe.
+    El resultado se guarda por proceso; la ausencia se revisa cada pocos minutos.
+    """
+    now = time.monotonic()
+    if _index_state['checked_at'] and (
+            _index_state['columns'] is not None
+            or now - _index_state['checked_at'] < _INDEX_RECHECK_SECONDS):
+        return _index_state['columns']
+
+    try:
+        cursor.execute("""
+            SELECT COLUMN_NAME
+            FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'Afiliados'
+              AND INDEX_NAME = %s
+            ORDER BY SEQ_IN_INDEX
+        """, (FULLTEXT_INDEX_NAME,))
+        rows = cursor.fetchall()
+    except Exception as e:
+        logger.warning(f"No se pudo verificar el índice FULLTEXT de Afiliados: {str(e)}")
+        rows = []
+
+    columns = []
+    for row in rows:
+        columns.append(row['COLUMN_NAME'] if isinstance(row, dict) else row[0])
+
+    _index_state['columns'] = tuple(columns) or None
+    _index_state['checked_at'] = now
+    if not columns:
+        logger.info("Índice FULLTEXT de Afiliados no disponible, la búsqueda usará LIKE")
+    return _index_state['columns']
+
+
+def build_term_clause(cursor, term: str, alias: str = 'a'):
+    """
+    Construye la condición de búsqueda por texto libre.
+
+    Todas las palabras deben coincidir (AND), igual que la búsqueda anterior.
+
+    Returns:
+        Tuple (condicion, params, relevancia, params_relevancia). condicion es
+        None si el término no tiene palabras; relevancia es None si no se usó
+        el índice FULLTEXT.
+    """
+    digits = phone_digits(term)
+    if digits:
+        # Teléfonos: se comparan solo los dígitos de a.telefono (no está en el índice)
+        return (f"({PHONE_DIGITS_SQL.format(col=f'{alias}.telefono')} LIKE %s)",
+                [f"%{digits}%"], None, [])
+
+    tokens = tokenize(term)
+    if not tokens:
+        return None, [], None, []
+
+    columns = get_fulltext_columns(cursor)
+    if columns:
+        like_tokens = [t for t in tokens if not _is_fulltext_token(t)]
+        # Lo que el índice no contiene (palabras cortas, números, 'c++', 'node.js')
+        # se filtra con LIKE sobre las filas ya acotadas por MATCH; las partes
+        # indexables de esas palabras ('node') acotan también con MATCH
+        ft_tokens = []
+        for t in tokens:
+            parts = [t] if t not in like_tokens else re.findall(r'[a-z0-9_]+', t)
+            ft_tokens.extend(p for p in parts if _is_fulltext_token(p) and p not in ft_tokens)
+    else:
+        ft_tokens = []
+        like_tokens = tokens
+
+    conditions = []
+    params = []
+    relevance_sql = None
+    relevance_params = []
+
+    if ft_tokens:
+        match_sql = f"MATCH({', '.join(f'{alias}.{col}' for col in columns)}) AGAINST (%s IN BOOLEAN MODE)"
+        # '+' exige la palabra y '*' permite prefijos ('desarroll' -> 'desarrollador')
+        expression = ' '.join(f'+{t}*' for t in ft_tokens)
+        conditions.append(match_sql)
+        params.append(expression)
+        relevance_sql = match_sql
+        relevance_params = [expression]
+
+    for t in like_tokens:
+        conditions.append("(" + " OR ".join(f"{alias}.{col} LIKE %s" for col in LIKE_COLUMNS) + ")")
+        params.extend([f"%{_escape_like(t)}%"] * len(LIKE_COLUMNS))
+
+    return "(" + " AND ".join(conditions) + ")", params, relevance_sql, relevance_params
+
+
+def _escape_like(token: str) -> str:
+    """Escapa los comodines de LIKE que puedan venir en la palabra"""
+    return token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
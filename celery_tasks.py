@@ -2,22 +2,25 @@
 # Configuración de tareas asíncronas para notificaciones WhatsApp
 
 import os
-from celery import Celery, shared_task
+from celery import Celery, chain, shared_task
+from celery.exceptions import Ignore
+from celery.schedules import crontab
+from kombu import Queue
 import requests
-import mysql.connector
 from datetime import datetime, timedelta
 import logging
-import json
-from typing import Dict, Any, Optional
+import sys
+from typing import Dict, Any, List, Optional
 import traceback
-from scoring_config import (
-    EXPERIENCE_WEIGHTS,
-    EDUCATION_WEIGHTS,
-    SKILLS_WEIGHTS,
-    HISTORY_WEIGHTS,
-    AVAILABILITY_WEIGHTS,
-    get_candidate_category
-)
+import db_pool
+from dashboard_rollups import refresh_tenant_rollups
+from candidate_export import EXPORT_DIR, export_filename, export_to_file, purge_old_exports
+from candidate_import import import_dataframe, missing_required_columns, read_spreadsheet, summarize_import
+import cv_cache
+from cv_pipeline import CVPipelineError, file_key, finish_file, run_extract, run_parse, run_save, run_upload
+from candidate_scoring import rescore_dirty, score_candidates, stale_candidate_ids, summarize
+from scoring_config import RECALCULATION_CONFIG
+from whatsapp_campaigns import MAX_ATTEMPTS, clean_phone_number, dispatch_campaign, send_notifications, update_notification_status
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -26,10 +29,11 @@ logger = logging.getLogger(__name__)
 # Configuración de Celery
 celery_app = Celery('henmir_crm')
 
-# Configuración del broker (Redis recomendado para producción)
+# Configuración del broker (Redis recomendado para producción). CELERY_BROKER_URL y
+# CELERY_RESULT_BACKEND permiten otro broker, p. ej. memory:// para pruebas locales
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-celery_app.conf.broker_url = REDIS_URL
-celery_app.conf.result_backend = REDIS_URL
+celery_app.conf.broker_url = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+celery_app.conf.result_backend = os.getenv('CELERY_RESULT_BACKEND', REDIS_URL)
 
 # Configuraciones adicionales de Celery
 celery_app.conf.update(
@@ -48,34 +52,141 @@ celery_app.conf.update(
     result_compression='gzip',
 )
 
+# Colas por tipo de trabajo, en orden de prioridad: un worker que consume varias
+# toma siempre primero de la que aparece antes (queue_order_strategy 'priority'),
+# así un backlog de recálculo nunca retrasa una notificación. Dentro de una cola,
+# la prioridad del mensaje (0 = más alta en Redis) ordena las tareas de la ruta.
+#   notifications  mensajes de WhatsApp a candidatos (sensibles al tiempo)
+#   cv             pipeline de CVs y mantenimiento de su caché
+#   exports        importación / exportación de candidatos y agregados del dashboard
+#   scoring        puntuación de candidatos (CPU)
+#   default        el resto
+TASK_QUEUES = ('notifications', 'cv', 'exports', 'scoring', 'default')
+
+TASK_ROUTES = {
+    'celery_tasks.send_whatsapp_notification_task': {'queue': 'notifications', 'priority': 0},
+    'send_whatsapp_notifications_batch': {'queue': 'notifications', 'priority': 3},
+    'dispatch_whatsapp_campaign': {'queue': 'notifications', 'priority': 3},
+    'cv_pipeline_upload': {'queue': 'cv', 'priority': 3},
+    'cv_pipeline_extract': {'queue': 'cv', 'priority': 3},
+    'cv_pipeline_parse': {'queue': 'cv', 'priority': 3},
+    'cv_pipeline_save': {'queue': 'cv', 'priority': 3},
+    'evict_cv_cache': {'queue': 'cv', 'priority': 9},
+    'export_candidates': {'queue': 'exports', 'priority': 3},
+    'import_candidates': {'queue': 'exports', 'priority': 3},
+    'refresh_dashboard_rollups': {'queue': 'exports', 'priority': 6},
+    'calculate_candidate_score': {'queue': 'scoring', 'priority': 0},
+    'rescore_dirty_candidates': {'queue': 'scoring', 'priority': 3},
+    'recalculate_stale_scores': {'queue': 'scoring', 'priority': 9},
+}
+
+# Límite de tareas por worker de cada cola (formato de Celery: '60/m'; vacío = sin límite)
+QUEUE_RATE_LIMITS = {
+    'notifications': os.getenv('CELERY_NOTIFICATIONS_RATE_LIMIT', ''),
+    'cv': os.getenv('CELERY_CV_RATE_LIMIT', ''),
+    'exports': os.getenv('CELERY_EXPORTS_RATE_LIMIT', ''),
+    'scoring': os.getenv('CELERY_SCORING_RATE_LIMIT', ''),
+}
+
+# Tareas a las que no se aplica el límite de su cola: una notificación
+# individual (postulación, entrevista, contratación) no espera detrás de las
+# campañas ni de los lotes
+UNLIMITED_TASKS = {'celery_tasks.send_whatsapp_notification_task'}
+
+celery_app.conf.update(
+    task_queues=[Queue(name) for name in TASK_QUEUES],
+    task_default_queue='default',
+    task_routes=TASK_ROUTES,
+    task_default_priority=5,
+    task_annotations={
+        task_name: {'rate_limit': QUEUE_RATE_LIMITS[route['queue']]}
+        for task_name, route in TASK_ROUTES.items()
+        if QUEUE_RATE_LIMITS.get(route['queue']) and task_name not in UNLIMITED_TASKS
+    },
+    broker_transport_options={
+        'queue_order_strategy': 'priority',
+        'priority_steps': list(range(10)),
+        'sep': ':',
+    },
+)
+
+# Perfil de workers: un worker dedicado por cola sensible y uno general. La
+# concurrencia de cada uno se ajusta con CELERY_<WORKER>_CONCURRENCY
+# ("max,min" para autoscale). `python celery_tasks.py profile` imprime los
+# comandos y `python celery_tasks.py run-worker <nombre>` arranca uno.
+WORKER_PROFILES = {
+    'notifications': {
+        'queues': ['notifications'],
+        'concurrency': os.getenv('CELERY_NOTIFICATIONS_CONCURRENCY', '4,1'),
+    },
+    'cv': {
+        'queues': ['cv'],
+        'concurrency': os.getenv('CELERY_CV_CONCURRENCY', '4,1'),
+    },
+    'scoring': {
+        'queues': ['scoring'],
+        'concurrency': os.getenv('CELERY_SCORING_CONCURRENCY', '1,1'),
+        # Liberar la memoria de pandas de los recálculos grandes
+        'max_tasks_per_child': 50,
+    },
+    'general': {
+        'queues': ['notifications', 'exports', 'default'],
+        'concurrency': os.getenv('CELERY_GENERAL_CONCURRENCY', '2,1'),
+    },
+}
+
+
+def worker_argv(name: str) -> List[str]:
+    """Argumentos de `celery worker` para el perfil name de WORKER_PROFILES"""
+    profile = WORKER_PROFILES[name]
+    argv = ['worker', '-n', f'{name}@%h', '-Q', ','.join(profile['queues']), '-l', 'info']
+    if ',' in profile['concurrency']:
+        argv.append(f"--autoscale={profile['concurrency']}")
+    else:
+        argv.append(f"--concurrency={profile['concurrency']}")
+    if profile.get('max_tasks_per_child'):
+        argv.append(f"--max-tasks-per-child={profile['max_tasks_per_child']}")
+    return argv
+
+# Tareas periódicas (requiere `celery -A celery_tasks beat`)
+celery_app.conf.beat_schedule = {
+    'refresh-dashboard-rollups': {
+        'task': 'refresh_dashboard_rollups',
+        'schedule': float(os.getenv('DASHBOARD_ROLLUP_INTERVAL', 30 * 60)),
+    },
+    # La pasada incremental solo repasa los últimos días; la reconstrucción
+    # nocturna absorbe ediciones y borrados de días más antiguos
+    'rebuild-dashboard-rollups': {
+        'task': 'refresh_dashboard_rollups',
+        'schedule': crontab(hour=int(os.getenv('DASHBOARD_ROLLUP_FULL_HOUR', 3)), minute=30),
+        'kwargs': {'full': True},
+    },
+    'evict-cv-cache': {
+        'task': 'evict_cv_cache',
+        'schedule': 60 * 60,
+    },
+    'rescore-dirty-candidates': {
+        'task': 'rescore_dirty_candidates',
+        'schedule': float(RECALCULATION_CONFIG['dirty_interval']),
+    },
+    'recalculate-stale-scores': {
+        'task': 'recalculate_stale_scores',
+        'schedule': crontab(hour=RECALCULATION_CONFIG['hour'], minute=RECALCULATION_CONFIG['minute']),
+    },
+}
+
 def get_db_connection():
-    """Obtiene conexión a la base de datos"""
+    """Obtiene conexión del pool compartido del proceso (db_pool)"""
     try:
-        return mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_NAME', 'henmir_crm'),
-            charset='utf8mb4',
-            collation='utf8mb4_unicode_ci'
-        )
+        return db_pool.get_connection()
     except Exception as e:
         logger.error(f"Error conectando a la BD: {e}")
         return None
 
-def clean_phone_number(phone_str):
-    """Limpia y estandariza los números de teléfono para Honduras."""
-    import re
-    if not phone_str:
-        return None
-    digits = re.sub(r'\D', '', str(phone_str))
-    if digits.startswith('504') and len(digits) == 11:
-        return digits
-    if len(digits) == 8:
-        return f"504{digits}"
-    return digits if len(digits) >= 8 else None
-
-@celery_app.task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
+# Nombres explícitos: con `python celery_tasks.py run-worker` el módulo es __main__
+# y sin name= las tareas se registrarían como henmir_crm.* en vez de celery_tasks.*
+@celery_app.task(bind=True, name='celery_tasks.send_whatsapp_notification_task',
+                 autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
 def send_whatsapp_notification_task(self, task_type, related_id, phone_number, message_body, candidate_name=None):
     """
     Tarea asíncrona para enviar notificaciones de WhatsApp.
@@ -124,22 +235,7 @@ def send_whatsapp_notification_task(self, task_type, related_id, phone_number, m
             if conn:
                 cursor = conn.cursor()
                 try:
-                    if task_type == 'postulation':
-                        cursor.execute(
-                            "UPDATE Postulaciones SET whatsapp_notification_status = 'sent' WHERE id_postulacion = %s",
-                            (related_id,)
-                        )
-                    elif task_type == 'interview':
-                        cursor.execute(
-                            "UPDATE Entrevistas SET notification_status = 'sent' WHERE id_entrevista = %s",
-                            (related_id,)
-                        )
-                    elif task_type == 'hired':
-                        cursor.execute(
-                            "UPDATE Contratados SET notification_status = 'sent' WHERE id_contratado = %s",
-                            (related_id,)
-                        )
-                    
+                    update_notification_status(cursor, task_type, [related_id], 'sent')
                     conn.commit()
                     logger.info(f"Estado de notificación actualizado en BD para {task_type}")
                     
@@ -170,22 +266,7 @@ def send_whatsapp_notification_task(self, task_type, related_id, phone_number, m
         if conn:
             cursor = conn.cursor()
             try:
-                if task_type == 'postulation':
-                    cursor.execute(
-                        "UPDATE Postulaciones SET whatsapp_notification_status = 'failed' WHERE id_postulacion = %s",
-                        (related_id,)
-                    )
-                elif task_type == 'interview':
-                    cursor.execute(
-                        "UPDATE Entrevistas SET notification_status = 'failed' WHERE id_entrevista = %s",
-                        (related_id,)
-                    )
-                elif task_type == 'hired':
-                    cursor.execute(
-                        "UPDATE Contratados SET notification_status = 'failed' WHERE id_contratado = %s",
-                        (related_id,)
-                    )
-                
+                update_notification_status(cursor, task_type, [related_id], 'failed')
                 conn.commit()
             except Exception as db_error:
                 logger.error(f"Error actualizando estado de fallo en BD: {db_error}")
@@ -196,7 +277,50 @@ def send_whatsapp_notification_task(self, task_type, related_id, phone_number, m
         # Re-lanzar excepción para retry automático
         raise self.retry(exc=exc)
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, name='send_whatsapp_notifications_batch')
+def send_whatsapp_notifications_batch(self, notifications: List[Dict[str, Any]], attempt: int = 1) -> Dict[str, int]:
+    """
+    Envía varias notificaciones ({task_type, related_id, phone_number,
+    message_body, tenant_id}) en lotes al bridge (whatsapp_campaigns.send_notifications).
+    Las que fallan por un error transitorio se vuelven a encolar en una
+    nueva tarea con espera creciente, hasta MAX_ATTEMPTS intentos.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("No se pudo conectar a la base de datos")
+    try:
+        result = send_notifications(conn, notifications, final=attempt >= MAX_ATTEMPTS)
+    finally:
+        conn.close()
+    retry = result.pop('retry')
+    if retry:
+        send_whatsapp_notifications_batch.apply_async(
+            args=[retry], kwargs={'attempt': attempt + 1}, countdown=60 * 2 ** (attempt - 1)
+        )
+    logger.info(f"Notificaciones WhatsApp por lote (intento {attempt}): {result['sent']} enviadas, "
+                f"{result['failed']} fallidas, {len(retry)} para reintentar")
+    return {**result, 'retrying': len(retry)}
+
+@celery_app.task(bind=True, name='dispatch_whatsapp_campaign')
+def dispatch_whatsapp_campaign(self, campaign_id: str) -> Dict[str, Any]:
+    """
+    Envía los mensajes pendientes de una campaña (whatsapp_campaigns.dispatch_campaign).
+    Si quedan pendientes (tiempo de la pasada agotado o fallos transitorios),
+    se vuelve a encolar y continúa desde ellos.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("No se pudo conectar a la base de datos")
+    try:
+        result = dispatch_campaign(conn, campaign_id)
+    finally:
+        conn.close()
+    if result['pending']:
+        countdown = 0 if result['sent'] else 60
+        dispatch_whatsapp_campaign.apply_async(args=[campaign_id], countdown=countdown)
+    return result
+
+@celery_app.task(bind=True, name='celery_tasks.get_task_status')
 def get_task_status(self, task_id):
     """
     Obtiene el estado de una tarea de Celery.
@@ -227,7 +351,8 @@ def get_task_status(self, task_id):
 @celery_app.task(bind=True, name='calculate_candidate_score')
 def calculate_candidate_score(self, candidate_id: int) -> Dict[str, Any]:
     """
-    Tarea asíncrona para calcular la puntuación de un candidato basada en múltiples factores.
+    Tarea asíncrona para calcular la puntuación de un candidato basada en múltiples factores
+    (un lote de uno del motor candidate_scoring).
     
     Args:
         candidate_id: ID del candidato/afiliado
@@ -242,220 +367,17 @@ def calculate_candidate_score(self, candidate_id: int) -> Dict[str, Any]:
         conn = get_db_connection()
         if not conn:
             raise Exception("No se pudo conectar a la base de datos")
-            
-        cursor = conn.cursor(dictionary=True)
         
         try:
-            # 1. Obtener datos básicos del candidato
-            cursor.execute("""
-                SELECT 
-                    a.*,
-                    (SELECT COUNT(*) FROM Postulaciones p WHERE p.id_afiliado = a.id_afiliado) as postulaciones_count,
-                    (SELECT COUNT(*) FROM Entrevistas e WHERE e.id_afiliado = a.id_afiliado) as entrevistas_count,
-                    (SELECT COUNT(*) FROM Contrataciones c WHERE c.id_afiliado = a.id_afiliado) as contrataciones_count,
-                    (SELECT GROUP_CONCAT(DISTINCT t.nombre_tag) 
-                     FROM Afiliado_Tags at 
-                     JOIN Tags t ON at.id_tag = t.id_tag 
-                     WHERE at.id_afiliado = a.id_afiliado) as tags
-                FROM Afiliados a
-                WHERE a.id_afiliado = %s
-            """, (candidate_id,))
-            
-            candidate = cursor.fetchone()
-            if not candidate:
+            results = score_candidates(conn, [candidate_id])
+            if not results:
                 raise ValueError(f"Candidato con ID {candidate_id} no encontrado")
             
-            # Inicializar puntuación y detalles
-            score = 0
-            max_score = 100
-            details = {}
-            
-            # 2. Calcular puntuación basada en experiencia
-            experiencia = candidate.get('experiencia', '').lower()
-            if 'año' in experiencia or 'años' in experiencia:
-                try:
-                    # Extraer años de experiencia (ej: "3 años" -> 3)
-                    years = int(''.join(filter(str.isdigit, experiencia.split()[0])))
-                    exp_score = min(
-                        years * EXPERIENCE_WEIGHTS['years_multiplier'], 
-                        EXPERIENCE_WEIGHTS['max_points']
-                    )
-                    score += exp_score
-                    details['experiencia'] = {
-                        'puntos': exp_score,
-                        'detalle': f"{years} años de experiencia"
-                    }
-                except (ValueError, IndexError) as e:
-                    logger.warning(f"No se pudo extraer años de experiencia: {str(e)}")
-                    details['experiencia'] = {
-                        'puntos': 0,
-                        'detalle': 'No se pudo determinar la experiencia',
-                        'advertencia': str(e)
-                    }
-            
-            # 3. Puntos por nivel educativo
-            educacion = candidate.get('grado_academico', '').lower()
-            puntos_educacion = 0
-            
-            for nivel, puntos in EDUCATION_WEIGHTS.items():
-                if nivel in educacion:
-                    puntos_educacion = puntos
-                    score += puntos
-                    details['educacion'] = {
-                        'puntos': puntos,
-                        'detalle': f"Nivel educativo: {nivel.capitalize()}",
-                        'categoria': nivel
-                    }
-                    break
-                    
-            if puntos_educacion == 0 and educacion.strip():
-                details['educacion'] = {
-                    'puntos': 0,
-                    'detalle': f"Nivel educativo no reconocido: {educacion}",
-                    'advertencia': 'Nivel educativo no reconocido'
-                }
-            
-            # 4. Puntos por habilidades (máximo 20 puntos)
-            try:
-                habilidades = json.loads(candidate.get('habilidades', '[]'))
-                if habilidades and isinstance(habilidades, list):
-                    habilidades_score = min(
-                        len(habilidades) * SKILLS_WEIGHTS['per_skill'],
-                        SKILLS_WEIGHTS['max_points']
-                    )
-                    score += habilidades_score
-                    details['habilidades'] = {
-                        'puntos': habilidades_score,
-                        'cantidad': len(habilidades),
-                        'detalle': f"{len(habilidades)} habilidades registradas"
-                    }
-            except json.JSONDecodeError:
-                logger.warning(f"Formato inválido de habilidades para el candidato {candidate_id}")
-                details['habilidades'] = {
-                    'puntos': 0,
-                    'detalle': 'Formato de habilidades inválido',
-                    'advertencia': 'No se pudieron procesar las habilidades'
-                }
-            
-            # 5. Puntos por historial (postulaciones, entrevistas, contrataciones)
-            historial_score = 0
-            historial_details = []
-            
-            # Puntos por postulaciones previas
-            postulaciones = candidate.get('postulaciones_count', 0)
-            if postulaciones > 0:
-                post_score = min(
-                    postulaciones * HISTORY_WEIGHTS['postulacion']['per_item'],
-                    HISTORY_WEIGHTS['postulacion']['max_points']
-                )
-                historial_score += post_score
-                historial_details.append(f"+{post_score} por {postulaciones} postulación(es)")
-            
-            # Puntos por entrevistas completadas
-            entrevistas = candidate.get('entrevistas_count', 0)
-            if entrevistas > 0:
-                entrevista_score = min(
-                    entrevistas * HISTORY_WEIGHTS['entrevista']['per_item'],
-                    HISTORY_WEIGHTS['entrevista']['max_points']
-                )
-                historial_score += entrevista_score
-                historial_details.append(f"+{entrevista_score} por {entrevistas} entrevista(s)")
-            
-            # Puntos por contrataciones previas
-            contrataciones = candidate.get('contrataciones_count', 0)
-            if contrataciones > 0:
-                contrato_score = min(
-                    contrataciones * HISTORY_WEIGHTS['contratacion']['per_item'],
-                    HISTORY_WEIGHTS['contratacion']['max_points']
-                )
-                historial_score += contrato_score
-                historial_details.append(f"+{contrato_score} por {contrataciones} contratación(es) previa(s)")
-            
-            # Asegurar que no exceda el máximo para esta categoría
-            historial_score = min(historial_score, HISTORY_WEIGHTS['max_total'])
-            score += historial_score
-            
-            if historial_details:
-                details['historial'] = {
-                    'puntos': historial_score,
-                    'detalle': "; ".join(historial_details),
-                    'desglose': {
-                        'postulaciones': postulaciones,
-                        'entrevistas': entrevistas,
-                        'contrataciones': contrataciones
-                    }
-                }
-            
-            # 6. Puntos por disponibilidad (máximo 10 puntos)
-            disponibilidad = candidate.get('disponibilidad', '').lower()
-            disp_score = AVAILABILITY_WEIGHTS.get(disponibilidad, AVAILABILITY_WEIGHTS['default'])
-            
-            if disp_score > 0:
-                score += disp_score
-                details['disponibilidad'] = {
-                    'puntos': disp_score,
-                    'disponibilidad': disponibilidad,
-                    'detalle': f"Disponibilidad: {disponibilidad.capitalize()}"
-                }
-            else:
-                details['disponibilidad'] = {
-                    'puntos': 0,
-                    'disponibilidad': 'no especificada',
-                    'detalle': 'Disponibilidad no especificada',
-                    'advertencia': 'El candidato no ha especificado su disponibilidad'
-                }
-            
-            # 7. Asegurar que el puntaje no exceda el máximo
-            score = min(score, max_score)
-            
-            # 8. Determinar categoría del candidato
-            categoria = get_candidate_category(score)
-            
-            # 9. Actualizar la puntuación en la base de datos
-            cursor.execute(
-                """
-                UPDATE Afiliados 
-                SET puntuacion = %s, 
-                    categoria_puntuacion = %s,
-                    ultima_actualizacion_puntuacion = NOW()
-                WHERE id_afiliado = %s
-                """,
-                (score, categoria, candidate_id)
-            )
-            
-            # 10. Registrar el cálculo en el historial
-            cursor.execute(
-                """
-                INSERT INTO puntuaciones_candidato 
-                (id_afiliado, puntuacion, motivo, usuario_id, fecha, detalles, categoria)
-                VALUES (%s, %s, %s, %s, NOW(), %s, %s)
-                """,
-                (candidate_id, score, 'Cálculo automático', 0, json.dumps(details), categoria)
-            )
-            
-            # Agregar resumen al resultado
-            details['resumen'] = {
-                'puntuacion_total': score,
-                'puntuacion_maxima': max_score,
-                'categoria': categoria,
-                'fecha_calculo': datetime.now().isoformat()
-            }
-            
-            conn.commit()
-            
-            logger.info(f"Puntuación calculada para el candidato {candidate_id}: {score}/{max_score}")
-            
-            return {
-                'success': True,
-                'candidate_id': candidate_id,
-                'score': score,
-                'max_score': max_score,
-                'details': details,
-                'message': f'Puntuación calculada exitosamente: {score}/{max_score}'
-            }
+            result = summarize(results[0])
+            logger.info(f"Puntuación calculada para el candidato {candidate_id}: {result['score']}/{result['max_score']}")
+            return result
             
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error al calcular puntuación para el candidato {candidate_id}: {str(e)}")
             logger.error(traceback.format_exc())
             return {
@@ -466,7 +388,6 @@ def calculate_candidate_score(self, candidate_id: int) -> Dict[str, Any]:
             }
             
         finally:
-            cursor.close()
             conn.close()
             
     except Exception as e:
@@ -480,23 +401,244 @@ def calculate_candidate_score(self, candidate_id: int) -> Dict[str, Any]:
         }
 
 
-def get_db_connection():
-    """Obtiene una conexión a la base de datos"""
+@celery_app.task(bind=True, name='rescore_dirty_candidates')
+def rescore_dirty_candidates(self) -> Dict[str, Any]:
+    """Recalcula solo los candidatos marcados por cambios desde la última pasada"""
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("No se pudo conectar a la base de datos")
     try:
-        conn = mysql.connector.connect(
-            host=os.getenv('DB_HOST'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME'),
-            port=int(os.getenv('DB_PORT', '3306')),
-            charset='utf8mb4',
-            collation='utf8mb4_unicode_ci'
-        )
-        return conn
+        total = rescore_dirty(conn)
+        if total:
+            logger.info(f"Recálculo por cambios: {total} candidatos")
+        return {'total': total}
+    finally:
+        conn.close()
+
+
+@celery_app.task(bind=True, name='recalculate_stale_scores')
+def recalculate_stale_scores(self, stale_days: int = RECALCULATION_CONFIG['stale_days']) -> Dict[str, Any]:
+    """
+    Recalcula las puntuaciones de los candidatos sin puntuar o sin actualizar en
+    los últimos stale_days días, por bloques de RECALCULATION_CONFIG['batch_size']
+    con el motor por lotes (candidate_scoring).
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("No se pudo conectar a la base de datos")
+
+    total = 0
+    last_id = 0
+    try:
+        while True:
+            candidate_ids = stale_candidate_ids(conn, stale_days, after_id=last_id)
+            if not candidate_ids:
+                break
+            total += len(score_candidates(conn, candidate_ids))
+            last_id = candidate_ids[-1]
+            self.update_state(
+                state='PROGRESS',
+                meta={'current': total, 'status': f'{total} candidatos recalculados'}
+            )
+
+        logger.info(f"Recálculo de puntuaciones: {total} candidatos")
+        return {
+            'total': total,
+            'message': f'Se recalcularon {total} candidatos'
+        }
     except Exception as e:
-        logger.error(f"Error al conectar a la base de datos: {str(e)}")
-        return None
+        logger.error(f"Error en recalculate_stale_scores: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+
+@celery_app.task(bind=True, name='refresh_dashboard_rollups')
+def refresh_dashboard_rollups_task(self, tenant_id: Optional[int] = None, full: bool = False) -> Dict[str, Any]:
+    """
+    Consolida los agregados diarios del dashboard (Dashboard_Daily_Rollups).
+
+    Args:
+        tenant_id: Tenant a consolidar; None recorre todos los tenants
+        full: Reconstruir todo el histórico en lugar de solo los últimos días
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'error': 'No se pudo conectar a la base de datos'}
+
+    refreshed = []
+    errors = []
+    try:
+        if tenant_id is None:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM Tenants")
+            tenant_ids = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+        else:
+            tenant_ids = [tenant_id]
+
+        for tid in tenant_ids:
+            try:
+                result = refresh_tenant_rollups(conn, tid, full=full)
+                refreshed.append(tid)
+                logger.info(f"Agregados del dashboard consolidados para tenant {tid} hasta {result['hasta']}")
+            except Exception as e:
+                # Un tenant con error no detiene al resto
+                logger.error(f"Error consolidando agregados del tenant {tid}: {str(e)}")
+                errors.append({'tenant_id': tid, 'error': str(e)})
+
+        return {'success': not errors, 'tenants': refreshed, 'errors': errors}
+    finally:
+        conn.close()
+
+
+@celery_app.task(bind=True, name='export_candidates')
+def export_candidates_task(self, tenant_id: int, user_id: int, filters: Dict[str, Any], fmt: str = 'xlsx') -> Dict[str, Any]:
+    """
+    Exportación asíncrona de candidatos (ver candidate_export).
+
+    El archivo queda en CANDIDATE_EXPORT_DIR con el id de la tarea como nombre;
+    /api/candidates/excel/export/<task_id> lo entrega al usuario que la pidió.
+    """
+    purge_old_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+
+    file_name = f"{self.request.id}.{fmt}"
+    path = os.path.join(EXPORT_DIR, file_name)
+    partial_path = f"{path}.part"
+
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("No se pudo conectar a la base de datos")
+
+    try:
+        rows = export_to_file(conn, tenant_id, user_id, filters, fmt, partial_path)
+        # La descarga nunca ve un archivo a medio escribir
+        os.replace(partial_path, path)
+        logger.info(f"Exportación {self.request.id}: {rows} candidatos del tenant {tenant_id} ({fmt})")
+        return {
+            'success': True,
+            'tenant_id': tenant_id,
+            'user_id': user_id,
+            'format': fmt,
+            'rows': rows,
+            'file_name': file_name,
+            'download_name': export_filename(fmt),
+        }
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    finally:
+        conn.close()
+
+
+@celery_app.task(bind=True, name='import_candidates')
+def import_candidates_task(self, tenant_id: int, user_id: int, path: str) -> Dict[str, Any]:
+    """
+    Importación asíncrona de candidatos desde un Excel ya guardado en
+    CANDIDATE_IMPORT_DIR. Publica el avance como estado PROGRESS con las
+    estadísticas acumuladas; el archivo se elimina al terminar.
+    """
+    owner = {'tenant_id': tenant_id, 'user_id': user_id}
+    conn = None
+    try:
+        df = read_spreadsheet(path)
+        missing = missing_required_columns(df)
+        if missing:
+            return dict(owner, success=False, error=f"Faltan columnas obligatorias: {', '.join(missing)}")
+
+        conn = get_db_connection()
+        if not conn:
+            raise Exception("No se pudo conectar a la base de datos")
+
+        def report(stats):
+            self.update_state(state='PROGRESS', meta=dict(owner, stats=stats))
+
+        outcome = import_dataframe(conn, df, tenant_id, user_id, progress=report)
+        logger.info(f"Importación {self.request.id}: {outcome['stats']}")
+        return dict(owner, **summarize_import(outcome))
+    finally:
+        if conn:
+            conn.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+
+# ==================== PIPELINE DE CVs ====================
+# Una cadena por archivo: upload -> extract -> parse -> save (validación,
+# duplicados y BD). Ver cv_pipeline.py para el estado en CV_Processing_Logs.
+
+def _run_cv_stage(task, stage: str, tenant_id: int, key: str, func, *args):
+    """
+    Ejecuta una etapa; los errores transitorios se reintentan con backoff y,
+    agotados los reintentos (o ante un CVPipelineError), el archivo queda
+    fallido y la cadena se detiene.
+    """
+    try:
+        return func(*args)
+    except CVPipelineError as e:
+        logger.warning(f"CV {key}: etapa {stage} falló sin reintento: {str(e)}")
+        finish_file(tenant_id, key, stage, False, str(e))
+        raise Ignore()
+    except Exception as e:
+        if task.request.retries < task.max_retries:
+            countdown = min(30 * 2 ** task.request.retries, 600)
+            logger.warning(f"CV {key}: etapa {stage} reintento {task.request.retries + 1} en {countdown}s: {str(e)}")
+            raise task.retry(exc=e, countdown=countdown)
+        logger.error(f"CV {key}: etapa {stage} agotó los reintentos: {str(e)}")
+        finish_file(tenant_id, key, stage, False, str(e))
+        raise Ignore()
+
+
+@celery_app.task(bind=True, name='cv_pipeline_upload', max_retries=5)
+def cv_upload_task(self, tenant_id: int, key: str) -> None:
+    _run_cv_stage(self, 'upload', tenant_id, key, run_upload, tenant_id, key)
+
+
+@celery_app.task(bind=True, name='cv_pipeline_extract', max_retries=3)
+def cv_extract_task(self, tenant_id: int, key: str) -> str:
+    return _run_cv_stage(self, 'extract', tenant_id, key, run_extract, tenant_id, key)
+
+
+@celery_app.task(bind=True, name='cv_pipeline_parse', max_retries=4)
+def cv_parse_task(self, cv_text: str, tenant_id: int, key: str) -> Dict[str, Any]:
+    return _run_cv_stage(self, 'parse', tenant_id, key, run_parse, tenant_id, key, cv_text)
+
+
+@celery_app.task(bind=True, name='cv_pipeline_save', max_retries=3)
+def cv_save_task(self, cv_data: Dict[str, Any], tenant_id: int, user_id: int, key: str) -> Dict[str, Any]:
+    result = _run_cv_stage(self, 'save', tenant_id, key, run_save, tenant_id, user_id, key, cv_data)
+    finish_file(tenant_id, key, 'save', True, 'CV procesado exitosamente', candidate_id=result['candidate_id'])
+    return result
+
+
+@celery_app.task(name='evict_cv_cache')
+def evict_cv_cache_task() -> int:
+    """Mantiene CV_Parse_Cache por debajo de CV_CACHE_MAX_MB (ver cv_cache.py)"""
+    return cv_cache.evict()
+
+
+def enqueue_cv_job(tenant_id: int, user_id: int, job_id: str, files) -> None:
+    """Encola la cadena de cada archivo registrado con cv_pipeline.create_job"""
+    for index, file_info in enumerate(files):
+        key = file_key(job_id, index)
+        steps = [] if file_info.get('object_key') else [cv_upload_task.si(tenant_id, key)]
+        steps += [
+            cv_extract_task.si(tenant_id, key),
+            cv_parse_task.s(tenant_id, key),
+            cv_save_task.s(tenant_id, user_id, key),
+        ]
+        chain(*steps).apply_async()
 
 
 if __name__ == '__main__':
-    celery_app.start()
+    if sys.argv[1:2] == ['profile']:
+        for name in WORKER_PROFILES:
+            print(f"celery -A celery_tasks {' '.join(worker_argv(name))}")
+        print("celery -A celery_tasks beat -l info")
+    elif sys.argv[1:2] == ['run-worker'] and len(sys.argv) == 3:
+        celery_app.worker_main(worker_argv(sys.argv[2]))
+    else:
+        celery_app.start()
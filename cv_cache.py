@@ -0,0 +1,219 @@
+"""
+Caché persistente de extracción de texto y parseo con Gemini de CVs.
+
+Tabla CV_Parse_Cache, una fila por archivo (SHA-256 de sus bytes):
+    - extracted_text  texto de extract_text_from_file (válido para EXTRACT_VERSION)
+    - parsed_json     respuesta estructurada de Gemini, válida para parse_version
+                      (hash del prompt, el modelo y la generationConfig)
+
+El parseo se busca por text_hash (SHA-256 del texto), porque es lo único que
+recibe process_cv_with_gemini; dos archivos con el mismo texto comparten
+resultado. El resultado depende solo del contenido, así que la caché no se
+separa por tenant.
+
+Volver a subir el mismo CV (re-subidas, process_existing_cv, el formulario
+público) no vuelve a extraer ni a llamar a Gemini. La tabla se acota a
+CV_CACHE_MAX_MB expulsando las filas usadas hace más tiempo (LRU por
+last_used_at); la expulsión corre cada EVICT_EVERY escrituras del proceso y en
+el job periódico evict_cv_cache de Celery.
+
+Los errores de la caché nunca interrumpen el procesamiento: se registran y se
+procesa el CV como si no hubiera caché.
+
+Variables de entorno:
+    CV_CACHE_ENABLED   'false' desactiva la caché (default true)
+    CV_CACHE_MAX_MB    Tamaño máximo de la tabla en MB (default 512)
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Union
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+CACHE_TABLE = 'CV_Parse_Cache'
+ENABLED = os.getenv('CV_CACHE_ENABLED', 'true').lower() == 'true'
+MAX_BYTES = int(float(os.getenv('CV_CACHE_MAX_MB', 512)) * 1024 * 1024)
+EVICT_EVERY = 200
+EVICT_BATCH = 500
+
+# Subir al cambiar la extracción de texto (PDF/DOCX) para invalidar el texto guardado
+EXTRACT_VERSION = '2'
+
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def sha256(content: Union[bytes, str]) -> str:
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 de un archivo en disco, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _execute(query: str, params: tuple, fetch: bool = False):
+    conn = db_pool.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        row = cursor.fetchone() if fetch else None
+        conn.commit()
+        return row
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _touch(content_hash: str):
+    _execute(f"""
+        UPDATE {CACHE_TABLE} SET hits = hits + 1, last_used_at = NOW()
+        WHERE content_hash = %s
+    """, (content_hash,))
+
+
+def _after_write():
+    global _writes
+    with _writes_lock:
+        _writes += 1
+        due = _writes % EVICT_EVERY == 0
+    if due:
+        evict()
+
+
+def get_text(content_hash: str) -> Optional[str]:
+    """Texto extraído del archivo, o None si no está en caché"""
+    if not ENABLED:
+        return None
+    try:
+        row = _execute(f"""
+            SELECT extracted_text FROM {CACHE_TABLE}
+            WHERE content_hash = %s AND extract_version = %s
+        """, (content_hash, EXTRACT_VERSION), fetch=True)
+        if row is None:
+            return None
+        _touch(content_hash)
+        return row['extracted_text']
+    except Exception as e:
+        logger.warning(f"Caché de CVs no disponible (lectura de texto): {str(e)}")
+        return None
+
+
+def put_text(content_hash: str, text: str):
+    """Guarda el texto del archivo; si cambió, descarta el parseo anterior"""
+    if not ENABLED:
+        return
+    try:
+        text_hash = sha256(text)
+        # Las asignaciones de ON DUPLICATE KEY UPDATE se evalúan en orden:
+        # parsed_json se compara con el text_hash anterior
+        _execute(f"""
+            INSERT INTO {CACHE_TABLE} (
+                content_hash, extract_version, text_hash, extracted_text,
+                size_bytes, hits, created_at, last_used_at
+            ) VALUES (%s, %s, %s, %s, %s, 0, NOW(), NOW())
+            ON DUPLICATE KEY UPDATE
+                parsed_json = IF(text_hash = VALUES(text_hash), parsed_json, NULL),
+                parse_version = IF(text_hash = VALUES(text_hash), parse_version, NULL),
+                extract_version = VALUES(extract_version),
+                text_hash = VALUES(text_hash),
+                extracted_text = VALUES(extracted_text),
+                size_bytes = LENGTH(extracted_text) + COALESCE(LENGTH(parsed_json), 0),
+                last_used_at = NOW()
+        """, (content_hash, EXTRACT_VERSION, text_hash, text, len(text.encode('utf-8'))))
+        _after_write()
+    except Exception as e:
+        logger.warning(f"Caché de CVs no disponible (escritura de texto): {str(e)}")
+
+
+def get_parsed(text_hash: str, parse_version: str) -> Optional[Dict[str, Any]]:
+    """Resultado de Gemini para ese texto y versión de prompt/modelo, o None"""
+    if not ENABLED:
+        return None
+    try:
+        row = _execute(f"""
+            SELECT content_hash, parsed_json FROM {CACHE_TABLE}
+            WHERE text_hash = %s AND parse_version = %s AND parsed_json IS NOT NULL
+            LIMIT 1
+        """, (text_hash, parse_version), fetch=True)
+        if row is None:
+            return None
+        _touch(row['content_hash'])
+        return json.loads(row['parsed_json'])
+    except Exception as e:
+        logger.warning(f"Caché de CVs no disponible (lectura de parseo): {str(e)}")
+        return None
+
+
+def put_parsed(text_hash: str, parse_version: str, data: Dict[str, Any]):
+    """Guarda el parseo en los archivos con ese texto (extraídos antes con put_text)"""
+    if not ENABLED:
+        return
+    try:
+        _execute(f"""
+            UPDATE {CACHE_TABLE}
+            SET parsed_json = %s,
+                parse_version = %s,
+                size_bytes = LENGTH(extracted_text) + LENGTH(parsed_json),
+                last_used_at = NOW()
+            WHERE text_hash = %s
+        """, (json.dumps(data, ensure_ascii=False), parse_version, text_hash))
+        _after_write()
+    except Exception as e:
+        logger.warning(f"Caché de CVs no disponible (escritura de parseo): {str(e)}")
+
+
+def evict(max_bytes: int = MAX_BYTES) -> int:
+    """
+    Expulsa las filas menos usadas recientemente hasta dejar la tabla en el 90%
+    de max_bytes. Devuelve las filas eliminadas.
+    """
+    removed = 0
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT COALESCE(SUM(size_bytes), 0) FROM {CACHE_TABLE}")
+            total = int(cursor.fetchone()[0])
+            target = max_bytes * 0.9 if total > max_bytes else total
+            while total > target:
+                cursor.execute(f"""
+                    SELECT content_hash, size_bytes FROM {CACHE_TABLE}
+                    ORDER BY last_used_at
+                    LIMIT %s
+                """, (EVICT_BATCH,))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                hashes = []
+                for content_hash, size_bytes in rows:
+                    if total <= target:
+                        break
+                    hashes.append(content_hash)
+                    total -= size_bytes or 0
+                cursor.execute(f"""
+                    DELETE FROM {CACHE_TABLE}
+                    WHERE content_hash IN ({', '.join(['%s'] * len(hashes))})
+                """, tuple(hashes))
+                conn.commit()
+                removed += len(hashes)
+        finally:
+            cursor.close()
+            conn.close()
+    except Exception as e:
+        logger.warning(f"No se pudo expulsar entradas de la caché de CVs: {str(e)}")
+    if removed:
+        logger.info(f"Caché de CVs: {removed} entradas expulsadas")
+    return removed
@@ -1,269 +1,277 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-import re
-import logging
-from typing import Dict, Any, List, Optional, Tuple
-from difflib import SequenceMatcher
-import phonenumbers
-from email_validator import validate_email, EmailNotValidError
-import mysql.connector
-from dotenv import load_dotenv
-import os
-
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-class CVDuplicateDetector:
-    """Detector de duplicados usando múltiples criterios"""
-    
-    def __init__(self):
-        """Inicializar detector de duplicados"""
-        load_dotenv()
-        self.similarity_threshold = 0.85  # Umbral de similitud para considerar duplicado
-        self.phone_similarity_threshold = 0.8  # Umbral para teléfonos
-        self.name_similarity_threshold = 0.9  # Umbral para nombres
-    
-    def get_db_connection(self):
-        """Obtener conexión a la base de datos"""
-        return mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_NAME', 'crm_henmir')
-        )
-    
-    def normalize_phone(self, phone: str) -> str:
-        """Normalizar número de teléfono para comparación"""
-        if not phone:
-            return ""
-        
-        # Remover caracteres no numéricos excepto +
-        phone = re.sub(r'[^\d\+]', '', phone)
-        
-        # Agregar + si no está presente
-        if not phone.startswith('+'):
-            if len(phone) == 8:  # Número local
-                phone = '+504' + phone
-            elif len(phone) == 11 and phone.startswith('504'):
-                phone = '+' + phone
-        
-        return phone
-    
-    def normalize_name(self, name: str) -> str:
-        """Normalizar nombre para comparación"""
-        if not name:
-            return ""
-        
-        # Convertir a minúsculas y remover acentos
-        name = name.lower()
-        name = re.sub(r'[áàäâ]', 'a', name)
-        name = re.sub(r'[éèëê]', 'e', name)
-        name = re.sub(r'[íìïî]', 'i', name)
-        name = re.sub(r'[óòöô]', 'o', name)
-        name = re.sub(r'[úùüû]', 'u', name)
-        name = re.sub(r'[ñ]', 'n', name)
-        
-        # Remover caracteres especiales
-        name = re.sub(r'[^\w\s]', '', name)
-        
-        # Normalizar espacios
-        name = re.sub(r'\s+', ' ', name).strip()
-        
-        return name
-    
-    def calculate_similarity(self, text1: str, text2: str) -> float:
-        """Calcular similitud entre dos textos"""
-        if not text1 or not text2:
-            return 0.0
-        
-        return SequenceMatcher(None, text1, text2).ratio()
-    
-    def is_phone_similar(self, phone1: str, phone2: str) -> bool:
-        """Verificar si dos teléfonos son similares"""
-        if not phone1 or not phone2:
-            return False
-        
-        norm_phone1 = self.normalize_phone(phone1)
-        norm_phone2 = self.normalize_phone(phone2)
-        
-        if norm_phone1 == norm_phone2:
-            return True
-        
-        # Comparar similitud
-        similarity = self.calculate_similarity(norm_phone1, norm_phone2)
-        return similarity >= self.phone_similarity_threshold
-    
-    def is_name_similar(self, name1: str, name2: str) -> bool:
-        """Verificar si dos nombres son similares"""
-        if not name1 or not name2:
-            return False
-        
-        norm_name1 = self.normalize_name(name1)
-        norm_name2 = self.normalize_name(name2)
-        
-        if norm_name1 == norm_name2:
-            return True
-        
-        # Comparar similitud
-        similarity = self.calculate_similarity(norm_name1, norm_name2)
-        return similarity >= self.name_similarity_threshold
-    
-    def find_duplicates_by_email(self, email: str, tenant_id: int) -> List[Dict[str, Any]]:
-        """Buscar duplicados por email"""
-        if not email:
-            return []
-        
-        conn = self.get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        try:
-            cursor.execute("""
-                SELECT id_afiliado, nombre_completo, email, telefono, fecha_registro
-                FROM Afiliados 
-                WHERE email = %s AND tenant_id = %s
-            """, (email, tenant_id))
-            
-            return cursor.fetchall()
-        finally:
-            cursor.close()
-            conn.close()
-    
-    def find_duplicates_by_phone(self, phone: str, tenant_id: int) -> List[Dict[str, Any]]:
-        """Buscar duplicados por teléfono"""
-        if not phone:
-            return []
-        
-        conn = self.get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        try:
-            # Buscar teléfonos exactos
-            cursor.execute("""
-                SELECT id_afiliado, nombre_completo, email, telefono, fecha_registro
-                FROM Afiliados 
-                WHERE telefono = %s AND tenant_id = %s
-            """, (phone, tenant_id))
-            
-            exact_matches = cursor.fetchall()
-            
-            # Buscar teléfonos similares
-            cursor.execute("""
-                SELECT id_afiliado, nombre_completo, email, telefono, fecha_registro
-                FROM Afiliados 
-                WHERE telefono IS NOT NULL AND tenant_id = %s
-            """, (tenant_id,))
-            
-            all_candidates = cursor.fetchall()
-            similar_matches = []
-            
-            for candidate in all_candidates:
-                if self.is_phone_similar(phone, candidate['telefono']):
-                    similar_matches.append(candidate)
-            
-            return exact_matches + similar_matches
-        finally:
-            cursor.close()
-            conn.close()
-    
-    def find_duplicates_by_name(self, name: str, tenant_id: int) -> List[Dict[str, Any]]:
-        """Buscar duplicados por nombre"""
-        if not name:
-            return []
-        
-        conn = self.get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        try:
-            # Buscar nombres similares
-            cursor.execute("""
-                SELECT id_afiliado, nombre_completo, email, telefono, fecha_registro
-                FROM Afiliados 
-                WHERE nombre_completo IS NOT NULL AND tenant_id = %s
-            """, (tenant_id,))
-            
-            all_candidates = cursor.fetchall()
-            similar_matches = []
-            
-            for candidate in all_candidates:
-                if self.is_name_similar(name, candidate['nombre_completo']):
-                    similar_matches.append(candidate)
-            
-            return similar_matches
-        finally:
-            cursor.close()
-            conn.close()
-    
-    def find_duplicates_comprehensive(self, candidate_data: Dict[str, Any], tenant_id: int) -> List[Dict[str, Any]]:
-        """Buscar duplicados usando múltiples criterios"""
-        duplicates = []
-        
-        # 1. Buscar por email (más confiable)
-        if candidate_data.get('email'):
-            email_duplicates = self.find_duplicates_by_email(candidate_data['email'], tenant_id)
-            duplicates.extend(email_duplicates)
-        
-        # 2. Buscar por teléfono
-        if candidate_data.get('telefono'):
-            phone_duplicates = self.find_duplicates_by_phone(candidate_data['telefono'], tenant_id)
-            duplicates.extend(phone_duplicates)
-        
-        # 3. Buscar por nombre (menos confiable, solo si no hay email ni teléfono)
-        if not candidate_data.get('email') and not candidate_data.get('telefono'):
-            if candidate_data.get('nombre_completo'):
-                name_duplicates = self.find_duplicates_by_name(candidate_data['nombre_completo'], tenant_id)
-                duplicates.extend(name_duplicates)
-        
-        # Eliminar duplicados
-        unique_duplicates = []
-        seen_ids = set()
-        
-        for duplicate in duplicates:
-            if duplicate['id_afiliado'] not in seen_ids:
-                unique_duplicates.append(duplicate)
-                seen_ids.add(duplicate['id_afiliado'])
-        
-        return unique_duplicates
-    
-    def calculate_duplicate_confidence(self, candidate_data: Dict[str, Any], duplicate: Dict[str, Any]) -> float:
-        """Calcular confianza de que es un duplicado"""
-        confidence = 0.0
-        
-        # Email exacto (máxima confianza)
-        if candidate_data.get('email') and duplicate.get('email'):
-            if candidate_data['email'].lower() == duplicate['email'].lower():
-                confidence += 0.5
-        
-        # Teléfono similar
-        if candidate_data.get('telefono') and duplicate.get('telefono'):
-            if self.is_phone_similar(candidate_data['telefono'], duplicate['telefono']):
-                confidence += 0.3
-        
-        # Nombre similar
-        if candidate_data.get('nombre_completo') and duplicate.get('nombre_completo'):
-            if self.is_name_similar(candidate_data['nombre_completo'], duplicate['nombre_completo']):
-                confidence += 0.2
-        
-        return min(confidence, 1.0)
-    
-    def classify_duplicate(self, candidate_data: Dict[str, Any], duplicate: Dict[str, Any]) -> str:
-        """Clasificar tipo de duplicado"""
-        confidence = self.calculate_duplicate_confidence(candidate_data, duplicate)
-        
-        if confidence >= 0.8:
-            return 'high_confidence'
-        elif confidence >= 0.5:
-            return 'medium_confidence'
-        else:
-            return 'low_confidence'
-
-# Función de utilidad
-def create_duplicate_detector() -> CVDuplicateDetector:
-    """Crear instancia del detector de duplicados"""
-    return CVDuplicateDetector()
-
-if __name__ == "__main__":
-    # Prueba del detector
-    detector = create_duplicate_detector()
-    print("Detector de duplicados configurado correctamente")
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from difflib import SequenceMatcher
+from dotenv import load_dotenv
+
+import db_pool
+from duplicate_index import (
+    candidate_keys, find_candidate_ids, match_keys,
+    normalize_email, normalize_name, normalize_phone, phone_keys
+)
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columnas de Afiliados que se devuelven para cada duplicado encontrado
+DUPLICATE_COLUMNS = ['id_afiliado', 'nombre_completo', 'email', 'telefono', 'fecha_registro']
+
+class CVDuplicateDetector:
+    """Detector de duplicados usando múltiples criterios"""
+    
+    def __init__(self):
+        """Inicializar detector de duplicados"""
+        load_dotenv()
+        self.similarity_threshold = 0.85  # Umbral de similitud para considerar duplicado
+        self.name_similarity_threshold = 0.9  # Umbral para nombres
+    
+    def get_db_connection(self):
+        """Obtener conexión del pool compartido del proceso"""
+        return db_pool.get_connection()
+    
+    def normalize_phone(self, phone: str) -> str:
+        """Normalizar número de teléfono para comparación"""
+        return normalize_phone(phone)
+    
+    def normalize_name(self, name: str) -> str:
+        """Normalizar nombre para comparación"""
+        return normalize_name(name)
+    
+    def calculate_similarity(self, text1: str, text2: str) -> float:
+        """Calcular similitud entre dos textos"""
+        if not text1 or not text2:
+            return 0.0
+        
+        return SequenceMatcher(None, text1, text2).ratio()
+    
+    def is_phone_similar(self, phone1: str, phone2: str) -> bool:
+        """
+        Verificar si dos teléfonos son similares: mismo número local de 8
+        dígitos o a una edición (un dígito cambiado o dos contiguos
+        intercambiados), es decir, comparten alguna clave de phone_keys
+        """
+        if not phone1 or not phone2:
+            return False
+        
+        norm_phone1 = self.normalize_phone(phone1)
+        norm_phone2 = self.normalize_phone(phone2)
+        
+        if norm_phone1 == norm_phone2:
+            return True
+        
+        return bool(phone_keys(phone1) & phone_keys(phone2))
+    
+    def is_name_similar(self, name1: str, name2: str) -> bool:
+        """Verificar si dos nombres son similares"""
+        if not name1 or not name2:
+            return False
+        
+        norm_name1 = self.normalize_name(name1)
+        norm_name2 = self.normalize_name(name2)
+        
+        if norm_name1 == norm_name2:
+            return True
+        
+        # Comparar similitud
+        similarity = self.calculate_similarity(norm_name1, norm_name2)
+        return similarity >= self.name_similarity_threshold
+    
+    def _find_in_index(self, tenant_id: int, keys) -> List[Dict[str, Any]]:
+        """Candidatos que comparten alguna clave del índice (bloque a verificar)"""
+        if not keys:
+            return []
+        
+        conn = self.get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        try:
+            ids = list(find_candidate_ids(cursor, tenant_id, keys))
+            if not ids:
+                return []
+            cursor.execute(f"""
+                SELECT id_afiliado, nombre_completo, email, telefono, fecha_registro
+                FROM Afiliados 
+                WHERE tenant_id = %s AND id_afiliado IN ({', '.join(['%s'] * len(ids))})
+            """, tuple([tenant_id] + ids))
+            
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+    
+    def find_duplicates_by_email(self, email: str, tenant_id: int) -> List[Dict[str, Any]]:
+        """Buscar duplicados por email"""
+        if not email:
+            return []
+        
+        return self._find_in_index(tenant_id, candidate_keys(email=email))
+    
+    def find_duplicates_by_phone(self, phone: str, tenant_id: int) -> List[Dict[str, Any]]:
+        """Buscar duplicados por teléfono (exactos y similares dentro del bloque del índice)"""
+        if not phone:
+            return []
+        
+        block = self._find_in_index(tenant_id, candidate_keys(telefono=phone))
+        return [candidate for candidate in block if self.is_phone_similar(phone, candidate['telefono'])]
+    
+    def find_duplicates_by_name(self, name: str, tenant_id: int) -> List[Dict[str, Any]]:
+        """Buscar duplicados por nombre (similares dentro del bloque fonético del índice)"""
+        if not name:
+            return []
+        
+        block = self._find_in_index(tenant_id, candidate_keys(nombre_completo=name))
+        return [candidate for candidate in block if self.is_name_similar(name, candidate['nombre_completo'])]
+    
+    def find_duplicates_comprehensive(self, candidate_data: Dict[str, Any], tenant_id: int) -> List[Dict[str, Any]]:
+        """Buscar duplicados usando múltiples criterios"""
+        return [duplicate for duplicate in self.find_duplicates_batch([candidate_data], tenant_id)[0]
+                if duplicate['source'] == 'db']
+    
+    def _search_keys(self, candidate_data: Dict[str, Any]) -> set:
+        """
+        Claves a buscar: email y teléfono; el nombre (menos confiable) solo si
+        no hay email ni teléfono
+        """
+        email = candidate_data.get('email')
+        telefono = candidate_data.get('telefono')
+        if email or telefono:
+            return candidate_keys(email=email, telefono=telefono)
+        return candidate_keys(nombre_completo=candidate_data.get('nombre_completo'))
+    
+    def _is_duplicate(self, candidate_data: Dict[str, Any], other: Dict[str, Any]) -> bool:
+        """Verificación fina de un candidato del mismo bloque"""
+        email = normalize_email(candidate_data.get('email'))
+        if email and email == normalize_email(other.get('email')):
+            return True
+        
+        if candidate_data.get('telefono'):
+            return self.is_phone_similar(candidate_data['telefono'], other.get('telefono'))
+        
+        if not email and candidate_data.get('nombre_completo'):
+            return self.is_name_similar(candidate_data['nombre_completo'], other.get('nombre_completo'))
+        
+        return False
+    
+    def _classified(self, candidate_data: Dict[str, Any], duplicate: Dict[str, Any], **extra) -> Dict[str, Any]:
+        return dict(
+            duplicate,
+            confidence=self.calculate_duplicate_confidence(candidate_data, duplicate),
+            classification=self.classify_duplicate(candidate_data, duplicate),
+            **extra
+        )
+    
+    def find_duplicates_batch(self, records: List[Dict[str, Any]], tenant_id: int,
+                              cursor=None) -> List[List[Dict[str, Any]]]:
+        """
+        Duplicados de un lote de candidatos entrantes ({'nombre_completo', 'email', 'telefono'}).
+        
+        Contra la BD usa dos consultas para todo el lote (claves del índice y
+        datos de los candidatos del bloque); dentro del lote, cada registro se
+        compara con los anteriores que comparten clave.
+        
+        Returns:
+            Una lista por registro, en el mismo orden, con:
+                - source 'db': fila de Afiliados (id_afiliado, nombre_completo, email, telefono, fecha_registro)
+                - source 'batch': batch_index del registro anterior del lote y sus datos
+            más 'confidence' y 'classification' (classify_duplicate).
+        """
+        search = [self._search_keys(record) for record in records]
+        all_keys = set().union(*search)
+        
+        existing: Dict[int, Dict[str, Any]] = {}
+        by_key = {}
+        if all_keys:
+            conn = None
+            if cursor is None:
+                conn = self.get_db_connection()
+                cursor = conn.cursor(dictionary=True)
+            try:
+                by_key = match_keys(cursor, tenant_id, all_keys)
+                ids = sorted(set().union(*by_key.values())) if by_key else []
+                if ids:
+                    cursor.execute(f"""
+                        SELECT {', '.join(DUPLICATE_COLUMNS)}
+                        FROM Afiliados 
+                        WHERE tenant_id = %s AND id_afiliado IN ({', '.join(['%s'] * len(ids))})
+                    """, tuple([tenant_id] + ids))
+                    for row in cursor.fetchall():
+                        row = row if isinstance(row, dict) else dict(zip(DUPLICATE_COLUMNS, row))
+                        existing[row['id_afiliado']] = row
+            finally:
+                if conn is not None:
+                    cursor.close()
+                    conn.close()
+        
+        results = []
+        seen: Dict[tuple, set] = {}
+        for index, record in enumerate(records):
+            found = []
+            
+            block = set().union(*(by_key.get(key, set()) for key in search[index]))
+            for id_afiliado in sorted(block):
+                duplicate = existing.get(id_afiliado)
+                if duplicate and self._is_duplicate(record, duplicate):
+                    found.append(self._classified(record, duplicate, source='db'))
+            
+            earlier = set().union(*(seen.get(key, set()) for key in search[index]))
+            for other_index in sorted(earlier):
+                other = records[other_index]
+                if self._is_duplicate(record, other):
+                    duplicate = {
+                        'batch_index': other_index,
+                        'nombre_completo': other.get('nombre_completo'),
+                        'email': other.get('email'),
+                        'telefono': other.get('telefono')
+                    }
+                    found.append(self._classified(record, duplicate, source='batch'))
+            
+            for key in candidate_keys(record.get('nombre_completo'), record.get('email'), record.get('telefono')):
+                seen.setdefault(key, set()).add(index)
+            results.append(found)
+        
+        return results
+    
+    def calculate_duplicate_confidence(self, candidate_data: Dict[str, Any], duplicate: Dict[str, Any]) -> float:
+        """Calcular confianza de que es un duplicado"""
+        confidence = 0.0
+        
+        # Email exacto (máxima confianza)
+        if candidate_data.get('email') and duplicate.get('email'):
+            if candidate_data['email'].lower() == duplicate['email'].lower():
+                confidence += 0.5
+        
+        # Teléfono similar
+        if candidate_data.get('telefono') and duplicate.get('telefono'):
+            if self.is_phone_similar(candidate_data['telefono'], duplicate['telefono']):
+                confidence += 0.3
+        
+        # Nombre similar
+        if candidate_data.get('nombre_completo') and duplicate.get('nombre_completo'):
+            if self.is_name_similar(candidate_data['nombre_completo'], duplicate['nombre_completo']):
+                confidence += 0.2
+        
+        return min(confidence, 1.0)
+    
+    def classify_duplicate(self, candidate_data: Dict[str, Any], duplicate: Dict[str, Any]) -> str:
+        """Clasificar tipo de duplicado"""
+        confidence = self.calculate_duplicate_confidence(candidate_data, duplicate)
+        
+        if confidence >= 0.8:
+            return 'high_confidence'
+        elif confidence >= 0.5:
+            return 'medium_confidence'
+        else:
+            return 'low_confidence'
+
+# Función de utilidad
+def create_duplicate_detector() -> CVDuplicateDetector:
+    """Crear instancia del detector de duplicados"""
+    return CVDuplicateDetector()
+
+if __name__ == "__main__":
+    # Prueba del detector
+    detector = create_duplicate_detector()
+    print("Detector de duplicados configurado correctamente")
@@ -0,0 +1,201 @@
+"""
+Caché de URLs de Pre-Authenticated Requests (PAR) de los CVs.
+
+Las URLs de CV que recibe la UI (listas de candidatos, perfil, descarga) salen
+de aquí en lugar de la URL guardada al subir el archivo: una PAR por objeto,
+con vigencia OCI_PAR_LIFETIME_DAYS, que se reutiliza mientras le quede al
+menos OCI_PAR_REFRESH_FRACTION de su vigencia y solo entonces se reemite.
+
+Tabla CV_PAR_Cache, una fila por object_key, más un memo en memoria del
+proceso (MEMO_SIZE entradas, LRU) para no ir a la base de datos en cada
+descarga. get_urls resuelve una página completa con una consulta y emite en
+paralelo (oci_upload_manager) solo las PARs que faltan o están por vencer;
+ninguna lista hace una llamada a OCI por fila.
+
+Las PARs reemplazadas no se borran en OCI: vencen solas al terminar su vigencia.
+
+Variables de entorno:
+    OCI_PAR_LIFETIME_DAYS      Vigencia de las PARs emitidas (default 30)
+    OCI_PAR_REFRESH_FRACTION   Se reemite cuando queda menos de esta fracción de vigencia (default 0.25)
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+import db_pool
+from oci_storage_service import oci_upload_manager
+
+logger = logging.getLogger(__name__)
+
+PAR_TABLE = 'CV_PAR_Cache'
+LIFETIME_DAYS = int(os.getenv('OCI_PAR_LIFETIME_DAYS', 30))
+REFRESH_FRACTION = float(os.getenv('OCI_PAR_REFRESH_FRACTION', 0.25))
+MEMO_SIZE = 2000
+BATCH_SIZE = 500
+
+_memo: 'OrderedDict[str, Tuple[str, datetime]]' = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def object_key_from_url(url: Optional[str]) -> Optional[str]:
+    """Clave del objeto de una URL de PAR de OCI (.../o/<clave>), o None"""
+    if not url:
+        return None
+    path = urlparse(url).path
+    if '/p/' not in path or '/o/' not in path:
+        return None
+    return unquote(path.split('/o/', 1)[1]) or None
+
+
+def _is_fresh(expires_at: datetime, now: datetime) -> bool:
+    return expires_at - now > timedelta(days=LIFETIME_DAYS * REFRESH_FRACTION)
+
+
+def _remember(object_key: str, url: str, expires_at: datetime):
+    with _memo_lock:
+        _memo[object_key] = (url, expires_at)
+        _memo.move_to_end(object_key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def _load(object_keys: List[str]) -> Dict[str, Tuple[str, datetime]]:
+    conn = db_pool.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(f"""
+            SELECT object_key, access_uri, expires_at FROM {PAR_TABLE}
+            WHERE object_key IN ({', '.join(['%s'] * len(object_keys))})
+        """, tuple(object_keys))
+        return {row['object_key']: (row['access_uri'], row['expires_at']) for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _store(rows: List[tuple]):
+    conn = db_pool.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            INSERT INTO {PAR_TABLE} (object_key, par_id, access_uri, expires_at, created_at)
+            VALUES {', '.join(['(%s, %s, %s, %s, NOW())'] * len(rows))}
+            ON DUPLICATE KEY UPDATE
+                par_id = VALUES(par_id),
+                access_uri = VALUES(access_uri),
+                expires_at = VALUES(expires_at),
+                created_at = NOW()
+        """, tuple(value for row in rows for value in row))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _issue(object_keys: List[str], now: datetime) -> Dict[str, Tuple[str, datetime]]:
+    """Emite PARs nuevas en paralelo y las guarda; las que fallan no aparecen"""
+    objects = [(key, os.path.splitext(os.path.basename(key))[0]) for key in object_keys]
+    results = oci_upload_manager.create_pars(objects, expiration_days=LIFETIME_DAYS)
+    expires_at = now + timedelta(days=LIFETIME_DAYS)
+
+    issued, rows = {}, []
+    for object_key, result in zip(object_keys, results):
+        if not result['success']:
+            logger.warning(f"No se pudo emitir PAR para {object_key}: {result.get('error')}")
+            continue
+        issued[object_key] = (result['access_uri'], expires_at)
+        rows.append((object_key, result['par_id'], result['access_uri'], expires_at))
+    if rows:
+        try:
+            _store(rows)
+        except Exception as e:
+            logger.warning(f"Caché de PARs no disponible (escritura): {str(e)}")
+    return issued
+
+
+def get_urls(object_keys: Iterable[str]) -> Dict[str, str]:
+    """
+    URLs de PAR vigentes de varios objetos: {object_key: url}. Memo, luego una
+    consulta por cada BATCH_SIZE claves, y emisión en paralelo de las que
+    faltan o están por vencer. Los objetos sin PAR (error de OCI) no aparecen.
+    """
+    now = datetime.now()
+    found: Dict[str, Tuple[str, datetime]] = {}
+    missing = []
+    with _memo_lock:
+        for object_key in dict.fromkeys(key for key in object_keys if key):
+            entry = _memo.get(object_key)
+            if entry and _is_fresh(entry[1], now):
+                found[object_key] = entry
+            else:
+                missing.append(object_key)
+
+    if missing:
+        stored = {}
+        try:
+            for start in range(0, len(missing), BATCH_SIZE):
+                stored.update(_load(missing[start:start + BATCH_SIZE]))
+        except Exception as e:
+            logger.warning(f"Caché de PARs no disponible (lectura): {str(e)}")
+        stale = []
+        for object_key in missing:
+            entry = stored.get(object_key)
+            if entry and _is_fresh(entry[1], now):
+                found[object_key] = entry
+            else:
+                stale.append(object_key)
+        if stale and oci_upload_manager is not None:
+            found.update(_issue(stale, now))
+        for object_key in missing:
+            if object_key in found:
+                _remember(object_key, *found[object_key])
+
+    return {object_key: entry[0] for object_key, entry in found.items()}
+
+
+def get_url(object_key: str) -> Optional[str]:
+    """URL de PAR vigente de un objeto, o None si no se pudo emitir"""
+    return get_urls([object_key]).get(object_key)
+
+
+def attach_cv_urls(rows: List[Dict[str, Any]], field: str = 'cv_url') -> List[Dict[str, Any]]:
+    """
+    Reemplaza en cada fila la URL de CV guardada al subirlo por una PAR vigente
+    de la caché. Las URLs que no son PARs de OCI (enlaces externos, backend
+    local) se dejan como están.
+    """
+    keys = {id(row): object_key_from_url(row.get(field)) for row in rows}
+    if not any(keys.values()):
+        return rows
+    try:
+        urls = get_urls(key for key in keys.values() if key)
+    except Exception as e:
+        logger.warning(f"No se pudieron resolver las URLs de CV: {str(e)}")
+        return rows
+    for row in rows:
+        url = urls.get(keys[id(row)])
+        if url:
+            row[field] = url
+    return rows
+
+
+def forget(object_key: str):
+    """Quita un objeto de la caché (al borrar el CV)"""
+    with _memo_lock:
+        _memo.pop(object_key, None)
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DELETE FROM {PAR_TABLE} WHERE object_key = %s", (object_key,))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+    except Exception as e:
+        logger.warning(f"Caché de PARs no disponible (borrado): {str(e)}")
@@ -0,0 +1,735 @@
+"""
+Procesamiento de CVs en segundo plano (tareas de Celery en celery_tasks.py).
+
+Cada archivo recorre las etapas:
+    upload      sube a OCI el archivo que la web dejó en CV_STAGING_DIR y crea la PAR
+    extract     descarga el objeto de OCI y extrae el texto
+    parse       Gemini convierte el texto en datos estructurados
+    validate    validate_cv_data
+    duplicates  busca al candidato en el índice de duplicados (CVDuplicateDetector)
+    save        crea el candidato (o usa el candidate_id indicado) y guarda el CV
+
+Los mensajes de Celery llevan rutas y object keys, nunca el contenido de los
+archivos, y cada etapa tiene sus propios reintentos.
+
+Cada job se reclama en CV_Pipeline_Jobs (clave primaria tenant_id + job_id)
+antes de registrar sus archivos, así un Idempotency-Key repetido no crea el
+job dos veces aunque las peticiones lleguen a la vez.
+
+Estado en CV_Processing_Logs:
+    - una fila por job (cv_identifier = job_id) con los contadores en details;
+      es lo que lee /api/candidates/process-status/<job_id>
+    - una fila por archivo (cv_identifier = '<job_id>/<n>') con la etapa actual
+      y lo ya hecho (object_key, candidate_id...). Si una tarea se reintenta o
+      se vuelve a entregar, las etapas con efectos ya completadas no se repiten
+      (no se sube dos veces el archivo ni se crea dos veces el candidato).
+
+Variables de entorno:
+    CV_STAGING_DIR   Carpeta compartida web/Celery donde se dejan los archivos
+                     recibidos hasta que se suben a OCI (default <tmp>/cv_uploads)
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import db_pool
+import cv_cache
+from cv_duplicate_detector import create_duplicate_detector
+from duplicate_index import reindex_candidates
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = os.getenv('CV_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'cv_uploads'))
+STAGES = ('upload', 'extract', 'parse', 'validate', 'duplicates', 'save')
+JOB_TABLE = 'CV_Pipeline_Jobs'
+
+_detector = create_duplicate_detector()
+
+
+class CVPipelineError(Exception):
+    """Error definitivo de un archivo (no se reintenta)"""
+
+
+def new_job_id(tenant_id: int, user_id: int, idempotency_key: Optional[str] = None) -> str:
+    """
+    Id del job. Con Idempotency-Key el id es estable, de modo que reenviar la
+    misma petición devuelve el job ya creado en lugar de procesar otra vez.
+    """
+    if idempotency_key:
+        digest = hashlib.sha256(f"{tenant_id}:{user_id}:{idempotency_key}".encode('utf-8')).hexdigest()
+        return f"cv_job_{tenant_id}_{digest[:24]}"
+    return f"batch_cv_{tenant_id}_{int(time.time())}_{user_id}_{uuid.uuid4().hex[:6]}"
+
+
+def file_key(job_id: str, index: int) -> str:
+    return f"{job_id}/{index}"
+
+
+def stage_file(file_storage) -> str:
+    """Guarda un archivo subido en STAGING_DIR y devuelve la ruta"""
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    path = os.path.join(STAGING_DIR, f"{uuid.uuid4().hex}{os.path.splitext(file_storage.filename)[1].lower()}")
+    file_storage.save(path)
+    return path
+
+
+def _loads(details) -> Dict[str, Any]:
+    if not details:
+        return {}
+    try:
+        return json.loads(details)
+    except (TypeError, ValueError):
+        return {}
+
+
+def get_job(cursor, tenant_id: int, job_id: str) -> Optional[Dict[str, Any]]:
+    cursor.execute("""
+        SELECT cv_identifier, processing_step, status, message, details, created_at
+        FROM CV_Processing_Logs
+        WHERE tenant_id = %s AND cv_identifier = %s
+        ORDER BY created_at DESC
+        LIMIT 1
+    """, (tenant_id, job_id))
+    return cursor.fetchone()
+
+
+def get_job_files(cursor, tenant_id: int, job_id: str) -> List[Dict[str, Any]]:
+    """Estado por archivo del job, en el orden de subida"""
+    cursor.execute("""
+        SELECT cv_identifier, processing_step, status, message, details
+        FROM CV_Processing_Logs
+        WHERE tenant_id = %s AND cv_identifier LIKE %s
+    """, (tenant_id, job_id.replace('_', '\\_') + '/%'))
+    files = []
+    for row in cursor.fetchall():
+        details = _loads(row['details'])
+        files.append({
+            'index': int(row['cv_identifier'].rsplit('/', 1)[1]),
+            'filename': details.get('filename'),
+            'stage': row['processing_step'],
+            'status': row['status'],
+            'message': row['message'],
+            'candidate_id': details.get('candidate_id'),
+            'cv_identifier': details.get('cv_identifier'),
+            'possible_duplicates': details.get('possible_duplicates', [])
+        })
+    return sorted(files, key=lambda item: item['index'])
+
+
+def create_job(conn, tenant_id: int, user_id: int, job_id: str, files: List[Dict[str, Any]]) -> bool:
+    """
+    Registra el job y una fila por archivo. files: [{'filename', 'path'}] para
+    archivos por subir, o con 'object_key', 'file_url', 'par_id', 'mime_type',
+    'size' y 'cv_identifier' si la web ya los subió a OCI.
+
+    El job se reclama primero en CV_Pipeline_Jobs, cuya clave primaria es
+    (tenant_id, job_id): de dos peticiones con el mismo Idempotency-Key solo
+    una lo registra. Retorna False si el job ya existía.
+    """
+    cursor = conn.cursor()
+    try:
+        # Nuevo: 1 fila afectada; repetido: 2 (el contador cambia, así el
+        # resultado no depende de CLIENT_FOUND_ROWS)
+        cursor.execute(f"""
+            INSERT INTO {JOB_TABLE} (tenant_id, job_id, user_id, created_at)
+            VALUES (%s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE repeticiones = repeticiones + 1
+        """, (tenant_id, job_id, user_id))
+        if cursor.rowcount != 1:
+            conn.commit()
+            return False
+
+        cursor.execute("""
+            INSERT INTO CV_Processing_Logs (
+                tenant_id, cv_identifier, processing_step, status, 
+                message, details, created_at
+            ) VALUES (
+                %s, %s, 'batch_start', 'processing', 
+                %s, %s, NOW()
+            )
+        """, (
+            tenant_id,
+            job_id,
+            f'Iniciando procesamiento de {len(files)} archivos',
+            json.dumps({
+                'total_files': len(files),
+                'processed_files': 0,
+                'successful_files': 0,
+                'failed_files': 0,
+                'user_id': user_id
+            })
+        ))
+
+        params = []
+        for index, file_info in enumerate(files):
+            params.extend([
+                tenant_id, file_key(job_id, index),
+                'upload' if not file_info.get('object_key') else 'extract',
+                json.dumps(dict(file_info, job_id=job_id))
+            ])
+        if params:
+            cursor.execute(f"""
+                INSERT INTO CV_Processing_Logs (
+                    tenant_id, cv_identifier, processing_step, status, message, details, created_at
+                ) VALUES {', '.join(["(%s, %s, %s, 'queued', 'En cola', %s, NOW())"] * len(files))}
+            """, tuple(params))
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def load_file(tenant_id: int, key: str) -> Dict[str, Any]:
+    conn = db_pool.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT details FROM CV_Processing_Logs
+            WHERE tenant_id = %s AND cv_identifier = %s
+        """, (tenant_id, key))
+        row = cursor.fetchone()
+        if not row:
+            raise CVPipelineError(f"Archivo {key} no registrado")
+        return _loads(row['details'])
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _lock_file(cursor, tenant_id: int, key: str) -> Dict[str, Any]:
+    """details del archivo, con la fila bloqueada hasta el fin de la transacción"""
+    cursor.execute("""
+        SELECT details FROM CV_Processing_Logs
+        WHERE tenant_id = %s AND cv_identifier = %s
+        FOR UPDATE
+    """, (tenant_id, key))
+    row = cursor.fetchone()
+    return _loads(row['details'] if row else None)
+
+
+def _write_stage(cursor, tenant_id: int, key: str, stage: str, status: str,
+                 message: Optional[str], details: Dict[str, Any]):
+    cursor.execute("""
+        UPDATE CV_Processing_Logs
+        SET processing_step = %s, status = %s, message = %s, details = %s
+        WHERE tenant_id = %s AND cv_identifier = %s
+    """, (stage, status, message or f'Etapa {stage}', json.dumps(details, default=str), tenant_id, key))
+
+
+def record_stage(tenant_id: int, key: str, stage: str, status: str = 'processing',
+                 message: Optional[str] = None, **state) -> Dict[str, Any]:
+    """Marca la etapa actual del archivo y agrega state a sus details"""
+    conn = db_pool.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        details = _lock_file(cursor, tenant_id, key)
+        details.update(state)
+        _write_stage(cursor, tenant_id, key, stage, status, message, details)
+        conn.commit()
+        return details
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def finish_file(tenant_id: int, key: str, stage: str, success: bool, message: str, **state):
+    """
+    Cierra el archivo en la etapa stage y suma al contador del job en la misma
+    transacción; el último archivo marca el job como completado. El cierre es
+    un UPDATE condicionado a que el archivo no esté ya cerrado, así dos
+    entregas de la misma tarea no cuentan el archivo dos veces.
+    """
+    counter = '$.successful_files' if success else '$.failed_files'
+    patch = json.dumps(dict(state, finished=True), default=str)
+    conn = db_pool.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE CV_Processing_Logs
+            SET processing_step = %s, status = %s, message = %s,
+                details = JSON_MERGE_PATCH(COALESCE(details, '{}'), %s)
+            WHERE tenant_id = %s AND cv_identifier = %s
+              AND NOT JSON_CONTAINS_PATH(COALESCE(details, '{}'), 'one', '$.finished')
+        """, (stage, 'success' if success else 'failed', message, patch, tenant_id, key))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return
+
+        cursor.execute(f"""
+            UPDATE CV_Processing_Logs
+            SET details = JSON_SET(details,
+                    '$.processed_files', JSON_EXTRACT(details, '$.processed_files') + 1,
+                    '{counter}', JSON_EXTRACT(details, '{counter}') + 1),
+                processing_step = IF(JSON_EXTRACT(details, '$.processed_files') >= JSON_EXTRACT(details, '$.total_files'),
+                                     'batch_completed', processing_step),
+                status = IF(JSON_EXTRACT(details, '$.processed_files') >= JSON_EXTRACT(details, '$.total_files'),
+                            'completed', status)
+            WHERE tenant_id = %s AND cv_identifier = %s
+        """, (tenant_id, key.rsplit('/', 1)[0]))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Etapas (las llaman las tareas de celery_tasks; una excepción distinta de
+# CVPipelineError se reintenta)
+# ---------------------------------------------------------------------------
+
+def _services():
+    from oci_storage_service import oci_storage_service
+    from cv_processing_service import cv_processing_service
+    if oci_storage_service is None or cv_processing_service is None:
+        raise RuntimeError('Servicios OCI / procesamiento de CVs no disponibles en el worker')
+    return oci_storage_service, cv_processing_service
+
+
+def run_upload(tenant_id: int, key: str) -> None:
+    details = load_file(tenant_id, key)
+    if details.get('object_key'):
+        return
+    storage, _ = _services()
+    record_stage(tenant_id, key, 'upload')
+
+    path = details.get('path')
+    if not path or not os.path.exists(path):
+        raise CVPipelineError('El archivo ya no está disponible para subir')
+
+    cv_identifier = details.get('cv_identifier') or storage.generate_cv_identifier(tenant_id=tenant_id, candidate_id=None)
+    with open(path, 'rb') as staged:
+        upload_result = storage.upload_cv(
+            file_content=staged,
+            tenant_id=tenant_id,
+            cv_identifier=cv_identifier,
+            original_filename=details['filename'],
+            candidate_id=None
+        )
+    if not upload_result['success']:
+        record_stage(tenant_id, key, 'upload', cv_identifier=cv_identifier)
+        raise RuntimeError(f"Error subiendo a OCI: {upload_result['error']}")
+
+    par_result = storage.create_par(object_key=upload_result['object_key'], cv_identifier=cv_identifier)
+    if not par_result['success']:
+        record_stage(tenant_id, key, 'upload', cv_identifier=cv_identifier)
+        raise RuntimeError(f"Error creando PAR: {par_result['error']}")
+
+    record_stage(
+        tenant_id, key, 'extract', 'queued', 'Archivo subido a OCI',
+        cv_identifier=cv_identifier,
+        object_key=upload_result['object_key'],
+        mime_type=upload_result['mime_type'],
+        size=upload_result['size'],
+        file_url=par_result['access_uri'],
+        par_id=par_result['par_id'],
+        content_hash=cv_cache.file_sha256(path),
+        path=None
+    )
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def run_extract(tenant_id: int, key: str) -> str:
+    details = load_file(tenant_id, key)
+    storage, processing = _services()
+    record_stage(tenant_id, key, 'extract')
+
+    # Archivo ya visto: el texto sale de la caché sin descargarlo de OCI
+    if details.get('content_hash'):
+        cv_text = cv_cache.get_text(details['content_hash'])
+        if cv_text and cv_text.strip():
+            return cv_text
+
+    download = storage.download_object(details['object_key'])
+    if not download['success']:
+        raise RuntimeError(f"Error descargando de OCI: {download['error']}")
+    try:
+        cv_text = processing.extract_text_from_file(file_content=download['content'], filename=details['filename'])
+    except Exception as e:
+        raise CVPipelineError(f"Error extrayendo texto: {str(e)}")
+    if not cv_text or not cv_text.strip():
+        raise CVPipelineError('El archivo no contiene texto')
+    return cv_text
+
+
+def run_parse(tenant_id: int, key: str, cv_text: str) -> Dict[str, Any]:
+    """Gemini; el planificador de keys (gemini_scheduler) elige la API key"""
+    _, processing = _services()
+    record_stage(tenant_id, key, 'parse')
+    gemini_result = processing.process_cv_with_gemini(cv_text=cv_text, tenant_id=tenant_id)
+    if not gemini_result['success']:
+        raise RuntimeError(f"Error procesando con IA: {gemini_result.get('error')}")
+    return gemini_result['data']
+
+
+def run_save(tenant_id: int, user_id: int, key: str, cv_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validación, búsqueda de duplicados y guardado en BD"""
+    details = load_file(tenant_id, key)
+    _, processing = _services()
+
+    record_stage(tenant_id, key, 'validate')
+    validation_result = processing.validate_cv_data(cv_data)
+    if not validation_result['success']:
+        raise CVPipelineError(f"Error validando datos: {validation_result['error']}")
+    processed_data = validation_result['validated_data']
+
+    candidate_id = details.get('candidate_id')
+    if not candidate_id:
+        record_stage(tenant_id, key, 'duplicates')
+        personal_info = processed_data.get('personal_info', {})
+        candidate_data = {
+            'nombre_completo': personal_info.get('nombre_completo'),
+            'email': personal_info.get('email'),
+            'telefono': personal_info.get('telefono')
+        }
+        duplicates = _detector.find_duplicates_comprehensive(candidate_data, tenant_id)
+        possible = [{
+            'id_afiliado': duplicate['id_afiliado'],
+            'nombre_completo': duplicate['nombre_completo'],
+            'classification': duplicate['classification']
+        } for duplicate in duplicates]
+
+        # Los posibles duplicados solo se registran para revisión; el CV se
+        # asocia a un candidato existente únicamente si se indicó candidate_id
+        candidate_id = details.get('target_candidate_id')
+        if candidate_id:
+            record_stage(tenant_id, key, 'save', possible_duplicates=possible,
+                         candidate_id=candidate_id, action='updated')
+        else:
+            candidate_id = _create_candidate_once(tenant_id, user_id, key, processed_data, possible)
+    else:
+        record_stage(tenant_id, key, 'save')
+
+    save_result = save_cv_to_database(
+        tenant_id=tenant_id,
+        candidate_id=int(candidate_id),
+        cv_identifier=details['cv_identifier'],
+        original_filename=details['filename'],
+        object_key=details['object_key'],
+        file_url=details['file_url'],
+        par_id=details.get('par_id'),
+        mime_type=details.get('mime_type'),
+        file_size=details.get('size'),
+        processed_data=processed_data
+    )
+    if not save_result['success']:
+        raise RuntimeError(save_result['error'])
+    return {'candidate_id': candidate_id}
+
+
+def _create_candidate_once(tenant_id: int, user_id: int, key: str,
+                           processed_data: Dict[str, Any], possible: List[Dict]) -> int:
+    """
+    Crea el candidato y guarda su id en la fila del archivo en la misma
+    transacción. La fila queda bloqueada mientras tanto: una entrega repetida
+    de la tarea espera y encuentra el candidate_id ya registrado.
+    """
+    conn = db_pool.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        details = _lock_file(cursor, tenant_id, key)
+        candidate_id = details.get('candidate_id')
+        if not candidate_id:
+            candidate_id = create_candidate_from_cv_data(processed_data, tenant_id, user_id, cursor=cursor)
+            details.update(candidate_id=candidate_id, action='created')
+        details['possible_duplicates'] = possible
+        _write_stage(cursor, tenant_id, key, 'save', 'processing', None, details)
+        conn.commit()
+        return candidate_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Escritura del candidato y del CV
+# ---------------------------------------------------------------------------
+
+def create_candidate_from_cv_data(cv_data, tenant_id, user_id, cursor=None):
+    """
+    Crear candidato en base de datos a partir de datos extraídos por IA.
+    Con cursor, escribe dentro de la transacción del llamador y no confirma.
+    """
+    if cursor is not None:
+        return _insert_candidate_from_cv_data(cursor, cv_data, tenant_id, user_id)
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        candidate_id = _insert_candidate_from_cv_data(cursor, cv_data, tenant_id, user_id)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        
+        logger.info(f"Candidato creado: ID {candidate_id} para tenant {tenant_id}")
+        return candidate_id
+        
+    except Exception as e:
+        logger.error(f"Error creando candidato: {str(e)}")
+        raise
+
+
+def _insert_candidate_from_cv_data(cursor, cv_data, tenant_id, user_id):
+    """INSERT del candidato y sus claves de duplicados, sin confirmar"""
+    personal_info = cv_data.get('personal_info', {})
+    experiencia = cv_data.get('experiencia', {})
+    habilidades = cv_data.get('habilidades', {})
+    
+    # Extraer información personal
+    nombre_completo = personal_info.get('nombre_completo', 'Candidato Sin Nombre')
+    email = personal_info.get('email', '')
+    telefono = personal_info.get('telefono', '')
+    ciudad = personal_info.get('ciudad', '')
+    linkedin = personal_info.get('linkedin', '')
+    portfolio = personal_info.get('portfolio', '')
+    
+    # Extraer experiencia detallada
+    años_experiencia = 0
+    if isinstance(experiencia, dict):
+        años_experiencia = experiencia.get('años_experiencia', 0)
+    elif isinstance(experiencia, list) and len(experiencia) > 0:
+        # Si es una lista, intentar obtener la experiencia del primer elemento
+        primera_exp = experiencia[0]
+        if isinstance(primera_exp, dict):
+            años_experiencia = primera_exp.get('años_experiencia', 0)
+    if isinstance(años_experiencia, str):
+        try:
+            años_experiencia = float(años_experiencia)
+        except ValueError:
+            años_experiencia = 0
+    
+    # Crear resumen de experiencia más detallado
+    experiencia_detallada = []
+    if isinstance(experiencia, dict):
+        experiencia_detallada = experiencia.get('experiencia_detallada', [])
+    elif isinstance(experiencia, list):
+        experiencia_detallada = experiencia  # Usar la lista directamente si es una lista
+    
+    experiencia_texto = ""
+    especializaciones = []
+    
+    if experiencia_detallada:
+        # Incluir más experiencias y más detalles
+        for exp in experiencia_detallada[:5]:  # Las primeras 5 experiencias
+            empresa = exp.get('empresa', '')
+            posicion = exp.get('posicion', '')
+            duracion = exp.get('duracion_meses', 0)
+            if empresa and posicion:
+                if duracion:
+                    experiencia_texto += f"{posicion} en {empresa} ({duracion} meses), "
+                else:
+                    experiencia_texto += f"{posicion} en {empresa}, "
+        experiencia_texto = experiencia_texto.rstrip(', ')
+    
+    # Agregar especializaciones al texto de experiencia
+    if isinstance(experiencia, dict):
+        especializaciones = experiencia.get('especializaciones', [])
+    if especializaciones:
+        especializaciones_texto = ", ".join(especializaciones[:3])
+        experiencia_texto += f" | Especializado en: {especializaciones_texto}"
+    
+    # Crear resumen de habilidades más completo
+    habilidades_tecnicas = habilidades.get('habilidades_tecnicas', [])
+    niveles_dominio = habilidades.get('niveles_dominio', {})
+    # Combinar habilidades técnicas con niveles de dominio
+    habilidades_texto = ""
+    if niveles_dominio:
+        expert_skills = niveles_dominio.get('expert', [])
+        avanzado_skills = niveles_dominio.get('avanzado', [])
+        if expert_skills:
+            habilidades_texto += f"Experto: {', '.join(expert_skills[:3])}"
+        if avanzado_skills:
+            if habilidades_texto:
+                habilidades_texto += f" | Avanzado: {', '.join(avanzado_skills[:3])}"
+            else:
+                habilidades_texto = f"Avanzado: {', '.join(avanzado_skills[:3])}"
+    
+    # Si no hay niveles de dominio, usar habilidades técnicas simples
+    if not habilidades_texto and habilidades_tecnicas:
+        habilidades_texto = ", ".join(habilidades_tecnicas[:10])
+    
+    # Insertar candidato en tabla Afiliados con campos adicionales
+    # Incluye el user_id para rastrear quién subió el CV
+    # 🔍 CORRECCIÓN: Usar 'active' en lugar de 'Activo' para el ENUM
+    cursor.execute("""
+        INSERT INTO Afiliados (
+            tenant_id, nombre_completo, email, telefono, ciudad,
+            experiencia, skills, linkedin, portfolio, estado, fecha_registro,
+            created_by_user_id, created_at
+        ) VALUES (
+            %s, %s, %s, %s, %s, %s, %s, %s, %s, 'active', NOW(), %s, NOW()
+        )
+    """, (
+        tenant_id, nombre_completo, email, telefono, ciudad,
+        experiencia_texto, habilidades_texto, linkedin, portfolio, user_id
+    ))
+    
+    candidate_id = cursor.lastrowid
+    reindex_candidates(cursor, tenant_id, ids=[candidate_id])
+    return candidate_id
+
+
+def save_cv_to_database(tenant_id, candidate_id, cv_identifier, original_filename, 
+                       object_key, file_url, par_id, mime_type, file_size, processed_data):
+    """
+    Actualizar información del CV en tabla Afiliados
+    
+    Args:
+        tenant_id: ID del tenant
+        candidate_id: ID del candidato en Afiliados
+        cv_identifier: Identificador único del CV
+        original_filename: Nombre original del archivo
+        object_key: Clave del objeto en el almacenamiento
+        file_url: URL del archivo subido
+        par_id: ID del PAR (opcional)
+        mime_type: Tipo MIME del archivo
+        file_size: Tamaño del archivo en bytes
+        processed_data: Datos procesados del CV
+        
+    Returns:
+        dict: {'success': bool, 'message': str, 'error': str or None}
+    """
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        # Extraer datos del CV procesado
+        personal_info = processed_data.get('personal_info', {})
+        experiencia = processed_data.get('experiencia', [])
+        habilidades = processed_data.get('habilidades', {})
+        
+        # Formatear experiencia para guardar en la base de datos
+        def format_experience(exp):
+            parts = []
+            
+            # Agregar puesto si existe
+            puesto = exp.get('puesto')
+            if puesto:
+                parts.append(puesto)
+            
+            # Agregar empresa si existe
+            empresa = exp.get('empresa')
+            if empresa:
+                if parts:  # Si ya hay un puesto, agregar "en"
+                    parts[-1] = f"{parts[-1]} en {empresa}"
+                else:
+                    parts.append(empresa)
+            
+            # Agregar fechas si hay al menos una
+            fecha_inicio = exp.get('fecha_inicio')
+            fecha_fin = exp.get('fecha_fin', 'actual')
+            
+            if fecha_inicio or fecha_fin:
+                fechas = []
+                if fecha_inicio:
+                    fechas.append(fecha_inicio)
+                fechas.append(fecha_fin)
+                parts.append(f"({fechas[0]} - {fechas[-1]})")
+            
+            # Agregar descripción si existe
+            descripcion = exp.get('descripcion')
+            if descripcion and descripcion.lower() != 'none':
+                if not parts:  # Si no hay nada más, solo poner la descripción
+                    return f"- {descripcion}"
+                parts.append(f"\n- {descripcion}")
+            
+            return " ".join(parts)
+        
+        # Aplicar formato a cada experiencia
+        experiencias_formateadas = [format_experience(exp) for exp in experiencia]
+        
+        # Filtrar experiencias vacías y unir con doble salto de línea
+        experiencia_texto = "\n\n".join(filter(None, experiencias_formateadas))
+        
+        # Combinar todas las habilidades en un solo texto
+        habilidades_tecnicas = habilidades.get('tecnicas', [])
+        habilidades_blandas = habilidades.get('blandas', [])
+        idiomas = [f"{i.get('idioma', '')} ({i.get('nivel', '')})" 
+                  for i in habilidades.get('idiomas', [])]
+        
+        # Combinar todas las habilidades en un solo campo
+        todas_las_habilidades = ", ".join(
+            habilidades_tecnicas + habilidades_blandas + idiomas
+        )
+        
+        # Actualizar el registro del candidato con toda la información del CV
+        cursor.execute("""
+            UPDATE Afiliados 
+            SET cv_url = %s,
+                experiencia = %s,
+                skills = %s,
+                telefono = COALESCE(%s, telefono),
+                email = COALESCE(%s, email),
+                ciudad = COALESCE(%s, ciudad),
+                ultima_actualizacion = NOW()
+            WHERE id_afiliado = %s AND tenant_id = %s
+        """, (
+            file_url,
+            experiencia_texto,
+            todas_las_habilidades,
+            personal_info.get('telefono'),
+            personal_info.get('email'),
+            personal_info.get('ciudad'),
+            candidate_id,
+            tenant_id
+        ))
+        reindex_candidates(cursor, tenant_id, ids=[candidate_id])
+        
+        # Registrar en log de procesamiento
+        cursor.execute("""
+            INSERT INTO CV_Processing_Logs (
+                tenant_id, cv_identifier, processing_step, status, 
+                message, details, created_at
+            ) VALUES (
+                %s, %s, 'cv_processed', 'success', 
+                'CV procesado exitosamente', %s, NOW()
+            )
+        """, (
+            tenant_id, 
+            cv_identifier, 
+            json.dumps({
+                'candidate_id': candidate_id,
+                'original_filename': original_filename,
+                'object_key': object_key,
+                'file_url': file_url,
+                'mime_type': mime_type,
+                'file_size': file_size,
+                'processing_summary': {
+                    'experience_items': len(experiencia),
+                    'skills_count': len(habilidades_tecnicas) + len(habilidades_blandas) + len(idiomas)
+                }
+            })
+        ))
+        
+        conn.commit()
+        cursor.close()
+        conn.close()
+        
+        logger.info(f"CV procesado exitosamente: {cv_identifier} para candidato {candidate_id}")
+        return {
+            'success': True,
+            'message': 'CV procesado exitosamente',
+            'error': None
+        }
+        
+    except Exception as e:
+        error_msg = f"Error procesando CV: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return {
+            'success': False,
+            'message': 'Error al procesar el CV',
+            'error': error_msg
+        }
@@ -6,11 +6,13 @@ import os
 import json
 import logging
 from typing import Dict, Any, Optional, List
-from io import BytesIO
 from datetime import datetime
 import concurrent.futures
 import time
-from threading import Lock
+
+import cv_cache
+import cv_text_extraction
+from gemini_scheduler import GeminiKeyScheduler, retry_after_seconds
 
 # Imports opcionales
 try:
@@ -68,9 +70,30 @@ class CVProcessingService:
         # Usar el modelo solicitado: gemini-2.5-flash-lite
         self.gemini_api_url = os.getenv('GEMINI_API_URL', 'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-lite:generateContent')
         
-        # Rate limiting: 60 peticiones por minuto por API (Gemini 2.0 Flash)
-        self.rate_limit_per_api = 60
+        # Rate limiting por API key (ver gemini_scheduler.py)
+        self.rate_limit_per_api = float(os.getenv('GEMINI_RATE_LIMIT_PER_KEY', 60))
         self.rate_limit_window = 60  # segundos
+        self.gemini_max_attempts = int(os.getenv('GEMINI_MAX_ATTEMPTS', 4))
+        self.gemini_acquire_timeout = float(os.getenv('GEMINI_ACQUIRE_TIMEOUT', 300))
+        self.gemini_generation_config = {
+            "temperature": 0.1,  # Más determinista
+            "topP": 0.9,
+            "topK": 40,
+            "maxOutputTokens": 4096,
+            "responseMimeType": "application/json"
+        }
+        
+        # Versión del parseo para la caché: cambia con el prompt, el modelo o la configuración
+        self.parse_version = cv_cache.sha256(
+            self.build_cv_prompt('') + self.gemini_api_url + json.dumps(self.gemini_generation_config, sort_keys=True)
+        )[:16]
+        
+        self.gemini_scheduler = GeminiKeyScheduler(
+            key_count=len(self.gemini_api_keys),
+            rate_per_minute=self.rate_limit_per_api,
+            burst=int(os.getenv('GEMINI_BURST_PER_KEY', 5)),
+            max_concurrency=int(os.getenv('GEMINI_MAX_CONCURRENCY', 8))
+        )
         
         if not self.gemini_api_keys:
             logger.warning("No se encontraron APIs de Gemini en variables de entorno")
@@ -79,7 +102,7 @@ class CVProcessingService:
     
     def extract_text_from_pdf(self, file_content: bytes) -> str:
         """
-        Extraer texto de archivo PDF
+        Extraer texto de archivo PDF (en línea, con los topes de cv_text_extraction)
         
         Args:
             file_content: Contenido del archivo PDF
@@ -91,13 +114,8 @@ class CVProcessingService:
             if not PyPDF2:
                 raise ImportError("PyPDF2 no está instalado")
             
-            pdf_reader = PyPDF2.PdfReader(BytesIO(file_content))
-            text = ""
-            
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            return text.strip()
+            text, _ = cv_text_extraction.extract_pdf(file_content)
+            return text
             
         except Exception as e:
             logger.error(f"Error extrayendo texto de PDF: {str(e)}")
@@ -117,26 +135,9 @@ class CVProcessingService:
             if not docx:
                 raise ImportError("python-docx no está instalado")
             
-            doc = Document(BytesIO(file_content))
-            text_parts = []
-            
-            # 1. Extraer de párrafos (cuerpo principal)
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text_parts.append(paragraph.text)
-            
-            # 2. Extraer de tablas (común en CVs)
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for paragraph in cell.paragraphs:
-                            text = paragraph.text.strip()
-                            if text:
-                                text_parts.append(text)
-                                
-            full_text = "\n".join(text_parts)
-            logger.info(f"Extracción DOCX: {len(full_text)} caracteres encontrados en párrafos y {len(doc.tables)} tablas")
-            return full_text
+            text, stats = cv_text_extraction.extract_docx(file_content)
+            logger.info(f"Extracción DOCX: {len(text)} caracteres encontrados en párrafos y {stats['tables']} tablas")
+            return text
             
         except Exception as e:
             logger.error(f"Error extrayendo texto de DOCX: {str(e)}")
@@ -144,7 +145,8 @@ class CVProcessingService:
     
     def extract_text_from_file(self, file_content: bytes, filename: str) -> str:
         """
-        Extraer texto de archivo según su tipo
+        Extraer texto de archivo según su tipo, en el pool de procesos de
+        cv_text_extraction (fuera del GIL del worker)
         
         Args:
             file_content: Contenido del archivo
@@ -154,31 +156,154 @@ class CVProcessingService:
             str: Texto extraído
         """
         try:
-            filename_lower = filename.lower()
-            
-            if filename_lower.endswith('.pdf'):
-                return self.extract_text_from_pdf(file_content)
-            elif filename_lower.endswith('.docx') or filename_lower.endswith('.doc'):
-                return self.extract_text_from_docx(file_content)
-            else:
-                # Para otros tipos de archivo, intentar como texto plano
-                try:
-                    return file_content.decode('utf-8')
-                except UnicodeDecodeError:
-                    return file_content.decode('latin-1')
-                    
+            return self.extract_texts_from_files([(file_content, filename)], raise_errors=True)[0]['text']
         except Exception as e:
             logger.error(f"Error extrayendo texto del archivo {filename}: {str(e)}")
             raise
     
-    def process_cv_with_gemini(self, cv_text: str, tenant_id: int, api_index: int = 0) -> Dict[str, Any]:
+    def extract_texts_from_files(self, documents: List[tuple], raise_errors: bool = False) -> List[Dict[str, Any]]:
+        """
+        Extraer texto de varios archivos en paralelo
+        
+        Args:
+            documents: Lista de (contenido o ruta en disco, nombre de archivo)
+            raise_errors: Lanzar ValueError con el primer error en lugar de devolverlo
+            
+        Returns:
+            Lista (mismo orden) de {'text', 'stats'} o {'error', 'stats'};
+            stats incluye elapsed_ms, páginas y si el texto se truncó
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+        hashes = [cv_cache.sha256(content) if isinstance(content, (bytes, bytearray)) else cv_cache.file_sha256(content)
+                  for content, _ in documents]
+        
+        # Mismo archivo ya extraído (caché por SHA-256 de los bytes)
+        pending = []
+        for index, (content, filename) in enumerate(documents):
+            cached = cv_cache.get_text(hashes[index])
+            if cached is not None:
+                logger.info(f"Texto de {filename} encontrado en caché")
+                results[index] = {'text': cached, 'stats': {'filename': filename, 'cached': True}}
+            else:
+                pending.append(index)
+        
+        extracted = cv_text_extraction.extract_many([documents[index] for index in pending])
+        for index, result in zip(pending, extracted):
+            results[index] = result
+            if 'error' in result:
+                if raise_errors:
+                    raise ValueError(result['error'])
+            else:
+                cv_cache.put_text(hashes[index], result['text'])
+        
+        return results
+    
+    def build_cv_prompt(self, cv_text: str) -> str:
+        """Prompt de extracción estructurada que se envía a Gemini"""
+        # Prompt mejorado para Gemini 2.0 Flash con instrucciones más específicas
+        return f"""
+        Eres un asistente experto en análisis de CVs con amplia experiencia en recursos humanos. 
+        Tu tarea es analizar meticulosamente el siguiente CV y extraer TODA la información relevante.
+        
+        INSTRUCCIONES DETALLADAS:
+        1. Lee TODO el contenido del CV sin omitir secciones
+        2. Extrae TODA la información relevante, especialmente experiencia y habilidades
+        3. Para la experiencia, asegúrate de incluir TODOS los trabajos con sus respectivos detalles
+        4. Para habilidades, extrae tanto habilidades técnicas como blandas, incluyendo tecnologías, herramientas y metodologías
+        5. Sigue ESTRICTAMENTE el esquema JSON proporcionado
+        6. Si un campo no aplica, usa null
+        7. No incluyas ningún texto fuera del JSON
+        
+        DETALLES DE EXTRACCIÓN:
+        - Para experiencia: Incluye todas las posiciones laborales, incluso si son pasantías o trabajos temporales
+        - Para habilidades técnicas: Incluye lenguajes de programación, frameworks, herramientas, bases de datos, etc.
+        - Para habilidades blandas: Incluye competencias como trabajo en equipo, liderazgo, comunicación, etc.
+        - Para idiomas: Incluye todos los idiomas con su nivel correspondiente
+        - Para el resumen: Crea un resumen profesional de 3-4 oraciones destacando la experiencia y habilidades principales
+        
+        ESQUEMA REQUERIDO:
+        {json.dumps({
+            "personal_info": {
+                "nombre_completo": "string | null",
+                "email": "string | null",
+                "telefono": "string | null",
+                "ciudad": "string | null",
+                "pais": "string | null"
+            },
+            "experiencia": [{
+                "empresa": "string (obligatorio)",
+                "puesto": "string (obligatorio)",
+                "fecha_inicio": "string (formato YYYY-MM-DD, estimar si no está claro)",
+                "fecha_fin": "string (formato YYYY-MM-DD o 'actual' si aún trabaja allí)",
+                "descripcion": "string (3-5 puntos destacando logros y responsabilidades)",
+                "habilidades": ["string (habilidades específicas usadas en este trabajo)"]
+            }],
+            "educacion": [{
+                "institucion": "string",
+                "titulo": "string (ej: 'Ingeniería en Sistemas')",
+                "fecha_inicio": "string (YYYY-MM)",
+                "fecha_fin": "string (YYYY-MM o 'actual')",
+                "grado": "string (ej: 'Licenciatura', 'Maestría')"
+            }],
+            "habilidades": {
+                "tecnicas": ["string (ej: 'Python', 'React', 'SQL')"],
+                "blandas": ["string (ej: 'Liderazgo', 'Trabajo en equipo')"],
+                "idiomas": [{
+                    "idioma": "string",
+                    "nivel": "string (básico/intermedio/avanzado/nativo)"
+                }]
+            },
+            "resumen": "string (resumen profesional de 3-4 oraciones)"
+        }, indent=2, ensure_ascii=False)}
+        
+        EJEMPLO DE SALIDA ESPERADA:
+        {{
+            "personal_info": {{
+                "nombre_completo": "Juan Pérez",
+                "email": "juan.perez@email.com",
+                "telefono": "+1234567890",
+                "ciudad": "Ciudad de México",
+                "pais": "México"
+            }},
+            "experiencia": [
+                {{
+                    "empresa": "Empresa Tecnológica SA",
+                    "puesto": "Desarrollador Senior",
+                    "fecha_inicio": "2020-01-01",
+                    "fecha_fin": "actual",
+                    "descripcion": "Desarrollo de aplicaciones web con React y Node.js. Liderazgo de equipo de 5 desarrolladores. Implementación de prácticas ágiles.",
+                    "habilidades": ["React", "Node.js", "Liderazgo", "Metodologías Ágiles"]
+                }}
+            ],
+            "habilidades": {{
+                "tecnicas": ["JavaScript", "Python", "React", "Node.js", "SQL", "Git"],
+                "blandas": ["Liderazgo", "Trabajo en equipo", "Comunicación"],
+                "idiomas": [
+                    {{"idioma": "Español", "nivel": "nativo"}},
+                    {{"idioma": "Inglés", "nivel": "avanzado"}}
+                ]
+            }},
+            "resumen": "Desarrollador Full Stack con 5+ años de experiencia en desarrollo web. Especializado en aplicaciones React y Node.js. Líder de equipo con experiencia en metodologías ágiles. Apasionado por crear soluciones tecnológicas innovadoras."
+        }}
+        
+        CV A ANALIZAR:
+        {cv_text}
+        
+        IMPORTANTE: 
+        - Devuelve SOLO el JSON válido, sin texto adicional.
+        - Asegúrate de que el JSON sea sintácticamente correcto.
+        - Si algún campo no está presente en el CV, usa null.
+        - Incluye TODA la experiencia laboral, sin omitir trabajos.
+        """
+
+    def process_cv_with_gemini(self, cv_text: str, tenant_id: int, api_index: Optional[int] = None) -> Dict[str, Any]:
         """
         Procesar CV con Gemini AI para extraer información estructurada
         
         Args:
             cv_text: Texto del CV
             tenant_id: ID del tenant
-            api_index: Índice de la API a usar (0, 1, 2)
+            api_index: API preferida (0, 1, 2); None deja que el planificador elija
             
         Returns:
             Dict con información estructurada del candidato
@@ -187,105 +312,20 @@ class CVProcessingService:
             if not self.gemini_api_keys:
                 raise ValueError("No hay APIs de Gemini configuradas")
             
-            # Seleccionar API usando round-robin
-            selected_api_key = self.gemini_api_keys[api_index % len(self.gemini_api_keys)]
-            logger.info(f"Usando Gemini API {api_index % len(self.gemini_api_keys) + 1} para procesar CV")
-            
-            # Prompt mejorado para Gemini 2.0 Flash con instrucciones más específicas
-            prompt = f"""
-            Eres un asistente experto en análisis de CVs con amplia experiencia en recursos humanos. 
-            Tu tarea es analizar meticulosamente el siguiente CV y extraer TODA la información relevante.
-            
-            INSTRUCCIONES DETALLADAS:
-            1. Lee TODO el contenido del CV sin omitir secciones
-            2. Extrae TODA la información relevante, especialmente experiencia y habilidades
-            3. Para la experiencia, asegúrate de incluir TODOS los trabajos con sus respectivos detalles
-            4. Para habilidades, extrae tanto habilidades técnicas como blandas, incluyendo tecnologías, herramientas y metodologías
-            5. Sigue ESTRICTAMENTE el esquema JSON proporcionado
-            6. Si un campo no aplica, usa null
-            7. No incluyas ningún texto fuera del JSON
-            
-            DETALLES DE EXTRACCIÓN:
-            - Para experiencia: Incluye todas las posiciones laborales, incluso si son pasantías o trabajos temporales
-            - Para habilidades técnicas: Incluye lenguajes de programación, frameworks, herramientas, bases de datos, etc.
-            - Para habilidades blandas: Incluye competencias como trabajo en equipo, liderazgo, comunicación, etc.
-            - Para idiomas: Incluye todos los idiomas con su nivel correspondiente
-            - Para el resumen: Crea un resumen profesional de 3-4 oraciones destacando la experiencia y habilidades principales
-            
-            ESQUEMA REQUERIDO:
-            {json.dumps({
-                "personal_info": {
-                    "nombre_completo": "string | null",
-                    "email": "string | null",
-                    "telefono": "string | null",
-                    "ciudad": "string | null",
-                    "pais": "string | null"
-                },
-                "experiencia": [{
-                    "empresa": "string (obligatorio)",
-                    "puesto": "string (obligatorio)",
-                    "fecha_inicio": "string (formato YYYY-MM-DD, estimar si no está claro)",
-                    "fecha_fin": "string (formato YYYY-MM-DD o 'actual' si aún trabaja allí)",
-                    "descripcion": "string (3-5 puntos destacando logros y responsabilidades)",
-                    "habilidades": ["string (habilidades específicas usadas en este trabajo)"]
-                }],
-                "educacion": [{
-                    "institucion": "string",
-                    "titulo": "string (ej: 'Ingeniería en Sistemas')",
-                    "fecha_inicio": "string (YYYY-MM)",
-                    "fecha_fin": "string (YYYY-MM o 'actual')",
-                    "grado": "string (ej: 'Licenciatura', 'Maestría')"
-                }],
-                "habilidades": {
-                    "tecnicas": ["string (ej: 'Python', 'React', 'SQL')"],
-                    "blandas": ["string (ej: 'Liderazgo', 'Trabajo en equipo')"],
-                    "idiomas": [{
-                        "idioma": "string",
-                        "nivel": "string (básico/intermedio/avanzado/nativo)"
-                    }]
-                },
-                "resumen": "string (resumen profesional de 3-4 oraciones)"
-            }, indent=2, ensure_ascii=False)}
-            
-            EJEMPLO DE SALIDA ESPERADA:
-            {{
-                "personal_info": {{
-                    "nombre_completo": "Juan Pérez",
-                    "email": "juan.perez@email.com",
-                    "telefono": "+1234567890",
-                    "ciudad": "Ciudad de México",
-                    "pais": "México"
-                }},
-                "experiencia": [
-                    {{
-                        "empresa": "Empresa Tecnológica SA",
-                        "puesto": "Desarrollador Senior",
-                        "fecha_inicio": "2020-01-01",
-                        "fecha_fin": "actual",
-                        "descripcion": "Desarrollo de aplicaciones web con React y Node.js. Liderazgo de equipo de 5 desarrolladores. Implementación de prácticas ágiles.",
-                        "habilidades": ["React", "Node.js", "Liderazgo", "Metodologías Ágiles"]
-                    }}
-                ],
-                "habilidades": {{
-                    "tecnicas": ["JavaScript", "Python", "React", "Node.js", "SQL", "Git"],
-                    "blandas": ["Liderazgo", "Trabajo en equipo", "Comunicación"],
-                    "idiomas": [
-                        {{"idioma": "Español", "nivel": "nativo"}},
-                        {{"idioma": "Inglés", "nivel": "avanzado"}}
-                    ]
-                }},
-                "resumen": "Desarrollador Full Stack con 5+ años de experiencia en desarrollo web. Especializado en aplicaciones React y Node.js. Líder de equipo con experiencia en metodologías ágiles. Apasionado por crear soluciones tecnológicas innovadoras."
-            }}
-            
-            CV A ANALIZAR:
-            {cv_text}
-            
-            IMPORTANTE: 
-            - Devuelve SOLO el JSON válido, sin texto adicional.
-            - Asegúrate de que el JSON sea sintácticamente correcto.
-            - Si algún campo no está presente en el CV, usa null.
-            - Incluye TODA la experiencia laboral, sin omitir trabajos.
-            """
+            # Respuesta ya parseada para este texto con el mismo prompt y modelo
+            text_hash = cv_cache.sha256(cv_text or '')
+            if cv_text and cv_text.strip():
+                cached = cv_cache.get_parsed(text_hash, self.parse_version)
+                if cached is not None:
+                    logger.info("CV encontrado en caché de parseo, sin llamar a Gemini")
+                    return {
+                        'success': True,
+                        'data': cached,
+                        'raw_response': None,
+                        'cached': True
+                    }
+            
+            prompt = self.build_cv_prompt(cv_text)
             
             # Preparar request para Gemini
             headers = {
@@ -296,63 +336,48 @@ class CVProcessingService:
                 "contents": [{
                     "parts": [{"text": prompt}]
                 }],
-                "generationConfig": {
-                    "temperature": 0.1,  # Más determinista
-                    "topP": 0.9,
-                    "topK": 40,
-                    "maxOutputTokens": 4096,
-                    "responseMimeType": "application/json"
-                }
+                "generationConfig": self.gemini_generation_config
             }
             
-            # Llamar a Gemini API
+            # Llamar a Gemini API: el planificador elige una key con cuota libre y,
+            # ante un 429 o un 5xx, el reintento pasa a otra key
             logger.info(f"Enviando solicitud a Gemini API con prompt de {len(prompt)} caracteres")
             try:
-                response = requests.post(
-                    f"{self.gemini_api_url}?key={selected_api_key}",
-                    headers=headers,
-                    json=data,
-                    timeout=120
-                )
-                
-                # Registrar respuesta HTTP
-                logger.info(f"Respuesta de Gemini - Status: {response.status_code}")
+                preferred = api_index
+                for attempt in range(self.gemini_max_attempts):
+                    key_index = self.gemini_scheduler.acquire(preferred, timeout=self.gemini_acquire_timeout)
+                    logger.info(f"Usando Gemini API {key_index + 1} para procesar CV (intento {attempt + 1})")
+                    started = time.monotonic()
+                    status_code, retry_after = None, None
+                    try:
+                        response = requests.post(
+                            f"{self.gemini_api_url}?key={self.gemini_api_keys[key_index]}",
+                            headers=headers,
+                            json=data,
+                            timeout=120
+                        )
+                        status_code = response.status_code
+                        if status_code == 429:
+                            retry_after = retry_after_seconds(response)
+                    finally:
+                        self.gemini_scheduler.release(key_index, status_code, time.monotonic() - started, retry_after)
+                    
+                    # Registrar respuesta HTTP
+                    logger.info(f"Respuesta de Gemini - Status: {response.status_code}")
+                    if response.status_code != 429 and response.status_code < 500:
+                        break
+                    logger.warning(f"Gemini API {key_index + 1} respondió {response.status_code}, reintentando con otra key")
+                    preferred = None
                 
                 if response.status_code != 200:
                     error_msg = f"Error en Gemini API ({response.status_code}): {response.text}"
                     logger.error(error_msg)
-                    
-                    # RETRY LOGIC FOR 429 (Too Many Requests)
-                    if response.status_code == 429:
-                        logger.warning("Rate limit excedido (429). Intentando reintento con backoff...")
-                        time.sleep(5)  # Esperar 5 segundos
-                        # Reintento simple (idealmente debería ser un bucle o recursivo, pero esto ayuda)
-                        try:
-                            response = requests.post(
-                                f"{self.gemini_api_url}?key={selected_api_key}",
-                                headers=headers,
-                                json=data,
-                                timeout=120
-                            )
-                            if response.status_code == 200:
-                                logger.info("Reintento exitoso!")
-                            else:
-                                logger.error(f"Reintento falló con status {response.status_code}")
-                                return {
-                                    'success': False,
-                                    'error': f"Rate limit persistente: {response.text}",
-                                    'response_status': response.status_code
-                                }
-                        except Exception as retry_e:
-                            logger.error(f"Error en reintento: {retry_e}")
-
-                    if response.status_code != 200: # Si sigue fallando
-                         return {
-                            'success': False,
-                            'error': error_msg,
-                            'response_status': response.status_code,
-                            'response_text': response.text[:1000]
-                        }
+                    return {
+                        'success': False,
+                        'error': error_msg,
+                        'response_status': response.status_code,
+                        'response_text': response.text[:1000]
+                    }
                 
                 # Procesar respuesta JSON
                 response_data = response.json()
@@ -416,6 +441,9 @@ class CVProcessingService:
                         logger.info(f"Habilidades blandas: {len(habs.get('blandas', []))}")
                         logger.info(f"Idiomas: {len(habs.get('idiomas', []))}")
                     
+                    if cv_text and cv_text.strip():
+                        cv_cache.put_parsed(text_hash, self.parse_version, parsed_response)
+                    
                     return {
                         'success': True,
                         'data': parsed_response,
@@ -718,28 +746,16 @@ class CVProcessingService:
             return [{'success': False, 'error': 'No hay APIs de Gemini configuradas'} for _ in cv_texts]
         
         results = [None] * len(cv_texts)  # Mantener orden original
-        api_counters = {i: 0 for i in range(len(self.gemini_api_keys))}  # Contador por API
-        counters_lock = Lock()
+        self.gemini_scheduler.add_pending(len(cv_texts))
         
         def process_single_cv(index_and_text):
             index, cv_text = index_and_text
+            self.gemini_scheduler.add_pending(-1)
             
             try:
-                # Usar round-robin para distribuir entre APIs
-                with counters_lock:
-                    api_index = index % len(self.gemini_api_keys)
-                    api_counters[api_index] += 1
-                    current_count = api_counters[api_index]
-                
-                logger.info(f"Procesando CV {index+1}/{len(cv_texts)} con API {api_index + 1} (petición #{current_count})")
-                
-                # Calcular delay basado en rate limiting (15 peticiones/minuto = 4 segundos entre peticiones)
-                delay = (current_count - 1) * 4  # 0, 4, 8, 12... segundos
-                if delay > 0:
-                    time.sleep(delay)
-                
-                result = self.process_cv_with_gemini(cv_text, tenant_id, api_index)
-                return index, result
+                # Sin key fija: el planificador asigna la key con cuota libre
+                logger.info(f"Procesando CV {index+1}/{len(cv_texts)}")
+                return index, self.process_cv_with_gemini(cv_text, tenant_id)
                     
             except Exception as e:
                 logger.error(f"Error procesando CV {index+1}: {str(e)}")
@@ -748,8 +764,8 @@ class CVProcessingService:
                     'error': str(e)
                 }
         
-        # Procesar en paralelo con ThreadPoolExecutor
-        max_workers = min(len(self.gemini_api_keys), 3)  # Máximo 3 workers para 3 APIs
+        # Cola compartida: cada hilo libre toma el siguiente CV (work stealing entre keys)
+        max_workers = max(min(self.gemini_scheduler.max_concurrency, len(cv_texts)), 1)
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             # Crear lista de tareas
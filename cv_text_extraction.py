@@ -0,0 +1,244 @@
+"""
+Extracción de texto de CVs (PDF / DOCX) en un pool de procesos.
+
+PyPDF2 y python-docx son CPU puro: ejecutados en el hilo de la petición
+retienen el GIL del worker web mientras dura la extracción. Aquí cada
+documento se extrae en un proceso del pool, página a página, acumulando las
+partes en una lista que se une una sola vez, y con topes de páginas y
+caracteres por documento (un PDF de 50MB no necesita leerse entero para
+obtener los datos de un CV).
+
+Los documentos pueden pasarse como bytes o como ruta de un archivo en disco;
+con rutas, el contenido lo lee el proceso del pool y no pasa por la memoria
+del worker web.
+
+Cada extracción devuelve sus métricas (páginas leídas, caracteres, si se
+truncó y milisegundos), que se registran en el log.
+
+Dentro de procesos daemon (workers prefork de Celery) no se pueden crear
+procesos hijos, así que ahí se extrae en línea; el pool tampoco se usa si
+falla al crearse.
+
+Variables de entorno:
+    CV_EXTRACT_MAX_PAGES   Páginas máximas por PDF (default 30)
+    CV_EXTRACT_MAX_CHARS   Caracteres máximos por documento (default 60000)
+    CV_EXTRACT_WORKERS     Procesos del pool por worker (default min(4, CPUs))
+    CV_EXTRACT_TIMEOUT     Segundos máximos por documento (default 60)
+"""
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+Source = Union[bytes, str]
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGES = int(os.getenv('CV_EXTRACT_MAX_PAGES', 30))
+MAX_CHARS = int(os.getenv('CV_EXTRACT_MAX_CHARS', 60000))
+WORKERS = int(os.getenv('CV_EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))
+TIMEOUT = float(os.getenv('CV_EXTRACT_TIMEOUT', 60))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class _Collector:
+    """Acumula trozos de texto hasta MAX_CHARS y los une una sola vez"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.chars = 0
+        self.truncated = False
+
+    def add(self, text: Optional[str]) -> bool:
+        """Agrega un trozo; devuelve False cuando ya se alcanzó el tope"""
+        if not text:
+            return not self.truncated
+        remaining = self.max_chars - self.chars
+        if len(text) >= remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self.parts.append(text)
+        self.chars += len(text)
+        return not self.truncated
+
+    def text(self, separator: str = "\n") -> str:
+        return separator.join(self.parts).strip()
+
+
+def _open(source: Source):
+    """Archivo binario para los lectores: BytesIO de los bytes o la ruta abierta"""
+    return BytesIO(source) if isinstance(source, (bytes, bytearray)) else open(source, 'rb')
+
+
+def source_size(source: Source) -> int:
+    return len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+
+
+def extract_pdf(file_content: Source, max_pages: int = MAX_PAGES,
+                max_chars: int = MAX_CHARS) -> Tuple[str, Dict[str, Any]]:
+    import PyPDF2
+
+    with _open(file_content) as stream:
+        reader = PyPDF2.PdfReader(stream)
+        collector = _Collector(max_chars)
+        total_pages = len(reader.pages)
+        pages = 0
+        for page in reader.pages:
+            if pages >= max_pages:
+                collector.truncated = True
+                break
+            pages += 1
+            if not collector.add(page.extract_text()):
+                break
+    return collector.text(), {'pages': pages, 'total_pages': total_pages, 'truncated': collector.truncated}
+
+
+def extract_docx(file_content: Source, max_chars: int = MAX_CHARS) -> Tuple[str, Dict[str, Any]]:
+    """Párrafos del cuerpo y luego el contenido de las tablas (común en CVs)"""
+    from docx import Document
+
+    with _open(file_content) as stream:
+        doc = Document(stream)
+    collector = _Collector(max_chars)
+
+    def paragraphs():
+        # 1. Extraer de párrafos (cuerpo principal)
+        for paragraph in doc.paragraphs:
+            yield paragraph.text
+        # 2. Extraer de tablas
+        for table in doc.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    for paragraph in cell.paragraphs:
+                        yield paragraph.text
+
+    for text in paragraphs():
+        text = text.strip()
+        if text and not collector.add(text + "\n"):
+            break
+    return collector.text(separator=""), {'tables': len(doc.tables), 'truncated': collector.truncated}
+
+
+def extract_document(file_content: Source, filename: str) -> Dict[str, Any]:
+    """
+    Extrae el texto según la extensión. Devuelve {'text', 'stats'} o
+    {'error', 'stats'}; nunca lanza, para poder viajar entre procesos.
+    """
+    started = time.perf_counter()
+    filename_lower = (filename or '').lower()
+    try:
+        if filename_lower.endswith('.pdf'):
+            text, stats = extract_pdf(file_content)
+        elif filename_lower.endswith('.docx') or filename_lower.endswith('.doc'):
+            text, stats = extract_docx(file_content)
+        else:
+            # Para otros tipos de archivo, intentar como texto plano
+            if isinstance(file_content, (bytes, bytearray)):
+                raw = file_content
+            else:
+                with open(file_content, 'rb') as stream:
+                    raw = stream.read(MAX_CHARS * 4)
+            try:
+                text = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                text = raw.decode('latin-1')
+            stats = {'truncated': len(text) > MAX_CHARS}
+            text = text[:MAX_CHARS]
+        result = {'text': text}
+    except Exception as e:
+        result, stats = {'error': f"{type(e).__name__}: {str(e)}"}, {}
+
+    stats.update({
+        'filename': filename,
+        'bytes': source_size(file_content),
+        'chars': len(result.get('text', '')),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+    result['stats'] = stats
+    return result
+
+
+def _get_pool() -> Optional[concurrent.futures.ProcessPoolExecutor]:
+    global _pool, _pool_pid
+    if WORKERS <= 0 or multiprocessing.current_process().daemon:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            try:
+                # spawn: no copiar al hijo el estado (hilos, conexiones) del worker web
+                _pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn')
+                )
+                _pool_pid = os.getpid()
+            except Exception as e:
+                logger.warning(f"Pool de extracción no disponible, se extrae en línea: {str(e)}")
+                return None
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _log(result: Dict[str, Any]):
+    stats = result['stats']
+    if 'error' in result:
+        logger.error(f"Extracción de {stats['filename']} falló en {stats['elapsed_ms']}ms: {result['error']}")
+    else:
+        logger.info(f"Extracción de {stats['filename']}: {stats['chars']} caracteres, "
+                    f"{stats.get('pages', '-')} páginas, {stats['elapsed_ms']}ms"
+                    f"{' (truncado)' if stats.get('truncated') else ''}")
+
+
+def extract_many(documents: List[Tuple[Source, str]]) -> List[Dict[str, Any]]:
+    """
+    Extrae varios documentos [(bytes o ruta, nombre)] en paralelo en el pool.
+    Devuelve un resultado de extract_document por documento, en el mismo orden.
+    """
+    pool = _get_pool()
+    results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+    inline = pool is None
+
+    if pool is not None:
+        try:
+            futures = {pool.submit(extract_document, content, filename): index
+                       for index, (content, filename) in enumerate(documents)}
+            timeout = TIMEOUT * max(len(documents) / max(WORKERS, 1), 1)
+            for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                results[futures[future]] = future.result()
+        except concurrent.futures.TimeoutError:
+            logger.error(f"Extracción de {len(documents)} documentos excedió {timeout:.0f}s")
+        except concurrent.futures.process.BrokenProcessPool as e:
+            logger.warning(f"Pool de extracción caído, se recrea y se extrae en línea: {str(e)}")
+            _reset_pool()
+            inline = True
+
+    for index, (content, filename) in enumerate(documents):
+        if results[index] is None:
+            results[index] = extract_document(content, filename) if inline else {
+                'error': 'Tiempo de extracción excedido',
+                'stats': {'filename': filename, 'bytes': source_size(content), 'chars': 0, 'elapsed_ms': TIMEOUT * 1000}
+            }
+        _log(results[index])
+    return results
+
+
+def extract_text(file_content: Source, filename: str) -> Tuple[str, Dict[str, Any]]:
+    """Extrae un documento (en el pool si está disponible). Lanza ValueError si falla."""
+    result = extract_many([(file_content, filename)])[0]
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return result['text'], result['stats']
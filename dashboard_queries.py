@@ -0,0 +1,328 @@
+"""
+Planificador de consultas de /api/dashboard/metrics.
+
+El endpoint calculaba cada métrica con su propio SELECT y en cada uno volvía a
+aplicar build_user_filter_condition, cuyas subconsultas sobre
+Asignaciones_Centrales MySQL reevaluaba una y otra vez. DashboardQueryPlanner
+resuelve una sola vez el conjunto de candidatos y de vacantes visibles para el
+usuario (en tablas temporales de la sesión) y las métricas se filtran contra
+esos conjuntos. Además, las métricas que recorren las mismas filas
+(conversión, efectividad y tasa de éxito por vacante; vacantes por estado y
+tiempo promedio de contratación; total y distribución por ciudad) salen de una
+sola consulta.
+
+Sentencias por carga: 6 SELECT de métricas, más 3 por conjunto materializado
+(DROP + CREATE ... SELECT al preparar y DROP al cerrar). El endpoint original
+lanzaba 14 SELECT, cada uno con las subconsultas de RBAC. Las métricas restantes agrupan
+por claves distintas (cliente, candidato, skill, ciudad) y unirlas obligaría a
+UNION ALL de formas heterogéneas sin ahorro real de lecturas.
+
+Con alcance 'todo' no hay nada que materializar y solo se filtra por tenant;
+con 'propio' el filtro es una igualdad sobre la columna de creador y tampoco
+se materializa.
+
+Uso:
+    with DashboardQueryPlanner(cursor, tenant_id, user_id) as planner:
+        vacantes = planner.vacantes_resumen()
+        ...
+    planner.timings  # segundos por métrica
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from permission_service import build_user_filter_condition, get_resource_scope
+
+logger = logging.getLogger(__name__)
+
+# Conjuntos que se materializan y cómo se filtran en cada consulta
+SCOPE_SETS = {
+    'candidatos': {
+        'table': 'Afiliados',
+        'id_col': 'id_afiliado',
+        'owner_col': 'created_by_user_id',
+        'resource': 'candidate',
+        'temp_table': 'tmp_dashboard_candidatos',
+    },
+    'vacantes': {
+        'table': 'Vacantes',
+        'id_col': 'id_vacante',
+        'owner_col': 'created_by_user',
+        'resource': 'vacancy',
+        'temp_table': 'tmp_dashboard_vacantes',
+    },
+}
+
+
+class DashboardQueryPlanner:
+    """
+    Calcula las métricas del dashboard sobre conjuntos de IDs ya filtrados por RBAC.
+
+    Args:
+        cursor: Cursor con dictionary=True
+        tenant_id: Tenant actual
+        user_id: Usuario cuyos permisos se aplican
+        materialize: False aplica build_user_filter_condition en cada consulta,
+            como hacía el endpoint (lo usa benchmark_dashboard.py para comparar)
+    """
+
+    def __init__(self, cursor, tenant_id: int, user_id: int, materialize: bool = True):
+        self.cursor = cursor
+        self.tenant_id = tenant_id
+        self.user_id = user_id
+        self.materialize = materialize
+        self.timings: Dict[str, float] = {}
+        self._modes: Dict[str, str] = {}
+        self._temp_tables: List[str] = []
+
+    def __enter__(self):
+        self.prepare()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @contextmanager
+    def timed(self, metric: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[metric] = self.timings.get(metric, 0.0) + time.perf_counter() - start
+
+    # =====================================================
+    # CONJUNTOS FILTRADOS
+    # =====================================================
+
+    def prepare(self):
+        """Determina cómo filtrar cada conjunto; materializa los de alcance 'asignados'"""
+        with self.timed('preparar_alcance'):
+            for name, spec in SCOPE_SETS.items():
+                scope = get_resource_scope(self.user_id, self.tenant_id, spec['resource'])
+                if scope == 'todo':
+                    self._modes[name] = 'todo'
+                    continue
+                if not self.materialize or scope != 'asignados':
+                    self._modes[name] = 'inline'
+                    continue
+
+                condition, params = build_user_filter_condition(
+                    self.user_id, self.tenant_id, f"x.{spec['owner_col']}", spec['resource'], f"x.{spec['id_col']}"
+                )
+                temp_table = spec['temp_table']
+                # La conexión vuelve al pool: una tabla de una petición anterior puede seguir viva
+                self.cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {temp_table}")
+                self.cursor.execute(f"""
+                    CREATE TEMPORARY TABLE {temp_table} (id INT PRIMARY KEY)
+                    SELECT x.{spec['id_col']} AS id FROM {spec['table']} x
+                    WHERE x.tenant_id = %s AND ({condition})
+                """, tuple([self.tenant_id] + params))
+                self._temp_tables.append(temp_table)
+                self._modes[name] = 'temp'
+
+    def close(self):
+        """Elimina las tablas temporales de la sesión"""
+        for temp_table in self._temp_tables:
+            try:
+                self.cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {temp_table}")
+            except Exception as e:
+                logger.warning(f"No se pudo eliminar {temp_table}: {str(e)}")
+        self._temp_tables = []
+
+    def scope_filter(self, name: str, alias: str) -> Tuple[str, list]:
+        """Fragmento ' AND (...)' del conjunto para el alias de tabla indicado"""
+        spec = SCOPE_SETS[name]
+        mode = self._modes[name]
+        if mode == 'todo':
+            return '', []
+        if mode == 'temp':
+            return f" AND {alias}.{spec['id_col']} IN (SELECT id FROM {spec['temp_table']})", []
+        condition, params = build_user_filter_condition(
+            self.user_id, self.tenant_id, f"{alias}.{spec['owner_col']}", spec['resource'], f"{alias}.{spec['id_col']}"
+        )
+        return (f" AND ({condition})", params) if condition else ('', [])
+
+    # =====================================================
+    # MÉTRICAS
+    # =====================================================
+
+    def vacantes_resumen(self) -> Dict:
+        """
+        Vacantes por estado y tiempo promedio de contratación en una sola
+        consulta sobre las vacantes visibles. El promedio se rehace con
+        SUM / COUNT sobre las mismas filas que promediaba AVG.
+        """
+        with self.timed('vacantes_resumen'):
+            vac_sql, vac_params = self.scope_filter('vacantes', 'v')
+            self.cursor.execute(f"""
+                SELECT
+                    v.estado,
+                    COUNT(DISTINCT v.id_vacante) as total,
+                    SUM(DATEDIFF(c.fecha_contratacion, p.fecha_aplicacion)) as dias_contratacion,
+                    COUNT(p.id_postulacion) as contrataciones_con_fecha
+                FROM Vacantes v
+                LEFT JOIN (
+                    Contratados c
+                    JOIN Postulaciones p ON c.id_afiliado = p.id_afiliado AND c.id_vacante = p.id_vacante
+                        AND p.tenant_id = %s AND p.fecha_aplicacion IS NOT NULL
+                ) ON c.id_vacante = v.id_vacante AND c.tenant_id = %s AND c.fecha_contratacion IS NOT NULL
+                WHERE v.tenant_id = %s{vac_sql}
+                GROUP BY v.estado
+            """, tuple([self.tenant_id] * 3 + vac_params))
+            rows = self.cursor.fetchall()
+
+        dias = sum(row['dias_contratacion'] or 0 for row in rows)
+        contrataciones = sum(row['contrataciones_con_fecha'] for row in rows)
+        return {
+            'vacantes_por_estado': [{'estado': row['estado'], 'total': row['total']} for row in rows],
+            'tiempo_promedio_contratacion': (dias / contrataciones) if contrataciones > 0 else 0,
+        }
+
+    def postulaciones_por_vacante(self) -> Dict:
+        """
+        Una sola pasada sobre las postulaciones visibles, agrupada por vacante.
+        De ahí salen la tasa de conversión, la efectividad del usuario y el top
+        de tasa de éxito por vacante.
+        """
+        with self.timed('postulaciones_por_vacante'):
+            vac_sql, vac_params = self.scope_filter('vacantes', 'v')
+            cand_sql, cand_params = self.scope_filter('candidatos', 'a')
+            self.cursor.execute(f"""
+                SELECT
+                    v.id_vacante,
+                    v.cargo_solicitado,
+                    COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
+                    COUNT(DISTINCT co.id_contratado) as total_contrataciones
+                FROM Postulaciones p
+                JOIN Vacantes v ON p.id_vacante = v.id_vacante
+                JOIN Afiliados a ON p.id_afiliado = a.id_afiliado
+                LEFT JOIN Contratados co ON co.id_afiliado = p.id_afiliado
+                    AND co.id_vacante = p.id_vacante AND co.tenant_id = %s
+                WHERE p.tenant_id = %s AND v.tenant_id = %s AND a.tenant_id = %s{vac_sql}{cand_sql}
+                GROUP BY v.id_vacante, v.cargo_solicitado
+            """, tuple([self.tenant_id] * 4 + vac_params + cand_params))
+            rows = self.cursor.fetchall()
+
+        total_postulaciones = sum(row['total_postulaciones'] for row in rows)
+        total_contrataciones = sum(row['total_contrataciones'] for row in rows)
+
+        por_vacante = []
+        for row in rows:
+            por_vacante.append({
+                'cargo_solicitado': row['cargo_solicitado'],
+                'total_postulaciones': row['total_postulaciones'],
+                'total_contrataciones': row['total_contrataciones'],
+                'tasa_exito': row['total_contrataciones'] * 100.0 / row['total_postulaciones'],
+            })
+        por_vacante.sort(key=lambda item: item['tasa_exito'], reverse=True)
+
+        return {
+            'total_postulaciones': total_postulaciones,
+            'total_contrataciones': total_contrataciones,
+            'tasa_conversion': (total_contrataciones / total_postulaciones * 100) if total_postulaciones > 0 else 0,
+            'tasa_exito_vacantes': por_vacante[:5],
+        }
+
+    def top_clientes(self) -> List[Dict]:
+        with self.timed('top_clientes'):
+            vac_sql, vac_params = self.scope_filter('vacantes', 'v')
+            self.cursor.execute(f"""
+                SELECT
+                    c.empresa,
+                    COUNT(DISTINCT v.id_vacante) as total_vacantes,
+                    COUNT(DISTINCT p.id_postulacion) as total_postulaciones,
+                    COUNT(DISTINCT co.id_contratado) as total_contrataciones
+                FROM Clientes c
+                LEFT JOIN Vacantes v ON c.id_cliente = v.id_cliente AND v.tenant_id = %s{vac_sql}
+                LEFT JOIN Postulaciones p ON v.id_vacante = p.id_vacante AND p.tenant_id = %s
+                LEFT JOIN Contratados co ON v.id_vacante = co.id_vacante AND co.tenant_id = %s
+                WHERE c.tenant_id = %s
+                GROUP BY c.id_cliente, c.empresa
+                ORDER BY total_postulaciones DESC
+                LIMIT 5
+            """, tuple([self.tenant_id] + vac_params + [self.tenant_id] * 3))
+            return self.cursor.fetchall()
+
+    def candidatos_mas_activos(self) -> List[Dict]:
+        with self.timed('candidatos_mas_activos'):
+            cand_sql, cand_params = self.scope_filter('candidatos', 'a')
+            self.cursor.execute(f"""
+                SELECT
+                    a.nombre_completo as nombre,
+                    a.email,
+                    a.ciudad,
+                    COUNT(DISTINCT p.id_postulacion) as postulaciones,
+                    COUNT(DISTINCT e.id_entrevista) as entrevistas,
+                    COUNT(DISTINCT c.id_contratado) as contrataciones,
+                    AVG(DATEDIFF(COALESCE(c.fecha_contratacion, NOW()), p.fecha_aplicacion)) as tiempoColocacion,
+                    a.skills,
+                    a.ultimo_contacto as ultimaActividad,
+                    a.puntuacion as rating
+                FROM Afiliados a
+                LEFT JOIN Postulaciones p ON a.id_afiliado = p.id_afiliado AND p.tenant_id = %s
+                LEFT JOIN Vacantes v ON p.id_vacante = v.id_vacante
+                LEFT JOIN Entrevistas e ON p.id_postulacion = e.id_postulacion
+                LEFT JOIN Contratados c ON p.id_afiliado = c.id_afiliado AND p.id_vacante = c.id_vacante AND c.tenant_id = %s
+                WHERE a.tenant_id = %s{cand_sql}
+                GROUP BY a.id_afiliado, a.nombre_completo, a.email, a.ciudad, a.skills, a.ultimo_contacto, a.puntuacion
+                HAVING postulaciones > 0
+                ORDER BY postulaciones DESC, rating DESC
+                LIMIT 5
+            """, tuple([self.tenant_id] * 3 + cand_params))
+            return self.cursor.fetchall()
+
+    def skills_demandados(self) -> List[Dict]:
+        with self.timed('skills_demandados'):
+            cand_sql, cand_params = self.scope_filter('candidatos', 'a')
+            self.cursor.execute(f"""
+                SELECT
+                    TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(a.skills, ',', numbers.n), ',', -1)) as skill,
+                    COUNT(*) as demanda,
+                    COUNT(*) as crecimiento
+                FROM Afiliados a
+                CROSS JOIN (
+                    SELECT 1 n UNION SELECT 2 UNION SELECT 3 UNION SELECT 4 UNION SELECT 5 UNION
+                    SELECT 6 UNION SELECT 7 UNION SELECT 8 UNION SELECT 9 UNION SELECT 10
+                ) numbers
+                WHERE a.tenant_id = %s
+                AND a.skills IS NOT NULL
+                AND a.skills != ''
+                AND CHAR_LENGTH(a.skills) - CHAR_LENGTH(REPLACE(a.skills, ',', '')) >= numbers.n - 1{cand_sql}
+                GROUP BY skill
+                HAVING skill != '' AND LENGTH(skill) > 2
+                ORDER BY demanda DESC
+                LIMIT 8
+            """, tuple([self.tenant_id] + cand_params))
+            return self.cursor.fetchall()
+
+    def distribucion_ciudades(self, limit: int = 10) -> Dict:
+        """Total de candidatos visibles y top de ciudades en una sola consulta"""
+        with self.timed('distribucion_ciudades'):
+            cand_sql, cand_params = self.scope_filter('candidatos', 'a')
+            self.cursor.execute(f"""
+                SELECT a.ciudad, COUNT(*) as candidatos
+                FROM Afiliados a
+                WHERE a.tenant_id = %s{cand_sql}
+                GROUP BY a.ciudad
+            """, tuple([self.tenant_id] + cand_params))
+            rows = self.cursor.fetchall()
+
+        total = sum(row['candidatos'] for row in rows)
+        ciudades = sorted(
+            (row for row in rows if row['ciudad']),
+            key=lambda row: row['candidatos'], reverse=True
+        )[:limit]
+        return {
+            'total': total,
+            'ciudades': [
+                {
+                    'ciudad': row['ciudad'],
+                    'candidatos': row['candidatos'],
+                    'porcentaje': round(row['candidatos'] * 100.0 / total, 1) if total > 0 else 0,
+                }
+                for row in ciudades
+            ],
+        }
@@ -0,0 +1,313 @@
+"""
+Agregados diarios precalculados para los endpoints del dashboard.
+
+Dashboard_Daily_Rollups guarda, por tenant, día, métrica y usuario creador
+(owner), el número de filas y el monto asociado. Un job de Celery
+(refresh_dashboard_rollups_task) consolida los días cerrados y avanza
+Dashboard_Rollup_State.rolled_until. Los días posteriores a esa marca (hoy, o
+todo si el job aún no corrió) se leen en vivo con predicados de rango sobre
+índices, así el coste de cargar el dashboard ya no crece con el histórico.
+
+El alcance RBAC se aplica sobre los agregados igual que build_user_filter_condition:
+    - 'todo': todas las filas del tenant
+    - 'asignados': owner = usuario o miembro de su equipo, más las entidades
+      asignadas individualmente (que se cuentan en vivo, son pocas)
+    - 'propio': owner = usuario
+
+Cada pasada incremental recalcula solo los últimos días consolidados. Las
+ediciones o borrados de días anteriores (reasignar owner, borrar candidatos)
+se corrigen en la reconstrucción completa que celery beat lanza cada noche
+(refresh_dashboard_rollups con full=True). Hasta entonces, los totales
+históricos pueden desviarse.
+
+Variables de entorno:
+    DASHBOARD_ROLLUP_RECOMPUTE_DAYS   Días cerrados que se recalculan en cada pasada (default 3)
+    DASHBOARD_ROLLUP_FULL_HOUR        Hora de la reconstrucción completa nocturna (default 3)
+"""
+
+import os
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from permission_service import get_resource_scope
+
+logger = logging.getLogger(__name__)
+
+RECOMPUTE_DAYS = int(os.getenv('DASHBOARD_ROLLUP_RECOMPUTE_DAYS', 3))
+
+# Métricas consolidadas y la consulta de origen de cada una. tenant_filter lleva
+# un %s por cada aparición de tenant_id; resource/owner_col/id_col replican los
+# argumentos que los endpoints pasan a build_user_filter_condition.
+ROLLUP_METRICS = {
+    'candidatos': {
+        'source': 'Afiliados a',
+        'tenant_filter': 'a.tenant_id = %s',
+        'tenant_params': 1,
+        'date_col': 'a.fecha_registro',
+        'owner_col': 'a.created_by_user_id',
+        'id_col': 'a.id_afiliado',
+        'resource': 'candidate',
+        'amount': '0',
+    },
+    'postulaciones': {
+        'source': 'Postulaciones p JOIN Vacantes v ON p.id_vacante = v.id_vacante',
+        'tenant_filter': 'p.tenant_id = %s AND v.tenant_id = %s',
+        'tenant_params': 2,
+        'date_col': 'p.fecha_aplicacion',
+        'owner_col': 'v.created_by_user',
+        'id_col': 'v.id_vacante',
+        'resource': 'vacancy',
+        'amount': '0',
+    },
+    'vacantes': {
+        'source': 'Vacantes v',
+        'tenant_filter': 'v.tenant_id = %s',
+        'tenant_params': 1,
+        'date_col': 'v.fecha_apertura',
+        'owner_col': 'v.created_by_user',
+        'id_col': 'v.id_vacante',
+        'resource': 'vacancy',
+        'amount': '0',
+    },
+    'contrataciones': {
+        'source': 'Contratados c',
+        'tenant_filter': 'c.tenant_id = %s',
+        'tenant_params': 1,
+        'date_col': 'c.fecha_contratacion',
+        'owner_col': 'c.created_by_user',
+        'id_col': 'c.id_contratado',
+        'resource': 'hired',
+        'amount': 'COALESCE(c.tarifa_servicio, 0)',
+    },
+}
+
+
+def months_ago(day: date, months: int) -> date:
+    """Equivalente a DATE_SUB(day, INTERVAL n MONTH) (recorta al último día del mes)"""
+    month_index = day.year * 12 + (day.month - 1) - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    next_month = date(year + (month // 12), month % 12 + 1, 1)
+    last_day = (next_month - timedelta(days=1)).day
+    return date(year, month, min(day.day, last_day))
+
+
+def db_today(cursor) -> date:
+    """CURDATE() del servidor MySQL, para no depender de la zona horaria del proceso"""
+    cursor.execute("SELECT CURDATE() as hoy")
+    row = cursor.fetchone()
+    return row['hoy'] if isinstance(row, dict) else row[0]
+
+
+def get_rolled_until(cursor, tenant_id: int) -> Optional[date]:
+    """Último día consolidado para el tenant, o None si nunca se consolidó"""
+    cursor.execute("SELECT rolled_until FROM Dashboard_Rollup_State WHERE tenant_id = %s", (tenant_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row['rolled_until'] if isinstance(row, dict) else row[0]
+
+
+# =====================================================
+# LECTURA (endpoints)
+# =====================================================
+
+def _owner_condition(scope: str, owner_col: str, user_id: int, tenant_id: int) -> Tuple[str, list]:
+    """Condición 'creado por el usuario o su equipo' sobre una columna de owner"""
+    if scope == 'asignados':
+        return (
+            f"({owner_col} = %s OR {owner_col} IN (SELECT entidad_id FROM Asignaciones_Centrales "
+            f"WHERE usuario_destino = %s AND tipo_entidad = 'usuario' AND tenant_id = %s))",
+            [user_id, user_id, tenant_id]
+        )
+    return f"{owner_col} = %s", [user_id]
+
+
+def _range_condition(column: str, start: Optional[date], end: Optional[date]) -> Tuple[str, list]:
+    """Rango de días [start, end] sargable sobre una columna DATE o DATETIME"""
+    conditions, params = [], []
+    if start is not None:
+        conditions.append(f"{column} >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append(f"{column} < %s")
+        params.append(end + timedelta(days=1))
+    return " AND ".join(conditions), params
+
+
+def _add(series: Dict, dia, total, amount):
+    current = series.get(dia, (0, 0.0))
+    series[dia] = (current[0] + int(total or 0), current[1] + float(amount or 0))
+
+
+def _read_rollups(cursor, metric: str, tenant_id: int, user_id: int, scope: str,
+                  start: Optional[date], end: date, series: Dict):
+    spec = ROLLUP_METRICS[metric]
+    sql = """
+        SELECT dia, SUM(total) as total, SUM(monto) as monto
+        FROM Dashboard_Daily_Rollups
+        WHERE tenant_id = %s AND metrica = %s
+    """
+    params = [tenant_id, metric]
+    range_sql, range_params = _range_condition('dia', start, end)
+    sql += f" AND {range_sql}"
+    params.extend(range_params)
+    if scope != 'todo':
+        owner_sql, owner_params = _owner_condition(scope, 'owner_user_id', user_id, tenant_id)
+        sql += f" AND {owner_sql}"
+        params.extend(owner_params)
+    sql += " GROUP BY dia"
+    cursor.execute(sql, tuple(params))
+    for row in cursor.fetchall():
+        _add(series, row['dia'], row['total'], row['monto'])
+
+    if scope == 'asignados':
+        # Entidades asignadas una a una cuyo owner no es el usuario ni su equipo
+        owner_sql, owner_params = _owner_condition(scope, spec['owner_col'], user_id, tenant_id)
+        range_sql, range_params = _range_condition(spec['date_col'], start, end)
+        sql = f"""
+            SELECT DATE({spec['date_col']}) as dia, COUNT(*) as total, SUM({spec['amount']}) as monto
+            FROM {spec['source']}
+            WHERE {spec['tenant_filter']}
+              AND {spec['id_col']} IN (SELECT entidad_id FROM Asignaciones_Centrales
+                                       WHERE usuario_destino = %s AND tipo_entidad = %s AND tenant_id = %s)
+              AND ({spec['owner_col']} IS NULL OR NOT {owner_sql})
+              AND {range_sql}
+            GROUP BY DATE({spec['date_col']})
+        """
+        params = [tenant_id] * spec['tenant_params'] + [user_id, spec['resource'], tenant_id] + owner_params + range_params
+        cursor.execute(sql, tuple(params))
+        for row in cursor.fetchall():
+            _add(series, row['dia'], row['total'], row['monto'])
+
+
+def _read_live(cursor, metric: str, tenant_id: int, user_id: int, scope: str,
+               start: Optional[date], end: Optional[date], include_undated: bool, series: Dict):
+    """Filas no consolidadas, con el mismo filtro que build_user_filter_condition"""
+    spec = ROLLUP_METRICS[metric]
+    sql = f"""
+        SELECT DATE({spec['date_col']}) as dia, COUNT(*) as total, SUM({spec['amount']}) as monto
+        FROM {spec['source']}
+        WHERE {spec['tenant_filter']}
+    """
+    params = [tenant_id] * spec['tenant_params']
+
+    range_sql, range_params = _range_condition(spec['date_col'], start, end)
+    if range_sql and include_undated:
+        sql += f" AND (({range_sql}) OR {spec['date_col']} IS NULL)"
+    elif range_sql:
+        sql += f" AND {range_sql}"
+    params.extend(range_params)
+
+    if scope == 'asignados':
+        owner_sql, owner_params = _owner_condition(scope, spec['owner_col'], user_id, tenant_id)
+        sql += f""" AND ({owner_sql} OR {spec['id_col']} IN (SELECT entidad_id FROM Asignaciones_Centrales
+                                                   WHERE usuario_destino = %s AND tipo_entidad = %s AND tenant_id = %s))"""
+        params.extend(owner_params + [user_id, spec['resource'], tenant_id])
+    elif scope == 'propio':
+        sql += f" AND {spec['owner_col']} = %s"
+        params.append(user_id)
+
+    sql += f" GROUP BY DATE({spec['date_col']})"
+    cursor.execute(sql, tuple(params))
+    for row in cursor.fetchall():
+        _add(series, row['dia'], row['total'], row['monto'])
+
+
+def _collect(cursor, metric: str, tenant_id: int, user_id: int,
+             start: Optional[date], end: Optional[date], include_undated: bool) -> Dict:
+    scope = get_resource_scope(user_id, tenant_id, ROLLUP_METRICS[metric]['resource'])
+    rolled_until = get_rolled_until(cursor, tenant_id)
+    series = {}
+
+    live_start = start
+    if rolled_until is not None and (start is None or start <= rolled_until):
+        rollup_end = rolled_until if end is None else min(end, rolled_until)
+        _read_rollups(cursor, metric, tenant_id, user_id, scope, start, rollup_end, series)
+        live_start = rolled_until + timedelta(days=1)
+
+    if end is None or live_start is None or live_start <= end:
+        _read_live(cursor, metric, tenant_id, user_id, scope, live_start, end, include_undated, series)
+    return series
+
+
+def daily_series(cursor, metric: str, tenant_id: int, user_id: int,
+                 start: Optional[date], end: Optional[date] = None) -> List[Dict]:
+    """
+    Serie diaria [{'dia', 'total', 'monto'}] ordenada, solo con días que tienen filas.
+    start/end son inclusivos; None deja el extremo abierto.
+    """
+    series = _collect(cursor, metric, tenant_id, user_id, start, end, include_undated=False)
+    days = sorted(dia for dia in series if dia is not None)
+    return [{'dia': dia, 'total': series[dia][0], 'monto': series[dia][1]} for dia in days]
+
+
+def metric_total(cursor, metric: str, tenant_id: int, user_id: int,
+                 start: Optional[date] = None, end: Optional[date] = None) -> Dict:
+    """
+    Total {'total', 'monto'} de la métrica en [start, end]. Sin start ni end
+    equivale a COUNT(*) sobre toda la tabla, incluidas las filas sin fecha.
+    """
+    include_undated = start is None and end is None
+    series = _collect(cursor, metric, tenant_id, user_id, start, end, include_undated)
+    return {
+        'total': sum(total for total, _ in series.values()),
+        'monto': sum(monto for _, monto in series.values()),
+    }
+
+
+# =====================================================
+# CONSOLIDACIÓN (job de Celery)
+# =====================================================
+
+def refresh_tenant_rollups(conn, tenant_id: int, full: bool = False,
+                           recompute_days: int = RECOMPUTE_DAYS) -> Dict:
+    """
+    Consolida los días cerrados (hasta ayer) de un tenant.
+
+    Sin full, recalcula solo los últimos recompute_days días ya consolidados más
+    los nuevos, para absorber ediciones tardías. Con full (o en la primera
+    pasada) reconstruye todo el histórico del tenant.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        yesterday = db_today(cursor) - timedelta(days=1)
+        rolled_until = None if full else get_rolled_until(cursor, tenant_id)
+        start = None if rolled_until is None else min(
+            rolled_until - timedelta(days=recompute_days - 1), yesterday
+        )
+
+        delete_sql = "DELETE FROM Dashboard_Daily_Rollups WHERE tenant_id = %s"
+        delete_params = [tenant_id]
+        if start is not None:
+            delete_sql += " AND dia >= %s"
+            delete_params.append(start)
+        cursor.execute(delete_sql, tuple(delete_params))
+
+        rows = 0
+        for metric, spec in ROLLUP_METRICS.items():
+            range_sql, range_params = _range_condition(spec['date_col'], start, yesterday)
+            cursor.execute(f"""
+                INSERT INTO Dashboard_Daily_Rollups (tenant_id, dia, metrica, owner_user_id, total, monto)
+                SELECT %s, DATE({spec['date_col']}), %s, COALESCE({spec['owner_col']}, 0),
+                       COUNT(*), SUM({spec['amount']})
+                FROM {spec['source']}
+                WHERE {spec['tenant_filter']} AND {range_sql}
+                GROUP BY DATE({spec['date_col']}), COALESCE({spec['owner_col']}, 0)
+            """, tuple([tenant_id, metric] + [tenant_id] * spec['tenant_params'] + range_params))
+            rows += cursor.rowcount
+
+        cursor.execute("""
+            INSERT INTO Dashboard_Rollup_State (tenant_id, rolled_until)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE rolled_until = VALUES(rolled_until)
+        """, (tenant_id, yesterday))
+
+        conn.commit()
+        return {'tenant_id': tenant_id, 'desde': start, 'hasta': yesterday, 'filas': rows}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -81,6 +81,94 @@ class DatabaseMigrations:
             'description': 'Creación de la nueva estructura de tablas para el Sistema de Permisos V3',
             'execute': self._migration_008_unified_permissions
         })
+
+        # Migración 9: Índice FULLTEXT para búsqueda de candidatos
+        self.migrations.append({
+            'id': 9,
+            'name': 'add_afiliados_fulltext_search_index',
+            'description': 'Crear índice FULLTEXT ft_afiliados_busqueda sobre las columnas de texto de Afiliados',
+            'execute': self._migration_009_candidate_fulltext
+        })
+
+        # Migración 10: Índice para paginación por cursor de candidatos
+        self.migrations.append({
+            'id': 10,
+            'name': 'add_afiliados_keyset_index',
+            'description': 'Crear índice (tenant_id, fecha_registro, id_afiliado) en Afiliados para paginación keyset',
+            'execute': self._migration_010_candidate_keyset_index
+        })
+
+        # Migración 11: Agregados diarios del dashboard
+        self.migrations.append({
+            'id': 11,
+            'name': 'create_dashboard_daily_rollups',
+            'description': 'Crear Dashboard_Daily_Rollups, Dashboard_Rollup_State e índices por fecha para el tramo en vivo',
+            'execute': self._migration_011_dashboard_rollups
+        })
+        
+        # Migración 12: Índice de detección de duplicados
+        self.migrations.append({
+            'id': 12,
+            'name': 'create_candidate_duplicate_index',
+            'description': 'Crear Afiliados_Claves_Duplicados y llenarla con los candidatos existentes',
+            'execute': self._migration_012_duplicate_index
+        })
+        
+        # Migración 13: Caché de extracción y parseo de CVs
+        self.migrations.append({
+            'id': 13,
+            'name': 'create_cv_parse_cache',
+            'description': 'Crear CV_Parse_Cache (texto extraído y respuesta de Gemini por SHA-256 del archivo)',
+            'execute': self._migration_013_cv_parse_cache
+        })
+        
+        # Migración 14: Caché de PARs de CVs
+        self.migrations.append({
+            'id': 14,
+            'name': 'create_cv_par_cache',
+            'description': 'Crear CV_PAR_Cache (URL de PAR vigente por objeto de OCI)',
+            'execute': self._migration_014_cv_par_cache
+        })
+        
+        # Migración 15: Candidatos pendientes de recalcular puntuación
+        self.migrations.append({
+            'id': 15,
+            'name': 'create_score_dirty_set',
+            'description': 'Crear Afiliados_Puntuacion_Pendiente (candidatos con cambios que afectan su puntuación)',
+            'execute': self._migration_015_score_dirty_set
+        })
+        
+        # Migración 16: Mensajes de campañas de WhatsApp
+        self.migrations.append({
+            'id': 16,
+            'name': 'create_whatsapp_campaign_messages',
+            'description': 'Crear WhatsApp_Campaign_Messages (un mensaje por destinatario con su estado de envío)',
+            'execute': self._migration_016_whatsapp_campaign_messages
+        })
+        
+        # Migración 17: Borrado en cascada de las claves de duplicados
+        self.migrations.append({
+            'id': 17,
+            'name': 'duplicate_index_cascade_delete',
+            'description': 'FK de Afiliados_Claves_Duplicados a Afiliados con ON DELETE CASCADE',
+            'execute': self._migration_017_duplicate_index_cascade
+        })
+        
+        # Migración 18: Reclamo de jobs del pipeline de CVs
+        self.migrations.append({
+            'id': 18,
+            'name': 'create_cv_pipeline_jobs',
+            'description': 'Crear CV_Pipeline_Jobs (un job por tenant e Idempotency-Key)',
+            'execute': self._migration_018_cv_pipeline_jobs
+        })
+        
+        # Migración 19: Reclamo de mensajes de campañas de WhatsApp
+        self.migrations.append({
+            'id': 19,
+            'name': 'whatsapp_campaign_message_claim',
+            'description': "Estado 'sending', claim_id y claimed_at en WhatsApp_Campaign_Messages",
+            'execute': self._migration_019_whatsapp_campaign_claim
+        })
     
     def _create_migrations_table(self, conn):
         """Crear tabla para trackear migraciones ejecutadas"""
@@ -694,6 +782,378 @@ class DatabaseMigrations:
         cursor.close()
         logger.info("   ✅ Tablas Permisos_Unificados y Asignaciones_Centrales creadas exitosamente")
 
+    def _migration_009_candidate_fulltext(self, conn):
+        """
+        Migración 009: Índice FULLTEXT para búsqueda de candidatos
+        Indexa las columnas de texto de Afiliados usadas por candidate_search.py.
+        Si el índice no se puede crear la búsqueda sigue funcionando con LIKE.
+        """
+        from candidate_search import FULLTEXT_INDEX_NAME, FULLTEXT_COLUMNS
+        
+        cursor = conn.cursor()
+        
+        logger.info("   🔍 Creando índice FULLTEXT de búsqueda en Afiliados...")
+        
+        cursor.execute("""
+            SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'Afiliados'
+              AND INDEX_NAME = %s
+            LIMIT 1
+        """, (FULLTEXT_INDEX_NAME,))
+        
+        if cursor.fetchone() is not None:
+            logger.info(f"   ⏭️  Índice {FULLTEXT_INDEX_NAME} ya existe")
+            cursor.close()
+            return
+        
+        # Solo columnas de texto existentes (FULLTEXT no admite otros tipos)
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'Afiliados'
+              AND DATA_TYPE IN ('char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext')
+        """)
+        existing = {row[0] for row in cursor.fetchall()}
+        columns = [col for col in FULLTEXT_COLUMNS if col in existing]
+        
+        if not columns:
+            logger.warning("   ⚠️  Afiliados no tiene columnas de texto indexables, se omite el índice")
+            cursor.close()
+            return
+        
+        try:
+            # InnoDB mantiene el índice en cada INSERT/UPDATE de Afiliados
+            cursor.execute(f"""
+                ALTER TABLE Afiliados
+                ADD FULLTEXT INDEX {FULLTEXT_INDEX_NAME} ({', '.join(columns)})
+            """)
+            logger.info(f"   ✅ Índice {FULLTEXT_INDEX_NAME} creado sobre: {', '.join(columns)}")
+        except mysql.connector.Error as e:
+            # Por ejemplo, columnas con colaciones distintas entre sí
+            logger.warning(f"   ⚠️  No se pudo crear el índice FULLTEXT, la búsqueda usará LIKE: {str(e)}")
+        
+        conn.commit()
+        cursor.close()
+
+    def _migration_010_candidate_keyset_index(self, conn):
+        """
+        Migración 010: Índice para paginación keyset de candidatos
+        Permite que ORDER BY fecha_registro, id_afiliado + condición de cursor
+        lea solo las filas de la página dentro de cada tenant.
+        """
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'Afiliados'
+              AND INDEX_NAME = 'idx_afiliados_tenant_fecha_id'
+            LIMIT 1
+        """)
+        
+        if cursor.fetchone() is not None:
+            logger.info("   ⏭️  Índice idx_afiliados_tenant_fecha_id ya existe")
+        else:
+            cursor.execute("""
+                CREATE INDEX idx_afiliados_tenant_fecha_id
+                ON Afiliados(tenant_id, fecha_registro, id_afiliado)
+            """)
+            logger.info("   ✅ Índice idx_afiliados_tenant_fecha_id creado")
+        
+        conn.commit()
+        cursor.close()
+
+    def _migration_011_dashboard_rollups(self, conn):
+        """
+        Migración 011: Agregados diarios del dashboard
+        Tablas que mantiene refresh_dashboard_rollups (celery_tasks) y los
+        índices (tenant_id, fecha) que usan las lecturas en vivo de los días
+        aún no consolidados.
+        """
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Dashboard_Daily_Rollups (
+                tenant_id INT NOT NULL,
+                dia DATE NOT NULL,
+                metrica VARCHAR(40) NOT NULL,
+                owner_user_id INT NOT NULL DEFAULT 0,
+                total INT NOT NULL DEFAULT 0,
+                monto DECIMAL(14,2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (tenant_id, metrica, dia, owner_user_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        logger.info("   ✅ Tabla Dashboard_Daily_Rollups verificada")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS Dashboard_Rollup_State (
+                tenant_id INT PRIMARY KEY,
+                rolled_until DATE NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        logger.info("   ✅ Tabla Dashboard_Rollup_State verificada")
+        
+        indexes = [
+            ('Postulaciones', 'idx_postulaciones_tenant_fecha', 'tenant_id, fecha_aplicacion'),
+            ('Contratados', 'idx_contratados_tenant_fecha', 'tenant_id, fecha_contratacion'),
+            ('Vacantes', 'idx_vacantes_tenant_fecha', 'tenant_id, fecha_apertura'),
+        ]
+        for table, index_name, columns in indexes:
+            cursor.execute("""
+                SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE()
+                  AND TABLE_NAME = %s
+                  AND INDEX_NAME = %s
+                LIMIT 1
+            """, (table, index_name))
+            
+            if cursor.fetchone() is not None:
+                logger.info(f"   ⏭️  Índice {index_name} ya existe")
+                continue
+            
+            cursor.execute(f"CREATE INDEX {index_name} ON {table}({columns})")
+            logger.info(f"   ✅ Índice {index_name} creado")
+        
+        conn.commit()
+        cursor.close()
+
+    def _migration_012_duplicate_index(self, conn):
+        """
+        Migración 012: Índice de detección de duplicados
+        Claves normalizadas (email, identidad, teléfono, nombre fonético) que
+        usa CVDuplicateDetector para buscar duplicados sin recorrer todos los
+        Afiliados del tenant (ver duplicate_index.py).
+        """
+        from duplicate_index import INDEX_TABLE, rebuild_index
+        
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {INDEX_TABLE} (
+                tenant_id INT NOT NULL,
+                tipo ENUM('email', 'identidad', 'telefono', 'nombre') NOT NULL,
+                valor VARCHAR(191) NOT NULL,
+                id_afiliado INT NOT NULL,
+                PRIMARY KEY (tenant_id, tipo, valor, id_afiliado),
+                INDEX idx_claves_duplicados_afiliado (tenant_id, id_afiliado)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        conn.commit()
+        cursor.close()
+        logger.info(f"   ✅ Tabla {INDEX_TABLE} verificada")
+        
+        indexed = rebuild_index(conn)
+        logger.info(f"   ✅ {indexed} candidatos indexados")
+
+    def _migration_013_cv_parse_cache(self, conn):
+        """
+        Migración 013: Caché de extracción y parseo de CVs
+        Una fila por archivo (SHA-256 de sus bytes) con el texto extraído y la
+        respuesta de Gemini; el parseo se busca por text_hash y la expulsión
+        LRU usa last_used_at (ver cv_cache.py).
+        """
+        from cv_cache import CACHE_TABLE
+        
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+                content_hash CHAR(64) NOT NULL PRIMARY KEY,
+                extract_version VARCHAR(16) NOT NULL,
+                text_hash CHAR(64) NOT NULL,
+                extracted_text MEDIUMTEXT NOT NULL,
+                parse_version VARCHAR(16) NULL,
+                parsed_json MEDIUMTEXT NULL,
+                size_bytes INT NOT NULL DEFAULT 0,
+                hits INT NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_cv_cache_text (text_hash, parse_version),
+                INDEX idx_cv_cache_lru (last_used_at)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        conn.commit()
+        cursor.close()
+        logger.info(f"   ✅ Tabla {CACHE_TABLE} verificada")
+    
+    def _migration_014_cv_par_cache(self, conn):
+        """
+        Migración 014: Caché de PARs de CVs
+        Una fila por object_key con la PAR vigente y su vencimiento; se reemite
+        cuando queda poca vigencia (ver cv_par_cache.py).
+        """
+        from cv_par_cache import PAR_TABLE
+        
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PAR_TABLE} (
+                object_key VARCHAR(512) NOT NULL PRIMARY KEY,
+                par_id VARCHAR(512) NOT NULL,
+                access_uri TEXT NOT NULL,
+                expires_at DATETIME NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        conn.commit()
+        cursor.close()
+        logger.info(f"   ✅ Tabla {PAR_TABLE} verificada")
+    
+    def _migration_015_score_dirty_set(self, conn):
+        """
+        Migración 015: Candidatos pendientes de recalcular puntuación
+        Una fila por candidato marcado; rescore_dirty_candidates la borra al
+        recalcularlo (ver candidate_scoring.py).
+        """
+        from candidate_scoring import DIRTY_TABLE
+        
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (
+                id_afiliado INT NOT NULL PRIMARY KEY,
+                motivo VARCHAR(50) NULL,
+                marked_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+                INDEX idx_puntuacion_pendiente_marked (marked_at)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        conn.commit()
+        cursor.close()
+        logger.info(f"   ✅ Tabla {DIRTY_TABLE} verificada")
+    
+    def _migration_016_whatsapp_campaign_messages(self, conn):
+        """
+        Migración 016: Mensajes de campañas de WhatsApp
+        Una fila por destinatario; dispatch_whatsapp_campaign los envía por lotes
+        y actualiza su estado (ver whatsapp_campaigns.py).
+        """
+        from whatsapp_campaigns import CAMPAIGN_TABLE
+        
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CAMPAIGN_TABLE} (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                campaign_id CHAR(32) NOT NULL,
+                tenant_id INT NOT NULL,
+                id_afiliado INT NOT NULL,
+                telefono VARCHAR(20) NOT NULL,
+                mensaje TEXT NOT NULL,
+                status ENUM('pending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+                attempts TINYINT UNSIGNED NOT NULL DEFAULT 0,
+                error VARCHAR(255) NULL,
+                created_by INT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at DATETIME NULL,
+                INDEX idx_campaign_status (campaign_id, status, id),
+                INDEX idx_campaign_tenant (tenant_id, created_at)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        conn.commit()
+        cursor.close()
+        logger.info(f"   ✅ Tabla {CAMPAIGN_TABLE} verificada")
+
+    def _migration_017_duplicate_index_cascade(self, conn):
+        """
+        Migración 017: Borrado en cascada de las claves de duplicados
+        Al borrar un candidato sus claves se borran con él; sin esto quedaban
+        claves huérfanas que seguían apareciendo en los bloques.
+        """
+        from duplicate_index import INDEX_TABLE
+        
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT 1 FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = %s
+              AND CONSTRAINT_NAME = 'fk_claves_duplicados_afiliado'
+            LIMIT 1
+        """, (INDEX_TABLE,))
+        
+        if cursor.fetchone() is not None:
+            logger.info("   ⏭️  FK fk_claves_duplicados_afiliado ya existe")
+            cursor.close()
+            return
+        
+        # Las claves de candidatos ya borrados impedirían crear la FK
+        cursor.execute(f"""
+            DELETE k FROM {INDEX_TABLE} k
+            LEFT JOIN Afiliados a ON a.id_afiliado = k.id_afiliado
+            WHERE a.id_afiliado IS NULL
+        """)
+        logger.info(f"   🧹 {cursor.rowcount} claves huérfanas eliminadas")
+        
+        cursor.execute(f"""
+            ALTER TABLE {INDEX_TABLE}
+            ADD CONSTRAINT fk_claves_duplicados_afiliado
+            FOREIGN KEY (id_afiliado) REFERENCES Afiliados(id_afiliado) ON DELETE CASCADE
+        """)
+        conn.commit()
+        cursor.close()
+        logger.info(f"   ✅ FK de {INDEX_TABLE} a Afiliados creada")
+
+    def _migration_018_cv_pipeline_jobs(self, conn):
+        """
+        Migración 018: Reclamo de jobs del pipeline de CVs
+        La clave primaria (tenant_id, job_id) garantiza que un job se registra
+        una sola vez aunque lleguen dos peticiones con el mismo Idempotency-Key
+        (ver cv_pipeline.create_job).
+        """
+        from cv_pipeline import JOB_TABLE
+        
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {JOB_TABLE} (
+                tenant_id INT NOT NULL,
+                job_id VARCHAR(100) NOT NULL,
+                user_id INT NULL,
+                repeticiones INT NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (tenant_id, job_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        conn.commit()
+        cursor.close()
+        logger.info(f"   ✅ Tabla {JOB_TABLE} verificada")
+
+    def _migration_019_whatsapp_campaign_claim(self, conn):
+        """
+        Migración 019: Reclamo de mensajes de campañas de WhatsApp
+        dispatch_campaign pasa los mensajes de 'pending' a 'sending' con un
+        UPDATE antes de enviarlos, así dos pasadas de la misma campaña nunca
+        envían el mismo mensaje (ver whatsapp_campaigns._claim_batch).
+        """
+        from whatsapp_campaigns import CAMPAIGN_TABLE
+        
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = %s
+              AND COLUMN_NAME = 'claim_id'
+        """, (CAMPAIGN_TABLE,))
+        
+        if cursor.fetchone() is not None:
+            logger.info(f"   ⏭️  Columna 'claim_id' ya existe en {CAMPAIGN_TABLE}")
+            cursor.close()
+            return
+        
+        cursor.execute(f"""
+            ALTER TABLE {CAMPAIGN_TABLE}
+            MODIFY COLUMN status ENUM('pending', 'sending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+            ADD COLUMN claim_id CHAR(32) NULL AFTER status,
+            ADD COLUMN claimed_at DATETIME NULL AFTER claim_id,
+            ADD INDEX idx_campaign_claim (claim_id)
+        """)
+        conn.commit()
+        cursor.close()
+        logger.info(f"   ✅ Reclamo de mensajes añadido a {CAMPAIGN_TABLE}")
+
 # Función helper para ejecutar migraciones desde app.py
 def run_database_migrations(db_config):
     """
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de conexiones MySQL compartido por proceso.
+
+Cada worker de gunicorn (y cada worker de Celery) mantiene su propio pool,
+creado de forma perezosa la primera vez que se pide una conexión. Las
+conexiones se entregan envueltas en un proxy cuyo close() las devuelve al
+pool en lugar de cerrar el socket, así el código existente que hace
+`conn = get_db_connection() ... conn.close()` no necesita cambios.
+
+Variables de entorno:
+    DB_POOL_SIZE                   Conexiones máximas por proceso (default 8)
+    DB_POOL_MAX_LIFETIME           Segundos antes de reciclar una conexión (default 1800)
+    DB_POOL_BORROW_TIMEOUT         Segundos máximos esperando una conexión libre (default 10)
+    DB_POOL_HEALTHCHECK_INTERVAL   Segundos inactiva antes de hacer ping al prestarla (default 30)
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+
+try:
+    import mysql.connector
+    MYSQL_AVAILABLE = True
+except ImportError:
+    mysql = None
+    MYSQL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhaustedError(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera."""
+
+
+class _PooledConnection:
+    """
+    Proxy sobre una conexión real. Delega todo en la conexión subyacente
+    excepto close(), que la devuelve al pool.
+    """
+
+    def __init__(self, pool, raw_conn, created_at):
+        self._pool = pool
+        self._raw = raw_conn
+        self._created_at = created_at
+        self._released = False
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+        self._raw = None
+
+    def is_connected(self):
+        if self._released:
+            return False
+        return self._raw.is_connected()
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise mysql.connector.errors.InterfaceError("La conexión ya fue devuelta al pool")
+        return getattr(raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Red de seguridad para conexiones que el código olvida cerrar
+        try:
+            if not self._released and self._raw is not None:
+                self.close()
+        except Exception:
+            pass
+
+
+class DatabaseConnectionPool:
+    """Pool acotado con health checks, reciclaje por antigüedad y métricas de préstamo."""
+
+    def __init__(self, connect_kwargs, size=8, max_lifetime=1800,
+                 borrow_timeout=10, healthcheck_interval=30):
+        self.connect_kwargs = connect_kwargs
+        self.size = max(1, int(size))
+        self.max_lifetime = max_lifetime
+        self.borrow_timeout = borrow_timeout
+        self.healthcheck_interval = healthcheck_interval
+
+        # Cada elemento: (conexión, creada_en, devuelta_en)
+        self._idle = queue.LifoQueue()
+        # Un permiso por conexión que puede existir al mismo tiempo
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'recycled': 0,
+            'healthcheck_failures': 0,
+            'borrows': 0,
+            'borrow_timeouts': 0,
+            'borrow_wait_total_ms': 0.0,
+            'borrow_wait_max_ms': 0.0,
+            'in_use': 0,
+        }
+
+    def _new_connection(self):
+        conn = mysql.connector.connect(**self.connect_kwargs)
+        with self._lock:
+            self._stats['created'] += 1
+        return conn, time.monotonic()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def get_connection(self):
+        """Presta una conexión del pool, creando una nueva si hace falta."""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.borrow_timeout):
+            with self._lock:
+                self._stats['borrow_timeouts'] += 1
+            raise PoolExhaustedError(
+                f"Sin conexiones libres tras {self.borrow_timeout}s (pool de {self.size})"
+            )
+
+        try:
+            conn, created_at = self._checkout_idle()
+            if conn is None:
+                conn, created_at = self._new_connection()
+        except Exception:
+            self._slots.release()
+            raise
+
+        wait_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            self._stats['borrows'] += 1
+            self._stats['in_use'] += 1
+            self._stats['borrow_wait_total_ms'] += wait_ms
+            self._stats['borrow_wait_max_ms'] = max(self._stats['borrow_wait_max_ms'], wait_ms)
+
+        return _PooledConnection(self, conn, created_at)
+
+    def _checkout_idle(self):
+        """Toma una conexión inactiva válida o (None, None) si no hay ninguna."""
+        now = time.monotonic()
+        while True:
+            try:
+                conn, created_at, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                return None, None
+
+            if self.max_lifetime and now - created_at > self.max_lifetime:
+                with self._lock:
+                    self._stats['recycled'] += 1
+                self._discard(conn)
+                continue
+
+            if now - returned_at > self.healthcheck_interval:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    with self._lock:
+                        self._stats['healthcheck_failures'] += 1
+                    self._discard(conn)
+                    continue
+
+            return conn, created_at
+
+    def _release(self, conn, created_at):
+        """Devuelve una conexión al pool dejando la sesión limpia."""
+        try:
+            reusable = conn.is_connected()
+            if reusable:
+                if getattr(conn, 'unread_result', False):
+                    conn.consume_results()
+                # Cerrar cualquier transacción implícita para que el siguiente
+                # préstamo no herede un snapshot de REPEATABLE READ
+                conn.rollback()
+        except Exception as e:
+            logger.warning(f"Descartando conexión del pool al devolverla: {e}")
+            reusable = False
+
+        if reusable and self.max_lifetime and time.monotonic() - created_at > self.max_lifetime:
+            with self._lock:
+                self._stats['recycled'] += 1
+            reusable = False
+
+        if reusable:
+            self._idle.put((conn, created_at, time.monotonic()))
+        else:
+            self._discard(conn)
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+        self._slots.release()
+
+    def close_all(self):
+        """Cierra todas las conexiones inactivas (las prestadas se cierran al devolverse)."""
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = self.size
+        stats['idle'] = self._idle.qsize()
+        stats['borrow_wait_avg_ms'] = (
+            round(stats['borrow_wait_total_ms'] / stats['borrows'], 3) if stats['borrows'] else 0.0
+        )
+        return stats
+
+
+# =====================================================
+# POOL GLOBAL POR PROCESO
+# =====================================================
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _connect_kwargs_from_env():
+    return {
+        'host': os.getenv('DB_HOST'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'port': int(os.getenv('DB_PORT', 3306)),
+        'database': os.getenv('DB_NAME'),
+        'charset': 'utf8mb4',
+        'collation': 'utf8mb4_unicode_ci',
+    }
+
+
+def get_pool():
+    """Devuelve el pool del proceso actual, creándolo tras un fork si es necesario."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            # Tras un fork no se reutilizan sockets heredados del proceso padre
+            _pool = DatabaseConnectionPool(
+                _connect_kwargs_from_env(),
+                size=int(os.getenv('DB_POOL_SIZE', 8)),
+                max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+                borrow_timeout=float(os.getenv('DB_POOL_BORROW_TIMEOUT', 10)),
+                healthcheck_interval=float(os.getenv('DB_POOL_HEALTHCHECK_INTERVAL', 30)),
+            )
+            _pool_pid = pid
+            logger.info(f"Pool de conexiones MySQL creado (pid {pid}, tamaño {_pool.size})")
+    return _pool
+
+
+def get_connection():
+    """Obtiene una conexión del pool del proceso. Lanza excepción si falla."""
+    if not MYSQL_AVAILABLE:
+        raise ImportError("mysql-connector-python no está instalado")
+    return get_pool().get_connection()
+
+
+def get_pool_stats():
+    """Métricas del pool del proceso actual (vacío si aún no se ha creado)."""
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    return _pool.get_stats()
@@ -0,0 +1,290 @@
+"""
+Índice de detección de duplicados de candidatos.
+
+La tabla Afiliados_Claves_Duplicados guarda, por candidato, claves
+normalizadas que permiten encontrar posibles duplicados con una consulta
+indexada en lugar de leer todos los Afiliados del tenant:
+    - email       email en minúsculas
+    - identidad   solo dígitos (0801-1990-12345 == 0801199012345)
+    - telefono    los 8 dígitos locales y sus variantes con un dígito menos;
+                  dos números a una edición de distancia comparten clave
+    - nombre      pares de códigos fonéticos de las palabras del nombre
+                  ('gonzalez' y 'gonsales' dan el mismo código)
+
+Las claves solo forman bloques de candidatos: la comparación fina
+(SequenceMatcher) la sigue haciendo CVDuplicateDetector dentro de cada bloque.
+Las claves exactas (email, identidad, teléfono completo) no se acotan; cada
+clave de bloque se acota por separado a MAX_BLOCK_SIZE candidatos.
+
+El índice se actualiza con reindex_candidates después de cada INSERT/UPDATE
+de nombre, email, teléfono o identidad en Afiliados. La migración 012 lo
+llena con los candidatos existentes; rebuild_index sirve para reconstruirlo.
+"""
+
+import re
+import logging
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_TABLE = 'Afiliados_Claves_Duplicados'
+KEY_TYPES = ('email', 'identidad', 'telefono', 'nombre')
+MAX_NAME_TOKENS = 4
+MAX_BLOCK_SIZE = 500
+BATCH_SIZE = 500
+BLOCK_QUERY_KEYS = 200
+
+# Reglas de pronunciación en español, aplicadas en orden
+_PHONETIC_RULES = [
+    (r'll', 'y'), (r'ch', 'x'), (r'qu', 'k'), (r'c(?=[ei])', 's'), (r'g(?=[ei])', 'j'), (r'gu(?=[ei])', 'g'),
+    (r'h', ''), (r'v', 'b'), (r'z', 's'), (r'c', 'k'), (r'w', 'u'), (r'y$', 'i'),
+]
+
+
+def normalize_phone(phone: str) -> str:
+    """Teléfono con prefijo internacional (+504 para números locales de 8 dígitos)"""
+    if not phone:
+        return ""
+
+    # Remover caracteres no numéricos excepto +
+    phone = re.sub(r'[^\d\+]', '', str(phone))
+
+    # Agregar + si no está presente
+    if not phone.startswith('+'):
+        if len(phone) == 8:  # Número local
+            phone = '+504' + phone
+        elif len(phone) == 11 and phone.startswith('504'):
+            phone = '+' + phone
+
+    return phone
+
+
+def normalize_name(name: str) -> str:
+    """Nombre en minúsculas, sin acentos ni caracteres especiales"""
+    if not name:
+        return ""
+
+    name = str(name).lower()
+    name = re.sub(r'[áàäâ]', 'a', name)
+    name = re.sub(r'[éèëê]', 'e', name)
+    name = re.sub(r'[íìïî]', 'i', name)
+    name = re.sub(r'[óòöô]', 'o', name)
+    name = re.sub(r'[úùüû]', 'u', name)
+    name = re.sub(r'[ñ]', 'n', name)
+
+    # Remover caracteres especiales
+    name = re.sub(r'[^\w\s]', '', name)
+
+    # Normalizar espacios
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+def normalize_email(email: str) -> str:
+    return str(email).strip().lower() if email else ""
+
+
+def normalize_identity(identidad: str) -> str:
+    return re.sub(r'\D', '', str(identidad)) if identidad else ""
+
+
+def phonetic_code(word: str) -> str:
+    """Primera letra más las consonantes según su sonido (sin vocales ni repetidas)"""
+    for pattern, replacement in _PHONETIC_RULES:
+        word = re.sub(pattern, replacement, word)
+    word = re.sub(r'(.)\1+', r'\1', word)
+    if not word:
+        return ""
+    return word[0] + re.sub(r'[aeiou]', '', word[1:])
+
+
+def phone_keys(phone: str) -> Set[str]:
+    """Número local de 8 dígitos y sus variantes con un dígito eliminado"""
+    digits = normalize_phone(phone).lstrip('+')
+    if len(digits) < 7:
+        return set()
+    local = digits[-8:]
+    return {local} | {local[:i] + local[i + 1:] for i in range(len(local))}
+
+
+def name_keys(name: str) -> Set[str]:
+    """Pares de códigos fonéticos de las primeras palabras del nombre (o el único código)"""
+    codes = []
+    for word in normalize_name(name).split()[:MAX_NAME_TOKENS]:
+        code = phonetic_code(word)
+        if len(word) > 1 and code and code not in codes:
+            codes.append(code)
+    if len(codes) == 1:
+        return set(codes)
+    return {' '.join(sorted(pair)) for pair in combinations(codes, 2)}
+
+
+def candidate_keys(nombre_completo=None, email=None, telefono=None, identidad=None) -> Set[Tuple[str, str]]:
+    """Claves (tipo, valor) de un candidato"""
+    keys = set()
+    if normalize_email(email):
+        keys.add(('email', normalize_email(email)[:191]))
+    if normalize_identity(identidad):
+        keys.add(('identidad', normalize_identity(identidad)[:191]))
+    keys.update(('telefono', key) for key in phone_keys(telefono))
+    keys.update(('nombre', key[:191]) for key in name_keys(nombre_completo))
+    return keys
+
+
+def _values(row) -> tuple:
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def reindex_candidates(cursor, tenant_id: int, ids: Optional[Iterable[int]] = None,
+                       emails: Optional[Iterable[str]] = None):
+    """
+    Recalcula las claves de los candidatos indicados por id o por email a partir
+    de Afiliados. Se llama dentro de la misma transacción que el INSERT/UPDATE.
+    """
+    ids, emails = list(ids or []), list(emails or [])
+    for start in range(0, max(len(ids), len(emails)), BATCH_SIZE):
+        id_chunk = ids[start:start + BATCH_SIZE]
+        email_chunk = emails[start:start + BATCH_SIZE]
+        conditions, params = [], [tenant_id]
+        if id_chunk:
+            conditions.append(f"id_afiliado IN ({', '.join(['%s'] * len(id_chunk))})")
+            params.extend(id_chunk)
+        if email_chunk:
+            conditions.append(f"email IN ({', '.join(['%s'] * len(email_chunk))})")
+            params.extend(email_chunk)
+        cursor.execute(f"""
+            SELECT id_afiliado, nombre_completo, email, telefono, identidad
+            FROM Afiliados
+            WHERE tenant_id = %s AND ({' OR '.join(conditions)})
+        """, tuple(params))
+        _write_keys(cursor, tenant_id, [_values(row) for row in cursor.fetchall()])
+
+
+def _write_keys(cursor, tenant_id: int, rows: List[tuple]):
+    if not rows:
+        return
+    row_ids = [row[0] for row in rows]
+    cursor.execute(f"""
+        DELETE FROM {INDEX_TABLE}
+        WHERE tenant_id = %s AND id_afiliado IN ({', '.join(['%s'] * len(row_ids))})
+    """, tuple([tenant_id] + row_ids))
+
+    params = []
+    for id_afiliado, nombre_completo, email, telefono, identidad in rows:
+        for key_type, value in candidate_keys(nombre_completo, email, telefono, identidad):
+            params.extend([tenant_id, key_type, value, id_afiliado])
+    if params:
+        cursor.execute(f"""
+            INSERT IGNORE INTO {INDEX_TABLE} (tenant_id, tipo, valor, id_afiliado)
+            VALUES {', '.join(['(%s, %s, %s, %s)'] * (len(params) // 4))}
+        """, tuple(params))
+
+
+def is_exact_key(key_type: str, value: str) -> bool:
+    """
+    Claves que identifican a una persona (email, identidad, teléfono completo)
+    frente a las de bloque (variantes del teléfono y nombre), que pueden reunir
+    a muchos candidatos.
+    """
+    return key_type in ('email', 'identidad') or (key_type == 'telefono' and len(value) == 8)
+
+
+def match_keys(cursor, tenant_id: int, keys: Iterable[Tuple[str, str]],
+               limit: int = MAX_BLOCK_SIZE) -> Dict[Tuple[str, str], Set[int]]:
+    """
+    Candidatos del tenant por clave: {(tipo, valor): {id_afiliado}}. Las claves
+    exactas se leen completas en una consulta; cada clave de bloque se acota a
+    sus limit candidatos más recientes (bloques muy comunes, como nombres
+    frecuentes), así un bloque grande no desplaza las coincidencias de otras
+    claves y el resultado de una clave no depende de las demás.
+    """
+    exact: Dict[str, Set[str]] = {}
+    blocks: List[Tuple[str, str]] = []
+    for key_type, value in set(keys):
+        if is_exact_key(key_type, value):
+            exact.setdefault(key_type, set()).add(value)
+        else:
+            blocks.append((key_type, value))
+
+    rows = []
+    if exact:
+        conditions, params = [], [tenant_id]
+        for key_type, values in exact.items():
+            conditions.append(f"(tipo = %s AND valor IN ({', '.join(['%s'] * len(values))}))")
+            params.append(key_type)
+            params.extend(sorted(values))
+        cursor.execute(f"""
+            SELECT tipo, valor, id_afiliado FROM {INDEX_TABLE}
+            WHERE tenant_id = %s AND ({' OR '.join(conditions)})
+        """, tuple(params))
+        rows.extend(cursor.fetchall())
+
+    blocks.sort()
+    for start in range(0, len(blocks), BLOCK_QUERY_KEYS):
+        chunk = blocks[start:start + BLOCK_QUERY_KEYS]
+        # Un LIMIT por clave: cada subconsulta recorre solo su rango de la clave primaria
+        subquery = f"""(
+            SELECT tipo, valor, id_afiliado FROM {INDEX_TABLE}
+            WHERE tenant_id = %s AND tipo = %s AND valor = %s
+            ORDER BY id_afiliado DESC
+            LIMIT %s
+        )"""
+        params = []
+        for key_type, value in chunk:
+            params.extend([tenant_id, key_type, value, limit])
+        cursor.execute(' UNION ALL '.join([subquery] * len(chunk)), tuple(params))
+        rows.extend(cursor.fetchall())
+
+    matches: Dict[Tuple[str, str], Set[int]] = {}
+    for key_type, value, id_afiliado in (_values(row) for row in rows):
+        matches.setdefault((key_type, value), set()).add(id_afiliado)
+    return matches
+
+
+def find_candidate_ids(cursor, tenant_id: int, keys: Iterable[Tuple[str, str]],
+                       limit: int = MAX_BLOCK_SIZE) -> Dict[int, Set[str]]:
+    """Candidatos del tenant que comparten alguna clave: {id_afiliado: {tipos coincidentes}}"""
+    matches: Dict[int, Set[str]] = {}
+    for (key_type, _), ids in match_keys(cursor, tenant_id, keys, limit).items():
+        for id_afiliado in ids:
+            matches.setdefault(id_afiliado, set()).add(key_type)
+    return matches
+
+
+def rebuild_index(conn, tenant_id: Optional[int] = None) -> int:
+    """Reconstruye el índice (de un tenant o de todos) recorriendo Afiliados por id"""
+    cursor = conn.cursor()
+    indexed = 0
+    last_id = 0
+    try:
+        while True:
+            query = """
+                SELECT id_afiliado, nombre_completo, email, telefono, identidad, tenant_id
+                FROM Afiliados WHERE id_afiliado > %s
+            """
+            params = [last_id]
+            if tenant_id is not None:
+                query += " AND tenant_id = %s"
+                params.append(tenant_id)
+            query += " ORDER BY id_afiliado LIMIT %s"
+            params.append(BATCH_SIZE)
+            cursor.execute(query, tuple(params))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            by_tenant: Dict[int, List[tuple]] = {}
+            for row in rows:
+                if row[5] is not None:
+                    by_tenant.setdefault(row[5], []).append(row[:5])
+            for row_tenant, tenant_rows in by_tenant.items():
+                _write_keys(cursor, row_tenant, tenant_rows)
+            conn.commit()
+
+            indexed += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        cursor.close()
+
+    logger.info(f"Índice de duplicados reconstruido: {indexed} candidatos")
+    return indexed
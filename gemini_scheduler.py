@@ -0,0 +1,228 @@
+"""
+Planificador de peticiones a Gemini con varias API keys.
+
+Cada key tiene un token bucket dimensionado con su cuota real
+(GEMINI_RATE_LIMIT_PER_KEY peticiones por minuto). Cada petición toma un token
+de la key con más capacidad libre. Si Gemini responde 429, la key queda en
+pausa el tiempo de Retry-After (o del retryDelay del cuerpo, o un backoff
+exponencial si no viene ninguno) y las peticiones pasan a las demás keys.
+
+No hay reparto fijo de CVs por key: process_cv_batch pone el lote en una cola
+compartida y cualquier hilo libre toma el siguiente CV con la key que tenga
+token (work stealing), así una key pausada no retiene su parte del lote.
+
+Los límites son por proceso (cada worker web / Celery tiene su planificador);
+con varios procesos, GEMINI_RATE_LIMIT_PER_KEY debe repartir la cuota entre ellos.
+
+Variables de entorno:
+    GEMINI_RATE_LIMIT_PER_KEY   Peticiones por minuto por key (default 60)
+    GEMINI_BURST_PER_KEY        Peticiones seguidas permitidas por key (default 5)
+    GEMINI_MAX_CONCURRENCY      Peticiones simultáneas del proceso (default 8)
+    GEMINI_MAX_ATTEMPTS         Intentos por CV ante 429 / 5xx (default 4)
+    GEMINI_ACQUIRE_TIMEOUT      Segundos máximos esperando una key libre (default 300)
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_PAUSE_SECONDS = 120
+THROUGHPUT_WINDOW = 60  # segundos
+
+
+class SchedulerTimeout(Exception):
+    """Ninguna key quedó libre dentro del tiempo de espera"""
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """Segundos de espera de una respuesta 429: header Retry-After o RetryInfo.retryDelay"""
+    header = response.headers.get('Retry-After') if getattr(response, 'headers', None) else None
+    if header:
+        try:
+            return max(float(header), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(header).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    try:
+        details = response.json().get('error', {}).get('details', [])
+    except Exception:
+        return None
+    for detail in details:
+        match = re.match(r'^([\d.]+)s$', str(detail.get('retryDelay', '')))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """Token bucket clásico; lo protege el lock del planificador"""
+
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.tokens
+
+    def wait_time(self, now: float) -> float:
+        """Segundos hasta tener un token completo"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.tokens = 0.0
+
+
+class _KeyState:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.paused_until = 0.0
+        self.consecutive_429 = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.latency_total = 0.0
+        self.completed = deque()
+
+    def wait_time(self, now: float) -> float:
+        return max(self.paused_until - now, self.bucket.wait_time(now))
+
+
+class GeminiKeyScheduler:
+    """Reparte las peticiones entre las API keys según sus tokens y pausas"""
+
+    def __init__(self, key_count: int, rate_per_minute: float = 60, burst: int = 5,
+                 max_concurrency: int = 8):
+        self.rate_per_minute = rate_per_minute
+        self.max_concurrency = max(max_concurrency, 1)
+        self._keys = [_KeyState(rate_per_minute, burst) for _ in range(key_count)]
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._pending = 0
+
+    def _pick(self, now: float, preferred: Optional[int]) -> Optional[int]:
+        ready = [i for i, key in enumerate(self._keys) if key.wait_time(now) == 0]
+        if not ready:
+            return None
+        if preferred is not None and preferred % len(self._keys) in ready:
+            return preferred % len(self._keys)
+        return max(ready, key=lambda i: (self._keys[i].bucket.available(now), -self._keys[i].in_flight))
+
+    def add_pending(self, count: int):
+        """Suma (o resta) CVs de un lote que aún no piden key, para queue_depth"""
+        with self._cond:
+            self._pending = max(self._pending + count, 0)
+
+    def acquire(self, preferred: Optional[int] = None, timeout: Optional[float] = None) -> int:
+        """
+        Espera hasta que haya una key con token, sin pausa y con cupo de
+        concurrencia, y devuelve su índice. preferred es una preferencia: si esa
+        key no está lista se usa otra. Llamar a release al terminar la petición.
+        """
+        if not self._keys:
+            raise ValueError("No hay APIs de Gemini configuradas")
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    index = self._pick(now, preferred) if self._in_flight < self.max_concurrency else None
+                    if index is not None:
+                        key = self._keys[index]
+                        key.bucket.take(now)
+                        key.in_flight += 1
+                        key.requests += 1
+                        self._in_flight += 1
+                        return index
+
+                    wait = min(key.wait_time(now) for key in self._keys) or 1.0
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise SchedulerTimeout(f"Sin API key de Gemini disponible en {timeout}s")
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    def release(self, index: int, status_code: Optional[int], latency: float,
+                retry_after: Optional[float] = None):
+        """
+        Cierra una petición. status_code None es un error de red; 429 pausa la
+        key (Retry-After o backoff exponencial) y vacía su bucket.
+        """
+        with self._cond:
+            now = time.monotonic()
+            key = self._keys[index]
+            key.in_flight -= 1
+            self._in_flight -= 1
+            key.latency_total += latency
+            key.completed.append(now)
+
+            if status_code == 200:
+                key.successes += 1
+                key.consecutive_429 = 0
+            else:
+                key.errors += 1
+                if status_code == 429:
+                    key.rate_limited += 1
+                    key.consecutive_429 += 1
+                    pause = retry_after if retry_after is not None else 2 ** key.consecutive_429
+                    pause = min(pause, MAX_PAUSE_SECONDS)
+                    key.paused_until = max(key.paused_until, now + pause)
+                    key.bucket.drain(now)
+                    logger.warning(f"Gemini API {index + 1}: 429, key en pausa {pause:.1f}s")
+
+            while key.completed and key.completed[0] < now - THROUGHPUT_WINDOW:
+                key.completed.popleft()
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            keys: List[Dict[str, Any]] = []
+            for index, key in enumerate(self._keys):
+                finished = key.successes + key.errors
+                keys.append({
+                    'key': index + 1,
+                    'requests': key.requests,
+                    'successes': key.successes,
+                    'errors': key.errors,
+                    'rate_limited': key.rate_limited,
+                    'error_rate': round(key.errors / finished, 4) if finished else 0.0,
+                    'throughput_per_minute': sum(1 for t in key.completed if t >= now - THROUGHPUT_WINDOW),
+                    'avg_latency_ms': round(key.latency_total / finished * 1000, 1) if finished else 0.0,
+                    'in_flight': key.in_flight,
+                    'tokens': round(key.bucket.available(now), 2),
+                    'paused_for': round(max(key.paused_until - now, 0.0), 1)
+                })
+            return {
+                'rate_limit_per_key': self.rate_per_minute,
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'queue_depth': self._waiting + self._pending,
+                'keys': keys
+            }
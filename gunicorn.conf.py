@@ -1,3 +1,12 @@
 bind = "0.0.0.0:5000"
 workers = 4
 timeout = 180
+
+
+def worker_exit(server, worker):
+    # Escribir los logs de API pendientes antes de que el worker termine
+    try:
+        from api_log_writer import api_log_writer
+        api_log_writer.drain()
+    except Exception:
+        pass
@@ -1,18 +1,39 @@
 """
 OCI Object Storage Service para almacenamiento de CVs
+
+Incluye:
+    - OCIStorageService     cliente de OCI Object Storage
+    - LocalStorageService   misma interfaz sobre una carpeta local, para pruebas
+                            y desarrollo sin OCI (OCI_STORAGE_BACKEND=local)
+    - OCIUploadManager      subidas, PARs y borrados concurrentes en un pool de
+                            hilos acotado que comparte el cliente del servicio,
+                            con reintentos con jitter ante errores transitorios
+
+Variables de entorno:
+    OCI_STORAGE_BACKEND         'oci' (default) o 'local'
+    OCI_LOCAL_STORAGE_DIR       Carpeta del backend local (default <tmp>/oci_local_storage)
+    OCI_UPLOAD_WORKERS          Operaciones simultáneas de OCIUploadManager (default 8)
+    OCI_RETRY_ATTEMPTS          Intentos por operación ante errores transitorios (default 4)
+    OCI_MULTIPART_THRESHOLD_MB  Tamaño desde el que upload_cv usa multipart (default 16)
+    OCI_MULTIPART_PART_MB       Tamaño de cada parte del multipart (default 8)
 """
 import os
 import json
+import time
 import uuid
+import random
+import shutil
+import tempfile
 import mimetypes
+import concurrent.futures
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, Union, BinaryIO
 import logging
 
 # Importaciones opcionales para OCI
 try:
     import oci
-    from oci.object_storage import ObjectStorageClient
+    from oci.object_storage import ObjectStorageClient, UploadManager
     from oci.object_storage.models import CreatePreauthenticatedRequestDetails
     from oci.exceptions import ServiceError
     OCI_AVAILABLE = True
@@ -20,6 +41,7 @@ except ImportError:
     OCI_AVAILABLE = False
     oci = None
     ObjectStorageClient = None
+    UploadManager = None
     CreatePreauthenticatedRequestDetails = None
     ServiceError = Exception
 
@@ -27,6 +49,33 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Archivos desde este tamaño se suben en multipart (partes en paralelo)
+MULTIPART_THRESHOLD = int(float(os.getenv('OCI_MULTIPART_THRESHOLD_MB', 16)) * 1024 * 1024)
+MULTIPART_PART_SIZE = int(float(os.getenv('OCI_MULTIPART_PART_MB', 8)) * 1024 * 1024)
+
+UPLOAD_WORKERS = int(os.getenv('OCI_UPLOAD_WORKERS', 8))
+RETRY_ATTEMPTS = int(os.getenv('OCI_RETRY_ATTEMPTS', 4))
+# Códigos de OCI que se reintentan; el resto (4xx, errores sin código) no
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Errores de red sin respuesta de OCI, que también se reintentan. El SDK de OCI
+# usa requests, cuyos ConnectionError/Timeout no heredan de los de Python
+NETWORK_ERRORS = (ConnectionError, TimeoutError)
+try:
+    import requests
+    NETWORK_ERRORS += (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+except ImportError:
+    pass
+
+
+def _general_error(e: Exception) -> Dict[str, Any]:
+    """Resultado de un error que no es ServiceError; network_error indica si se puede reintentar"""
+    return {
+        'success': False,
+        'error': f"Error general: {str(e)}",
+        'network_error': isinstance(e, NETWORK_ERRORS)
+    }
+
 class OCIStorageService:
     """Servicio para manejar archivos en OCI Object Storage"""
     
@@ -46,6 +95,9 @@ class OCIStorageService:
             self.bucket_name = os.getenv('OCI_BUCKET_NAME', 'crm-cvs')
             self.region = os.getenv('OCI_REGION', 'us-ashburn-1')
             
+            # Subidas multipart para archivos grandes (ver upload_cv)
+            self.upload_manager = UploadManager(self.object_storage_client, allow_parallel_uploads=True)
+            
             logger.info(f"OCI Storage Service inicializado - Namespace: {self.namespace}, Bucket: {self.bucket_name}")
             
         except Exception as e:
@@ -91,7 +143,7 @@ class OCIStorageService:
     
     def upload_cv(
         self, 
-        file_content: bytes, 
+        file_content: Union[bytes, BinaryIO], 
         tenant_id: int, 
         cv_identifier: str, 
         original_filename: str,
@@ -100,8 +152,12 @@ class OCIStorageService:
         """
         Subir CV a OCI Object Storage
         
+        Los archivos abiertos se envían en streaming desde disco, sin cargarlos
+        en memoria; desde MULTIPART_THRESHOLD se suben en multipart con
+        partes de MULTIPART_PART_SIZE en paralelo.
+        
         Args:
-            file_content: Contenido del archivo
+            file_content: Contenido del archivo (bytes) o archivo binario abierto
             tenant_id: ID del tenant
             cv_identifier: Identificador único del CV
             original_filename: Nombre original del archivo
@@ -119,16 +175,35 @@ class OCIStorageService:
             if not mime_type:
                 mime_type = 'application/octet-stream'
             
+            # Tamaño por longitud del stream, sin leerlo
+            if isinstance(file_content, (bytes, bytearray)):
+                size = len(file_content)
+            else:
+                file_content.seek(0, os.SEEK_END)
+                size = file_content.tell()
+                file_content.seek(0)
+            
             # Subir archivo
-            logger.info(f"Subiendo CV: {object_key}")
+            logger.info(f"Subiendo CV: {object_key} ({size} bytes)")
             
-            put_object_response = self.object_storage_client.put_object(
-                namespace_name=self.namespace,
-                bucket_name=self.bucket_name,
-                object_name=object_key,
-                put_object_body=file_content,
-                content_type=mime_type
-            )
+            if size >= MULTIPART_THRESHOLD and not isinstance(file_content, (bytes, bytearray)):
+                put_object_response = self.upload_manager.upload_stream(
+                    self.namespace,
+                    self.bucket_name,
+                    object_key,
+                    file_content,
+                    part_size=MULTIPART_PART_SIZE,
+                    content_type=mime_type
+                )
+            else:
+                put_object_response = self.object_storage_client.put_object(
+                    namespace_name=self.namespace,
+                    bucket_name=self.bucket_name,
+                    object_name=object_key,
+                    put_object_body=file_content,
+                    content_length=size,
+                    content_type=mime_type
+                )
             
             logger.info(f"CV subido exitosamente: {object_key}")
             
@@ -137,8 +212,8 @@ class OCIStorageService:
                 'object_key': object_key,
                 'cv_identifier': cv_identifier,
                 'mime_type': mime_type,
-                'size': len(file_content),
-                'etag': put_object_response.headers.get('etag'),
+                'size': size,
+                'etag': put_object_response.headers.get('etag') or put_object_response.headers.get('opc-multipart-md5'),
                 'namespace': self.namespace,
                 'bucket': self.bucket_name
             }
@@ -152,16 +227,14 @@ class OCIStorageService:
             }
         except Exception as e:
             logger.error(f"Error general al subir CV: {str(e)}")
-            return {
-                'success': False,
-                'error': f"Error general: {str(e)}"
-            }
+            return _general_error(e)
     
     def create_par(
         self, 
         object_key: str, 
         cv_identifier: str,
-        expiration_years: int = 10
+        expiration_years: int = 10,
+        expiration_days: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Crear Pre-Authenticated Request (PAR) para acceso al archivo
@@ -170,13 +243,14 @@ class OCIStorageService:
             object_key: Clave del objeto en OCI
             cv_identifier: Identificador único del CV
             expiration_years: Años de expiración (default: 10)
+            expiration_days: Días de expiración; si se indica reemplaza a expiration_years
             
         Returns:
             Dict con información de la PAR
         """
         try:
             # Calcular fecha de expiración
-            expiration_date = datetime.now() + timedelta(days=expiration_years * 365)
+            expiration_date = datetime.now() + timedelta(days=expiration_days or expiration_years * 365)
             
             # Crear detalles de la PAR
             par_details = CreatePreauthenticatedRequestDetails(
@@ -218,10 +292,7 @@ class OCIStorageService:
             }
         except Exception as e:
             logger.error(f"Error general al crear PAR: {str(e)}")
-            return {
-                'success': False,
-                'error': f"Error general: {str(e)}"
-            }
+            return _general_error(e)
     
     def delete_object(self, object_key: str) -> Dict[str, Any]:
         """
@@ -258,10 +329,41 @@ class OCIStorageService:
             }
         except Exception as e:
             logger.error(f"Error general al eliminar objeto: {str(e)}")
+            return _general_error(e)
+    
+    def download_object(self, object_key: str) -> Dict[str, Any]:
+        """
+        Descargar el contenido de un objeto
+        
+        Args:
+            object_key: Clave del objeto
+            
+        Returns:
+            Dict con 'content' (bytes) si tuvo éxito
+        """
+        try:
+            get_object_response = self.object_storage_client.get_object(
+                namespace_name=self.namespace,
+                bucket_name=self.bucket_name,
+                object_name=object_key
+            )
+            
+            return {
+                'success': True,
+                'content': get_object_response.data.content,
+                'mime_type': get_object_response.headers.get('content-type')
+            }
+            
+        except ServiceError as e:
+            logger.error(f"Error de OCI al descargar objeto: {str(e)}")
             return {
                 'success': False,
-                'error': f"Error general: {str(e)}"
+                'error': f"Error de OCI: {str(e)}",
+                'error_code': e.status
             }
+        except Exception as e:
+            logger.error(f"Error general al descargar objeto: {str(e)}")
+            return _general_error(e)
     
     def get_object_info(self, object_key: str) -> Dict[str, Any]:
         """
@@ -298,15 +400,187 @@ class OCIStorageService:
             }
         except Exception as e:
             logger.error(f"Error general al obtener info del objeto: {str(e)}")
+            return _general_error(e)
+
+
+
+class LocalStorageService(OCIStorageService):
+    """
+    Backend de OCIStorageService sobre una carpeta local (pruebas y desarrollo
+    sin OCI). Los objetos se guardan con la misma clave que tendrían en el
+    bucket y la PAR es una URL file:// al archivo.
+    """
+    
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv('OCI_LOCAL_STORAGE_DIR', os.path.join(tempfile.gettempdir(), 'oci_local_storage'))
+        self.namespace = 'local'
+        self.bucket_name = os.getenv('OCI_BUCKET_NAME', 'crm-cvs')
+        self.region = 'local'
+        os.makedirs(self.root, exist_ok=True)
+        logger.info(f"Almacenamiento local de CVs en {self.root}")
+    
+    def _path(self, object_key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, object_key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Clave de objeto inválida: {object_key}")
+        return path
+    
+    def upload_cv(self, file_content, tenant_id, cv_identifier, original_filename, candidate_id=None):
+        try:
+            object_key = self.get_object_key(tenant_id, cv_identifier, original_filename)
+            mime_type = mimetypes.guess_type(original_filename)[0] or 'application/octet-stream'
+            path = self._path(object_key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as target:
+                if isinstance(file_content, (bytes, bytearray)):
+                    target.write(file_content)
+                else:
+                    file_content.seek(0)
+                    shutil.copyfileobj(file_content, target)
             return {
-                'success': False,
-                'error': f"Error general: {str(e)}"
+                'success': True,
+                'object_key': object_key,
+                'cv_identifier': cv_identifier,
+                'mime_type': mime_type,
+                'size': os.path.getsize(path),
+                'etag': uuid.uuid4().hex,
+                'namespace': self.namespace,
+                'bucket': self.bucket_name
             }
+        except Exception as e:
+            logger.error(f"Error general al subir CV: {str(e)}")
+            return {'success': False, 'error': f"Error general: {str(e)}"}
+    
+    def create_par(self, object_key, cv_identifier, expiration_years=10, expiration_days=None):
+        path = self._path(object_key)
+        if not os.path.exists(path):
+            return {'success': False, 'error': f"Objeto {object_key} no existe", 'error_code': 404}
+        expiration_date = datetime.now() + timedelta(days=expiration_days or expiration_years * 365)
+        access_uri = f"file://{path}"
+        return {
+            'success': True,
+            'par_id': f"local_{cv_identifier}",
+            'access_uri': access_uri,
+            'expiration_date': expiration_date.isoformat(),
+            'full_path': access_uri
+        }
+    
+    def delete_object(self, object_key):
+        try:
+            os.remove(self._path(object_key))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            return {'success': False, 'error': f"Error general: {str(e)}"}
+        return {'success': True, 'message': f"Objeto {object_key} eliminado exitosamente"}
+    
+    def download_object(self, object_key):
+        try:
+            with open(self._path(object_key), 'rb') as source:
+                content = source.read()
+        except FileNotFoundError:
+            return {'success': False, 'error': f"Objeto {object_key} no existe", 'error_code': 404}
+        return {'success': True, 'content': content, 'mime_type': mimetypes.guess_type(object_key)[0]}
+    
+    def get_object_info(self, object_key):
+        path = self._path(object_key)
+        if not os.path.exists(path):
+            return {'success': False, 'error': f"Objeto {object_key} no existe", 'error_code': 404}
+        return {
+            'success': True,
+            'size': os.path.getsize(path),
+            'mime_type': mimetypes.guess_type(object_key)[0],
+            'last_modified': datetime.fromtimestamp(os.path.getmtime(path)).isoformat(),
+            'etag': None,
+            'metadata': {}
+        }
+
+
+class OCIUploadManager:
+    """
+    Operaciones de almacenamiento concurrentes sobre un OCIStorageService: un
+    pool de hilos acotado comparte el cliente del servicio, y cada operación se
+    reintenta con backoff exponencial con jitter si falla con un error
+    transitorio (RETRYABLE_STATUS o NETWORK_ERRORS). Los resultados conservan
+    el orden de entrada.
+    """
+    
+    def __init__(self, storage: OCIStorageService, max_workers: int = UPLOAD_WORKERS,
+                 max_attempts: int = RETRY_ATTEMPTS):
+        self.storage = storage
+        self.max_workers = max(max_workers, 1)
+        self.max_attempts = max(max_attempts, 1)
+    
+    def _with_retry(self, operation, *args, **kwargs) -> Dict[str, Any]:
+        for attempt in range(self.max_attempts):
+            result = operation(*args, **kwargs)
+            transient = result.get('error_code') in RETRYABLE_STATUS or result.get('network_error')
+            if result.get('success') or not transient:
+                return result
+            if attempt + 1 < self.max_attempts:
+                delay = random.uniform(0, min(0.5 * 2 ** attempt, 8))
+                logger.warning(f"{operation.__name__} falló ({result.get('error')}), reintento en {delay:.1f}s")
+                time.sleep(delay)
+        return result
+    
+    def _run(self, function, items) -> list:
+        items = list(items)
+        if not items:
+            return []
+        workers = min(self.max_workers, len(items))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, items))
+    
+    def _upload(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """item: tenant_id, cv_identifier, original_filename y file_content (bytes) o path"""
+        kwargs = {key: item.get(key) for key in ('tenant_id', 'cv_identifier', 'original_filename', 'candidate_id')}
+        if item.get('path'):
+            with open(item['path'], 'rb') as stream:
+                return self._with_retry(self.storage.upload_cv, file_content=stream, **kwargs)
+        return self._with_retry(self.storage.upload_cv, file_content=item['file_content'], **kwargs)
+    
+    def upload_many(self, items) -> list:
+        """Sube varios archivos; un resultado de upload_cv por item"""
+        return self._run(self._upload, items)
+    
+    def create_pars(self, objects, **options) -> list:
+        """
+        PARs de varios objetos [(object_key, cv_identifier)]; un resultado de
+        create_par por objeto. options se pasan a create_par (expiration_days...).
+        """
+        return self._run(lambda obj: self._with_retry(self.storage.create_par, object_key=obj[0],
+                                                      cv_identifier=obj[1], **options),
+                         objects)
+    
+    def delete_many(self, object_keys) -> list:
+        return self._run(lambda object_key: self._with_retry(self.storage.delete_object, object_key), object_keys)
+    
+    def upload_with_par(self, items) -> list:
+        """
+        Sube cada archivo y crea su PAR en la misma tarea del pool.
+        Devuelve [{'upload': resultado, 'par': resultado o None}] en el orden de items.
+        """
+        def upload_and_share(item):
+            upload_result = self._upload(item)
+            if not upload_result['success']:
+                return {'upload': upload_result, 'par': None}
+            par_result = self._with_retry(self.storage.create_par,
+                                          object_key=upload_result['object_key'],
+                                          cv_identifier=item['cv_identifier'])
+            return {'upload': upload_result, 'par': par_result}
+        
+        return self._run(upload_and_share, items)
+
 
 # Instancia global del servicio (solo si la configuración está disponible)
 try:
-    oci_storage_service = OCIStorageService()
+    if os.getenv('OCI_STORAGE_BACKEND', 'oci').lower() == 'local':
+        oci_storage_service = LocalStorageService()
+    else:
+        oci_storage_service = OCIStorageService()
 except Exception as e:
     logger.error(f"Error inicializando OCI Storage Service: {e}")
     oci_storage_service = None
 
+oci_upload_manager = OCIUploadManager(oci_storage_service) if oci_storage_service else None
+
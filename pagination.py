@@ -0,0 +1,163 @@
+"""
+Paginación por cursor (keyset) y conteos cacheados para listados de candidatos.
+
+Los listados se ordenan por (fecha_registro, id_afiliado). En lugar de
+LIMIT/OFFSET, cada página devuelve un cursor opaco con la última fila vista y
+la siguiente consulta continúa con una condición sobre esas dos columnas, así
+el coste de la página 500 es el mismo que el de la primera.
+
+El total de resultados es opcional: exacto, cacheado unos segundos por
+tenant/usuario/filtros, o estimado con EXPLAIN.
+
+Variables de entorno:
+    CANDIDATE_COUNT_CACHE_TTL   Segundos que se reutiliza un total cacheado (default 60)
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CURSOR_VERSION = 1
+COUNT_MODES = ('exact', 'cached', 'estimate', 'none')
+
+
+def encode_cursor(fecha, row_id: int, order: str = 'desc') -> str:
+    """Cursor opaco (base64 url-safe) con la posición de la última fila devuelta"""
+    if isinstance(fecha, (datetime, date)):
+        fecha = fecha.isoformat()
+    payload = {'v': CURSOR_VERSION, 'f': fecha, 'id': int(row_id), 'o': order}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """
+    Decodifica un cursor de encode_cursor.
+
+    Returns:
+        dict con 'fecha' (datetime o None), 'id' y 'order'
+
+    Raises:
+        ValueError: si el cursor está malformado
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload.get('v') != CURSOR_VERSION:
+            raise ValueError('versión de cursor no soportada')
+        fecha = payload.get('f')
+        return {
+            'fecha': datetime.fromisoformat(fecha) if fecha else None,
+            'id': int(payload['id']),
+            'order': 'asc' if payload.get('o') == 'asc' else 'desc',
+        }
+    except Exception as e:
+        raise ValueError(f"Cursor inválido: {str(e)}")
+
+
+def keyset_order_clause(order: str = 'desc', date_col: str = 'a.fecha_registro',
+                        id_col: str = 'a.id_afiliado') -> str:
+    """ORDER BY estable para paginar por (fecha, id)"""
+    direction = 'ASC' if order == 'asc' else 'DESC'
+    return f"ORDER BY {date_col} {direction}, {id_col} {direction}"
+
+
+def keyset_condition(after: Dict[str, Any], date_col: str = 'a.fecha_registro',
+                     id_col: str = 'a.id_afiliado') -> Tuple[str, List[Any]]:
+    """
+    Condición WHERE para las filas posteriores al cursor.
+
+    MySQL ordena los NULL como el valor más bajo (al final en DESC, al principio
+    en ASC), por lo que las filas sin fecha también se recorren.
+    """
+    fecha, row_id = after['fecha'], after['id']
+
+    if after['order'] == 'asc':
+        if fecha is None:
+            return f"(({date_col} IS NULL AND {id_col} > %s) OR {date_col} IS NOT NULL)", [row_id]
+        return f"({date_col} > %s OR ({date_col} = %s AND {id_col} > %s))", [fecha, fecha, row_id]
+
+    if fecha is None:
+        return f"({date_col} IS NULL AND {id_col} < %s)", [row_id]
+    return (
+        f"({date_col} < %s OR ({date_col} = %s AND {id_col} < %s) OR {date_col} IS NULL)",
+        [fecha, fecha, row_id]
+    )
+
+
+def estimate_count(cursor, from_where_sql: str, params) -> int:
+    """
+    Estimación del optimizador (EXPLAIN) para 'SELECT ... <from_where_sql>'.
+    Es inmediata pero puede desviarse bastante con filtros muy selectivos.
+    """
+    cursor.execute(f"EXPLAIN SELECT 1 {from_where_sql}", tuple(params))
+    plan = cursor.fetchall()
+    if not plan:
+        return 0
+    first = plan[0]
+    rows = first.get('rows') or 0
+    filtered = first.get('filtered') or 100
+    return int(round(float(rows) * float(filtered) / 100))
+
+
+class CountCache:
+    """Totales de listados cacheados por clave con TTL y límite de entradas"""
+
+    def __init__(self, ttl: float = 60, max_entries: int = 2000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha1(json.dumps(parts, default=str, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, key: str, compute: Callable[[], int]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = (value, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+def resolve_count(mode: str, cursor, from_where_sql: str, params, cache_key: Optional[str] = None) -> Optional[int]:
+    """
+    Total de filas según el modo pedido: 'exact', 'cached', 'estimate' o 'none'.
+    Devuelve None para 'none'.
+    """
+    if mode == 'none':
+        return None
+    if mode == 'estimate':
+        return estimate_count(cursor, from_where_sql, params)
+
+    def exact():
+        cursor.execute(f"SELECT COUNT(*) as total {from_where_sql}", tuple(params))
+        row = cursor.fetchone()
+        return row['total'] if isinstance(row, dict) else row[0]
+
+    if mode == 'cached' and cache_key:
+        return count_cache.get_or_compute(cache_key, exact)
+    return exact()
+
+
+# Instancia global de la caché de conteos
+count_cache = CountCache(ttl=float(os.getenv('CANDIDATE_COUNT_CACHE_TTL', 60)))
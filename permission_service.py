@@ -4,11 +4,23 @@
 Módulo B4: Gestión de permisos, roles y acceso a recursos conectado a Permisos_Unificados.
 """
 
-import mysql.connector
+import os
 import json
+import time
 import logging
+import threading
 from functools import lru_cache
 
+import db_pool
+
+try:
+    from flask import g, has_request_context
+    FLASK_AVAILABLE = True
+except ImportError:
+    g = None
+    has_request_context = lambda: False
+    FLASK_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 # =====================================================
@@ -16,32 +28,51 @@ logger = logging.getLogger(__name__)
 # =====================================================
 
 def get_db_connection():
-    """Obtiene conexión a la base de datos"""
+    """Obtiene conexión del pool compartido del proceso (db_pool)"""
     try:
-        from app import get_db_connection as app_get_db
-        return app_get_db()
-    except:
-        # Fallback si no se puede importar de app
-        import os
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        return mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_NAME', 'whatsapp_backend'),
-            charset='utf8mb4',
-            collation='utf8mb4_unicode_ci'
-        )
+        return db_pool.get_connection()
+    except Exception as e:
+        logger.error(f"Error obteniendo conexión del pool: {str(e)}")
+        return None
 
 
 # =====================================================
-# 1. FUNCIONES DE ROLES (Legacy / Compatibilidad)
+# CONTEXTO DE PERMISOS RESUELTO (por petición + caché TTL)
 # =====================================================
 
-def get_user_role_info(user_id, tenant_id):
-    """Obtiene información básica del rol del usuario para compatibilidad."""
+# Segundos que un contexto resuelto puede reutilizarse entre peticiones.
+# La caché es por proceso: la invalidación llega al worker que atendió la
+# escritura y el TTL acota cuánto tardan en enterarse los demás.
+PERMISSION_CACHE_TTL = float(os.getenv('PERMISSION_CACHE_TTL', 30))
+PERMISSION_CACHE_MAX_ENTRIES = 5000
+
+_permission_cache = {}
+_permission_cache_lock = threading.Lock()
+
+
+class PermissionContext:
+    """Rol y filas de Permisos_Unificados de un usuario, resueltos en una sola visita a la BD."""
+
+    def __init__(self, user_id, tenant_id, role_info, modules):
+        self.user_id = user_id
+        self.tenant_id = tenant_id
+        self.role_info = role_info
+        self.modules = modules
+
+    @property
+    def role_name(self):
+        return self.role_info['role_name'] if self.role_info else None
+
+    @property
+    def is_admin(self):
+        return self.role_name == 'Administrador'
+
+    def module(self, modulo):
+        """Fila de Permisos_Unificados para el módulo (ya normalizado) o None."""
+        return self.modules.get((modulo or '').strip().lower())
+
+
+def _load_permission_context(user_id, tenant_id):
     conn = get_db_connection()
     if not conn: return None
     cursor = conn.cursor(dictionary=True)
@@ -52,14 +83,89 @@ def get_user_role_info(user_id, tenant_id):
             JOIN Roles r ON u.rol_id = r.id
             WHERE u.id = %s AND u.tenant_id = %s AND u.activo = 1 AND r.activo = 1
         """, (user_id, tenant_id))
-        return cursor.fetchone()
+        role_info = cursor.fetchone()
+
+        cursor.execute("SELECT * FROM Permisos_Unificados WHERE user_id = %s", (user_id,))
+        modules = {}
+        for row in cursor.fetchall():
+            # Si hubiera filas repetidas para un módulo gana la primera, igual que fetchone()
+            # La comparación en MySQL no distingue mayúsculas (collation _ci)
+            modules.setdefault((row['modulo'] or '').strip().lower(), row)
+
+        return PermissionContext(user_id, tenant_id, role_info, modules)
     except Exception as e:
-        logger.error(f"Error en get_user_role_info: {str(e)}")
+        logger.error(f"Error cargando contexto de permisos: {str(e)}")
         return None
     finally:
         cursor.close()
         conn.close()
 
+
+def get_permission_context(user_id, tenant_id):
+    """
+    Devuelve el PermissionContext del usuario. Dentro de una petición Flask se
+    resuelve una sola vez (flask.g); entre peticiones se reutiliza durante
+    PERMISSION_CACHE_TTL segundos. Devuelve None si la BD no está disponible.
+    """
+    key = (tenant_id, user_id)
+
+    request_cache = None
+    if FLASK_AVAILABLE and has_request_context():
+        request_cache = g.setdefault('_permission_contexts', {})
+        if key in request_cache:
+            return request_cache[key]
+
+    now = time.monotonic()
+    context = None
+    with _permission_cache_lock:
+        cached = _permission_cache.get(key)
+        if cached and cached[1] > now:
+            context = cached[0]
+
+    if context is None:
+        context = _load_permission_context(user_id, tenant_id)
+        if context is None:
+            return None  # No se cachean fallos de conexión
+        with _permission_cache_lock:
+            if len(_permission_cache) >= PERMISSION_CACHE_MAX_ENTRIES:
+                _permission_cache.clear()
+            _permission_cache[key] = (context, now + PERMISSION_CACHE_TTL)
+
+    if request_cache is not None:
+        request_cache[key] = context
+    return context
+
+
+def invalidate_permission_cache(tenant_id=None, user_id=None):
+    """
+    Descarta contextos cacheados. Sin argumentos limpia todo (p. ej. al cambiar
+    un rol, que se comparte entre tenants); con tenant_id limpia ese tenant;
+    con user_id, ese usuario en cualquier tenant.
+    """
+    with _permission_cache_lock:
+        if tenant_id is None and user_id is None:
+            _permission_cache.clear()
+        else:
+            for key in list(_permission_cache):
+                if tenant_id is not None and key[0] != tenant_id:
+                    continue
+                if user_id is not None and key[1] != user_id:
+                    continue
+                del _permission_cache[key]
+
+    if FLASK_AVAILABLE and has_request_context():
+        g.pop('_permission_contexts', None)
+
+
+# =====================================================
+# 1. FUNCIONES DE ROLES (Legacy / Compatibilidad)
+# =====================================================
+
+def get_user_role_info(user_id, tenant_id):
+    """Obtiene información básica del rol del usuario para compatibilidad."""
+    context = get_permission_context(user_id, tenant_id)
+    return context.role_info if context else None
+
 def get_user_role_name(user_id, tenant_id):
     role_info = get_user_role_info(user_id, tenant_id)
     return role_info['role_name'] if role_info else None
@@ -111,89 +217,49 @@ def normalizar_modulo(modulo):
 
 def can_access_tab(user_id, tenant_id, modulo):
     """
-    Reescrita Fase 3: Consulta SELECT ver FROM Permisos_Unificados.
+    Reescrita Fase 3: Lee la columna ver de Permisos_Unificados (vía PermissionContext).
     """
-    if is_admin(user_id, tenant_id): return True
+    context = get_permission_context(user_id, tenant_id)
+    if not context: return False
+    if context.is_admin: return True
     
-    modulo_db = normalizar_modulo(modulo)
-    
-    conn = get_db_connection()
-    if not conn: return False
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT ver FROM Permisos_Unificados WHERE user_id=%s AND modulo=%s", (user_id, modulo_db))
-        result = cursor.fetchone()
-        return bool(result[0]) if result else False
-    except Exception as e:
-        logger.error(f"Error en can_access_tab: {str(e)}")
-        return False
-    finally:
-        cursor.close()
-        conn.close()
+    row = context.module(normalizar_modulo(modulo))
+    return bool(row.get('ver')) if row else False
 
 def can_perform_action(user_id, tenant_id, modulo, action):
     """
-    Reescrita Fase 3: Consulta columna específica en Permisos_Unificados.
+    Reescrita Fase 3: Consulta columna específica en Permisos_Unificados (vía PermissionContext).
     """
-    if is_admin(user_id, tenant_id): return True
-    
-    modulo_db = normalizar_modulo(modulo)
+    context = get_permission_context(user_id, tenant_id)
+    if not context: return False
+    if context.is_admin: return True
     
-    # Lista blanca de columnas permitidas para evitar SQL Injection indirecto
+    # Lista blanca de columnas permitidas
     allowed_actions = ['ver', 'crear', 'editar', 'eliminar', 'exportar', 'importar', 'asignar']
     if action not in allowed_actions:
-        # Si la acción no está en la lista estándar, intentamos usarla pero con cuidado
         logger.warning(f"Acción no estándar solicitada: {action}")
     
-    conn = get_db_connection()
-    if not conn: return False
-    cursor = conn.cursor()
-    try:
-        # Nota: Los nombres de columnas son seguros aquí ya que vienen del código, no del user input directo
-        query = f"SELECT `{action}` FROM Permisos_Unificados WHERE user_id=%s AND modulo=%s"
-        cursor.execute(query, (user_id, modulo_db))
-        result = cursor.fetchone()
-        return bool(result[0]) if result else False
-    except Exception as e:
-        logger.error(f"Error en can_perform_action: {str(e)}")
-        return False
-    finally:
-        cursor.close()
-        conn.close()
+    row = context.module(normalizar_modulo(modulo))
+    return bool(row.get(action)) if row else False
 
 def get_redactions_for_tab(user_id, tenant_id, modulo):
     """
-    Reescrita Fase 3: Consulta switches de privacidad.
+    Reescrita Fase 3: Consulta switches de privacidad (vía PermissionContext).
     """
-    if is_admin(user_id, tenant_id): return []
+    context = get_permission_context(user_id, tenant_id)
+    if not context: return []
+    if context.is_admin: return []
     
-    modulo_db = normalizar_modulo(modulo)
+    result = context.module(normalizar_modulo(modulo))
     
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("""
-            SELECT ver_email_telefono, ver_nombre_empresa 
-            FROM Permisos_Unificados 
-            WHERE user_id=%s AND modulo=%s
-        """, (user_id, modulo_db))
-        result = cursor.fetchone()
-        
-        redacted = []
-        if result:
-            # Lógica corregida: 1 (True) = visible, 0 (False) = redactado
-            if not bool(result.get('ver_email_telefono')):
-                redacted.extend(['email', 'telefono'])
-            if not bool(result.get('ver_nombre_empresa')):
-                redacted.append('empresa')
-        return redacted
-    except Exception as e:
-        logger.error(f"Error en get_redactions_for_tab: {str(e)}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+    redacted = []
+    if result:
+        # Lógica corregida: 1 (True) = visible, 0 (False) = redactado
+        if not bool(result.get('ver_email_telefono')):
+            redacted.extend(['email', 'telefono'])
+        if not bool(result.get('ver_nombre_empresa')):
+            redacted.append('empresa')
+    return redacted
 
 # Alias para compatibilidad con firmas antiguas que usaban tab_key
 def can_action_on_tab(user_id, tenant_id, tab_key, action):
@@ -204,31 +270,20 @@ def can_action_on_tab(user_id, tenant_id, tab_key, action):
 
 def get_scope_for_tab(user_id, tenant_id, modulo):
     """Obtiene el alcance (alcance: todo, asignados, ninguno)"""
-    if is_admin(user_id, tenant_id): return 'all'
+    context = get_permission_context(user_id, tenant_id)
+    if not context: return 'none'
+    if context.is_admin: return 'all'
     
-    modulo_db = normalizar_modulo(modulo)
+    result = context.module(normalizar_modulo(modulo))
+    if not result: return 'none'
     
-    conn = get_db_connection()
-    if not conn: return 'none'
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT alcance FROM Permisos_Unificados WHERE user_id=%s AND modulo=%s", (user_id, modulo_db))
-        result = cursor.fetchone()
-        if not result: return 'none'
-        
-        # Mapeo de alcances V3 a lógica de filtros
-        mapping = {
-            'todo': 'all',
-            'asignados': 'own',
-            'ninguno': 'none'
-        }
-        return mapping.get(result['alcance'], 'none')
-    except Exception as e:
-        logger.error(f"Error en get_scope_for_tab (V3): {str(e)}")
-        return 'none'
-    finally:
-        cursor.close()
-        conn.close()
+    # Mapeo de alcances V3 a lógica de filtros
+    mapping = {
+        'todo': 'all',
+        'asignados': 'own',
+        'ninguno': 'none'
+    }
+    return mapping.get(result['alcance'], 'none')
 
 
 # =====================================================
@@ -343,48 +398,45 @@ def get_accessible_user_ids(user_id, tenant_id):
         return [user_id] + get_team_members(user_id, tenant_id)
     return [user_id]
 
-def build_user_filter_condition(user_id, tenant_id, created_by_field, resource_type, resource_id_field):
+def get_resource_scope(user_id, tenant_id, resource_type):
     """
-    Reescrita Fase 4: Filtro de seguridad basado en alcances de Permisos_Unificados y Asignaciones_Centrales.
+    Alcance efectivo del usuario sobre un tipo de recurso:
+    'todo', 'asignados' o 'propio' (solo lo creado por él).
     """
     # Mapeo de resource_type a modulo de la tabla Permisos_Unificados (Traductor Inglés/Español)
     modulo_db = normalizar_modulo(resource_type)
     
-    conn = get_db_connection()
-    if not conn:
+    context = get_permission_context(user_id, tenant_id)
+    if not context:
         # Fallback restrictivo por seguridad si falla la conexión
-        return f"{created_by_field} = %s", [user_id]
+        return 'propio'
     
-    cursor = conn.cursor(dictionary=True)
-    try:
-        # Consulta el alcance (scope) del usuario para este módulo
-        cursor.execute("SELECT alcance FROM Permisos_Unificados WHERE user_id = %s AND modulo = %s", (user_id, modulo_db))
-        result = cursor.fetchone()
-        alcance = result['alcance'] if result else 'asignados'
+    result = context.module(modulo_db)
+    alcance = result['alcance'] if result else 'asignados'
+    return alcance if alcance in ('todo', 'asignados') else 'propio'
+
+def build_user_filter_condition(user_id, tenant_id, created_by_field, resource_type, resource_id_field):
+    """
+    Reescrita Fase 4: Filtro de seguridad basado en alcances de Permisos_Unificados y Asignaciones_Centrales.
+    """
+    # Alcance (scope) del usuario para este módulo
+    alcance = get_resource_scope(user_id, tenant_id, resource_type)
+    
+    # Caso 1 (alcance = 'todo'): Retorna string vacío y parámetros vacíos
+    if alcance == 'todo':
+        return "", []
         
-        # Caso 1 (alcance = 'todo'): Retorna string vacío y parámetros vacíos
-        if alcance == 'todo':
-            return "", []
-            
-        # Caso 2 (alcance = 'asignados'): Genera filtro inclusivo (Creado por mí | Asignado a mí | Creado por mi equipo)
-        if alcance == 'asignados':
-            # 1. Creado por mí: {created_by_field} = %s
-            # 2. Asignado a mí: {resource_id_field} IN (SELECT entidad_id FROM Asignaciones_Centrales WHERE usuario_destino = %s AND tipo_entidad = %s)
-            # 3. Creado por mi equipo: {created_by_field} IN (SELECT entidad_id FROM Asignaciones_Centrales WHERE usuario_destino = %s AND tipo_entidad = 'usuario')
-            condition = f"({created_by_field} = %s OR {resource_id_field} IN (SELECT entidad_id FROM Asignaciones_Centrales WHERE usuario_destino = %s AND tipo_entidad = %s AND tenant_id = %s) OR {created_by_field} IN (SELECT entidad_id FROM Asignaciones_Centrales WHERE usuario_destino = %s AND tipo_entidad = 'usuario' AND tenant_id = %s))"
-            params = [user_id, user_id, resource_type, tenant_id, user_id, tenant_id]
-            return condition, params
-            
-        # Fallback por defecto: Solo lo propio
-        return f"{created_by_field} = %s", [user_id]
+    # Caso 2 (alcance = 'asignados'): Genera filtro inclusivo (Creado por mí | Asignado a mí | Creado por mi equipo)
+    if alcance == 'asignados':
+        # 1. Creado por mí: {created_by_field} = %s
+        # 2. Asignado a mí: {resource_id_field} IN (SELECT entidad_id FROM Asignaciones_Centrales WHERE usuario_destino = %s AND tipo_entidad = %s)
+        # 3. Creado por mi equipo: {created_by_field} IN (SELECT entidad_id FROM Asignaciones_Centrales WHERE usuario_destino = %s AND tipo_entidad = 'usuario')
+        condition = f"({created_by_field} = %s OR {resource_id_field} IN (SELECT entidad_id FROM Asignaciones_Centrales WHERE usuario_destino = %s AND tipo_entidad = %s AND tenant_id = %s) OR {created_by_field} IN (SELECT entidad_id FROM Asignaciones_Centrales WHERE usuario_destino = %s AND tipo_entidad = 'usuario' AND tenant_id = %s))"
+        params = [user_id, user_id, resource_type, tenant_id, user_id, tenant_id]
+        return condition, params
         
-    except Exception as e:
-        logger.error(f"Error en build_user_filter_condition: {str(e)}")
-        # En caso de error, restringir a registros propios por seguridad
-        return f"{created_by_field} = %s", [user_id]
-    finally:
-        cursor.close()
-        conn.close()
+    # Fallback por defecto: Solo lo propio
+    return f"{created_by_field} = %s", [user_id]
 
 
 # =====================================================
@@ -13,6 +13,11 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 import json
 
+import db_pool
+from rate_limiter import rate_limiter
+from api_log_writer import api_log_writer
+from api_key_cache import api_key_cache, invalidate_api_key
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -170,18 +175,57 @@ class PublicAPIService:
     
     def validate_api_key(self, conn, api_key: str) -> Tuple[bool, Optional[Dict]]:
         """
-        Validar una API Key y obtener información del tenant
+        Validar una API Key y obtener información del tenant.
+        Los registros encontrados se cachean (ver api_key_cache.py); el estado
+        y la expiración se comprueban en cada llamada.
         
         Args:
-            conn: Conexión a la base de datos
+            conn: Conexión a la base de datos, o None para tomar una del pool
+                  solo si la API Key no está en caché
             api_key: API Key a validar
             
         Returns:
             Tuple (es_valida, datos_api_key)
         """
+        api_key_data = api_key_cache.get('tenant_api_keys', api_key)
+        if api_key_data is None:
+            api_key_data = self._load_api_key(conn, api_key)
+            if api_key_data is None:
+                return False, None
+            api_key_cache.set('tenant_api_keys', api_key, api_key_data,
+                              api_key_id=api_key_data['id'], tenant_id=api_key_data['tenant_id'])
+        
+        # Verificar si está activa
+        if not api_key_data['activa']:
+            logger.warning(f"API Key inactiva: {api_key[:20]}...")
+            return False, {'error': 'API Key desactivada'}
+        
+        # Verificar si ha expirado
+        if api_key_data['fecha_expiracion']:
+            if datetime.now() > api_key_data['fecha_expiracion']:
+                logger.warning(f"API Key expirada: {api_key[:20]}...")
+                return False, {'error': 'API Key expirada'}
+        
+        # Registrar último uso (se vuelca a MySQL en lote, ver rate_limiter.py)
+        rate_limiter.touch(api_key_data['id'])
+        
+        logger.info(f"API Key válida para tenant {api_key_data['tenant_id']}")
+        
+        # Copia para que el llamador no modifique la entrada cacheada
+        return True, dict(api_key_data)
+    
+    def _load_api_key(self, conn, api_key: str) -> Optional[Dict]:
+        """
+        Buscar la API Key en Tenant_API_Keys con los permisos ya parseados.
+        Devuelve None si no existe o si falla la consulta.
+        """
+        # Si no hay conexión disponible la excepción llega al decorador (error 500)
+        own_conn = conn is None
+        if own_conn:
+            conn = db_pool.get_connection()
+        
+        cursor = conn.cursor(dictionary=True)
         try:
-            cursor = conn.cursor(dictionary=True)
-            
             # Buscar la API Key
             sql = """
                 SELECT 
@@ -197,18 +241,7 @@ class PublicAPIService:
             
             if not api_key_data:
                 logger.warning(f"API Key no encontrada: {api_key[:20]}...")
-                return False, None
-            
-            # Verificar si está activa
-            if not api_key_data['activa']:
-                logger.warning(f"API Key inactiva: {api_key[:20]}...")
-                return False, {'error': 'API Key desactivada'}
-            
-            # Verificar si ha expirado
-            if api_key_data['fecha_expiracion']:
-                if datetime.now() > api_key_data['fecha_expiracion']:
-                    logger.warning(f"API Key expirada: {api_key[:20]}...")
-                    return False, {'error': 'API Key expirada'}
+                return None
             
             # Parsear permisos JSON
             if api_key_data['permisos']:
@@ -217,85 +250,34 @@ class PublicAPIService:
                 except:
                     api_key_data['permisos'] = {}
             
-            # Actualizar último uso
-            cursor.execute(
-                "UPDATE Tenant_API_Keys SET ultimo_uso = NOW() WHERE id = %s",
-                (api_key_data['id'],)
-            )
-            conn.commit()
-            
-            logger.info(f"API Key válida para tenant {api_key_data['tenant_id']}")
-            
-            return True, api_key_data
+            return api_key_data
             
         except Exception as e:
             logger.error(f"Error validando API Key: {str(e)}")
-            return False, None
+            return None
         finally:
             cursor.close()
+            if own_conn:
+                conn.close()
     
-    def check_rate_limit(self, conn, api_key_id: int, rate_limit_per_minute: int) -> Tuple[bool, int]:
+    def check_rate_limit(self, conn, api_key_id: int, rate_limit_per_minute: int,
+                         rate_limit_per_day: int = None) -> Tuple[bool, int, Optional[str]]:
         """
-        Verificar si la API Key ha excedido el rate limit
+        Verificar si la API Key ha excedido el rate limit por minuto o por día.
+        No escribe en la base de datos: el conteo vive en el backend de
+        rate_limiter y se vuelca a API_Key_Rate_Limits periódicamente.
         
         Args:
-            conn: Conexión a la base de datos
+            conn: Conexión a la base de datos (no se usa, se mantiene por compatibilidad)
             api_key_id: ID de la API Key
             rate_limit_per_minute: Límite de requests por minuto
+            rate_limit_per_day: Límite de requests por día (None = sin límite diario)
             
         Returns:
-            Tuple (permitido, requests_restantes)
+            Tuple (permitido, requests_restantes, ventana_excedida)
+            ventana_excedida es 'minute', 'day' o None si se permitió
         """
-        try:
-            cursor = conn.cursor(dictionary=True)
-            
-            # Ventana de tiempo: último minuto
-            ventana_inicio = datetime.now().replace(second=0, microsecond=0)
-            
-            # Buscar o crear registro de rate limit
-            sql = """
-                SELECT request_count 
-                FROM API_Key_Rate_Limits
-                WHERE api_key_id = %s 
-                AND ventana_inicio = %s 
-                AND ventana_tipo = 'minute'
-            """
-            
-            cursor.execute(sql, (api_key_id, ventana_inicio))
-            result = cursor.fetchone()
-            
-            if result:
-                current_count = result['request_count']
-                
-                if current_count >= rate_limit_per_minute:
-                    logger.warning(f"Rate limit excedido para API Key {api_key_id}")
-                    return False, 0
-                
-                # Incrementar contador
-                cursor.execute("""
-                    UPDATE API_Key_Rate_Limits 
-                    SET request_count = request_count + 1
-                    WHERE api_key_id = %s AND ventana_inicio = %s AND ventana_tipo = 'minute'
-                """, (api_key_id, ventana_inicio))
-                
-                requests_restantes = rate_limit_per_minute - current_count - 1
-            else:
-                # Crear nuevo registro
-                cursor.execute("""
-                    INSERT INTO API_Key_Rate_Limits (api_key_id, ventana_inicio, ventana_tipo, request_count)
-                    VALUES (%s, %s, 'minute', 1)
-                """, (api_key_id, ventana_inicio))
-                
-                requests_restantes = rate_limit_per_minute - 1
-            
-            conn.commit()
-            return True, requests_restantes
-            
-        except Exception as e:
-            logger.error(f"Error verificando rate limit: {str(e)}")
-            return True, rate_limit_per_minute  # En caso de error, permitir
-        finally:
-            cursor.close()
+        return rate_limiter.check(api_key_id, rate_limit_per_minute, rate_limit_per_day)
     
     def log_api_request(self, conn, api_key_id: int, tenant_id: int,
                        endpoint: str, metodo: str, status_code: int,
@@ -303,10 +285,12 @@ class PublicAPIService:
                        query_params: Dict = None, error_message: str = None,
                        response_time_ms: int = None):
         """
-        Registrar uso de la API Key para auditoría
+        Registrar uso de la API Key para auditoría.
+        El registro se encola y se escribe en lote (ver api_log_writer.py),
+        junto con los contadores de Tenant_API_Keys.
         
         Args:
-            conn: Conexión a la base de datos
+            conn: Conexión a la base de datos (no se usa, se mantiene por compatibilidad)
             api_key_id: ID de la API Key
             tenant_id: ID del tenant
             endpoint: Endpoint accedido
@@ -319,54 +303,24 @@ class PublicAPIService:
             response_time_ms: Tiempo de respuesta en ms
         """
         try:
-            cursor = conn.cursor()
-            
-            exitoso = 200 <= status_code < 300
-            
-            sql = """
-                INSERT INTO API_Key_Logs (
-                    api_key_id, tenant_id, endpoint, metodo, status_code,
-                    exitoso, ip_origen, user_agent, query_params,
-                    error_message, response_time_ms
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            cursor.execute(sql, (
-                api_key_id,
-                tenant_id,
-                endpoint,
-                metodo,
-                status_code,
-                exitoso,
-                ip_origen,
-                user_agent,
-                json.dumps(query_params) if query_params else None,
-                error_message,
-                response_time_ms
-            ))
-            
-            # Actualizar contador en la API Key
-            if exitoso:
-                cursor.execute("""
-                    UPDATE Tenant_API_Keys 
-                    SET total_requests = total_requests + 1,
-                        requests_exitosos = requests_exitosos + 1
-                    WHERE id = %s
-                """, (api_key_id,))
-            else:
-                cursor.execute("""
-                    UPDATE Tenant_API_Keys 
-                    SET total_requests = total_requests + 1,
-                        requests_fallidos = requests_fallidos + 1
-                    WHERE id = %s
-                """, (api_key_id,))
-            
-            conn.commit()
-            
+            queued = api_log_writer.submit({
+                'api_key_id': api_key_id,
+                'tenant_id': tenant_id,
+                'endpoint': endpoint,
+                'metodo': metodo,
+                'status_code': status_code,
+                'exitoso': 200 <= status_code < 300,
+                'ip_origen': ip_origen,
+                'user_agent': user_agent,
+                'query_params': json.dumps(query_params) if query_params else None,
+                'error_message': error_message,
+                'response_time_ms': response_time_ms,
+                'timestamp': datetime.now()
+            })
+            if not queued:
+                logger.warning(f"Cola de logs de API llena, registro descartado (API Key {api_key_id})")
         except Exception as e:
             logger.error(f"Error registrando log de API: {str(e)}")
-        finally:
-            cursor.close()
     
     def get_api_keys_by_tenant(self, conn, tenant_id: int) -> List[Dict]:
         """
@@ -440,6 +394,8 @@ class PublicAPIService:
             cursor.execute(sql, (api_key_id, tenant_id))
             conn.commit()
             
+            invalidate_api_key(api_key_id, tenant_id)
+            
             if cursor.rowcount > 0:
                 logger.info(f"API Key {api_key_id} desactivada para tenant {tenant_id}")
                 return True
@@ -476,6 +432,8 @@ class PublicAPIService:
             cursor.execute(sql, (api_key_id, tenant_id))
             conn.commit()
             
+            invalidate_api_key(api_key_id, tenant_id)
+            
             if cursor.rowcount > 0:
                 logger.info(f"API Key {api_key_id} eliminada para tenant {tenant_id}")
                 return True
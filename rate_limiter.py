@@ -0,0 +1,259 @@
+"""
+Rate limiting para las API Keys públicas sin escrituras en MySQL por petición.
+
+Backends:
+    - RedisRateLimitBackend: contadores compartidos entre workers usando el
+      REDIS_URL existente. Acepta cualquier cliente compatible con redis-py
+      (por ejemplo fakeredis.FakeRedis en pruebas).
+    - InMemoryRateLimitBackend: token bucket por proceso. Cada worker de
+      gunicorn lleva su propia cuenta, así que con N workers el límite
+      efectivo llega a N veces el configurado. Solo para desarrollo o un
+      único worker.
+
+El uso (ultimo_uso y conteos por minuto en API_Key_Rate_Limits) se acumula en
+memoria y se vuelca a MySQL periódicamente desde un hilo en segundo plano.
+
+Variables de entorno:
+    RATE_LIMIT_BACKEND          'redis' o 'memory'. Sin valor: 'redis' si hay
+                                REDIS_URL, si no 'memory'
+    RATE_LIMIT_FLUSH_INTERVAL   Segundos entre volcados de uso a MySQL (default 30)
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+from datetime import datetime, date
+from typing import Dict, Optional, Tuple
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryRateLimitBackend:
+    """Token bucket por minuto + contador diario, en memoria del proceso"""
+
+    def __init__(self):
+        self._buckets = {}   # api_key_id -> [tokens, ultimo_refill]
+        self._daily = {}     # api_key_id -> (fecha, conteo)
+        self._lock = threading.Lock()
+
+    def hit(self, api_key_id: int, per_minute: int, per_day: Optional[int]) -> Tuple[bool, int, Optional[str]]:
+        now = time.monotonic()
+        today = date.today()
+
+        with self._lock:
+            day, day_count = self._daily.get(api_key_id, (today, 0))
+            if day != today:
+                day_count = 0
+            if per_day and day_count >= per_day:
+                return False, 0, 'day'
+
+            tokens, last_refill = self._buckets.get(api_key_id, (float(per_minute), now))
+            # Recargar a razón de per_minute tokens cada 60 segundos
+            tokens = min(float(per_minute), tokens + (now - last_refill) * per_minute / 60.0)
+            if tokens < 1:
+                self._buckets[api_key_id] = (tokens, now)
+                return False, 0, 'minute'
+
+            tokens -= 1
+            self._buckets[api_key_id] = (tokens, now)
+            self._daily[api_key_id] = (today, day_count + 1)
+            return True, int(tokens), None
+
+
+class RedisRateLimitBackend:
+    """Ventanas fijas por minuto y por día compartidas en Redis"""
+
+    def __init__(self, client=None, prefix='rl'):
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise ImportError("redis no está instalado")
+            client = redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        # Falla aquí y no en la primera petición: RateLimiter.check deja pasar
+        # todo cuando el backend lanza excepciones
+        client.ping()
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, api_key_id: int, per_minute: int, per_day: Optional[int]) -> Tuple[bool, int, Optional[str]]:
+        now = int(time.time())
+        minute_key = f"{self.prefix}:{api_key_id}:m:{now // 60}"
+        day_key = f"{self.prefix}:{api_key_id}:d:{date.today().isoformat()}"
+
+        pipe = self.client.pipeline()
+        pipe.incr(minute_key)
+        pipe.expire(minute_key, 120)
+        minute_count = int(pipe.execute()[0])
+        if minute_count > per_minute:
+            return False, 0, 'minute'
+
+        if per_day:
+            pipe = self.client.pipeline()
+            pipe.incr(day_key)
+            pipe.expire(day_key, 2 * 86400)
+            day_count = int(pipe.execute()[0])
+            if day_count > per_day:
+                # No consumir cupo de minuto por una petición rechazada
+                self.client.decr(minute_key)
+                return False, 0, 'day'
+
+        return True, per_minute - minute_count, None
+
+
+class UsageRecorder:
+    """Acumula el uso de las API Keys y lo vuelca a MySQL en lote"""
+
+    def __init__(self, flush_interval: float = 30):
+        self.flush_interval = flush_interval
+        self._counts: Dict[Tuple[int, datetime], int] = {}
+        self._last_used: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    def touch(self, api_key_id: int):
+        with self._lock:
+            self._last_used[api_key_id] = datetime.now()
+        self._ensure_thread()
+
+    def count(self, api_key_id: int):
+        ventana = datetime.now().replace(second=0, microsecond=0)
+        with self._lock:
+            key = (api_key_id, ventana)
+            self._counts[key] = self._counts.get(key, 0) + 1
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._thread_pid != pid or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='api-usage-flush', daemon=True)
+                self._thread_pid = pid
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Escribe en MySQL el uso acumulado desde el último volcado"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            last_used, self._last_used = self._last_used, {}
+
+        if not counts and not last_used:
+            return
+
+        try:
+            conn = db_pool.get_connection()
+        except Exception as e:
+            logger.error(f"No se pudo volcar uso de API Keys: {str(e)}")
+            self._restore(counts, last_used)
+            return
+
+        cursor = conn.cursor()
+        try:
+            if counts:
+                cursor.executemany("""
+                    INSERT INTO API_Key_Rate_Limits (api_key_id, ventana_inicio, ventana_tipo, request_count)
+                    VALUES (%s, %s, 'minute', %s)
+                    ON DUPLICATE KEY UPDATE request_count = request_count + VALUES(request_count)
+                """, [(api_key_id, ventana, n) for (api_key_id, ventana), n in counts.items()])
+
+            if last_used:
+                cursor.executemany(
+                    "UPDATE Tenant_API_Keys SET ultimo_uso = GREATEST(COALESCE(ultimo_uso, %s), %s) WHERE id = %s",
+                    [(ts, ts, api_key_id) for api_key_id, ts in last_used.items()]
+                )
+
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error volcando uso de API Keys: {str(e)}")
+            self._restore(counts, last_used)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _restore(self, counts, last_used):
+        """Reincorpora lo no escrito para el siguiente intento"""
+        with self._lock:
+            for key, n in counts.items():
+                self._counts[key] = self._counts.get(key, 0) + n
+            for api_key_id, ts in last_used.items():
+                current = self._last_used.get(api_key_id)
+                if current is None or ts > current:
+                    self._last_used[api_key_id] = ts
+
+
+class RateLimiter:
+    """Fachada usada por PublicAPIService: aplica límites y registra el uso"""
+
+    def __init__(self, backend, recorder: UsageRecorder):
+        self.backend = backend
+        self.recorder = recorder
+
+    def check(self, api_key_id: int, per_minute: int, per_day: Optional[int] = None) -> Tuple[bool, int, Optional[str]]:
+        """
+        Returns:
+            Tuple (permitido, requests_restantes_en_el_minuto, ventana_excedida)
+            donde ventana_excedida es 'minute', 'day' o None
+        """
+        try:
+            allowed, remaining, window = self.backend.hit(api_key_id, per_minute, per_day)
+        except Exception as e:
+            logger.error(f"Error verificando rate limit: {str(e)}")
+            return True, per_minute, None  # En caso de error, permitir
+
+        if allowed:
+            self.recorder.count(api_key_id)
+        else:
+            logger.warning(f"Rate limit ({window}) excedido para API Key {api_key_id}")
+        return allowed, remaining, window
+
+    def touch(self, api_key_id: int):
+        self.recorder.touch(api_key_id)
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Construye el RateLimiter según RATE_LIMIT_BACKEND (por defecto Redis si hay REDIS_URL)"""
+    backend_name = os.getenv('RATE_LIMIT_BACKEND', '').lower()
+    if not backend_name:
+        backend_name = 'redis' if os.getenv('REDIS_URL') else 'memory'
+    backend = None
+
+    if backend_name == 'redis':
+        try:
+            backend = RedisRateLimitBackend()
+            logger.info("Rate limiter usando backend Redis")
+        except Exception as e:
+            logger.error(
+                f"Backend Redis no disponible para rate limiting: {str(e)}. "
+                f"Usando memoria: los límites se cuentan por worker, no globalmente"
+            )
+
+    if backend is None:
+        backend = InMemoryRateLimitBackend()
+        if backend_name != 'redis':
+            logger.warning("Rate limiter en memoria: los límites se cuentan por worker, no globalmente")
+
+    recorder = UsageRecorder(flush_interval=float(os.getenv('RATE_LIMIT_FLUSH_INTERVAL', 30)))
+    atexit.register(recorder.flush)
+    return RateLimiter(backend, recorder)
+
+
+# Instancia global del rate limiter
+rate_limiter = create_rate_limiter()
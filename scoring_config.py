@@ -59,7 +59,8 @@ AVAILABILITY_WEIGHTS = {
 
 # Configuración de la tarea periódica de recálculo
 RECALCULATION_CONFIG = {
-    'stale_days': 7,       # Número de días para considerar una puntuación "estancada"
+    'stale_days': 30,      # Días para considerar una puntuación "estancada" (los cambios se recalculan por eventos)
+    'dirty_interval': 120, # Segundos entre pasadas del recálculo de candidatos con cambios
     'batch_size': 1000,    # Número máximo de candidatos a recalcular por lote
     'hour': 2,             # Hora del día para ejecutar el recálculo (2 AM)
     'minute': 0
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Simulación de pesos de puntuación (what-if) desde la línea de comandos.
+
+Puntúa en memoria los candidatos de un tenant con los pesos de
+scoring_config y con un juego alternativo, sin escribir nada, y muestra el
+histograma de categorías de ambos y los candidatos que más cambian. Es lo
+mismo que POST /api/candidates/scoring/simulate. Usa la configuración de BD
+del .env.
+
+Uso:
+    python simulate_scoring.py --tenant 1 --weights '{"experience": {"years_multiplier": 3}}'
+    python simulate_scoring.py --tenant 1 --weights pesos.json --top 50
+    python simulate_scoring.py --tenant 1 --weights pesos.json --json
+
+--weights acepta JSON en línea o la ruta de un archivo JSON, con las secciones
+de candidate_scoring.default_weights (experience, education, skills, history,
+availability, thresholds); solo hace falta indicar las claves que cambian.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import db_pool
+from candidate_scoring import load_tenant_features, prepare_features, simulate
+
+
+def _read_weights(value):
+    if not value:
+        return None
+    if os.path.exists(value):
+        with open(value, encoding='utf-8') as source:
+            return json.load(source)
+    return json.loads(value)
+
+
+def report(result):
+    print(f"Candidatos: {result['candidatos']}  ({result['elapsed_ms']} ms)")
+    print(f"Score promedio: {result['score_promedio']['actual']} -> {result['score_promedio']['simulado']}")
+    print(f"Cambios de categoría: {result['cambios_categoria']}\n")
+
+    print(f"{'categoría':<12}{'actual':>10}{'simulado':>10}{'delta':>8}")
+    for category, actual in result['histograma']['actual'].items():
+        simulated = result['histograma']['simulado'][category]
+        print(f"{category:<12}{actual:>10}{simulated:>10}{simulated - actual:>+8}")
+
+    if result['top_movers']:
+        print(f"\n{'id':>8}  {'nombre':<32}{'actual':>8}{'simulado':>10}{'delta':>7}  categoría")
+        for mover in result['top_movers']:
+            name = (mover['nombre_completo'] or '')[:30]
+            print(f"{mover['id_afiliado']:>8}  {name:<32}{mover['score_actual']:>8}{mover['score_simulado']:>10}"
+                  f"{mover['delta']:>+7}  {mover['categoria_actual']} -> {mover['categoria_simulada']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulación de pesos de puntuación de candidatos')
+    parser.add_argument('--tenant', type=int, required=True)
+    parser.add_argument('--weights', help='JSON en línea o ruta de un archivo JSON con los pesos a cambiar')
+    parser.add_argument('--top', type=int, default=20, help='Candidatos con mayor cambio a mostrar')
+    parser.add_argument('--json', action='store_true', help='Imprimir el resultado completo en JSON')
+    args = parser.parse_args()
+
+    try:
+        overrides = _read_weights(args.weights)
+    except (OSError, json.JSONDecodeError) as e:
+        parser.error(f"--weights inválido: {e}")
+
+    conn = db_pool.get_connection()
+    try:
+        features = prepare_features(load_tenant_features(conn, args.tenant))
+    finally:
+        conn.close()
+
+    try:
+        result = simulate(features, overrides, top=args.top)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        report(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
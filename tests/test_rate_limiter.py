@@ -0,0 +1,181 @@
+"""
+Pruebas de los backends de rate_limiter.
+
+No necesitan Redis ni MySQL: el backend Redis recibe un cliente falso con la
+parte de la API de redis-py que usa (ping, pipeline, incr, expire, decr).
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limiter  # noqa: E402
+from rate_limiter import (  # noqa: E402
+    InMemoryRateLimitBackend,
+    RateLimiter,
+    RedisRateLimitBackend,
+)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def incr(self, key):
+        self.ops.append(lambda: self.client.incr(key))
+        return self
+
+    def expire(self, key, seconds):
+        self.ops.append(lambda: self.client.expire(key, seconds))
+        return self
+
+    def execute(self):
+        return [op() for op in self.ops]
+
+
+class FakeRedis:
+    """Cliente en memoria compartido entre 'workers' (instancias del backend)"""
+
+    def __init__(self, available=True):
+        self.available = available
+        self.values = {}
+        self.ttls = {}
+
+    def ping(self):
+        if not self.available:
+            raise ConnectionError("Connection refused")
+        return True
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def decr(self, key):
+        self.values[key] = self.values.get(key, 0) - 1
+        return self.values[key]
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return True
+
+
+class NullRecorder:
+    def __init__(self):
+        self.counted = []
+
+    def count(self, api_key_id):
+        self.counted.append(api_key_id)
+
+    def touch(self, api_key_id):
+        pass
+
+
+# --- InMemoryRateLimitBackend ---
+
+def test_memory_allows_up_to_per_minute():
+    backend = InMemoryRateLimitBackend()
+    results = [backend.hit(1, 3, None) for _ in range(4)]
+
+    assert [allowed for allowed, _, _ in results] == [True, True, True, False]
+    assert results[-1] == (False, 0, 'minute')
+
+
+def test_memory_day_limit():
+    backend = InMemoryRateLimitBackend()
+    assert backend.hit(1, 100, 2)[0]
+    assert backend.hit(1, 100, 2)[0]
+    assert backend.hit(1, 100, 2) == (False, 0, 'day')
+
+
+def test_memory_counts_per_process():
+    # Dos workers con backend en memoria no comparten cuenta
+    worker_a = InMemoryRateLimitBackend()
+    worker_b = InMemoryRateLimitBackend()
+    assert worker_a.hit(1, 1, None)[0]
+    assert not worker_a.hit(1, 1, None)[0]
+    assert worker_b.hit(1, 1, None)[0]
+
+
+# --- RedisRateLimitBackend ---
+
+def test_redis_shared_between_workers():
+    client = FakeRedis()
+    worker_a = RedisRateLimitBackend(client=client)
+    worker_b = RedisRateLimitBackend(client=client)
+
+    assert worker_a.hit(1, 2, None) == (True, 1, None)
+    assert worker_b.hit(1, 2, None) == (True, 0, None)
+    assert worker_a.hit(1, 2, None) == (False, 0, 'minute')
+    assert all(ttl == 120 for key, ttl in client.ttls.items() if ':m:' in key)
+
+
+def test_redis_day_limit_does_not_consume_minute():
+    client = FakeRedis()
+    backend = RedisRateLimitBackend(client=client)
+
+    assert backend.hit(1, 10, 1)[0]
+    assert backend.hit(1, 10, 1) == (False, 0, 'day')
+    minute_counts = [v for key, v in client.values.items() if ':m:' in key]
+    assert minute_counts == [1]
+
+
+def test_redis_pings_on_construction():
+    with pytest.raises(ConnectionError):
+        RedisRateLimitBackend(client=FakeRedis(available=False))
+
+
+# --- create_rate_limiter ---
+
+def _patch_redis_from_url(monkeypatch, client):
+    class FakeRedisModule:
+        class Redis:
+            @staticmethod
+            def from_url(url):
+                return client
+
+    monkeypatch.setattr(rate_limiter, 'redis', FakeRedisModule)
+    monkeypatch.setattr(rate_limiter, 'REDIS_AVAILABLE', True)
+
+
+def test_defaults_to_redis_when_redis_url_set(monkeypatch):
+    monkeypatch.delenv('RATE_LIMIT_BACKEND', raising=False)
+    monkeypatch.setenv('REDIS_URL', 'redis://fake:6379/0')
+    _patch_redis_from_url(monkeypatch, FakeRedis())
+
+    limiter = rate_limiter.create_rate_limiter()
+    assert isinstance(limiter.backend, RedisRateLimitBackend)
+
+
+def test_defaults_to_memory_without_redis_url(monkeypatch):
+    monkeypatch.delenv('RATE_LIMIT_BACKEND', raising=False)
+    monkeypatch.delenv('REDIS_URL', raising=False)
+
+    limiter = rate_limiter.create_rate_limiter()
+    assert isinstance(limiter.backend, InMemoryRateLimitBackend)
+
+
+def test_falls_back_loudly_when_redis_down(monkeypatch, caplog):
+    monkeypatch.setenv('RATE_LIMIT_BACKEND', 'redis')
+    _patch_redis_from_url(monkeypatch, FakeRedis(available=False))
+
+    with caplog.at_level('ERROR', logger='rate_limiter'):
+        limiter = rate_limiter.create_rate_limiter()
+
+    assert isinstance(limiter.backend, InMemoryRateLimitBackend)
+    assert any('por worker' in r.getMessage() for r in caplog.records if r.levelname == 'ERROR')
+
+
+def test_rate_limiter_records_only_allowed():
+    recorder = NullRecorder()
+    limiter = RateLimiter(RedisRateLimitBackend(client=FakeRedis()), recorder)
+
+    assert limiter.check(7, 1)[0]
+    assert not limiter.check(7, 1)[0]
+    assert recorder.counted == [7]
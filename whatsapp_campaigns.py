@@ -0,0 +1,513 @@
+"""
+Envío por lotes de campañas y notificaciones de WhatsApp a través de bridge.js.
+
+Una campaña se crea en dos consultas acotadas: los destinatarios se resuelven
+con un solo SELECT ... IN por cada ID_CHUNK candidatos, y los mensajes ya
+personalizados se guardan en WhatsApp_Campaign_Messages con INSERTs de varias
+filas. El envío lo hace la tarea dispatch_whatsapp_campaign de Celery:
+
+    - reclama los mensajes pendientes por keyset (id) en lotes de BATCH_SIZE:
+      un UPDATE los pasa a 'sending' con un claim_id propio, así dos pasadas
+      de la misma campaña nunca toman el mismo mensaje
+    - espera tokens del throttle del tenant (token bucket de RATE_PER_MINUTE)
+    - envía el lote completo al bridge en una petición (/api/send-batch);
+      si el bridge no tiene ese endpoint, envía uno por uno reutilizando la
+      conexión HTTP (requests.Session)
+    - actualiza los estados del lote con un UPDATE por estado
+
+Una sola conexión a la base de datos por pasada y tres o cuatro consultas por
+lote: una campaña de 5.000 candidatos son ~100 lotes y, con el ritmo por
+defecto, unos 8 minutos de envío.
+
+Los fallos transitorios (red, 429, 5xx) dejan el mensaje en 'pending' hasta
+MAX_ATTEMPTS intentos; un 429 además pausa el tenant el tiempo de Retry-After.
+Si la pasada llega a DISPATCH_MAX_SECONDS, la tarea se vuelve a encolar y
+continúa desde los pendientes. Un mensaje que sigue en 'sending' más de
+CLAIM_TIMEOUT_SECONDS (worker caído a mitad de lote) vuelve a reclamarse.
+
+Las notificaciones de postulación / entrevista / contratación en grupo (p. ej.
+la resincronización de pendientes) usan el mismo envío y throttle con
+send_notifications; sus fallos transitorios se devuelven para reintentarlos.
+
+El throttle es por proceso (como los límites de gemini_scheduler): con varios
+workers de notifications enviando campañas del mismo tenant a la vez,
+WHATSAPP_TENANT_RATE_PER_MINUTE debe repartir la cuota entre ellos.
+
+Variables de entorno:
+    WHATSAPP_BATCH_SIZE               Mensajes por petición al bridge (default 50)
+    WHATSAPP_TENANT_RATE_PER_MINUTE   Mensajes por minuto por tenant (default 600)
+    WHATSAPP_MAX_ATTEMPTS             Intentos por mensaje ante fallos transitorios (default 3)
+    WHATSAPP_DISPATCH_MAX_SECONDS     Duración máxima de una pasada de envío (default 1200)
+    WHATSAPP_CLAIM_TIMEOUT_SECONDS    Segundos tras los que un mensaje en 'sending' se reclama de nuevo (default 600)
+"""
+
+import os
+import re
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from gemini_scheduler import TokenBucket, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_TABLE = 'WhatsApp_Campaign_Messages'
+BRIDGE_URL = os.getenv('BRIDGE_URL', 'http://localhost:3000')
+BATCH_SIZE = int(os.getenv('WHATSAPP_BATCH_SIZE', 50))
+RATE_PER_MINUTE = float(os.getenv('WHATSAPP_TENANT_RATE_PER_MINUTE', 600))
+MAX_ATTEMPTS = int(os.getenv('WHATSAPP_MAX_ATTEMPTS', 3))
+DISPATCH_MAX_SECONDS = float(os.getenv('WHATSAPP_DISPATCH_MAX_SECONDS', 20 * 60))
+CLAIM_TIMEOUT_SECONDS = int(os.getenv('WHATSAPP_CLAIM_TIMEOUT_SECONDS', 10 * 60))
+ID_CHUNK = 1000
+INSERT_CHUNK = 500
+REQUEST_TIMEOUT = 30
+MAX_PAUSE_SECONDS = 120
+
+TRANSIENT_STATUS = {None, 429, 500, 502, 503, 504}
+
+DEFAULT_MESSAGES = {
+    'vacancy_invitation': "Hola [nombre], tenemos una nueva oportunidad laboral que podría interesarte. ¿Te gustaría conocer más detalles?",
+    'interview_reminder': "Hola [nombre], te recordamos tu entrevista programada. ¡Te esperamos!",
+    'status_update': "Hola [nombre], hay una actualización sobre tu postulación. Te contactaremos pronto.",
+    'custom': "Hola [nombre], nos comunicamos contigo desde nuestro equipo de reclutamiento.",
+}
+
+# Estado de notificación por tipo de tarea: (tabla, columna de estado, clave)
+NOTIFICATION_STATUS_COLUMNS = {
+    'postulation': ('Postulaciones', 'whatsapp_notification_status', 'id_postulacion'),
+    'interview': ('Entrevistas', 'notification_status', 'id_entrevista'),
+    'hired': ('Contratados', 'notification_status', 'id_contratado'),
+}
+
+
+def clean_phone_number(phone_str):
+    """Limpia y estandariza los números de teléfono para Honduras."""
+    if not phone_str:
+        return None
+    digits = re.sub(r'\D', '', str(phone_str))
+    if digits.startswith('504') and len(digits) == 11:
+        return digits
+    if len(digits) == 8:
+        return f"504{digits}"
+    return digits if len(digits) >= 8 else None
+
+
+def _placeholders(count: int) -> str:
+    return ', '.join(['%s'] * count)
+
+
+# ---------------------------------------------------------------
+# Throttle por tenant
+# ---------------------------------------------------------------
+
+class TenantThrottle:
+    """Un token bucket por tenant; wait bloquea hasta poder enviar count mensajes"""
+
+    def __init__(self, rate_per_minute: float = RATE_PER_MINUTE, burst: int = BATCH_SIZE):
+        self.rate_per_minute = rate_per_minute
+        self.burst = max(burst, 1)
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._paused_until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, tenant_id: int, count: int):
+        count = min(max(count, 1), self.burst)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self._buckets.setdefault(tenant_id, TokenBucket(self.rate_per_minute, self.burst))
+                pause = self._paused_until.get(tenant_id, 0.0) - now
+                available = bucket.available(now)
+                if pause <= 0 and available >= count:
+                    bucket.tokens -= count
+                    return
+                delay = max(pause, (count - available) / bucket.rate)
+            time.sleep(delay)
+
+    def pause(self, tenant_id: int, seconds: float):
+        """Detiene los envíos del tenant (p. ej. tras un 429 del bridge)"""
+        seconds = min(max(seconds, 1.0), MAX_PAUSE_SECONDS)
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until[tenant_id] = max(self._paused_until.get(tenant_id, 0.0), now + seconds)
+            bucket = self._buckets.get(tenant_id)
+            if bucket:
+                bucket.drain(now)
+        logger.warning(f"WhatsApp: tenant {tenant_id} en pausa {seconds:.1f}s")
+
+
+throttle = TenantThrottle()
+
+
+# ---------------------------------------------------------------
+# Envío al bridge
+# ---------------------------------------------------------------
+
+_batch_endpoint = True
+_session_local = threading.local()
+
+
+def _session() -> requests.Session:
+    session = getattr(_session_local, 'session', None)
+    if session is None:
+        session = _session_local.session = requests.Session()
+        session.headers.update({'Content-Type': 'application/json'})
+    return session
+
+
+def _result_from_response(response) -> Tuple[bool, Optional[int], Optional[str]]:
+    if response.status_code == 200:
+        return True, 200, None
+    return False, response.status_code, f"{response.status_code} - {response.text[:200]}"
+
+
+def send_tasks(tasks: List[Dict[str, Any]], tenant_id: Optional[int] = None) -> List[Tuple[bool, Optional[int], Optional[str]]]:
+    """
+    Envía un lote de tareas al bridge ({task_type, related_id, chat_id,
+    message_body}). Devuelve (enviado, status HTTP, error) por tarea, en el
+    mismo orden; status None es un error de red. Un 429 pausa al tenant.
+    """
+    global _batch_endpoint
+    session = _session()
+    timestamp = datetime.now().isoformat()
+    tasks = [dict(task, timestamp=timestamp) for task in tasks]
+
+    if _batch_endpoint:
+        try:
+            response = session.post(f"{BRIDGE_URL}/api/send-batch", json={'tasks': tasks},
+                                    timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            return [(False, None, f"bridge no disponible: {str(e)}")] * len(tasks)
+        if response.status_code in (404, 405):
+            logger.warning("bridge.js sin /api/send-batch, se envía mensaje por mensaje")
+            _batch_endpoint = False
+        elif response.status_code == 200:
+            # Sin detalle por mensaje, el 200 vale para todo el lote
+            try:
+                results = {str(item.get('related_id')): item for item in response.json().get('results', [])}
+            except (ValueError, AttributeError):
+                results = {}
+            outcome = []
+            for task in tasks:
+                item = results.get(str(task['related_id']), {'success': not results})
+                if item.get('success'):
+                    outcome.append((True, 200, None))
+                else:
+                    outcome.append((False, 200, str(item.get('error') or 'rechazado por bridge')))
+            return outcome
+        else:
+            if response.status_code == 429 and tenant_id is not None:
+                throttle.pause(tenant_id, retry_after_seconds(response) or 2 ** MAX_ATTEMPTS)
+            return [_result_from_response(response)] * len(tasks)
+
+    results = []
+    for task in tasks:
+        try:
+            response = session.post(f"{BRIDGE_URL}/api/send-task", json=task, timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            results.append((False, None, f"bridge no disponible: {str(e)}"))
+            continue
+        if response.status_code == 429 and tenant_id is not None:
+            throttle.pause(tenant_id, retry_after_seconds(response) or 2 ** MAX_ATTEMPTS)
+            # El resto del lote queda para el siguiente intento
+            results.extend([_result_from_response(response)] * (len(tasks) - len(results)))
+            break
+        results.append(_result_from_response(response))
+    return results
+
+
+def update_notification_status(cursor, task_type: str, related_ids: Iterable[int], status: str):
+    """Marca el estado de notificación ('sent' / 'failed') de varias filas de un tipo"""
+    related_ids = list(related_ids)
+    if task_type not in NOTIFICATION_STATUS_COLUMNS or not related_ids:
+        return
+    table, column, key = NOTIFICATION_STATUS_COLUMNS[task_type]
+    for start in range(0, len(related_ids), ID_CHUNK):
+        chunk = related_ids[start:start + ID_CHUNK]
+        cursor.execute(
+            f"UPDATE {table} SET {column} = %s WHERE {key} IN ({_placeholders(len(chunk))})",
+            (status, *chunk)
+        )
+
+
+def _split_results(ids: List[Any], results) -> Tuple[List[Any], List[Tuple[Any, bool, str]]]:
+    """Separa el resultado de send_tasks en enviados y fallos (id, transitorio, error)"""
+    sent_ids, failures = [], []
+    for item_id, (ok, status_code, error) in zip(ids, results):
+        if ok:
+            sent_ids.append(item_id)
+        else:
+            failures.append((item_id, status_code in TRANSIENT_STATUS, error))
+    return sent_ids, failures
+
+
+def send_notifications(conn, notifications: List[Dict[str, Any]], final: bool = False) -> Dict[str, Any]:
+    """
+    Envía notificaciones de postulación / entrevista / contratación
+    ({task_type, related_id, phone_number, message_body, tenant_id}) por lotes,
+    con el throttle de su tenant, y actualiza sus estados con un UPDATE por
+    tipo y estado. Los fallos transitorios se devuelven en 'retry' sin tocar
+    su estado, salvo en el último intento (final), que los marca 'failed'.
+    """
+    outcome: Dict[Tuple[str, str], List[int]] = {}
+    by_tenant: Dict[Optional[int], List[Dict[str, Any]]] = {}
+    for item in notifications:
+        if clean_phone_number(item.get('phone_number')):
+            by_tenant.setdefault(item.get('tenant_id'), []).append(item)
+        else:
+            outcome.setdefault((item['task_type'], 'failed'), []).append(item['related_id'])
+
+    retry = []
+    for tenant_id, items in by_tenant.items():
+        for start in range(0, len(items), throttle.burst):
+            batch = items[start:start + throttle.burst]
+            throttle.wait(tenant_id, len(batch))
+            results = send_tasks([
+                {'task_type': item['task_type'], 'related_id': item['related_id'],
+                 'chat_id': clean_phone_number(item['phone_number']), 'message_body': item['message_body']}
+                for item in batch
+            ], tenant_id=tenant_id)
+            sent, failures = _split_results(batch, results)
+            for item in sent:
+                outcome.setdefault((item['task_type'], 'sent'), []).append(item['related_id'])
+            for item, transient, _ in failures:
+                if transient and not final:
+                    retry.append(item)
+                else:
+                    outcome.setdefault((item['task_type'], 'failed'), []).append(item['related_id'])
+
+    cursor = conn.cursor()
+    try:
+        for (task_type, status), related_ids in outcome.items():
+            update_notification_status(cursor, task_type, related_ids, status)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    counts = {status: sum(len(ids) for (_, s), ids in outcome.items() if s == status)
+              for status in ('sent', 'failed')}
+    return {**counts, 'retry': retry}
+
+
+# ---------------------------------------------------------------
+# Campañas
+# ---------------------------------------------------------------
+
+def parse_candidate_ids(candidate_ids) -> List[int]:
+    """IDs de candidatos de una lista o de un texto separado por comas, sin repetidos"""
+    if isinstance(candidate_ids, str):
+        candidate_ids = candidate_ids.split(',')
+    ids = (str(value).strip() for value in candidate_ids or [])
+    return list(dict.fromkeys(int(value) for value in ids if value.isdigit()))
+
+
+def resolve_recipients(cursor, tenant_id: int, candidate_ids=None,
+                       vacancy_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Candidatos destinatarios (id_afiliado, nombre_completo, telefono): por lista
+    de IDs, una consulta por cada ID_CHUNK, o los postulados a una vacante.
+    cursor debe ser dictionary=True.
+    """
+    if candidate_ids:
+        ids = parse_candidate_ids(candidate_ids)
+        recipients = []
+        for start in range(0, len(ids), ID_CHUNK):
+            chunk = ids[start:start + ID_CHUNK]
+            cursor.execute(f"""
+                SELECT id_afiliado, nombre_completo, telefono
+                FROM Afiliados
+                WHERE tenant_id = %s AND id_afiliado IN ({_placeholders(len(chunk))})
+            """, (tenant_id, *chunk))
+            recipients.extend(cursor.fetchall())
+        order = {candidate_id: index for index, candidate_id in enumerate(ids)}
+        return sorted(recipients, key=lambda row: order[row['id_afiliado']])
+
+    if vacancy_id:
+        cursor.execute("""
+            SELECT DISTINCT a.id_afiliado, a.nombre_completo, a.telefono
+            FROM Afiliados a
+            JOIN Postulaciones p ON a.id_afiliado = p.id_afiliado
+            JOIN Vacantes v ON p.id_vacante = v.id_vacante
+            WHERE v.id_vacante = %s AND v.tenant_id = %s AND a.tenant_id = %s
+        """, (vacancy_id, tenant_id, tenant_id))
+        return cursor.fetchall()
+
+    return []
+
+
+def build_messages(recipients: List[Dict[str, Any]], message_body: str) -> List[Dict[str, Any]]:
+    """Mensajes personalizados ([nombre]) para los destinatarios con teléfono válido, uno por teléfono"""
+    messages, phones = [], set()
+    for recipient in recipients:
+        phone = clean_phone_number(recipient.get('telefono'))
+        if not phone or len(phone) < 10 or phone in phones:
+            continue
+        phones.add(phone)
+        messages.append({
+            'id_afiliado': recipient['id_afiliado'],
+            'nombre_completo': recipient['nombre_completo'],
+            'telefono': phone,
+            'mensaje_personalizado': message_body.replace('[nombre]', recipient['nombre_completo'] or ''),
+        })
+    return messages
+
+
+def create_campaign(conn, tenant_id: int, messages: List[Dict[str, Any]],
+                    created_by: Optional[int] = None) -> str:
+    """Guarda los mensajes de la campaña como pendientes y devuelve su campaign_id"""
+    campaign_id = uuid.uuid4().hex
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(messages), INSERT_CHUNK):
+            chunk = messages[start:start + INSERT_CHUNK]
+            cursor.execute(f"""
+                INSERT INTO {CAMPAIGN_TABLE}
+                    (campaign_id, tenant_id, id_afiliado, telefono, mensaje, status, created_by)
+                VALUES {', '.join(["(%s, %s, %s, %s, %s, 'pending', %s)"] * len(chunk))}
+            """, tuple(
+                value for message in chunk for value in (
+                    campaign_id, tenant_id, message['id_afiliado'], message['telefono'],
+                    message['mensaje_personalizado'], created_by
+                )
+            ))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return campaign_id
+
+
+def _claim_batch(conn, cursor, campaign_id: str, last_id: int, limit: int) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Pasa a 'sending' hasta limit mensajes pendientes de la campaña (o en
+    'sending' desde hace más de CLAIM_TIMEOUT_SECONDS) con id > last_id y
+    devuelve el claim_id y las filas reclamadas. El UPDATE es atómico: otra
+    pasada concurrente ya no ve esas filas como pendientes.
+    """
+    claim_id = uuid.uuid4().hex
+    cursor.execute(f"""
+        UPDATE {CAMPAIGN_TABLE}
+        SET status = 'sending', claim_id = %s, claimed_at = NOW()
+        WHERE campaign_id = %s AND id > %s
+          AND (status = 'pending'
+               OR (status = 'sending' AND claimed_at < NOW() - INTERVAL %s SECOND))
+        ORDER BY id
+        LIMIT %s
+    """, (claim_id, campaign_id, last_id, CLAIM_TIMEOUT_SECONDS, limit))
+    claimed = cursor.rowcount
+    conn.commit()
+    if not claimed:
+        return claim_id, []
+    cursor.execute(f"""
+        SELECT id, tenant_id, telefono, mensaje FROM {CAMPAIGN_TABLE}
+        WHERE claim_id = %s AND status = 'sending'
+        ORDER BY id
+    """, (claim_id,))
+    return claim_id, cursor.fetchall()
+
+
+def _update_batch(cursor, claim_id: str, sent_ids: List[int], failures: List[Tuple[int, bool, str]]):
+    """
+    Un UPDATE para los enviados y uno por error distinto para los fallidos.
+    Solo cambia las filas que siguen en 'sending' con este claim_id.
+    """
+    claimed = "status = 'sending' AND claim_id = %s"
+    if sent_ids:
+        cursor.execute(f"""
+            UPDATE {CAMPAIGN_TABLE}
+            SET status = 'sent', attempts = attempts + 1, error = NULL, sent_at = NOW()
+            WHERE {claimed} AND id IN ({_placeholders(len(sent_ids))})
+        """, (claim_id, *sent_ids))
+
+    grouped: Dict[Tuple[bool, str], List[int]] = {}
+    for message_id, transient, error in failures:
+        grouped.setdefault((transient, (error or '')[:255]), []).append(message_id)
+    for (transient, error), ids in grouped.items():
+        # Los fallos transitorios siguen pendientes hasta agotar MAX_ATTEMPTS
+        status_sql = "IF(attempts + 1 >= %s, 'failed', 'pending')" if transient else "'failed'"
+        params = (MAX_ATTEMPTS,) if transient else ()
+        cursor.execute(f"""
+            UPDATE {CAMPAIGN_TABLE}
+            SET status = {status_sql}, attempts = attempts + 1, error = %s
+            WHERE {claimed} AND id IN ({_placeholders(len(ids))})
+        """, (*params, error, claim_id, *ids))
+
+
+def dispatch_campaign(conn, campaign_id: str, max_seconds: float = DISPATCH_MAX_SECONDS) -> Dict[str, Any]:
+    """
+    Reclama y envía los mensajes pendientes de la campaña por lotes,
+    respetando el throttle del tenant. Devuelve los enviados / fallidos de esta pasada y
+    cuántos quedan pendientes (para volver a encolar).
+    """
+    started = time.monotonic()
+    cursor = conn.cursor(dictionary=True)
+    sent = failed = 0
+    try:
+        last_id = 0
+        while time.monotonic() - started < max_seconds:
+            claim_id, rows = _claim_batch(conn, cursor, campaign_id, last_id, min(BATCH_SIZE, throttle.burst))
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            tenant_id = rows[0]['tenant_id']
+
+            throttle.wait(tenant_id, len(rows))
+            results = send_tasks([
+                {'task_type': 'campaign', 'related_id': row['id'], 'chat_id': row['telefono'],
+                 'message_body': row['mensaje']}
+                for row in rows
+            ], tenant_id=tenant_id)
+
+            sent_ids, failures = _split_results([row['id'] for row in rows], results)
+            _update_batch(cursor, claim_id, sent_ids, failures)
+            conn.commit()
+            sent += len(sent_ids)
+            failed += len(failures)
+
+        cursor.execute(f"""
+            SELECT COUNT(*) AS pending FROM {CAMPAIGN_TABLE}
+            WHERE campaign_id = %s
+              AND (status = 'pending'
+                   OR (status = 'sending' AND claimed_at < NOW() - INTERVAL %s SECOND))
+        """, (campaign_id, CLAIM_TIMEOUT_SECONDS))
+        pending = int(cursor.fetchone()['pending'])
+    finally:
+        cursor.close()
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Campaña {campaign_id}: {sent} enviados, {failed} fallidos, "
+                f"{pending} pendientes en {elapsed:.1f}s")
+    return {'campaign_id': campaign_id, 'sent': sent, 'failed': failed,
+            'pending': pending, 'elapsed_seconds': round(elapsed, 1)}
+
+
+def campaign_summary(cursor, tenant_id: int, campaign_id: str) -> Optional[Dict[str, Any]]:
+    """Conteo por estado de una campaña del tenant, o None si no existe"""
+    cursor.execute(f"""
+        SELECT status, COUNT(*) AS total, MIN(created_at) AS created_at, MAX(sent_at) AS last_sent_at
+        FROM {CAMPAIGN_TABLE}
+        WHERE campaign_id = %s AND tenant_id = %s
+        GROUP BY status
+    """, (campaign_id, tenant_id))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    counts = {status: 0 for status in ('pending', 'sending', 'sent', 'failed')}
+    counts.update({row['status']: int(row['total']) for row in rows})
+    last_sent = [row['last_sent_at'] for row in rows if row['last_sent_at']]
+    return {
+        'campaign_id': campaign_id,
+        'total': sum(counts.values()),
+        **counts,
+        'created_at': min(row['created_at'] for row in rows).isoformat(),
+        'last_sent_at': max(last_sent).isoformat() if last_sent else None,
+    }